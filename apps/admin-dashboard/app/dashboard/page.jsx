@@ -26,6 +26,10 @@ const roleLabels = {
   admin: 'AM',
 }
 
+// Poll the queued report email for up to a minute
+const EMAIL_POLL_INTERVAL_MS = 2000
+const EMAIL_POLL_ATTEMPTS = 30
+
 export default function DashboardPage() {
   const router = useRouter()
   const [user, setUser] = useState(null)
@@ -36,7 +40,7 @@ export default function DashboardPage() {
   const [brief, setBrief] = useState(null)
   const [briefLoading, setBriefLoading] = useState(false)
   const [emailSending, setEmailSending] = useState(false)
-  const [emailStatus, setEmailStatus] = useState(null) // null | 'sent' | 'error'
+  const [emailStatus, setEmailStatus] = useState(null) // null | 'queued' | 'sent' | 'error'
   const [emailMsg, setEmailMsg] = useState('')
 
   useEffect(() => {
@@ -118,16 +122,33 @@ export default function DashboardPage() {
     try {
       const today = new Date().toISOString().split('T')[0]
       const result = await api.sendDailyEmailReport(today)
-      setEmailStatus('sent')
-      setEmailMsg(result?.email ? `Report sent to ${result.email}` : 'Report sent successfully')
+      if (!result?.queued) {
+        setEmailStatus('error')
+        setEmailMsg(result?.message || 'Email not configured')
+        return
+      }
+      setEmailStatus('queued')
+      setEmailMsg('Report queued for delivery...')
+
+      // Delivery happens in the background; poll the job until it is sent or failed
+      for (let i = 0; i < EMAIL_POLL_ATTEMPTS; i++) {
+        await new Promise(resolve => setTimeout(resolve, EMAIL_POLL_INTERVAL_MS))
+        const job = await api.getEmailJob(result.job_id)
+        if (job?.status === 'sent') {
+          setEmailStatus('sent')
+          setEmailMsg(`Report sent to ${job.recipients.join(', ')}`)
+          return
+        }
+        if (job?.status === 'failed') {
+          setEmailStatus('error')
+          setEmailMsg(job.last_error ? `Failed to send report: ${job.last_error}` : 'Failed to send report')
+          return
+        }
+      }
+      setEmailMsg('Report is still queued — it will be sent when the mail server is reachable')
     } catch (err) {
       setEmailStatus('error')
-      const msg = err.message || ''
-      if (msg.toLowerCase().includes('smtp') || msg.toLowerCase().includes('email') || msg.toLowerCase().includes('not configured')) {
-        setEmailMsg('Email not configured')
-      } else {
-        setEmailMsg(msg || 'Failed to send report')
-      }
+      setEmailMsg(err.message || 'Failed to send report')
     } finally {
       setEmailSending(false)
       setTimeout(() => { setEmailStatus(null); setEmailMsg('') }, 5000)
@@ -285,6 +306,9 @@ export default function DashboardPage() {
               }
               {emailSending ? 'Sending...' : 'Send Daily Email Report'}
             </button>
+            {emailStatus === 'queued' && (
+              <span className="text-xs text-slate-400">{emailMsg}</span>
+            )}
             {emailStatus === 'sent' && (
               <span className="text-xs text-green-400">✅ {emailMsg}</span>
             )}
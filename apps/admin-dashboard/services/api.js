@@ -617,6 +617,10 @@ class ApiService {
     return this.request(`/reports/send-email-report?target_date=${targetDate}`, { method: 'POST' })
   }
 
+  async getEmailJob(jobId) {
+    return this.request(`/reports/email-jobs/${jobId}`)
+  }
+
   // ============ PROMOTIONS ROI ============
   async getPromotionROI(dateFrom, dateTo, branchId) {
     const params = new URLSearchParams()
@@ -8,9 +8,15 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import logging
 
-from routers import auth, users, territories, areas, branches, flavors, inventory, analytics, cake, sales, budget, notification, expiry, visits, daily_brief, feedback, kpi, whatsapp
-from utils.database import engine, Base
+from routers import auth, users, territories, areas, branches, flavors, inventory, analytics, cake, sales, budget, notification, expiry, visits, daily_brief, feedback, kpi, whatsapp, exports
+from utils.database import engine, Base, dispose_async_engine
 from utils.config import settings
+from services.llm_gateway import shutdown_gateway
+from services.image_pipeline import shutdown_pipeline
+from services.push_dispatch import push_dispatcher
+from services.email_service import email_outbox
+from services.whatsapp import whatsapp_client
+from services.daily_brief import brief_scheduler
 
 logger = logging.getLogger(__name__)
 
@@ -177,6 +183,25 @@ def run_migrations():
                 logger.info("Migration: Adding template_filename to expiry_requests")
                 conn.execute(text("ALTER TABLE expiry_requests ADD COLUMN template_filename VARCHAR(255)"))
                 conn.commit()
+            if 'template_file_id' not in er_cols:
+                logger.info("Migration: Adding template_file_id to expiry_requests")
+                conn.execute(text("ALTER TABLE expiry_requests ADD COLUMN template_file_id INTEGER REFERENCES stored_files(id)"))
+                conn.commit()
+
+            # Move base64 templates out of the rows into the file store
+            has_legacy_templates = conn.execute(
+                text("SELECT 1 FROM expiry_requests WHERE template_file_data IS NOT NULL LIMIT 1")
+            ).first()
+            conn.commit()
+            if has_legacy_templates:
+                from utils.database import SessionLocal
+                from services.file_store import move_legacy_expiry_templates
+                db = SessionLocal()
+                try:
+                    moved = move_legacy_expiry_templates(db)
+                finally:
+                    db.close()
+                logger.info(f"Migration: {moved} expiry templates moved to the file store")
 
         # Customer feedback table migration
         if 'branches' in inspector.get_table_names() and 'customer_feedback' not in inspector.get_table_names():
@@ -246,6 +271,68 @@ def run_migrations():
                     conn.commit()
                     logger.info("Migration: expiry_responses.quantity is now FLOAT")
 
+        # Backfill sales_line_items from daily_sales.items_data on first run after the table appears
+        if 'sales_line_items' in inspector.get_table_names():
+            has_line_items = conn.execute(text("SELECT 1 FROM sales_line_items LIMIT 1")).first()
+            has_items_data = conn.execute(text("SELECT 1 FROM daily_sales WHERE items_data IS NOT NULL LIMIT 1")).first()
+            conn.commit()
+            if not has_line_items and has_items_data:
+                from utils.database import SessionLocal
+                from services.sales_items import backfill_line_items
+                logger.info("Migration: Backfilling sales_line_items from daily_sales.items_data")
+                db = SessionLocal()
+                try:
+                    count = backfill_line_items(db)
+                finally:
+                    db.close()
+                logger.info(f"Migration: {count} sales line items backfilled")
+
+        # Build branch_day_sales from history on first run after the table appears
+        if 'branch_day_sales' in inspector.get_table_names():
+            has_rollup = conn.execute(text("SELECT 1 FROM branch_day_sales LIMIT 1")).first()
+            has_sales = conn.execute(text("SELECT 1 FROM daily_sales LIMIT 1")).first()
+            conn.commit()
+            if not has_rollup and has_sales:
+                from utils.database import SessionLocal
+                from services.sales_rollup import rebuild_rollup
+                logger.info("Migration: Building branch_day_sales rollup from daily_sales")
+                db = SessionLocal()
+                try:
+                    count = rebuild_rollup(db)
+                finally:
+                    db.close()
+                logger.info(f"Migration: {count} branch_day_sales rows built")
+
+        # Seed reference data version counters so workers never race to create them
+        if 'reference_data_versions' in inspector.get_table_names():
+            from services.reference_data import ensure_version_rows
+            ensure_version_rows(conn)
+            conn.commit()
+
+        # Create composite indexes declared on models (create_all skips tables that already exist)
+        existing_tables = set(inspector.get_table_names())
+        for table in Base.metadata.tables.values():
+            if table.name not in existing_tables:
+                continue
+            existing_indexes = {ix['name'] for ix in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing_indexes:
+                    continue
+                try:
+                    logger.info(f"Migration: Creating index {index.name} on {table.name}")
+                    index.create(bind=conn)
+                    conn.commit()
+                except Exception as e:
+                    conn.rollback()
+                    if not index.unique:
+                        logger.warning(f"Migration: Could not create index {index.name}: {e}")
+                        continue
+                    # Existing duplicate rows block the unique index — fall back to a plain one
+                    logger.warning(f"Migration: Unique index {index.name} failed ({e}); creating non-unique index")
+                    columns = ", ".join(c.name for c in index.columns)
+                    conn.execute(text(f"CREATE INDEX {index.name} ON {table.name} ({columns})"))
+                    conn.commit()
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -263,8 +350,20 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.warning(f"Migration warning: {e}")
 
+    await push_dispatcher.start()
+    await email_outbox.start()
+    await whatsapp_client.start()
+    await brief_scheduler.start()
+
     yield
-    # Shutdown: Cleanup if needed
+    # Shutdown: deliver queued pushes/messages, then release pooled async connections and worker pools
+    await brief_scheduler.stop()
+    await whatsapp_client.stop()
+    await email_outbox.stop()
+    await push_dispatcher.stop()
+    await dispose_async_engine()
+    shutdown_gateway()
+    shutdown_pipeline()
 
 
 app = FastAPI(
@@ -282,6 +381,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Content-Disposition", "X-Next-Before-Id"],  # export filenames, expiry list paging
 )
 
 # Include routers
@@ -303,6 +403,7 @@ app.include_router(daily_brief.router, prefix="/api/v1/reports", tags=["Daily Br
 app.include_router(feedback.router, prefix="/api/v1/feedback", tags=["Feedback"])
 app.include_router(kpi.router, prefix="/api/v1/reports", tags=["KPI"])
 app.include_router(whatsapp.router, prefix="/api/v1/whatsapp", tags=["WhatsApp"])
+app.include_router(exports.router, prefix="/api/v1/exports", tags=["Exports"])
 
 
 @app.get("/")
@@ -9,6 +9,11 @@ from models.sales import DailySales, CupUsage, Promotion, PromotionUsage, Branch
 from models.cake import CakeProduct, CakeStock, CakeStockLog, CakeAlertConfig
 from models.notification import PushSubscription
 from models.feedback import CustomerFeedback
+from models.email_outbox import EmailJob
+from models.daily_brief import DailyBriefSnapshot, DailyBriefRun
+from models.reference_data import ReferenceDataVersion
+from models.whatsapp_config import WhatsAppConfig, WhatsAppOutboxMessage
+from models.stored_file import StoredFile
 
 __all__ = [
     "User",
@@ -29,4 +34,11 @@ __all__ = [
     "CakeAlertConfig",
     "PushSubscription",
     "CustomerFeedback",
+    "EmailJob",
+    "DailyBriefSnapshot",
+    "DailyBriefRun",
+    "ReferenceDataVersion",
+    "WhatsAppConfig",
+    "WhatsAppOutboxMessage",
+    "StoredFile",
 ]
@@ -3,7 +3,7 @@ Branch Visit model: Swipe In / Swipe Out tracking for Area Managers
 Tracks AM branch visits with time, duration, and optional photo proof
 """
 
-from sqlalchemy import Column, Integer, String, Float, DateTime, Date, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Float, DateTime, Date, ForeignKey, Text, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -29,6 +29,11 @@ class BranchVisit(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    __table_args__ = (
+        Index('ix_branch_visits_user_date', 'user_id', 'visit_date'),
+        Index('ix_branch_visits_branch_date', 'branch_id', 'visit_date'),
+    )
+
     # Relationships
     user = relationship("User")
     branch = relationship("Branch")
@@ -3,7 +3,7 @@ Cake Inventory models: CakeProduct, CakeStock, CakeStockLog, CakeAlertConfig
 Real-time cake inventory tracking with low-stock alerts
 """
 
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Enum, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Enum, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
@@ -90,6 +90,10 @@ class CakeStockLog(Base):
     recorded_by_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        Index('ix_cake_stock_logs_branch_created', 'branch_id', 'created_at'),
+    )
+
     branch = relationship("Branch", back_populates="cake_stock_logs")
     cake_product = relationship("CakeProduct", back_populates="stock_logs")
     recorded_by = relationship("User")
@@ -0,0 +1,51 @@
+"""
+Daily brief models: DailyBriefSnapshot, DailyBriefRun
+Generated AI briefs stored per user and date, keyed by a hash of their input data
+"""
+
+from sqlalchemy import Column, Integer, String, DateTime, Date, ForeignKey, Text, UniqueConstraint
+from sqlalchemy.sql import func
+
+from utils.database import Base
+
+
+class DailyBriefSnapshot(Base):
+    """
+    DailyBriefSnapshot - The latest brief for one user on one date.
+    data_hash fingerprints the gathered data (and role) the brief was written from;
+    the brief is only regenerated when that fingerprint changes.
+    """
+    __tablename__ = "daily_brief_snapshots"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    brief_date = Column(Date, nullable=False)
+    data_hash = Column(String(64), nullable=False)
+    data_json = Column(Text, nullable=False)
+    brief_text = Column(Text, nullable=False)
+    source = Column(String(20), nullable=False, default="ai")  # ai | fallback | empty
+    generated_at = Column(DateTime(timezone=True), server_default=func.now())
+    checked_at = Column(DateTime(timezone=True), nullable=True)  # last time the inputs were re-hashed
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "brief_date", name="uq_daily_brief_user_date"),
+    )
+
+    def __repr__(self):
+        return f"<DailyBriefSnapshot user={self.user_id} {self.brief_date}>"
+
+
+class DailyBriefRun(Base):
+    """
+    DailyBriefRun - One scheduled pre-generation slot.
+    Every API worker runs the scheduler; inserting the row for a slot claims it,
+    so only the worker whose insert succeeds generates that slot's briefs.
+    """
+    __tablename__ = "daily_brief_runs"
+
+    run_at = Column(DateTime, primary_key=True)  # scheduled slot, naive UTC
+    claimed_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    def __repr__(self):
+        return f"<DailyBriefRun {self.run_at}>"
@@ -0,0 +1,50 @@
+"""
+Email outbox model: EmailJob
+Queued emails delivered by the background SMTP worker (services/email_service.py)
+"""
+
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Enum, Index
+from sqlalchemy.sql import func
+import enum
+
+from utils.database import Base
+
+
+class EmailJobStatus(str, enum.Enum):
+    QUEUED = "queued"
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+
+
+class EmailJob(Base):
+    """
+    EmailJob - One email waiting for (or done with) delivery.
+    next_attempt_at is both the retry schedule for QUEUED jobs and the lease
+    expiry for SENDING jobs, so a job claimed by a crashed worker is picked up again.
+    """
+    __tablename__ = "email_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    recipients = Column(Text, nullable=False)  # comma-separated
+    subject = Column(String(500), nullable=False)
+    html_body = Column(Text, nullable=False)
+    status = Column(Enum(EmailJobStatus), default=EmailJobStatus.QUEUED, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(Text, nullable=True)
+    next_attempt_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    created_by_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_email_jobs_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+    @property
+    def recipient_list(self):
+        return [addr for addr in self.recipients.split(",") if addr]
+
+    def __repr__(self):
+        return f"<EmailJob {self.id} {self.status}>"
@@ -3,8 +3,8 @@ Expiry Tracking models: ExpiryRequest, ExpiryRequestItem, ExpiryRequestBranch, E
 Area Managers create expiry check requests, branches respond with expiry data
 """
 
-from sqlalchemy import Column, Integer, Float, String, Boolean, DateTime, Date, ForeignKey, Text, Enum, UniqueConstraint
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, Float, String, Boolean, DateTime, Date, ForeignKey, Text, Enum, UniqueConstraint, Index
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 import enum
 
@@ -33,8 +33,10 @@ class ExpiryRequest(Base):
     notes = Column(Text, nullable=True)
     status = Column(Enum(ExpiryRequestStatus), default=ExpiryRequestStatus.OPEN, nullable=False)
     created_by_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    template_file_data = Column(Text, nullable=True)      # base64 encoded Excel file
+    template_file_id = Column(Integer, ForeignKey("stored_files.id"), nullable=True)  # Excel template in the file store
     template_filename = Column(String(255), nullable=True)
+    # Legacy base64 copy of the template; run_migrations moves it into the file store and clears it
+    template_file_data = deferred(Column(Text, nullable=True))
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -42,10 +44,16 @@ class ExpiryRequest(Base):
 
     # Relationships
     created_by = relationship("User", foreign_keys=[created_by_id])
+    template_file = relationship("StoredFile")
     items = relationship("ExpiryRequestItem", back_populates="expiry_request", cascade="all, delete-orphan", order_by="ExpiryRequestItem.sort_order")
     branches = relationship("ExpiryRequestBranch", back_populates="expiry_request", cascade="all, delete-orphan")
     responses = relationship("ExpiryResponse", back_populates="expiry_request", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Area managers' listings: their own requests, newest id first
+        Index('ix_expiry_requests_creator_id', 'created_by_id', 'id'),
+    )
+
     def __repr__(self):
         return f"<ExpiryRequest {self.title}>"
 
@@ -128,6 +136,8 @@ class ExpiryResponse(Base):
 
     __table_args__ = (
         UniqueConstraint('expiry_request_item_id', 'branch_id', name='uq_expiry_response_item_branch'),
+        Index('ix_expiry_responses_request_branch', 'expiry_request_id', 'branch_id'),
+        Index('ix_expiry_responses_branch_expiry', 'branch_id', 'expiry_date'),
     )
 
     def __repr__(self):
@@ -3,7 +3,7 @@ Customer Feedback model
 Allows customers to submit ratings and feedback for a branch
 """
 
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -26,7 +26,11 @@ class CustomerFeedback(Base):
     customer_phone = Column(String(30), nullable=True)
     served_by_user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     served_by_name = Column(String(100), nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+    __table_args__ = (
+        Index('ix_customer_feedback_branch_created', 'branch_id', 'created_at'),
+    )
 
     # Relationships
     branch = relationship("Branch")
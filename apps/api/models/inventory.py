@@ -3,7 +3,7 @@ Inventory models: Flavor, DailyInventory, TubReceipt
 Core models for tracking ice cream inventory
 """
 
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Date, Text, Enum
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Date, Text, Enum, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
@@ -76,6 +76,10 @@ class DailyInventory(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    __table_args__ = (
+        Index('ix_daily_inventory_branch_date_flavor', 'branch_id', 'date', 'flavor_id'),
+    )
+
     # Relationships
     branch = relationship("Branch", back_populates="daily_inventory")
     flavor = relationship("Flavor", back_populates="daily_inventory")
@@ -119,6 +123,10 @@ class TubReceipt(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    __table_args__ = (
+        Index('ix_tub_receipts_branch_date_flavor', 'branch_id', 'date', 'flavor_id'),
+    )
+
     # Relationships
     branch = relationship("Branch", back_populates="tub_receipts")
     flavor = relationship("Flavor", back_populates="tub_receipts")
@@ -0,0 +1,25 @@
+"""
+Reference data model: ReferenceDataVersion
+Shared version counters for the in-process reference data cache (services/reference_data.py)
+"""
+
+from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy.sql import func
+
+from utils.database import Base
+
+
+class ReferenceDataVersion(Base):
+    """
+    ReferenceDataVersion - One counter per cached kind ("flavors", "branches", ...).
+    Bumped in the same transaction as any write to that kind, so every worker
+    sees the new version exactly when the change becomes visible.
+    """
+    __tablename__ = "reference_data_versions"
+
+    kind = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<ReferenceDataVersion {self.kind}={self.version}>"
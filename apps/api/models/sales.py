@@ -3,7 +3,7 @@ Sales models: DailySales, SalesSnapshot, CupUsage, Promotion
 Models for tracking sales performance and promotions
 """
 
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Date, Text, Enum, Time
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Date, Text, Enum, Time, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
@@ -98,6 +98,11 @@ class DailySales(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    __table_args__ = (
+        # Reports filter on (branch_id, date) — served by the leading columns of this index
+        Index('uq_daily_sales_branch_date_window', 'branch_id', 'date', 'sales_window', unique=True),
+    )
+
     # Relationships
     branch = relationship("Branch")
     submitted_by = relationship("User")
@@ -273,6 +278,10 @@ class DailyBudget(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    __table_args__ = (
+        Index('uq_daily_budgets_branch_date', 'branch_id', 'budget_date', unique=True),
+    )
+
     # Relationships
     branch = relationship("Branch")
 
@@ -317,6 +326,87 @@ class BudgetUpload(Base):
         return f"<BudgetUpload {self.branch_id} {self.month}>"
 
 
+class BranchDaySales(Base):
+    """
+    Branch Day Sales rollup
+    One row per branch per day holding the latest (closing-equivalent) window.
+    POS figures are cumulative, so the latest submitted window is the day's total.
+    Maintained on write by submit_daily_sales; rebuild with scripts/rebuild_sales_rollup.py.
+    """
+    __tablename__ = "branch_day_sales"
+
+    id = Column(Integer, primary_key=True, index=True)
+    branch_id = Column(Integer, ForeignKey("branches.id"), nullable=False)
+    date = Column(Date, nullable=False)
+
+    latest_sales_id = Column(Integer, ForeignKey("daily_sales.id", ondelete="SET NULL"), nullable=True)
+    latest_window = Column(String(20), nullable=True)
+    windows_submitted = Column(Integer, default=0)
+
+    # In-store POS
+    gross_sales = Column(Float, default=0)
+    net_sales = Column(Float, default=0)
+    transaction_count = Column(Integer, default=0)
+
+    # Channels
+    hd_gross_sales = Column(Float, default=0)
+    hd_net_sales = Column(Float, default=0)
+    hd_orders = Column(Integer, default=0)
+    deliveroo_gross_sales = Column(Float, default=0)
+    deliveroo_net_sales = Column(Float, default=0)
+    deliveroo_orders = Column(Integer, default=0)
+    cm_gross_sales = Column(Float, default=0)
+    cm_net_sales = Column(Float, default=0)
+    cm_orders = Column(Integer, default=0)
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        Index('uq_branch_day_sales_branch_date', 'branch_id', 'date', unique=True),
+        Index('ix_branch_day_sales_date', 'date'),
+    )
+
+    @property
+    def total_net(self) -> float:
+        """Net sales across POS + HD + Deliveroo + Cool Mood"""
+        return (self.net_sales or 0) + (self.hd_net_sales or 0) + (self.deliveroo_net_sales or 0) + (self.cm_net_sales or 0)
+
+    @property
+    def total_orders(self) -> int:
+        """GC across POS + HD + Deliveroo + Cool Mood"""
+        return (self.transaction_count or 0) + (self.hd_orders or 0) + (self.deliveroo_orders or 0) + (self.cm_orders or 0)
+
+    def __repr__(self):
+        return f"<BranchDaySales {self.branch_id} {self.date} {self.latest_window}>"
+
+
+class SalesLineItem(Base):
+    """
+    POS line item extracted from a DailySales submission.
+    Normalized copy of DailySales.items_data so promotion ROI can aggregate
+    in SQL instead of parsing JSON per row.
+    """
+    __tablename__ = "sales_line_items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    daily_sales_id = Column(Integer, ForeignKey("daily_sales.id", ondelete="CASCADE"), nullable=False, index=True)
+    branch_id = Column(Integer, ForeignKey("branches.id"), nullable=False)
+    date = Column(Date, nullable=False)
+
+    item_code = Column(String(50), nullable=True)
+    item_name = Column(String(255), nullable=True)
+    category = Column(String(100), nullable=True)
+    quantity = Column(Float, default=0)
+    sales = Column(Float, default=0)
+
+    __table_args__ = (
+        Index('ix_sales_line_items_branch_date_code', 'branch_id', 'date', 'item_code'),
+    )
+
+    def __repr__(self):
+        return f"<SalesLineItem {self.branch_id} {self.date} {self.item_code} qty={self.quantity}>"
+
+
 class TrackedItem(Base):
     """
     Tracked Promotion Item
@@ -0,0 +1,32 @@
+"""
+Stored file model: StoredFile
+Metadata for uploaded files kept in the file store (services/file_store.py) instead of table rows
+"""
+
+from sqlalchemy import Column, Integer, String, DateTime, Index
+from sqlalchemy.sql import func
+
+from utils.database import Base
+
+
+class StoredFile(Base):
+    """
+    StoredFile - One row per distinct file content. The content lives in the file
+    store under its SHA-256, so identical uploads share a single row and blob.
+    """
+    __tablename__ = "stored_files"
+
+    id = Column(Integer, primary_key=True, index=True)
+    sha256 = Column(String(64), nullable=False)
+    size_bytes = Column(Integer, nullable=False)
+    content_type = Column(String(255), nullable=False, default="application/octet-stream")
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    __table_args__ = (
+        Index('uq_stored_files_sha256', 'sha256', unique=True),
+    )
+
+    def __repr__(self):
+        return f"<StoredFile {self.sha256[:12]} ({self.size_bytes} bytes)>"
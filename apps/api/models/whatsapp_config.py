@@ -1,5 +1,8 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime, Enum, Index
 from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+import enum
+
 from utils.database import Base
 
 
@@ -12,3 +15,28 @@ class WhatsAppConfig(Base):
     alert_types = Column(String, default="sales,budget,stock,expiry")  # comma-separated
 
     branch = relationship("Branch", foreign_keys=[branch_id])
+
+
+class WhatsAppOutboxStatus(str, enum.Enum):
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+
+
+class WhatsAppOutboxMessage(Base):
+    """A message the live queue could not deliver (service down, queue full, shutdown); retried in the background."""
+    __tablename__ = "whatsapp_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    recipients = Column(Text, nullable=False)  # comma-separated phone numbers
+    message = Column(Text, nullable=False)
+    status = Column(Enum(WhatsAppOutboxStatus), default=WhatsAppOutboxStatus.PENDING, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(Text, nullable=True)
+    next_attempt_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_whatsapp_outbox_status_next_attempt", "status", "next_attempt_at"),
+    )
@@ -5,7 +5,7 @@ Handles consumption reports, trending flavors, and insights
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, desc
+from sqlalchemy import desc
 from typing import List, Optional
 from datetime import date, timedelta
 from pydantic import BaseModel
@@ -13,8 +13,12 @@ from pydantic import BaseModel
 from utils.database import get_db
 from utils.security import get_current_user, require_role
 from models.user import User, UserRole
-from models.location import Branch, Area, Territory
-from models.inventory import DailyInventory, TubReceipt, Flavor, InventoryEntryType
+from models.location import Branch, Territory
+from services.access_scope import ADMIN_AREA, get_access_scope
+from services.reference_data import get_branch, get_flavors
+from services.consumption import (
+    compute_consumption, count_days_tracked_by_flavor, count_days_reported_by_branch,
+)
 
 router = APIRouter()
 
@@ -80,72 +84,7 @@ async def get_consumption_by_flavor(
     if not branch_ids:
         return []
 
-    # Calculate consumption for each flavor
-    # Consumption = Sum of (Opening + Received - Closing) for each day
-    results = []
-
-    flavors = db.query(Flavor).filter(Flavor.is_active == True).all()
-
-    days_in_period = (date_to - date_from).days + 1
-
-    for flavor in flavors:
-        # Get total opening
-        total_opening = db.query(func.sum(DailyInventory.inches)).filter(
-            and_(
-                DailyInventory.branch_id.in_(branch_ids),
-                DailyInventory.flavor_id == flavor.id,
-                DailyInventory.date >= date_from,
-                DailyInventory.date <= date_to,
-                DailyInventory.entry_type == InventoryEntryType.OPENING
-            )
-        ).scalar() or 0
-
-        # Get total closing
-        total_closing = db.query(func.sum(DailyInventory.inches)).filter(
-            and_(
-                DailyInventory.branch_id.in_(branch_ids),
-                DailyInventory.flavor_id == flavor.id,
-                DailyInventory.date >= date_from,
-                DailyInventory.date <= date_to,
-                DailyInventory.entry_type == InventoryEntryType.CLOSING
-            )
-        ).scalar() or 0
-
-        # Get total received
-        total_received = db.query(
-            func.sum(TubReceipt.quantity * TubReceipt.inches_per_tub)
-        ).filter(
-            and_(
-                TubReceipt.branch_id.in_(branch_ids),
-                TubReceipt.flavor_id == flavor.id,
-                TubReceipt.date >= date_from,
-                TubReceipt.date <= date_to
-            )
-        ).scalar() or 0
-
-        total_consumed = total_opening + total_received - total_closing
-
-        if total_consumed > 0:
-            # Count days with data
-            days_tracked = db.query(func.count(func.distinct(DailyInventory.date))).filter(
-                and_(
-                    DailyInventory.branch_id.in_(branch_ids),
-                    DailyInventory.flavor_id == flavor.id,
-                    DailyInventory.date >= date_from,
-                    DailyInventory.date <= date_to
-                )
-            ).scalar() or 1
-
-            results.append(FlavorConsumption(
-                flavor_id=flavor.id,
-                flavor_name=flavor.name,
-                total_consumed=round(total_consumed, 2),
-                avg_daily_consumed=round(total_consumed / max(days_tracked, 1), 2),
-                days_tracked=days_tracked
-            ))
-
-    # Sort by total consumed descending
-    results.sort(key=lambda x: x.total_consumed, reverse=True)
+    results = build_flavor_consumption(db, branch_ids, date_from, date_to)
     return results[:limit]
 
 
@@ -172,19 +111,21 @@ async def get_trending_flavors(
     if not branch_ids:
         return []
 
-    results = []
-    flavors = db.query(Flavor).filter(Flavor.is_active == True).all()
+    flavors = get_flavors(db)
 
-    for flavor in flavors:
-        # Current period consumption
-        current_consumption = calculate_consumption(
-            db, branch_ids, flavor.id, current_start, today
-        )
+    # Both periods in one grouped query
+    matrix = compute_consumption(
+        db, branch_ids,
+        {"current": (current_start, today), "previous": (previous_start, previous_end)},
+        flavor_ids=[f.id for f in flavors],
+    )
+    current_by_flavor = matrix.by_flavor("current")
+    previous_by_flavor = matrix.by_flavor("previous")
 
-        # Previous period consumption
-        previous_consumption = calculate_consumption(
-            db, branch_ids, flavor.id, previous_start, previous_end
-        )
+    results = []
+    for flavor in flavors:
+        current_consumption = max(0, current_by_flavor.get(flavor.id, 0))
+        previous_consumption = max(0, previous_by_flavor.get(flavor.id, 0))
 
         if current_consumption > 0 or previous_consumption > 0:
             if previous_consumption > 0:
@@ -238,8 +179,17 @@ async def get_branch_performance(
     days_in_period = (date_to - date_from).days + 1
     results = []
 
+    flavors = get_flavors(db)
+    flavor_names = {f.id: f.name for f in flavors}
+
+    matrix = compute_consumption(
+        db, branch_ids, {"period": (date_from, date_to)}, flavor_ids=list(flavor_names)
+    )
+    cell_consumption = matrix.by_branch_flavor("period")
+    days_by_branch = count_days_reported_by_branch(db, branch_ids, date_from, date_to)
+
     for branch_id in branch_ids:
-        branch = db.query(Branch).filter(Branch.id == branch_id).first()
+        branch = get_branch(db, branch_id)
         if not branch:
             continue
 
@@ -247,9 +197,8 @@ async def get_branch_performance(
         total_consumption = 0
         flavor_consumption = {}
 
-        flavors = db.query(Flavor).filter(Flavor.is_active == True).all()
         for flavor in flavors:
-            consumption = calculate_consumption(db, [branch_id], flavor.id, date_from, date_to)
+            consumption = max(0, cell_consumption.get((branch_id, flavor.id), 0))
             if consumption > 0:
                 flavor_consumption[flavor.name] = consumption
                 total_consumption += consumption
@@ -258,13 +207,7 @@ async def get_branch_performance(
         top_flavor = max(flavor_consumption.items(), key=lambda x: x[1])[0] if flavor_consumption else "N/A"
 
         # Count days with both opening and closing
-        complete_days = db.query(func.count(func.distinct(DailyInventory.date))).filter(
-            and_(
-                DailyInventory.branch_id == branch_id,
-                DailyInventory.date >= date_from,
-                DailyInventory.date <= date_to
-            )
-        ).scalar() or 0
+        complete_days = days_by_branch.get(branch_id, 0)
 
         # Simplistic completion rate calculation
         completion_rate = (complete_days / days_in_period) * 100 if days_in_period > 0 else 0
@@ -308,17 +251,8 @@ async def get_consumption_summary(
             bottom_flavors=[]
         )
 
-    # Get all consumption data
-    all_consumption = await get_consumption_by_flavor(
-        date_from=date_from,
-        date_to=date_to,
-        branch_id=branch_id,
-        area_id=area_id,
-        territory_id=territory_id,
-        limit=100,
-        current_user=current_user,
-        db=db
-    )
+    # Get all consumption data (same engine run as /consumption)
+    all_consumption = build_flavor_consumption(db, branch_ids, date_from, date_to)[:100]
 
     total = sum(f.total_consumed for f in all_consumption)
     days = (date_to - date_from).days + 1
@@ -344,30 +278,63 @@ def get_accessible_branch_ids(
 ) -> List[int]:
     """
     Get list of branch IDs the user can access
-    Applies role-based filtering
+    Role scope comes from the shared access-scope cache (inactive branches included
+    for history); the optional filters narrow it down
     """
-    query = db.query(Branch.id)
-
-    # Apply role-based filter
-    if user.role == UserRole.STAFF:
-        query = query.filter(Branch.id == user.branch_id)
-    elif user.role == UserRole.ADMIN:
-        query = query.filter(Branch.area_id == user.area_id)
-    elif user.role == UserRole.SUPER_ADMIN:
-        query = query.join(Area).filter(Area.territory_id == user.territory_id)
-    # Supreme admin sees all
-
-    # Apply additional filters
+    scoped_ids = get_access_scope(db, user, ADMIN_AREA).all_branch_ids
+    if not (branch_id or area_id or territory_id):
+        return scoped_ids
+
+    query = db.query(Branch.id).filter(Branch.id.in_(scoped_ids))
     if branch_id:
         query = query.filter(Branch.id == branch_id)
     if area_id:
         query = query.filter(Branch.area_id == area_id)
     if territory_id:
-        query = query.join(Area).filter(Area.territory_id == territory_id)
+        query = query.filter(Branch.territory_id == territory_id)
 
     return [r[0] for r in query.all()]
 
 
+def build_flavor_consumption(
+    db: Session,
+    branch_ids: List[int],
+    date_from: date,
+    date_to: date
+) -> List[FlavorConsumption]:
+    """
+    Consumption per active flavor across branches, sorted by total consumed
+    Consumption = Sum of (Opening + Received - Closing) for each day
+    """
+    flavors = get_flavors(db)
+
+    matrix = compute_consumption(
+        db, branch_ids, {"period": (date_from, date_to)}, flavor_ids=[f.id for f in flavors]
+    )
+    by_flavor = matrix.by_flavor("period")
+    days_by_flavor = count_days_tracked_by_flavor(db, branch_ids, date_from, date_to)
+
+    results = []
+    for flavor in flavors:
+        total_consumed = by_flavor.get(flavor.id, 0)
+
+        if total_consumed > 0:
+            # Count days with data
+            days_tracked = days_by_flavor.get(flavor.id) or 1
+
+            results.append(FlavorConsumption(
+                flavor_id=flavor.id,
+                flavor_name=flavor.name,
+                total_consumed=round(total_consumed, 2),
+                avg_daily_consumed=round(total_consumed / max(days_tracked, 1), 2),
+                days_tracked=days_tracked
+            ))
+
+    # Sort by total consumed descending
+    results.sort(key=lambda x: x.total_consumed, reverse=True)
+    return results
+
+
 def calculate_consumption(
     db: Session,
     branch_ids: List[int],
@@ -378,35 +345,5 @@ def calculate_consumption(
     """
     Calculate total consumption for a flavor across branches and dates
     """
-    total_opening = db.query(func.sum(DailyInventory.inches)).filter(
-        and_(
-            DailyInventory.branch_id.in_(branch_ids),
-            DailyInventory.flavor_id == flavor_id,
-            DailyInventory.date >= date_from,
-            DailyInventory.date <= date_to,
-            DailyInventory.entry_type == InventoryEntryType.OPENING
-        )
-    ).scalar() or 0
-
-    total_closing = db.query(func.sum(DailyInventory.inches)).filter(
-        and_(
-            DailyInventory.branch_id.in_(branch_ids),
-            DailyInventory.flavor_id == flavor_id,
-            DailyInventory.date >= date_from,
-            DailyInventory.date <= date_to,
-            DailyInventory.entry_type == InventoryEntryType.CLOSING
-        )
-    ).scalar() or 0
-
-    total_received = db.query(
-        func.sum(TubReceipt.quantity * TubReceipt.inches_per_tub)
-    ).filter(
-        and_(
-            TubReceipt.branch_id.in_(branch_ids),
-            TubReceipt.flavor_id == flavor_id,
-            TubReceipt.date >= date_from,
-            TubReceipt.date <= date_to
-        )
-    ).scalar() or 0
-
-    return max(0, total_opening + total_received - total_closing)
+    matrix = compute_consumption(db, branch_ids, {"period": (date_from, date_to)}, flavor_ids=[flavor_id])
+    return max(0, matrix.by_flavor("period").get(flavor_id, 0))
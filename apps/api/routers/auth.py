@@ -20,6 +20,7 @@ from utils.security import (
 )
 from models.user import User, UserRole
 from models.location import Branch
+from services.reference_data import location_names
 from schemas.user import UserLogin, TokenResponse, UserResponse, UserCreate, VerifyAccount, PasswordChange
 from pydantic import BaseModel as PydanticBaseModel
 
@@ -322,17 +323,10 @@ async def get_current_user_info(
     """
     Get current authenticated user info with location names
     """
-    from models.location import Territory, Area, Branch
     resp = UserResponse.model_validate(current_user)
-    if current_user.territory_id:
-        territory = db.query(Territory).filter(Territory.id == current_user.territory_id).first()
-        resp.territory_name = territory.name if territory else None
-    if current_user.area_id:
-        area = db.query(Area).filter(Area.id == current_user.area_id).first()
-        resp.area_name = area.name if area else None
-    if current_user.branch_id:
-        branch = db.query(Branch).filter(Branch.id == current_user.branch_id).first()
-        resp.branch_name = branch.name if branch else None
+    resp.territory_name, resp.area_name, resp.branch_name = location_names(
+        db, current_user.territory_id, current_user.area_id, current_user.branch_id
+    )
     return resp
 
 
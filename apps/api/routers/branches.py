@@ -4,7 +4,8 @@ Handles branch management with direct AM assignment via manager_id
 """
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import func as sa_func, select
+from sqlalchemy.orm import Session, aliased
 from typing import List, Optional
 from pydantic import BaseModel
 import secrets
@@ -14,6 +15,7 @@ from utils.database import get_db
 from utils.security import get_current_user, require_role, get_password_hash
 from models.user import User, UserRole
 from models.location import Territory, Area, Branch
+from services.reference_data import location_names
 from schemas.location import (
     BranchCreate, BranchUpdate, BranchResponse
 )
@@ -27,18 +29,35 @@ class BranchAssignRequest(BaseModel):
 router = APIRouter()
 
 
-def enrich_branch_response(branch: Branch, db: Session) -> BranchResponse:
-    """Add manager_name, territory_name, area_name, staff_count to branch response"""
+def _branch_rows(db: Session):
+    """Branches with their manager's name and staff count, in one query."""
+    staff_counts = (
+        select(User.branch_id, sa_func.count(User.id).label("staff_count"))
+        .where(User.branch_id.isnot(None))
+        .group_by(User.branch_id)
+        .subquery()
+    )
+    manager = aliased(User)
+    return (
+        db.query(Branch, manager.full_name, staff_counts.c.staff_count)
+        .outerjoin(manager, manager.id == Branch.manager_id)
+        .outerjoin(staff_counts, staff_counts.c.branch_id == Branch.id)
+    )
+
+
+def _branch_response(db: Session, branch: Branch, manager_name: Optional[str], staff_count: Optional[int]) -> BranchResponse:
     response = BranchResponse.model_validate(branch)
-    response.territory_name = branch.territory.name if branch.territory else None
-    response.area_name = branch.area.name if branch.area else None
-    if branch.manager_id:
-        manager = db.query(User).filter(User.id == branch.manager_id).first()
-        response.manager_name = manager.full_name if manager else None
-    response.staff_count = len(branch.staff) if branch.staff else 0
+    response.territory_name, response.area_name, _ = location_names(db, branch.territory_id, branch.area_id)
+    response.manager_name = manager_name
+    response.staff_count = staff_count or 0
     return response
 
 
+def enrich_branch_response(branch: Branch, db: Session) -> BranchResponse:
+    """Add manager_name, territory_name, area_name, staff_count to branch response"""
+    return _branch_response(db, *_branch_rows(db).filter(Branch.id == branch.id).one())
+
+
 @router.get("", response_model=List[BranchResponse])
 async def list_branches(
     area_id: Optional[int] = None,
@@ -48,14 +67,16 @@ async def list_branches(
     is_active: Optional[bool] = None,
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
+    after_id: Optional[int] = Query(None, ge=0, description="Keyset pagination: return branches with id > after_id (skip is ignored)"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
     List branches based on user role.
     AM sees branches assigned to them via manager_id.
+    Ordered by id; pass the last id seen as after_id to page through large lists.
     """
-    query = db.query(Branch)
+    query = _branch_rows(db)
 
     # Filter based on role
     if current_user.role == UserRole.STAFF:
@@ -78,8 +99,12 @@ async def list_branches(
     if is_active is not None:
         query = query.filter(Branch.is_active == is_active)
 
-    branches = query.offset(skip).limit(limit).all()
-    return [enrich_branch_response(b, db) for b in branches]
+    query = query.order_by(Branch.id)
+    if after_id is not None:
+        query = query.filter(Branch.id > after_id)
+    else:
+        query = query.offset(skip)
+    return [_branch_response(db, *row) for row in query.limit(limit).all()]
 
 
 @router.get("/{branch_id}", response_model=BranchResponse)
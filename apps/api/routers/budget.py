@@ -9,6 +9,7 @@ from sqlalchemy import and_, func
 from typing import List, Optional
 from datetime import date, datetime
 from pydantic import BaseModel
+import asyncio
 import logging
 import json
 import calendar
@@ -17,7 +18,10 @@ from utils.database import get_db
 from utils.security import get_current_user
 from models.user import User
 from models.location import Branch
-from models.sales import DailyBudget, BudgetUpload, DailySales
+from services.budget_tracker import STATUS_ORDER, tracker_metrics
+from services.bulk_upsert import upsert_rows
+from services.reference_data import get_branch, get_branches
+from models.sales import DailyBudget, BudgetUpload, DailySales, BranchDaySales
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -48,6 +52,10 @@ class BudgetConfirmRequest(BaseModel):
     days: List[DailyBudgetDay]
 
 
+class BudgetBatchConfirmRequest(BaseModel):
+    sheets: List[BudgetConfirmRequest]
+
+
 class BudgetExtractionResponse(BaseModel):
     success: bool
     extracted: Optional[dict] = None
@@ -58,6 +66,94 @@ class BudgetExtractionResponse(BaseModel):
 
 # ============== 1A. UPLOAD BUDGET SHEET (EXCEL) ==============
 
+_EXCEL_TYPES = [
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "application/vnd.ms-excel",
+    "application/octet-stream",
+]
+
+
+def _excel_summary(extracted: dict):
+    """Totals and warnings for one parsed tracker sheet → (calculated, warnings)."""
+    days = extracted.get("daily_data", [])
+    warnings = []
+
+    if len(days) == 0:
+        warnings.append("No daily data found in the Excel file")
+    elif len(days) < 28:
+        warnings.append(f"Only {len(days)} days extracted — expected 28-31")
+
+    kpis = extracted.get("kpis", {})
+
+    total_budget = sum((d.get("days_sales") or {}).get("budget") or 0 for d in days)
+    total_ly_sales = sum((d.get("days_sales") or {}).get("ly_2025") or 0 for d in days)
+    total_ly_gc = sum((d.get("days_guest_count") or {}).get("ly_2025") or 0 for d in days)
+    total_budget_gc = sum(d.get("_budget_gc") or 0 for d in days)
+    days_with_budget = [d for d in days if (d.get("days_sales") or {}).get("budget")]
+
+    calculated = {
+        "total_budget": total_budget,
+        "total_ly_sales": total_ly_sales,
+        "total_ly_gc": total_ly_gc,
+        "total_budget_gc": total_budget_gc,
+        "avg_daily_budget": round(total_budget / len(days_with_budget), 2) if days_with_budget else 0,
+        "ly_kpis": kpis,
+        "days_with_data": len(days_with_budget),
+    }
+    return calculated, warnings
+
+
+def _match_branch(db: Session, *labels: Optional[str]) -> Optional[int]:
+    """Branch id whose name or code equals one of the labels (parlor name, sheet name)."""
+    wanted = [label.strip().upper() for label in labels if label and label.strip()]
+    for label in wanted:
+        for branch in get_branches(db):
+            if label in (branch.name.upper(), (branch.code or "").upper()):
+                return branch.id
+    return None
+
+
+def _confirm_request(branch_id: Optional[int], extracted: dict) -> Optional[dict]:
+    """
+    A parsed tracker sheet as a BudgetConfirmRequest body (same mapping the dashboard
+    applies before /confirm): days with a budget or LY sales and an ISO date.
+    None when the sheet has no branch or no such days.
+    """
+    header = extracted.get("header", {})
+    days = []
+    for d in extracted.get("daily_data", []):
+        sales = d.get("days_sales") or {}
+        day_date = d.get("date_2026")
+        if not (sales.get("budget") or sales.get("ly_2025")):
+            continue
+        try:
+            date.fromisoformat(day_date or "")
+        except ValueError:
+            continue
+        days.append({
+            "date": day_date,
+            "day_name": d.get("day") or None,
+            "day_of_week": d.get("day") or None,
+            "budget": sales.get("budget") or 0,
+            "ly_sales": sales.get("ly_2025") or 0,
+            "ly_gc": (d.get("days_guest_count") or {}).get("ly_2025") or 0,
+            "budget_gc": d.get("_budget_gc") or 0,
+            "mtd_ly_sales": (d.get("mtd_sales") or {}).get("ly_2025") or 0,
+            "mtd_budget": (d.get("mtd_sales") or {}).get("budget") or 0,
+            "ly_atv": d.get("_ly_atv") or 0,
+        })
+    if branch_id is None or not days:
+        return None
+    return BudgetConfirmRequest(
+        branch_id=branch_id,
+        month=days[0]["date"][:7],
+        parlor_name=header.get("parlor_name"),
+        area_manager=header.get("area_manager"),
+        kpis=extracted.get("kpis") or {},
+        days=days,
+    ).model_dump()
+
+
 @router.post("/upload-excel", response_model=BudgetExtractionResponse)
 async def upload_budget_excel(
     file: UploadFile = File(...),
@@ -69,47 +165,18 @@ async def upload_budget_excel(
     Much faster and more reliable than photo extraction."""
     from services.budget_excel import parse_budget_excel
 
-    branch = db.query(Branch).filter(Branch.id == branch_id).first()
+    branch = get_branch(db, branch_id)
     if not branch:
         raise HTTPException(status_code=404, detail="Branch not found")
 
-    allowed_types = [
-        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        "application/vnd.ms-excel",
-        "application/octet-stream",
-    ]
-    if file.content_type not in allowed_types:
+    if file.content_type not in _EXCEL_TYPES:
         raise HTTPException(status_code=400, detail="Invalid file type. Please upload an Excel (.xlsx) file.")
 
     try:
         file_bytes = await file.read()
-        extracted = parse_budget_excel(file_bytes)
-
-        days = extracted.get("daily_data", [])
-        warnings = []
-
-        if len(days) == 0:
-            warnings.append("No daily data found in the Excel file")
-        elif len(days) < 28:
-            warnings.append(f"Only {len(days)} days extracted — expected 28-31")
-
-        kpis = extracted.get("kpis", {})
-
-        total_budget = sum((d.get("days_sales") or {}).get("budget") or 0 for d in days)
-        total_ly_sales = sum((d.get("days_sales") or {}).get("ly_2025") or 0 for d in days)
-        total_ly_gc = sum((d.get("days_guest_count") or {}).get("ly_2025") or 0 for d in days)
-        total_budget_gc = sum(d.get("_budget_gc") or 0 for d in days)
-        days_with_budget = [d for d in days if (d.get("days_sales") or {}).get("budget")]
-
-        calculated = {
-            "total_budget": total_budget,
-            "total_ly_sales": total_ly_sales,
-            "total_ly_gc": total_ly_gc,
-            "total_budget_gc": total_budget_gc,
-            "avg_daily_budget": round(total_budget / len(days_with_budget), 2) if days_with_budget else 0,
-            "ly_kpis": kpis,
-            "days_with_data": len(days_with_budget),
-        }
+        # openpyxl is CPU-bound; keep the event loop free while it parses
+        extracted = await asyncio.to_thread(parse_budget_excel, file_bytes)
+        calculated, warnings = _excel_summary(extracted)
 
         return BudgetExtractionResponse(
             success=True,
@@ -125,6 +192,47 @@ async def upload_budget_excel(
         )
 
 
+@router.post("/upload-excel-workbook")
+async def upload_budget_workbook(
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Upload a workbook with one tracker sheet per parlor.
+    Each sheet is matched to a branch by parlor name or sheet name (branch name/code).
+    A matched sheet's "confirm" is a ready BudgetConfirmRequest: review, then post the
+    confirms together as {"sheets": [...]} to /confirm-batch."""
+    from services.budget_excel import parse_budget_workbook
+
+    if file.content_type not in _EXCEL_TYPES:
+        raise HTTPException(status_code=400, detail="Invalid file type. Please upload an Excel (.xlsx) file.")
+
+    file_bytes = await file.read()
+    try:
+        parsed_sheets = await asyncio.to_thread(parse_budget_workbook, file_bytes)
+    except Exception as e:
+        logger.error(f"Budget workbook parsing failed: {e}")
+        return {"success": False, "sheets": [], "error": str(e)}
+
+    sheets = []
+    for parsed in parsed_sheets:
+        sheet_name = parsed.pop("sheet_name")
+        calculated, warnings = _excel_summary(parsed)
+        branch_id = _match_branch(db, parsed["header"].get("parlor_name"), sheet_name)
+        if branch_id is None:
+            warnings.append(f"No branch matches sheet '{sheet_name}' — pick one before confirming")
+        sheets.append({
+            "sheet_name": sheet_name,
+            "branch_id": branch_id,
+            "confirm": _confirm_request(branch_id, parsed),
+            "extracted": parsed,
+            "calculated": calculated,
+            "warnings": warnings,
+        })
+
+    return {"success": True, "sheets": sheets, "error": None}
+
+
 # ============== 1B. UPLOAD BUDGET SHEET PHOTO (LEGACY) ==============
 
 @router.post("/upload", response_model=BudgetExtractionResponse)
@@ -138,7 +246,7 @@ async def upload_budget_sheet(
     Photo is NOT saved — only used for extraction."""
     from services.claude_vision import extract_budget_sheet
 
-    branch = db.query(Branch).filter(Branch.id == branch_id).first()
+    branch = get_branch(db, branch_id)
     if not branch:
         raise HTTPException(status_code=404, detail="Branch not found")
 
@@ -193,70 +301,41 @@ async def upload_budget_sheet(
 
 # ============== 2. CONFIRM & SAVE EXTRACTED BUDGET ==============
 
-@router.post("/confirm")
-async def confirm_budget(
-    data: BudgetConfirmRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
-):
-    """Confirm extracted budget data and save to database."""
-    branch = db.query(Branch).filter(Branch.id == data.branch_id).first()
-    if not branch:
-        raise HTTPException(status_code=404, detail="Branch not found")
-
-    saved_count = 0
+def _budget_rows(data: BudgetConfirmRequest, user_id: int) -> List[dict]:
+    """daily_budgets rows for one confirmed sheet (days with unparseable dates are skipped)."""
+    rows = []
     for day in data.days:
         try:
             budget_date = date.fromisoformat(day.date)
         except ValueError:
             continue
+        rows.append({
+            "branch_id": data.branch_id,
+            "budget_date": budget_date,
+            "budget_amount": day.budget,
+            "budget_gc": day.budget_gc or 0,
+            "ly_sales": day.ly_sales or 0,
+            "ly_gc": day.ly_gc or 0,
+            "day_name": day.day_name,
+            "day_of_week": day.day_of_week or day.day_name,
+            "mtd_ly_sales": day.mtd_ly_sales or 0,
+            "mtd_budget": day.mtd_budget or 0,
+            "ly_atv": day.ly_atv or 0,
+            "notes": day.notes,
+            "set_by": user_id,
+        })
+    return rows
 
-        existing = db.query(DailyBudget).filter(
-            and_(
-                DailyBudget.branch_id == data.branch_id,
-                DailyBudget.budget_date == budget_date,
-            )
-        ).first()
-
-        if existing:
-            existing.budget_amount = day.budget
-            existing.budget_gc = day.budget_gc or 0
-            existing.ly_sales = day.ly_sales or 0
-            existing.ly_gc = day.ly_gc or 0
-            existing.day_name = day.day_name
-            existing.day_of_week = day.day_of_week or day.day_name
-            existing.mtd_ly_sales = day.mtd_ly_sales or 0
-            existing.mtd_budget = day.mtd_budget or 0
-            existing.ly_atv = day.ly_atv or 0
-            existing.notes = day.notes
-            existing.set_by = current_user.id
-        else:
-            entry = DailyBudget(
-                branch_id=data.branch_id,
-                budget_date=budget_date,
-                budget_amount=day.budget,
-                budget_gc=day.budget_gc or 0,
-                ly_sales=day.ly_sales or 0,
-                ly_gc=day.ly_gc or 0,
-                day_name=day.day_name,
-                day_of_week=day.day_of_week or day.day_name,
-                mtd_ly_sales=day.mtd_ly_sales or 0,
-                mtd_budget=day.mtd_budget or 0,
-                ly_atv=day.ly_atv or 0,
-                notes=day.notes,
-                set_by=current_user.id,
-            )
-            db.add(entry)
-        saved_count += 1
 
-    # Log the upload with full KPIs
+def _upload_log(data: BudgetConfirmRequest, days_saved: int, user_id: int) -> BudgetUpload:
+    """BudgetUpload record with the sheet's footer KPIs."""
     kpis = data.kpis or {}
-    upload_log = BudgetUpload(
+    return BudgetUpload(
         branch_id=data.branch_id,
         parlor_name=data.parlor_name,
         month=data.month,
         area_manager=data.area_manager,
-        days_count=saved_count,
+        days_count=days_saved,
         total_budget=sum(d.budget for d in data.days),
         total_ly_sales=sum(d.ly_sales or 0 for d in data.days),
         total_ly_gc=sum(d.ly_gc or 0 for d in data.days),
@@ -264,26 +343,78 @@ async def confirm_budget(
         ly_auv=kpis.get("auv", {}).get("ly_2025") if kpis.get("auv") else None,
         ly_cake_qty=kpis.get("cake_qty", {}).get("ly_2025") if kpis.get("cake_qty") else None,
         ly_hp_qty=kpis.get("hp_qty", {}).get("ly_2025") if kpis.get("hp_qty") else None,
-        uploaded_by=current_user.id,
+        uploaded_by=user_id,
         status="confirmed",
     )
-    db.add(upload_log)
 
+
+def _confirm_summary(data: BudgetConfirmRequest, days_saved: int) -> dict:
+    return {
+        "branch_id": data.branch_id,
+        "parlor_name": data.parlor_name,
+        "month": data.month,
+        "area_manager": data.area_manager,
+        "days_saved": days_saved,
+        "total_budget": sum(d.budget for d in data.days),
+        "total_ly_sales": sum(d.ly_sales or 0 for d in data.days),
+        "total_ly_gc": sum(d.ly_gc or 0 for d in data.days),
+        "ly_kpis": data.kpis or {},
+    }
+
+
+def _save_sheets(db: Session, sheets: List[BudgetConfirmRequest], user_id: int) -> List[int]:
+    """Upsert every sheet's days in bulk and log each upload; the caller commits."""
+    missing = sorted({s.branch_id for s in sheets if not get_branch(db, s.branch_id)})
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Branch not found: {', '.join(map(str, missing))}")
+
+    rows_by_sheet = [_budget_rows(sheet, user_id) for sheet in sheets]
+    upsert_rows(db, DailyBudget, [row for rows in rows_by_sheet for row in rows], ("branch_id", "budget_date"))
+
+    days_saved = [len({row["budget_date"] for row in rows}) for rows in rows_by_sheet]
+    for sheet, saved in zip(sheets, days_saved):
+        db.add(_upload_log(sheet, saved, user_id))
+    return days_saved
+
+
+@router.post("/confirm")
+async def confirm_budget(
+    data: BudgetConfirmRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Confirm extracted budget data and save to database."""
+    saved_count = _save_sheets(db, [data], current_user.id)[0]
     db.commit()
 
     return {
         "success": True,
         "message": f"Budget saved: {saved_count} days for {data.parlor_name or data.branch_id}",
-        "summary": {
-            "parlor_name": data.parlor_name,
-            "month": data.month,
-            "area_manager": data.area_manager,
-            "days_saved": saved_count,
-            "total_budget": sum(d.budget for d in data.days),
-            "total_ly_sales": sum(d.ly_sales or 0 for d in data.days),
-            "total_ly_gc": sum(d.ly_gc or 0 for d in data.days),
-            "ly_kpis": kpis,
-        },
+        "summary": _confirm_summary(data, saved_count),
+    }
+
+
+@router.post("/confirm-batch")
+async def confirm_budget_batch(
+    data: BudgetBatchConfirmRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Confirm many parlors' budget sheets at once (e.g. HQ at month start).
+    All sheets are saved in one transaction: if any branch is unknown, nothing is saved.
+    """
+    if not data.sheets:
+        raise HTTPException(status_code=400, detail="No budget sheets provided")
+
+    days_saved = _save_sheets(db, data.sheets, current_user.id)
+    db.commit()
+
+    summaries = [_confirm_summary(sheet, saved) for sheet, saved in zip(data.sheets, days_saved)]
+    return {
+        "success": True,
+        "message": f"Budget saved: {sum(days_saved)} days for {len(data.sheets)} sheets",
+        "sheets": summaries,
     }
 
 
@@ -449,39 +580,34 @@ async def smart_advisor(
         )
     ).first()
 
-    # Get today's sales (all windows)
-    sales = db.query(DailySales).filter(
+    # Today's closing-equivalent sales (latest cumulative window)
+    day_sales = db.query(BranchDaySales).filter(
         and_(
-            DailySales.branch_id == branch_id,
-            DailySales.date == date,
+            BranchDaySales.branch_id == branch_id,
+            BranchDaySales.date == date,
         )
-    ).all()
+    ).first()
 
     # Get branch info
-    branch = db.query(Branch).filter(Branch.id == branch_id).first()
+    branch = get_branch(db, branch_id)
 
     # Get latest upload KPIs
     upload = db.query(BudgetUpload).filter(
         BudgetUpload.branch_id == branch_id,
     ).order_by(BudgetUpload.created_at.desc()).first()
 
-    # Use the LATEST submitted window (POS data is cumulative — each window includes all previous)
-    window_priority = {"closing": 4, "9pm": 3, "7pm": 2, "3pm": 1}
-    latest_sale = max(sales, key=lambda s: window_priority.get(s.sales_window.value if hasattr(s.sales_window, 'value') else s.sales_window, 0)) if sales else None
-    latest_window_name = (latest_sale.sales_window.value if hasattr(latest_sale.sales_window, 'value') else latest_sale.sales_window) if latest_sale else None
-
-    actual_gross = (getattr(latest_sale, 'gross_sales', 0) or 0) if latest_sale else 0
-    actual_net = (latest_sale.total_sales or 0) if latest_sale else 0
-    actual_gc = (latest_sale.transaction_count or 0) if latest_sale else 0
-    hd_gross = (getattr(latest_sale, 'hd_gross_sales', 0) or 0) if latest_sale else 0
-    hd_net = (getattr(latest_sale, 'hd_net_sales', 0) or 0) if latest_sale else 0
-    hd_orders = (getattr(latest_sale, 'hd_orders', 0) or 0) if latest_sale else 0
-    del_gross = (getattr(latest_sale, 'deliveroo_gross_sales', 0) or 0) if latest_sale else 0
-    del_net = (getattr(latest_sale, 'deliveroo_net_sales', 0) or 0) if latest_sale else 0
-    del_orders = (getattr(latest_sale, 'deliveroo_orders', 0) or 0) if latest_sale else 0
-    cm_gross = (getattr(latest_sale, 'cm_gross_sales', 0) or 0) if latest_sale else 0
-    cm_net = (getattr(latest_sale, 'cm_net_sales', 0) or 0) if latest_sale else 0
-    cm_orders_val = (getattr(latest_sale, 'cm_orders', 0) or 0) if latest_sale else 0
+    # Rollup holds the LATEST submitted window (POS data is cumulative — each window includes all previous)
+    latest_window_name = day_sales.latest_window if day_sales else None
+    windows_submitted = day_sales.windows_submitted if day_sales else 0
+
+    actual_net = (day_sales.net_sales or 0) if day_sales else 0
+    actual_gc = (day_sales.transaction_count or 0) if day_sales else 0
+    hd_net = (day_sales.hd_net_sales or 0) if day_sales else 0
+    hd_orders = (day_sales.hd_orders or 0) if day_sales else 0
+    del_net = (day_sales.deliveroo_net_sales or 0) if day_sales else 0
+    del_orders = (day_sales.deliveroo_orders or 0) if day_sales else 0
+    cm_net = (day_sales.cm_net_sales or 0) if day_sales else 0
+    cm_orders_val = (day_sales.cm_orders or 0) if day_sales else 0
 
     combined_net = actual_net + hd_net + del_net + cm_net
     combined_gc = actual_gc + hd_orders + del_orders + cm_orders_val
@@ -511,45 +637,28 @@ async def smart_advisor(
     vs_ly_growth = ((combined_net - ly_sales) / ly_sales * 100) if ly_sales > 0 else 0
     vs_ly_gc_growth = ((combined_gc - ly_gc) / ly_gc * 100) if ly_gc > 0 else 0
 
-    # MTD actuals — use only the latest window per day (POS data is cumulative)
+    # MTD actuals — summed over the per-day rollup (one closing-equivalent row per day)
     month_start = date.replace(day=1)
-    mtd_sales_rows = db.query(DailySales).filter(
-        and_(
-            DailySales.branch_id == branch_id,
-            DailySales.date >= month_start,
-            DailySales.date <= date,
-        )
-    ).all()
-
-    # Group by date, keep only the latest window per day
-    mtd_by_date = {}
-    for s in mtd_sales_rows:
-        d = str(s.date)
-        w = s.sales_window.value if hasattr(s.sales_window, 'value') else s.sales_window
-        prio = window_priority.get(w, 0)
-        if d not in mtd_by_date or prio > mtd_by_date[d][0]:
-            mtd_by_date[d] = (prio, s)
-
-    mtd_latest_rows = [v[1] for v in mtd_by_date.values()]
-
-    mtd_actual_net = sum(
-        (s.total_sales or 0) +
-        (getattr(s, 'hd_net_sales', 0) or 0) +
-        (getattr(s, 'deliveroo_net_sales', 0) or 0) +
-        (getattr(s, 'cm_net_sales', 0) or 0)
-        for s in mtd_latest_rows
-    )
-    mtd_actual_gc = sum(
-        (s.transaction_count or 0) +
-        (getattr(s, 'hd_orders', 0) or 0) +
-        (getattr(s, 'deliveroo_orders', 0) or 0) +
-        (getattr(s, 'cm_orders', 0) or 0)
-        for s in mtd_latest_rows
-    )
+    mtd_actual_net, mtd_actual_gc = db.query(
+        func.coalesce(func.sum(
+            func.coalesce(BranchDaySales.net_sales, 0) + func.coalesce(BranchDaySales.hd_net_sales, 0) +
+            func.coalesce(BranchDaySales.deliveroo_net_sales, 0) + func.coalesce(BranchDaySales.cm_net_sales, 0)
+        ), 0),
+        func.coalesce(func.sum(
+            func.coalesce(BranchDaySales.transaction_count, 0) + func.coalesce(BranchDaySales.hd_orders, 0) +
+            func.coalesce(BranchDaySales.deliveroo_orders, 0) + func.coalesce(BranchDaySales.cm_orders, 0)
+        ), 0),
+    ).filter(
+        BranchDaySales.branch_id == branch_id,
+        BranchDaySales.date >= month_start,
+        BranchDaySales.date <= date,
+    ).one()
     mtd_ach_pct = (mtd_actual_net / mtd_budget_val * 100) if mtd_budget_val > 0 else 0
     mtd_growth = ((mtd_actual_net - mtd_ly_sales) / mtd_ly_sales * 100) if mtd_ly_sales > 0 else 0
 
     # Parse category data from latest window only
+    latest_sale = db.query(DailySales).filter(DailySales.id == day_sales.latest_sales_id).first() \
+        if day_sales and day_sales.latest_sales_id else None
     categories = []
     if latest_sale and latest_sale.category_data:
         try:
@@ -563,7 +672,7 @@ async def smart_advisor(
     advice = []
 
     # Achievement status
-    if not sales:
+    if not day_sales:
         advice.append({
             "type": "no_data", "priority": "info", "icon": "clock",
             "title": f"No sales uploaded yet — Target: {budget_amt:,.0f} AED",
@@ -589,7 +698,7 @@ async def smart_advisor(
         })
 
     # ATV Focus
-    if sales:
+    if day_sales:
         if current_atv >= budget_atv and budget_atv > 0:
             advice.append({
                 "type": "atv", "priority": "success", "icon": "trending_up",
@@ -638,7 +747,7 @@ async def smart_advisor(
                 })
 
     # vs Last Year
-    if sales and ly_sales > 0:
+    if day_sales and ly_sales > 0:
         advice.append({
             "type": "ly", "priority": "success" if vs_ly_growth >= 0 else "warning",
             "icon": "trending_up" if vs_ly_growth >= 0 else "trending_down",
@@ -660,7 +769,7 @@ async def smart_advisor(
         "branch_id": branch_id,
         "parlor_name": branch.name if branch else None,
         "day_name": day_name,
-        "windows_submitted": len(sales),
+        "windows_submitted": windows_submitted,
         "latest_window": latest_window_name,
 
         "daily": {
@@ -679,7 +788,7 @@ async def smart_advisor(
             "remaining_gc": gc_remaining,
             "growth_vs_ly": round(vs_ly_growth, 1),
             "gc_growth_vs_ly": round(vs_ly_gc_growth, 1),
-            "has_sales": len(sales) > 0,
+            "has_sales": windows_submitted > 0,
         },
 
         "mtd": {
@@ -743,24 +852,16 @@ async def budget_chart(
         )
     ).order_by(DailyBudget.budget_date).all()
 
-    # Get all sales for the month
-    sales = db.query(DailySales).filter(
-        and_(
-            DailySales.branch_id == branch_id,
-            DailySales.date >= start,
-            DailySales.date < end,
-        )
-    ).all()
-
-    # Group sales by date, keep only the latest window per day
-    window_priority = {"closing": 4, "9pm": 3, "7pm": 2, "3pm": 1}
-    sales_by_date = {}
-    for s in sales:
-        d = str(s.date)
-        w = s.sales_window.value if hasattr(s.sales_window, 'value') else s.sales_window
-        prio = window_priority.get(w, 0)
-        if d not in sales_by_date or prio > sales_by_date[d][0]:
-            sales_by_date[d] = (prio, s)
+    # Closing-equivalent sales per day for the month
+    sales_by_date = {
+        str(r.date): r for r in db.query(BranchDaySales).filter(
+            and_(
+                BranchDaySales.branch_id == branch_id,
+                BranchDaySales.date >= start,
+                BranchDaySales.date < end,
+            )
+        ).all()
+    }
 
     b_map = {str(b.budget_date): b for b in budgets}
 
@@ -770,17 +871,8 @@ async def budget_chart(
         d = date(int(year), int(mon), day_num)
         ds = str(d)
         bud = b_map.get(ds)
-        sal_entry = sales_by_date.get(ds)
-        sal = sal_entry[1] if sal_entry else None
-
-        actual_net = 0
-        if sal:
-            actual_net = (
-                (sal.total_sales or 0) +
-                (getattr(sal, 'hd_net_sales', 0) or 0) +
-                (getattr(sal, 'deliveroo_net_sales', 0) or 0) +
-                (getattr(sal, 'cm_net_sales', 0) or 0)
-            )
+        sal = sales_by_date.get(ds)
+        actual_net = sal.total_net if sal else 0
 
         days.append({
             "date": ds,
@@ -809,79 +901,21 @@ async def tracker_overview(
 
     # Bulk fetch budgets + sales for the date
     budgets = db.query(DailyBudget).filter(DailyBudget.budget_date == date).all()
-    all_sales = db.query(DailySales).filter(DailySales.date == date).all()
+    s_map = {r.branch_id: r for r in db.query(BranchDaySales).filter(BranchDaySales.date == date).all()}
 
     b_map = {b.branch_id: b for b in budgets}
-    # Group sales by branch
-    s_map = {}
-    for s in all_sales:
-        if s.branch_id not in s_map:
-            s_map[s.branch_id] = []
-        s_map[s.branch_id].append(s)
 
     overview = []
     for br in branches:
-        bud = b_map.get(br.id)
-        sal_list = s_map.get(br.id, [])
-
-        budget_amt = bud.budget_amount if bud else 0
-        ly_sales_val = bud.ly_sales if bud else 0
-        ly_gc_val = bud.ly_gc if bud else 0
-
-        actual_gross = sum(
-            (getattr(s, 'gross_sales', 0) or 0) +
-            (getattr(s, 'hd_gross_sales', 0) or 0) +
-            (getattr(s, 'deliveroo_gross_sales', 0) or 0)
-            for s in sal_list
-        )
-        actual_gc = sum(
-            (s.transaction_count or 0) +
-            (getattr(s, 'hd_orders', 0) or 0) +
-            (getattr(s, 'deliveroo_orders', 0) or 0)
-            for s in sal_list
-        )
-
-        ach_pct = (actual_gross / budget_amt * 100) if budget_amt > 0 else 0
-        growth_vs_ly = ((actual_gross - ly_sales_val) / ly_sales_val * 100) if ly_sales_val > 0 else 0
-        atv = actual_gross / actual_gc if actual_gc > 0 else 0
-        ly_atv_branch = ly_sales_val / ly_gc_val if ly_gc_val > 0 else 0
-
-        # Determine status
-        if not bud:
-            status = "no_budget"
-        elif ach_pct >= 100:
-            status = "achieved"
-        elif ach_pct >= 75:
-            status = "on_track"
-        elif ach_pct >= 50:
-            status = "behind"
-        else:
-            status = "critical"
-
         overview.append({
             "branch_id": br.id,
             "branch_code": br.code,
             "branch_name": br.name,
-            "day_name": bud.day_name if bud else None,
-            "budget": budget_amt,
-            "ly_sales": ly_sales_val,
-            "ly_gc": ly_gc_val,
-            "actual_gross": round(actual_gross, 2),
-            "actual_gc": actual_gc,
-            "achievement_pct": round(ach_pct, 1),
-            "remaining": round(budget_amt - actual_gross, 2),
-            "atv": round(atv, 2),
-            "ly_atv": round(ly_atv_branch, 2),
-            "growth_vs_ly": round(growth_vs_ly, 1),
-            "budget_loaded": bud is not None,
-            "has_sales": len(sal_list) > 0,
-            "windows": len(sal_list),
-            "status": status,
+            **tracker_metrics(b_map.get(br.id), s_map.get(br.id)),
         })
 
     # Sort: critical first, then behind, no_budget, on_track, achieved
-    order = {"critical": 0, "behind": 1, "no_budget": 2, "on_track": 3, "achieved": 4}
-    overview.sort(key=lambda x: order.get(x["status"], 5))
+    overview.sort(key=lambda x: STATUS_ORDER.get(x["status"], 5))
 
     return {
         "success": True,
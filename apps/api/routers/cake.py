@@ -12,8 +12,11 @@ from datetime import date, datetime
 from utils.database import get_db
 from utils.security import get_current_user, require_role
 from models.user import User, UserRole
-from models.location import Branch, Area
-from services.push_service import check_and_notify_low_stock
+from services import cake_stock
+from services.access_scope import ADMIN_AREA, get_access_scope
+from services.cake_alerts import evaluate_low_stock, get_effective_thresholds
+from services.push_service import LowStockEvent, check_and_notify_low_stock, notify_low_stock
+from services.reference_data import BranchRef, get_branch, get_branches, get_cake_product, get_cake_products
 from models.cake import CakeProduct, CakeStock, CakeStockLog, CakeStockChangeType, CakeAlertConfig
 from schemas.cake import (
     CakeProductCreate, CakeProductUpdate, CakeProductResponse,
@@ -30,7 +33,7 @@ router = APIRouter()
 
 # ============== HELPER FUNCTIONS ==============
 
-def verify_branch_access(current_user: User, branch: Branch):
+def verify_branch_access(current_user: User, branch: BranchRef):
     """Check if user has access to a branch"""
     if current_user.role == UserRole.STAFF:
         if branch.id != current_user.branch_id:
@@ -39,20 +42,23 @@ def verify_branch_access(current_user: User, branch: Branch):
         if branch.area_id != current_user.area_id:
             raise HTTPException(status_code=403, detail="Access denied")
     elif current_user.role == UserRole.SUPER_ADMIN:
-        if branch.area.territory_id != current_user.territory_id:
+        if branch.territory_id != current_user.territory_id:
             raise HTTPException(status_code=403, detail="Access denied")
 
 
-def get_effective_threshold(db: Session, branch_id: int, cake_product_id: int, default: int) -> int:
-    """Get alert threshold: branch-specific config or product default"""
-    config = db.query(CakeAlertConfig).filter(
-        and_(
-            CakeAlertConfig.branch_id == branch_id,
-            CakeAlertConfig.cake_product_id == cake_product_id,
-            CakeAlertConfig.is_enabled == True
-        )
-    ).first()
-    return config.threshold if config else default
+def _stock_response(branch_id: int, level: cake_stock.StockLevel, product, threshold: int) -> CakeStockResponse:
+    return CakeStockResponse(
+        id=level.id,
+        branch_id=branch_id,
+        cake_product_id=level.cake_product_id,
+        current_quantity=level.current_quantity,
+        last_updated_at=level.last_updated_at,
+        cake_name=product.name,
+        cake_code=product.code,
+        category=product.category,
+        alert_threshold=threshold,
+        is_low_stock=level.current_quantity <= threshold,
+    )
 
 
 # ============== CAKE PRODUCTS ==============
@@ -65,12 +71,10 @@ async def list_cake_products(
     db: Session = Depends(get_db)
 ):
     """List all cake products"""
-    query = db.query(CakeProduct)
-    if active_only:
-        query = query.filter(CakeProduct.is_active == True)
+    products = get_cake_products(db, active_only=active_only)
     if category:
-        query = query.filter(CakeProduct.category == category)
-    return query.order_by(CakeProduct.name).all()
+        products = [p for p in products if p.category == category]
+    return products
 
 
 @router.post("/cake-products", response_model=CakeProductResponse, status_code=status.HTTP_201_CREATED)
@@ -139,14 +143,15 @@ async def bulk_create_cake_products(
 
 # ============== CAKE STOCK ==============
 
-@router.get("/cake-stock/{branch_id}", response_model=List[CakeStockResponse])
+# `:int` keeps this route from swallowing /cake-stock/alerts
+@router.get("/cake-stock/{branch_id:int}", response_model=List[CakeStockResponse])
 async def get_cake_stock(
     branch_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get current cake stock for a branch (includes all active products)"""
-    branch = db.query(Branch).filter(Branch.id == branch_id).first()
+    branch = get_branch(db, branch_id)
     if not branch:
         raise HTTPException(status_code=404, detail="Branch not found")
 
@@ -157,12 +162,14 @@ async def get_cake_stock(
     stock_by_product = {s.cake_product_id: s for s in stocks}
 
     # Get ALL active cake products so new products appear immediately
-    all_products = db.query(CakeProduct).filter(CakeProduct.is_active == True).order_by(CakeProduct.name).all()
+    all_products = get_cake_products(db)
+
+    thresholds = get_effective_thresholds(db, branch_id)
 
     result = []
     for product in all_products:
         stock = stock_by_product.get(product.id)
-        threshold = get_effective_threshold(db, branch_id, product.id, product.default_alert_threshold)
+        threshold = thresholds.get(product.id, product.default_alert_threshold)
         current_qty = stock.current_quantity if stock else 0
         response = CakeStockResponse(
             id=stock.id if stock else 0,
@@ -191,62 +198,22 @@ async def init_cake_stock(
     if data.branch_id != current_user.branch_id:
         raise HTTPException(status_code=403, detail="Can only set stock for your branch")
 
-    created = []
-    for item in data.items:
-        product = db.query(CakeProduct).filter(CakeProduct.id == item.cake_product_id).first()
-        if not product:
-            continue
-
-        existing = db.query(CakeStock).filter(
-            and_(CakeStock.branch_id == data.branch_id, CakeStock.cake_product_id == item.cake_product_id)
-        ).first()
-
-        if existing:
-            qty_before = existing.current_quantity
-            existing.current_quantity = item.quantity
-            existing.last_updated_by_id = current_user.id
-            stock = existing
-        else:
-            qty_before = 0
-            stock = CakeStock(
-                branch_id=data.branch_id,
-                cake_product_id=item.cake_product_id,
-                current_quantity=item.quantity,
-                last_updated_by_id=current_user.id,
-            )
-            db.add(stock)
-
-        log = CakeStockLog(
-            branch_id=data.branch_id,
-            cake_product_id=item.cake_product_id,
-            change_type=CakeStockChangeType.INITIAL,
-            quantity_change=item.quantity - qty_before,
-            quantity_before=qty_before,
-            quantity_after=item.quantity,
-            notes="Initial stock upload",
-            recorded_by_id=current_user.id,
-        )
-        db.add(log)
-        created.append((stock, product))
-
+    # Unknown products are skipped
+    lines = [
+        cake_stock.StockLine(item.cake_product_id, item.quantity)
+        for item in data.items
+        if get_cake_product(db, item.cake_product_id)
+    ]
+    levels = cake_stock.initialize(db, data.branch_id, lines, current_user.id, notes="Initial stock upload")
     db.commit()
 
+    thresholds = get_effective_thresholds(db, data.branch_id)
+
     result = []
-    for stock, product in created:
-        db.refresh(stock)
-        threshold = get_effective_threshold(db, data.branch_id, product.id, product.default_alert_threshold)
-        result.append(CakeStockResponse(
-            id=stock.id,
-            branch_id=stock.branch_id,
-            cake_product_id=stock.cake_product_id,
-            current_quantity=stock.current_quantity,
-            last_updated_at=stock.last_updated_at,
-            cake_name=product.name,
-            cake_code=product.code,
-            category=product.category,
-            alert_threshold=threshold,
-            is_low_stock=stock.current_quantity <= threshold,
-        ))
+    for level in levels:
+        product = get_cake_product(db, level.cake_product_id)
+        threshold = thresholds.get(product.id, product.default_alert_threshold)
+        result.append(_stock_response(data.branch_id, level, product, threshold))
 
     return result
 
@@ -257,75 +224,32 @@ async def record_cake_sale(
     current_user: User = Depends(require_role([UserRole.STAFF])),
     db: Session = Depends(get_db)
 ):
-    """Record cake sale(s) - decrements stock"""
+    """Record cake sale(s) - decrements stock atomically (all items or none)"""
     if data.branch_id != current_user.branch_id:
         raise HTTPException(status_code=403, detail="Can only record sales for your branch")
 
-    updated = []
-    for item in data.items:
-        stock = db.query(CakeStock).filter(
-            and_(CakeStock.branch_id == data.branch_id, CakeStock.cake_product_id == item.cake_product_id)
-        ).first()
-
-        if not stock:
-            raise HTTPException(
-                status_code=400,
-                detail=f"No stock record for cake product {item.cake_product_id}. Please initialize stock first."
-            )
-
-        if stock.current_quantity < item.quantity:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Insufficient stock for {stock.cake_product.name}. Available: {stock.current_quantity}, Requested: {item.quantity}"
-            )
-
-        qty_before = stock.current_quantity
-        stock.current_quantity -= item.quantity
-        stock.last_updated_by_id = current_user.id
-
-        log = CakeStockLog(
-            branch_id=data.branch_id,
-            cake_product_id=item.cake_product_id,
-            change_type=CakeStockChangeType.SALE,
-            quantity_change=-item.quantity,
-            quantity_before=qty_before,
-            quantity_after=stock.current_quantity,
-            notes=item.notes,
-            recorded_by_id=current_user.id,
-        )
-        db.add(log)
-        updated.append(stock)
-
+    lines = [cake_stock.StockLine(item.cake_product_id, item.quantity, item.notes) for item in data.items]
+    try:
+        levels = cake_stock.record_sale(db, data.branch_id, lines, current_user.id)
+    except cake_stock.StockError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
     db.commit()
 
+    thresholds = get_effective_thresholds(db, data.branch_id)
+
     result = []
-    for stock in updated:
-        db.refresh(stock)
-        product = stock.cake_product
-        threshold = get_effective_threshold(db, data.branch_id, product.id, product.default_alert_threshold)
-        result.append(CakeStockResponse(
-            id=stock.id,
-            branch_id=stock.branch_id,
-            cake_product_id=stock.cake_product_id,
-            current_quantity=stock.current_quantity,
-            last_updated_at=stock.last_updated_at,
-            cake_name=product.name,
-            cake_code=product.code,
-            category=product.category,
-            alert_threshold=threshold,
-            is_low_stock=stock.current_quantity <= threshold,
-        ))
+    low_stock = []
+    for level in levels:
+        product = get_cake_product(db, level.cake_product_id)
+        threshold = thresholds.get(product.id, product.default_alert_threshold)
+        result.append(_stock_response(data.branch_id, level, product, threshold))
 
-        # Send push notification if stock is low
-        check_and_notify_low_stock(
-            db=db,
-            branch_id=data.branch_id,
-            cake_name=product.name,
-            cake_code=product.code,
-            current_quantity=stock.current_quantity,
-            threshold=threshold,
-            triggered_by_user_id=current_user.id,
-        )
+        if level.current_quantity <= threshold:
+            low_stock.append(LowStockEvent(product.name, product.code, level.current_quantity, threshold))
+
+    # One digest push for everything this sale took below threshold
+    notify_low_stock(db, data.branch_id, low_stock, triggered_by_user_id=current_user.id)
 
     return result
 
@@ -340,62 +264,22 @@ async def receive_cakes(
     if data.branch_id != current_user.branch_id:
         raise HTTPException(status_code=403, detail="Can only record receipts for your branch")
 
-    updated = []
-    for item in data.items:
-        product = db.query(CakeProduct).filter(CakeProduct.id == item.cake_product_id).first()
-        if not product:
-            continue
-
-        stock = db.query(CakeStock).filter(
-            and_(CakeStock.branch_id == data.branch_id, CakeStock.cake_product_id == item.cake_product_id)
-        ).first()
-
-        if stock:
-            qty_before = stock.current_quantity
-            stock.current_quantity += item.quantity
-            stock.last_updated_by_id = current_user.id
-        else:
-            qty_before = 0
-            stock = CakeStock(
-                branch_id=data.branch_id,
-                cake_product_id=item.cake_product_id,
-                current_quantity=item.quantity,
-                last_updated_by_id=current_user.id,
-            )
-            db.add(stock)
-
-        log = CakeStockLog(
-            branch_id=data.branch_id,
-            cake_product_id=item.cake_product_id,
-            change_type=CakeStockChangeType.RECEIVED,
-            quantity_change=item.quantity,
-            quantity_before=qty_before,
-            quantity_after=qty_before + item.quantity,
-            reference_number=data.reference_number,
-            notes=item.notes,
-            recorded_by_id=current_user.id,
-        )
-        db.add(log)
-        updated.append((stock, product))
-
+    # Unknown products are skipped
+    lines = [
+        cake_stock.StockLine(item.cake_product_id, item.quantity, item.notes)
+        for item in data.items
+        if get_cake_product(db, item.cake_product_id)
+    ]
+    levels = cake_stock.receive(db, data.branch_id, lines, current_user.id, data.reference_number)
     db.commit()
 
+    thresholds = get_effective_thresholds(db, data.branch_id)
+
     result = []
-    for stock, product in updated:
-        db.refresh(stock)
-        threshold = get_effective_threshold(db, data.branch_id, product.id, product.default_alert_threshold)
-        result.append(CakeStockResponse(
-            id=stock.id,
-            branch_id=stock.branch_id,
-            cake_product_id=stock.cake_product_id,
-            current_quantity=stock.current_quantity,
-            last_updated_at=stock.last_updated_at,
-            cake_name=product.name,
-            cake_code=product.code,
-            category=product.category,
-            alert_threshold=threshold,
-            is_low_stock=stock.current_quantity <= threshold,
-        ))
+    for level in levels:
+        product = get_cake_product(db, level.cake_product_id)
+        threshold = thresholds.get(product.id, product.default_alert_threshold)
+        result.append(_stock_response(data.branch_id, level, product, threshold))
 
     return result
 
@@ -410,43 +294,21 @@ async def adjust_cake_stock(
     if data.branch_id != current_user.branch_id:
         raise HTTPException(status_code=403, detail="Can only adjust stock for your branch")
 
-    product = db.query(CakeProduct).filter(CakeProduct.id == data.cake_product_id).first()
+    product = get_cake_product(db, data.cake_product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Cake product not found")
 
-    stock = db.query(CakeStock).filter(
-        and_(CakeStock.branch_id == data.branch_id, CakeStock.cake_product_id == data.cake_product_id)
-    ).first()
-
-    if stock:
-        qty_before = stock.current_quantity
-        stock.current_quantity = data.new_quantity
-        stock.last_updated_by_id = current_user.id
-    else:
-        qty_before = 0
-        stock = CakeStock(
-            branch_id=data.branch_id,
-            cake_product_id=data.cake_product_id,
-            current_quantity=data.new_quantity,
-            last_updated_by_id=current_user.id,
+    try:
+        level = cake_stock.set_quantity(
+            db, data.branch_id, data.cake_product_id, data.new_quantity, current_user.id,
+            notes=data.notes or "Manual adjustment",
         )
-        db.add(stock)
-
-    log = CakeStockLog(
-        branch_id=data.branch_id,
-        cake_product_id=data.cake_product_id,
-        change_type=CakeStockChangeType.ADJUSTMENT,
-        quantity_change=data.new_quantity - qty_before,
-        quantity_before=qty_before,
-        quantity_after=data.new_quantity,
-        notes=data.notes or "Manual adjustment",
-        recorded_by_id=current_user.id,
-    )
-    db.add(log)
+    except cake_stock.StockError as e:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=str(e))
     db.commit()
-    db.refresh(stock)
 
-    threshold = get_effective_threshold(db, data.branch_id, product.id, product.default_alert_threshold)
+    threshold = get_effective_thresholds(db, data.branch_id).get(product.id, product.default_alert_threshold)
 
     # Send push notification if adjusted stock is at/below threshold
     check_and_notify_low_stock(
@@ -454,23 +316,12 @@ async def adjust_cake_stock(
         branch_id=data.branch_id,
         cake_name=product.name,
         cake_code=product.code,
-        current_quantity=stock.current_quantity,
+        current_quantity=level.current_quantity,
         threshold=threshold,
         triggered_by_user_id=current_user.id,
     )
 
-    return CakeStockResponse(
-        id=stock.id,
-        branch_id=stock.branch_id,
-        cake_product_id=stock.cake_product_id,
-        current_quantity=stock.current_quantity,
-        last_updated_at=stock.last_updated_at,
-        cake_name=product.name,
-        cake_code=product.code,
-        category=product.category,
-        alert_threshold=threshold,
-        is_low_stock=stock.current_quantity <= threshold,
-    )
+    return _stock_response(data.branch_id, level, product, threshold)
 
 
 # ============== STOCK LOGS ==============
@@ -486,7 +337,7 @@ async def get_stock_logs(
     db: Session = Depends(get_db)
 ):
     """Get stock change history for a branch"""
-    branch = db.query(Branch).filter(Branch.id == branch_id).first()
+    branch = get_branch(db, branch_id)
     if not branch:
         raise HTTPException(status_code=404, detail="Branch not found")
 
@@ -524,75 +375,35 @@ async def get_low_stock_alerts(
 ):
     """Get all low-stock cake alerts based on user's role scope"""
     # Determine branch scope based on role
-    if current_user.role == UserRole.STAFF:
-        branch_ids = [current_user.branch_id] if current_user.branch_id else []
-    elif current_user.role == UserRole.ADMIN:
-        id_set = set()
-        if current_user.area_id:
-            for b in db.query(Branch).filter(Branch.area_id == current_user.area_id).all():
-                id_set.add(b.id)
-        for b in db.query(Branch).filter(Branch.manager_id == current_user.id).all():
-            id_set.add(b.id)
+    branch_ids = get_access_scope(db, current_user).branch_ids
+    unscoped_admin = current_user.role == UserRole.ADMIN or (
+        current_user.role == UserRole.SUPER_ADMIN and not current_user.territory_id
+    )
+    if not branch_ids and unscoped_admin:
         # fallback: all branches if no scope configured
-        branch_ids = list(id_set) if id_set else [b.id for b in db.query(Branch).filter(Branch.is_active == True).all()]
-    elif current_user.role == UserRole.SUPER_ADMIN:
-        if current_user.territory_id:
-            areas = db.query(Area).filter(Area.territory_id == current_user.territory_id).all()
-            area_ids = [a.id for a in areas]
-            branches = db.query(Branch).filter(Branch.area_id.in_(area_ids)).all()
-            branch_ids = [b.id for b in branches]
-        else:
-            branch_ids = [b.id for b in db.query(Branch).filter(Branch.is_active == True).all()]
-    else:
-        # SUPREME_ADMIN — see all
-        branches = db.query(Branch).filter(Branch.is_active == True).all()
-        branch_ids = [b.id for b in branches]
-
-    # Build a lookup of existing stock records: {(branch_id, cake_product_id): stock}
-    stocks = db.query(CakeStock).filter(CakeStock.branch_id.in_(branch_ids)).all()
-    stock_map = {(s.branch_id, s.cake_product_id): s for s in stocks}
-
-    # Get all active products and all active branches in scope
-    all_products = db.query(CakeProduct).filter(CakeProduct.is_active == True).all()
-    all_branches = db.query(Branch).filter(Branch.id.in_(branch_ids), Branch.is_active == True).all()
-    branch_map = {b.id: b for b in all_branches}
-
-    alerts = []
-    critical_count = 0
-    warning_count = 0
-
-    for branch in all_branches:
-        for product in all_products:
-            stock = stock_map.get((branch.id, product.id))
-            current_qty = stock.current_quantity if stock else 0
-
-            threshold = get_effective_threshold(db, branch.id, product.id, product.default_alert_threshold)
-
-            if current_qty <= threshold:
-                severity = "critical" if current_qty == 0 else "warning"
-                if severity == "critical":
-                    critical_count += 1
-                else:
-                    warning_count += 1
-
-                alerts.append(LowStockAlert(
-                    cake_product_id=product.id,
-                    cake_name=product.name,
-                    cake_code=product.code,
-                    branch_id=branch.id,
-                    branch_name=branch.name,
-                    current_quantity=current_qty,
-                    threshold=threshold,
-                    severity=severity,
-                ))
-
-    alerts.sort(key=lambda a: (0 if a.severity == "critical" else 1, a.current_quantity))
+        branch_ids = [b.id for b in get_branches(db)]
+
+    items = evaluate_low_stock(db, branch_ids)
+    alerts = [
+        LowStockAlert(
+            cake_product_id=item.cake_product_id,
+            cake_name=item.cake_name,
+            cake_code=item.cake_code,
+            branch_id=item.branch_id,
+            branch_name=item.branch_name,
+            current_quantity=item.current_quantity,
+            threshold=item.threshold,
+            severity=item.severity,
+        )
+        for item in items
+    ]
+    critical_count = sum(1 for a in alerts if a.severity == "critical")
 
     return LowStockAlertList(
         alerts=alerts,
         total_count=len(alerts),
         critical_count=critical_count,
-        warning_count=warning_count,
+        warning_count=len(alerts) - critical_count,
     )
 
 
@@ -603,39 +414,16 @@ async def notify_low_stock_now(
 ):
     """Manually trigger push notifications for ALL currently low-stock items in scope.
     Use this when stock was already low before a sale (notifications normally only fire on sales)."""
-    if current_user.role == UserRole.ADMIN:
-        branches = db.query(Branch).filter(Branch.area_id == current_user.area_id).all()
-        branch_ids = [b.id for b in branches]
-    elif current_user.role == UserRole.SUPER_ADMIN:
-        from models.location import Area
-        areas = db.query(Area).filter(Area.territory_id == current_user.territory_id).all()
-        area_ids = [a.id for a in areas]
-        branches = db.query(Branch).filter(Branch.area_id.in_(area_ids)).all()
-        branch_ids = [b.id for b in branches]
-    else:
-        branch_ids = [b.id for b in db.query(Branch).filter(Branch.is_active == True).all()]
-
-    stock_map = {(s.branch_id, s.cake_product_id): s for s in
-                 db.query(CakeStock).filter(CakeStock.branch_id.in_(branch_ids)).all()}
-    all_products = db.query(CakeProduct).filter(CakeProduct.is_active == True).all()
-    all_branches = db.query(Branch).filter(Branch.id.in_(branch_ids), Branch.is_active == True).all()
-
-    notified = 0
-    for branch in all_branches:
-        for product in all_products:
-            stock = stock_map.get((branch.id, product.id))
-            current_qty = stock.current_quantity if stock else 0
-            threshold = get_effective_threshold(db, branch.id, product.id, product.default_alert_threshold)
-            if current_qty <= threshold:
-                check_and_notify_low_stock(
-                    db=db,
-                    branch_id=branch.id,
-                    cake_name=product.name,
-                    cake_code=product.code,
-                    current_quantity=current_qty,
-                    threshold=threshold,
-                )
-                notified += 1
+    branch_ids = get_access_scope(db, current_user, ADMIN_AREA).branch_ids
+
+    by_branch = {}
+    for item in evaluate_low_stock(db, branch_ids):
+        by_branch.setdefault(item.branch_id, []).append(
+            LowStockEvent(item.cake_name, item.cake_code, item.current_quantity, item.threshold)
+        )
+
+    # One digest per branch; an explicit request bypasses the repeat-alert cooldown
+    notified = sum(notify_low_stock(db, branch_id, events, force=True) for branch_id, events in by_branch.items())
 
     return {"notified": notified, "message": f"Sent notifications for {notified} low-stock items"}
 
@@ -649,7 +437,7 @@ async def get_alert_configs(
     db: Session = Depends(get_db)
 ):
     """Get alert configurations for a branch"""
-    branch = db.query(Branch).filter(Branch.id == branch_id).first()
+    branch = get_branch(db, branch_id)
     if not branch:
         raise HTTPException(status_code=404, detail="Branch not found")
 
@@ -676,7 +464,7 @@ async def create_or_update_alert_config(
     if data.branch_id != current_user.branch_id:
         raise HTTPException(status_code=403, detail="Can only configure alerts for your branch")
 
-    product = db.query(CakeProduct).filter(CakeProduct.id == data.cake_product_id).first()
+    product = get_cake_product(db, data.cake_product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Cake product not found")
 
@@ -719,7 +507,7 @@ async def bulk_update_alert_configs(
 
     updated = []
     for item in data.configs:
-        product = db.query(CakeProduct).filter(CakeProduct.id == item.cake_product_id).first()
+        product = get_cake_product(db, item.cake_product_id)
         if not product:
             continue
 
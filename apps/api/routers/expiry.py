@@ -3,25 +3,29 @@ Expiry Tracking router
 Area Managers create expiry check requests, branches respond with expiry data
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_
-from typing import List
+from sqlalchemy import and_, case, func, insert, select
+from typing import List, Optional, Union
 from datetime import datetime
+import base64
 
 from utils.database import get_db
 from utils.security import get_current_user, require_role
 from models.user import User, UserRole
-from models.location import Branch
 from models.expiry import (
     ExpiryRequest, ExpiryRequestItem, ExpiryRequestBranch,
     ExpiryResponse, ExpiryRequestStatus, ExpiryBranchStatus,
 )
 from schemas.expiry import (
     ExpiryRequestCreate, ExpiryRequestUpdate,
-    ExpiryResponseBulk,
+    ExpiryItemInput, ExpiryResponseBulk,
     ExpiryRequestListResponse, ExpiryRequestDetailResponse,
 )
+from services.access_scope import ADMIN_MANAGED, get_access_scope
+from services.bulk_upsert import upsert_rows
+from services import file_store
 from services.push_service import send_push_to_branch
 
 router = APIRouter()
@@ -31,15 +35,36 @@ router = APIRouter()
 
 def get_admin_branch_ids(db: Session, user: User) -> List[int]:
     """Get branch IDs the admin has access to"""
-    query = db.query(Branch.id).filter(Branch.is_active == True)
-    if user.role == UserRole.ADMIN:
-        query = query.filter(Branch.manager_id == user.id)
-    elif user.role == UserRole.SUPER_ADMIN:
-        from models.location import Area
-        area_ids = [a.id for a in db.query(Area.id).filter(Area.territory_id == user.territory_id).all()]
-        query = query.filter(Branch.area_id.in_(area_ids))
-    # SUPREME_ADMIN sees all
-    return [r[0] for r in query.all()]
+    return get_access_scope(db, user, ADMIN_MANAGED).branch_ids
+
+
+def _insert_items(db: Session, request_id: int, items: List[Union[ExpiryItemInput, str]]):
+    """Insert a request's items in one statement (string or object format; repeated names keep the first)"""
+    rows = {}
+    for item_data in items:
+        if isinstance(item_data, str):
+            product_name = item_data.strip()
+            expiry_date = None
+        else:
+            product_name = item_data.product_name.strip()
+            expiry_date = item_data.expiry_date
+        if product_name not in rows:
+            rows[product_name] = {
+                "expiry_request_id": request_id,
+                "product_name": product_name,
+                "expiry_date": expiry_date,
+                "sort_order": len(rows),
+            }
+    if rows:
+        # Table-level insert: ORM bulk insert would split rows by which values are None
+        db.execute(insert(ExpiryRequestItem.__table__), list(rows.values()))
+
+
+def _insert_branches(db: Session, request_id: int, branch_ids: List[int]):
+    """Assign branches to a request in one statement"""
+    rows = [{"expiry_request_id": request_id, "branch_id": bid} for bid in dict.fromkeys(branch_ids)]
+    if rows:
+        db.execute(insert(ExpiryRequestBranch.__table__), rows)
 
 
 # ============== ADMIN ENDPOINTS ==============
@@ -57,40 +82,28 @@ async def create_expiry_request(
         if bid not in allowed_ids:
             raise HTTPException(status_code=403, detail=f"No access to branch {bid}")
 
+    # Template file goes to the file store; the row only keeps a reference
+    template_file_id = None
+    if data.template_file_data:
+        try:
+            file_bytes = base64.b64decode(data.template_file_data, validate=True)
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Template file is not valid base64")
+        template_file_id = file_store.save_file(db, file_bytes, file_store.XLSX_CONTENT_TYPE).id
+
     # Create request
     req = ExpiryRequest(
         title=data.title,
         notes=data.notes,
         created_by_id=current_user.id,
-        template_file_data=data.template_file_data,
+        template_file_id=template_file_id,
         template_filename=data.template_filename,
     )
     db.add(req)
     db.flush()
 
-    # Add items (support both string and object format)
-    for i, item_data in enumerate(data.items):
-        if isinstance(item_data, str):
-            product_name = item_data.strip()
-            expiry_date = None
-        else:
-            product_name = item_data.product_name.strip()
-            expiry_date = item_data.expiry_date
-        item = ExpiryRequestItem(
-            expiry_request_id=req.id,
-            product_name=product_name,
-            expiry_date=expiry_date,
-            sort_order=i,
-        )
-        db.add(item)
-
-    # Add branches
-    for bid in data.branch_ids:
-        branch_assign = ExpiryRequestBranch(
-            expiry_request_id=req.id,
-            branch_id=bid,
-        )
-        db.add(branch_assign)
+    _insert_items(db, req.id, data.items)
+    _insert_branches(db, req.id, data.branch_ids)
 
     db.commit()
     db.refresh(req)
@@ -110,49 +123,96 @@ async def create_expiry_request(
     return {"id": req.id, "message": "Expiry request created and branches notified"}
 
 
+def _request_list_rows(db: Session, filters: list, before_id: Optional[int], limit: Optional[int]):
+    """
+    One page of requests (newest first, all of them if limit is None) with creator name,
+    item count, branch count and responded count, in one statement. Counts are aggregated
+    for the page's ids only.
+    """
+    page_query = select(ExpiryRequest.id).where(*filters).order_by(ExpiryRequest.id.desc())
+    if before_id is not None:
+        page_query = page_query.where(ExpiryRequest.id < before_id)
+    if limit is not None:
+        page_query = page_query.limit(limit)
+    page_ids = select(page_query.subquery().c.id)
+
+    item_counts = (
+        select(ExpiryRequestItem.expiry_request_id, func.count(ExpiryRequestItem.id).label("item_count"))
+        .where(ExpiryRequestItem.expiry_request_id.in_(page_ids))
+        .group_by(ExpiryRequestItem.expiry_request_id)
+        .subquery()
+    )
+    branch_counts = (
+        select(
+            ExpiryRequestBranch.expiry_request_id,
+            func.count(ExpiryRequestBranch.id).label("branch_count"),
+            func.sum(case((ExpiryRequestBranch.status != ExpiryBranchStatus.PENDING, 1), else_=0)).label("responded_count"),
+        )
+        .where(ExpiryRequestBranch.expiry_request_id.in_(page_ids))
+        .group_by(ExpiryRequestBranch.expiry_request_id)
+        .subquery()
+    )
+    stmt = (
+        select(
+            ExpiryRequest.id, ExpiryRequest.title, ExpiryRequest.notes, ExpiryRequest.status,
+            ExpiryRequest.created_at, User.full_name,
+            item_counts.c.item_count, branch_counts.c.branch_count, branch_counts.c.responded_count,
+        )
+        .outerjoin(User, User.id == ExpiryRequest.created_by_id)
+        .outerjoin(item_counts, item_counts.c.expiry_request_id == ExpiryRequest.id)
+        .outerjoin(branch_counts, branch_counts.c.expiry_request_id == ExpiryRequest.id)
+        .where(ExpiryRequest.id.in_(page_ids))
+        .order_by(ExpiryRequest.id.desc())
+    )
+    return db.execute(stmt).all()
+
+
+NEXT_BEFORE_ID_HEADER = "X-Next-Before-Id"
+
+
 @router.get("/requests")
 async def list_expiry_requests(
-    status_filter: str = None,
+    response: Response,
+    status_filter: Optional[ExpiryRequestStatus] = None,
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Page size; omit to list every request"),
+    before_id: Optional[int] = Query(None, ge=1, description="Keyset pagination: return requests with id < before_id"),
     current_user: User = Depends(require_role([UserRole.SUPREME_ADMIN, UserRole.SUPER_ADMIN, UserRole.ADMIN])),
     db: Session = Depends(get_db),
 ):
-    """List all expiry requests created by or visible to this admin"""
-    query = db.query(ExpiryRequest).options(
-        joinedload(ExpiryRequest.created_by),
-        joinedload(ExpiryRequest.items),
-        joinedload(ExpiryRequest.branches),
-    )
+    """
+    List expiry requests created by or visible to this admin, newest first.
+    With limit, the X-Next-Before-Id header is set while older requests remain;
+    pass it back as before_id to fetch the next page.
+    """
+    filters = []
 
     # Filter by role scope
     if current_user.role == UserRole.ADMIN:
-        query = query.filter(ExpiryRequest.created_by_id == current_user.id)
+        filters.append(ExpiryRequest.created_by_id == current_user.id)
     elif current_user.role == UserRole.SUPER_ADMIN:
         # Show requests from admins in same territory
-        from models.location import Area
-        territory_user_ids = [u.id for u in db.query(User.id).filter(User.territory_id == current_user.territory_id).all()]
-        query = query.filter(ExpiryRequest.created_by_id.in_(territory_user_ids))
+        territory_user_ids = select(User.id).where(User.territory_id == current_user.territory_id)
+        filters.append(ExpiryRequest.created_by_id.in_(territory_user_ids))
 
     if status_filter:
-        query = query.filter(ExpiryRequest.status == status_filter)
+        filters.append(ExpiryRequest.status == status_filter)
 
-    requests = query.order_by(ExpiryRequest.created_at.desc()).all()
-
-    result = []
-    for req in requests:
-        responded = sum(1 for b in req.branches if b.status != ExpiryBranchStatus.PENDING)
-        result.append({
-            "id": req.id,
-            "title": req.title,
-            "notes": req.notes,
-            "status": req.status.value if req.status else "open",
-            "created_by_name": req.created_by.full_name if req.created_by else "Unknown",
-            "created_at": req.created_at.isoformat() if req.created_at else None,
-            "item_count": len(req.items),
-            "branch_count": len(req.branches),
-            "responded_count": responded,
-        })
+    rows = _request_list_rows(db, filters, before_id, limit + 1 if limit else None)
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_BEFORE_ID_HEADER] = str(rows[-1].id)
 
-    return result
+    return [{
+        "id": row.id,
+        "title": row.title,
+        "notes": row.notes,
+        "status": row.status.value if row.status else "open",
+        "created_by_name": row.full_name or "Unknown",
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+        "item_count": row.item_count or 0,
+        "branch_count": row.branch_count or 0,
+        "responded_count": row.responded_count or 0,
+    } for row in rows]
 
 
 @router.get("/requests/{request_id}")
@@ -209,7 +269,7 @@ async def get_expiry_request_detail(
         "created_by_name": req.created_by.full_name if req.created_by else "Unknown",
         "created_at": req.created_at.isoformat() if req.created_at else None,
         "template_filename": req.template_filename,
-        "has_template": bool(req.template_file_data),
+        "has_template": req.template_file_id is not None,
         "items": items,
         "branches": branches,
         "responses": responses,
@@ -222,22 +282,25 @@ async def download_expiry_template(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    """Download the original Excel template file uploaded when creating the request"""
-    from fastapi.responses import Response
-    import base64
-
-    req = db.query(ExpiryRequest).filter(ExpiryRequest.id == request_id).first()
+    """Download the original Excel template file uploaded when creating the request (streamed in chunks)"""
+    req = db.query(ExpiryRequest).options(
+        joinedload(ExpiryRequest.template_file),
+    ).filter(ExpiryRequest.id == request_id).first()
     if not req:
         raise HTTPException(status_code=404, detail="Request not found")
-    if not req.template_file_data:
+    stored = req.template_file
+    if stored is None or not file_store.file_exists(stored):
         raise HTTPException(status_code=404, detail="No template file for this request")
 
-    file_bytes = base64.b64decode(req.template_file_data)
     filename = req.template_filename or f"expiry-template-{request_id}.xlsx"
-    return Response(
-        content=file_bytes,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    return StreamingResponse(
+        file_store.iter_file(stored),
+        media_type=stored.content_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Content-Length": str(stored.size_bytes),
+            "ETag": f'"{stored.sha256}"',
+        },
     )
 
 
@@ -263,20 +326,7 @@ async def update_expiry_request(
     # Update items if provided
     if data.items is not None:
         db.query(ExpiryRequestItem).filter(ExpiryRequestItem.expiry_request_id == request_id).delete()
-        for i, item_data in enumerate(data.items):
-            if isinstance(item_data, str):
-                product_name = item_data.strip()
-                expiry_date = None
-            else:
-                product_name = item_data.product_name.strip()
-                expiry_date = item_data.expiry_date
-            item = ExpiryRequestItem(
-                expiry_request_id=request_id,
-                product_name=product_name,
-                expiry_date=expiry_date,
-                sort_order=i,
-            )
-            db.add(item)
+        _insert_items(db, request_id, data.items)
 
     # Update branches if provided
     if data.branch_ids is not None:
@@ -285,9 +335,7 @@ async def update_expiry_request(
             if bid not in allowed_ids:
                 raise HTTPException(status_code=403, detail=f"No access to branch {bid}")
         db.query(ExpiryRequestBranch).filter(ExpiryRequestBranch.expiry_request_id == request_id).delete()
-        for bid in data.branch_ids:
-            branch_assign = ExpiryRequestBranch(expiry_request_id=request_id, branch_id=bid)
-            db.add(branch_assign)
+        _insert_branches(db, request_id, data.branch_ids)
 
     db.commit()
     return {"message": "Request updated"}
@@ -325,7 +373,10 @@ async def delete_expiry_request(
     if req.created_by_id != current_user.id and current_user.role not in [UserRole.SUPREME_ADMIN]:
         raise HTTPException(status_code=403, detail="Only the creator can delete this request")
 
+    template_file_id = req.template_file_id
     db.delete(req)
+    db.flush()
+    file_store.delete_file_if_unused(db, template_file_id)
     db.commit()
     return {"message": "Request deleted"}
 
@@ -401,31 +452,31 @@ async def submit_expiry_responses(
     if not req or req.status == ExpiryRequestStatus.CLOSED:
         raise HTTPException(status_code=400, detail="Request is closed")
 
-    # Upsert responses
-    for resp_data in data.responses:
-        existing = db.query(ExpiryResponse).filter(
-            and_(
-                ExpiryResponse.expiry_request_item_id == resp_data.expiry_request_item_id,
-                ExpiryResponse.branch_id == current_user.branch_id,
-            )
-        ).first()
-
-        if existing:
-            existing.quantity = resp_data.quantity
-            existing.expiry_date = resp_data.expiry_date
-            existing.notes = resp_data.notes
-            existing.submitted_by_id = current_user.id
-        else:
-            new_resp = ExpiryResponse(
-                expiry_request_id=data.expiry_request_id,
-                expiry_request_item_id=resp_data.expiry_request_item_id,
-                branch_id=current_user.branch_id,
-                quantity=resp_data.quantity,
-                expiry_date=resp_data.expiry_date,
-                notes=resp_data.notes,
-                submitted_by_id=current_user.id,
-            )
-            db.add(new_resp)
+    # Only this request's items can be answered
+    item_ids = {resp_data.expiry_request_item_id for resp_data in data.responses}
+    known_ids = set(db.execute(
+        select(ExpiryRequestItem.id).where(
+            ExpiryRequestItem.expiry_request_id == data.expiry_request_id,
+            ExpiryRequestItem.id.in_(item_ids),
+        )
+    ).scalars())
+    unknown_ids = sorted(item_ids - known_ids)
+    if unknown_ids:
+        raise HTTPException(status_code=400, detail=f"Items {unknown_ids} are not part of this request")
+
+    # Upsert responses in one statement, keyed on (item, branch)
+    upsert_rows(db, ExpiryResponse, [
+        {
+            "expiry_request_id": data.expiry_request_id,
+            "expiry_request_item_id": resp_data.expiry_request_item_id,
+            "branch_id": current_user.branch_id,
+            "quantity": resp_data.quantity,
+            "expiry_date": resp_data.expiry_date,
+            "notes": resp_data.notes,
+            "submitted_by_id": current_user.id,
+        }
+        for resp_data in data.responses
+    ], key_columns=("expiry_request_item_id", "branch_id"))
 
     # Update branch status
     is_update = branch_assign.status != ExpiryBranchStatus.PENDING
@@ -0,0 +1,99 @@
+"""
+Exports router
+Streams CSV / XLSX downloads of expiry responses, daily sales and the budget tracker
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from datetime import date
+import calendar
+
+from utils.database import get_db
+from utils.security import get_current_user, require_role
+from models.user import User, UserRole
+from models.expiry import ExpiryRequest
+from services import export
+from services.access_scope import ADMIN_MANAGED, get_access_scope
+
+router = APIRouter()
+
+FORMAT_QUERY = Query("csv", pattern="^(csv|xlsx)$", description="csv or xlsx")
+
+
+def _scoped_branch_ids(db: Session, user: User, branch_id: Optional[int]) -> List[int]:
+    """Branches in the user's scope (inactive included, for history), or just branch_id."""
+    scope = get_access_scope(db, user, ADMIN_MANAGED)  # same rule as the sales endpoints
+    if branch_id is None:
+        return scope.all_branch_ids
+    if not scope.can_access(branch_id):
+        raise HTTPException(status_code=403, detail="No access to this branch")
+    return [branch_id]
+
+
+# ============== EXPIRY RESPONSES ==============
+
+@router.get("/expiry/{request_id}")
+async def export_expiry_responses(
+    request_id: int,
+    format: str = FORMAT_QUERY,
+    current_user: User = Depends(require_role([UserRole.SUPREME_ADMIN, UserRole.SUPER_ADMIN, UserRole.ADMIN])),
+    db: Session = Depends(get_db),
+):
+    """Expiry responses as an items × branches matrix (quantity and expiry date per branch)"""
+    title = db.query(ExpiryRequest.title).filter(ExpiryRequest.id == request_id).scalar()
+    if title is None:
+        raise HTTPException(status_code=404, detail="Request not found")
+
+    columns, branch_ids = export.expiry_matrix_columns(db, request_id)
+    return export.export_response(
+        format, f"expiry-{request_id}", title, columns,
+        export.expiry_matrix_rows(db, request_id, branch_ids),
+    )
+
+
+# ============== DAILY SALES ==============
+
+@router.get("/daily-sales")
+async def export_daily_sales(
+    start_date: date,
+    end_date: date,
+    branch_id: Optional[int] = None,
+    format: str = FORMAT_QUERY,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Every submitted sales window in a date range, for one branch or all branches in scope"""
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+
+    branch_ids = _scoped_branch_ids(db, current_user, branch_id)
+    return export.export_response(
+        format, f"daily-sales-{start_date}-to-{end_date}", "Daily Sales", export.DAILY_SALES_COLUMNS,
+        export.daily_sales_rows(db, branch_ids, start_date, end_date),
+    )
+
+
+# ============== BUDGET TRACKER ==============
+
+@router.get("/tracker")
+async def export_tracker_month(
+    month: str = Query(..., description="YYYY-MM format"),
+    branch_id: Optional[int] = None,
+    format: str = FORMAT_QUERY,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Budget vs actual for every branch-day of a month (the tracker overview, day by day)"""
+    try:
+        year, mon = (int(part) for part in month.split("-"))
+        start = date(year, mon, 1)
+        end = date(year, mon, calendar.monthrange(year, mon)[1])
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid month format. Use YYYY-MM")
+
+    branch_ids = _scoped_branch_ids(db, current_user, branch_id)
+    return export.export_response(
+        format, f"tracker-{month}", f"Tracker {month}", export.TRACKER_COLUMNS,
+        export.tracker_month_rows(db, branch_ids, start, end),
+    )
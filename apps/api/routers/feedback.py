@@ -14,6 +14,8 @@ from utils.security import get_current_user
 from models.user import User, UserRole
 from models.location import Branch
 from models.feedback import CustomerFeedback
+from services.access_scope import get_access_scope
+from services.reference_data import get_branch
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -34,7 +36,7 @@ async def get_branch_info(
     Used by the QR feedback form to populate branch name and staff dropdown.
     """
     # Allow any branch (active or not) so QR codes always work
-    branch = db.query(Branch).filter(Branch.id == branch_id).first()
+    branch = get_branch(db, branch_id)
     if not branch:
         raise HTTPException(status_code=404, detail="Branch not found")
 
@@ -100,7 +102,7 @@ async def submit_feedback(
         raise HTTPException(status_code=400, detail=f"feedback_type must be one of: {', '.join(VALID_FEEDBACK_TYPES)}")
 
     # Validate branch exists
-    branch = db.query(Branch).filter(Branch.id == branch_id).first()
+    branch = get_branch(db, branch_id)
     if not branch:
         raise HTTPException(status_code=404, detail="Branch not found")
 
@@ -171,9 +173,7 @@ async def list_feedback(
     elif current_user.role == UserRole.SUPER_ADMIN:
         # Territory manager — filter by territory if territory_id is set
         if current_user.territory_id:
-            territory_branch_ids = [
-                b.id for b in db.query(Branch).filter(Branch.territory_id == current_user.territory_id).all()
-            ]
+            territory_branch_ids = get_access_scope(db, current_user).all_branch_ids
             if territory_branch_ids:
                 if branch_id and branch_id not in territory_branch_ids:
                     raise HTTPException(status_code=403, detail="Not authorized to view this branch's feedback")
@@ -187,16 +187,11 @@ async def list_feedback(
 
     elif current_user.role == UserRole.ADMIN:
         # Area manager — collect all branch IDs in their area OR managed directly
-        scoped_ids = set()
-        if current_user.area_id:
-            for b in db.query(Branch).filter(Branch.area_id == current_user.area_id).all():
-                scoped_ids.add(b.id)
-        for b in db.query(Branch).filter(Branch.manager_id == current_user.id).all():
-            scoped_ids.add(b.id)
+        scoped_ids = get_access_scope(db, current_user).all_branch_ids
         if scoped_ids:
             if branch_id and branch_id not in scoped_ids:
                 raise HTTPException(status_code=403, detail="Not authorized to view this branch's feedback")
-            query = query.filter(CustomerFeedback.branch_id.in_(list(scoped_ids)))
+            query = query.filter(CustomerFeedback.branch_id.in_(scoped_ids))
         # If no branches found via area/manager, fall back to all (better than empty)
 
     elif current_user.role == UserRole.STAFF:
@@ -254,14 +249,9 @@ async def feedback_stats(
             return []
         branch_query = branch_query.filter(Branch.id == current_user.branch_id)
     elif current_user.role == UserRole.ADMIN:
-        branch_ids_set = set()
-        if current_user.area_id:
-            for b in db.query(Branch).filter(Branch.area_id == current_user.area_id, Branch.is_active == True).all():
-                branch_ids_set.add(b.id)
-        for b in db.query(Branch).filter(Branch.manager_id == current_user.id, Branch.is_active == True).all():
-            branch_ids_set.add(b.id)
-        if branch_ids_set:
-            branch_query = branch_query.filter(Branch.id.in_(list(branch_ids_set)))
+        scoped_ids = get_access_scope(db, current_user).branch_ids
+        if scoped_ids:
+            branch_query = branch_query.filter(Branch.id.in_(scoped_ids))
         # else no filter = sees all (fallback when area/manager not configured)
     elif current_user.role == UserRole.SUPER_ADMIN:
         if current_user.territory_id:
@@ -11,6 +11,7 @@ from utils.database import get_db
 from utils.security import get_current_user, require_role
 from models.user import User, UserRole
 from models.inventory import Flavor
+from services import reference_data
 from schemas.inventory import FlavorCreate, FlavorUpdate, FlavorResponse
 
 router = APIRouter()
@@ -30,20 +31,17 @@ async def list_flavors(
     List all flavors
     All authenticated users can view flavors
     """
-    query = db.query(Flavor)
+    flavors = reference_data.get_flavors(db, active_only=False)
 
     if category:
-        query = query.filter(Flavor.category == category)
+        flavors = [f for f in flavors if f.category == category]
     if is_active is not None:
-        query = query.filter(Flavor.is_active == is_active)
+        flavors = [f for f in flavors if f.is_active == is_active]
     if search:
-        query = query.filter(
-            (Flavor.name.ilike(f"%{search}%")) |
-            (Flavor.code.ilike(f"%{search}%"))
-        )
+        needle = search.lower()
+        flavors = [f for f in flavors if needle in f.name.lower() or needle in f.code.lower()]
 
-    flavors = query.order_by(Flavor.name).offset(skip).limit(limit).all()
-    return [FlavorResponse.model_validate(f) for f in flavors]
+    return [FlavorResponse.model_validate(f) for f in flavors[skip:skip + limit]]
 
 
 @router.get("/categories")
@@ -54,10 +52,7 @@ async def list_categories(
     """
     List all unique flavor categories
     """
-    categories = db.query(Flavor.category).distinct().filter(
-        Flavor.category.isnot(None)
-    ).all()
-    return [c[0] for c in categories if c[0]]
+    return sorted({f.category for f in reference_data.get_flavors(db, active_only=False) if f.category})
 
 
 @router.get("/{flavor_id}", response_model=FlavorResponse)
@@ -69,7 +64,7 @@ async def get_flavor(
     """
     Get a specific flavor
     """
-    flavor = db.query(Flavor).filter(Flavor.id == flavor_id).first()
+    flavor = reference_data.get_flavor(db, flavor_id)
     if not flavor:
         raise HTTPException(status_code=404, detail="Flavor not found")
     return FlavorResponse.model_validate(flavor)
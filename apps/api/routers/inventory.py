@@ -13,8 +13,9 @@ from datetime import date, datetime, timedelta
 from utils.database import get_db
 from utils.security import get_current_user, require_role
 from models.user import User, UserRole
-from models.location import Branch, Area
-from models.inventory import DailyInventory, TubReceipt, Flavor, InventoryEntryType
+from models.location import Area
+from models.inventory import DailyInventory, TubReceipt, InventoryEntryType
+from services.reference_data import get_branch, get_flavor, get_flavors
 from schemas.inventory import (
     DailyInventoryCreate,
     DailyInventoryResponse,
@@ -45,7 +46,7 @@ async def list_daily_inventory(
     List daily inventory entries for a branch
     """
     # Verify branch access
-    branch = db.query(Branch).filter(Branch.id == branch_id).first()
+    branch = get_branch(db, branch_id)
     if not branch:
         raise HTTPException(status_code=404, detail="Branch not found")
 
@@ -57,7 +58,7 @@ async def list_daily_inventory(
         if branch.area_id != current_user.area_id:
             raise HTTPException(status_code=403, detail="Access denied")
     elif current_user.role == UserRole.SUPER_ADMIN:
-        if branch.area.territory_id != current_user.territory_id:
+        if branch.territory_id != current_user.territory_id:
             raise HTTPException(status_code=403, detail="Access denied")
 
     query = db.query(DailyInventory).filter(DailyInventory.branch_id == branch_id)
@@ -76,7 +77,8 @@ async def list_daily_inventory(
     result = []
     for entry in entries:
         entry_response = DailyInventoryResponse.model_validate(entry)
-        entry_response.flavor_name = entry.flavor.name if entry.flavor else None
+        flavor = get_flavor(db, entry.flavor_id)
+        entry_response.flavor_name = flavor.name if flavor else None
         entry_response.entered_by_name = entry.entered_by.full_name if entry.entered_by else None
         result.append(entry_response)
     return result
@@ -97,7 +99,7 @@ async def create_daily_inventory(
         raise HTTPException(status_code=403, detail="Can only enter inventory for your branch")
 
     # Verify flavor exists
-    flavor = db.query(Flavor).filter(Flavor.id == data.flavor_id).first()
+    flavor = get_flavor(db, data.flavor_id)
     if not flavor:
         raise HTTPException(status_code=400, detail="Flavor not found")
 
@@ -169,7 +171,7 @@ async def bulk_create_daily_inventory(
     created = []
     for item in data.items:
         # Verify flavor exists
-        flavor = db.query(Flavor).filter(Flavor.id == item.flavor_id).first()
+        flavor = get_flavor(db, item.flavor_id)
         if not flavor:
             continue  # Skip invalid flavors
 
@@ -227,7 +229,8 @@ async def get_opening_inventory(
         result = []
         for entry in opening:
             response = DailyInventoryResponse.model_validate(entry)
-            response.flavor_name = entry.flavor.name if entry.flavor else None
+            flavor = get_flavor(db, entry.flavor_id)
+            response.flavor_name = flavor.name if flavor else None
             result.append(response)
         return result
 
@@ -244,7 +247,8 @@ async def get_opening_inventory(
     result = []
     for entry in closing:
         response = DailyInventoryResponse.model_validate(entry)
-        response.flavor_name = entry.flavor.name if entry.flavor else None
+        flavor = get_flavor(db, entry.flavor_id)
+        response.flavor_name = flavor.name if flavor else None
         # Mark as previous day's closing
         response.notes = f"Carried forward from {yesterday}"
         result.append(response)
@@ -285,7 +289,8 @@ async def list_tub_receipts(
     result = []
     for receipt in receipts:
         response = TubReceiptResponse.model_validate(receipt)
-        response.flavor_name = receipt.flavor.name if receipt.flavor else None
+        flavor = get_flavor(db, receipt.flavor_id)
+        response.flavor_name = flavor.name if flavor else None
         response.recorded_by_name = receipt.recorded_by.full_name if receipt.recorded_by else None
         response.total_inches = receipt.quantity * receipt.inches_per_tub
         result.append(response)
@@ -305,7 +310,7 @@ async def create_tub_receipt(
         raise HTTPException(status_code=403, detail="Can only record receipts for your branch")
 
     # Verify flavor exists
-    flavor = db.query(Flavor).filter(Flavor.id == data.flavor_id).first()
+    flavor = get_flavor(db, data.flavor_id)
     if not flavor:
         raise HTTPException(status_code=400, detail="Flavor not found")
 
@@ -345,7 +350,7 @@ async def bulk_create_tub_receipts(
 
     created = []
     for item in data.items:
-        flavor = db.query(Flavor).filter(Flavor.id == item.flavor_id).first()
+        flavor = get_flavor(db, item.flavor_id)
         if not flavor:
             continue
 
@@ -390,7 +395,7 @@ async def get_daily_summary(
     Shows opening, received, closing, and consumed for each flavor
     """
     # Verify access
-    branch = db.query(Branch).filter(Branch.id == branch_id).first()
+    branch = get_branch(db, branch_id)
     if not branch:
         raise HTTPException(status_code=404, detail="Branch not found")
 
@@ -399,7 +404,7 @@ async def get_daily_summary(
             raise HTTPException(status_code=403, detail="Access denied")
 
     # Get all flavors
-    flavors = db.query(Flavor).filter(Flavor.is_active == True).all()
+    flavors = get_flavors(db)
 
     # Get opening entries
     opening_entries = {
@@ -12,11 +12,12 @@ import logging
 
 from utils.database import get_db
 from utils.security import get_current_user
-from models.user import User, UserRole
+from models.user import User
 from models.location import Branch
-from models.sales import DailySales, BranchBudget, DailyBudget
+from models.sales import BranchDaySales, BranchBudget, DailyBudget
 from models.branch_visit import BranchVisit
 from models.expiry import ExpiryRequestBranch, ExpiryBranchStatus, ExpiryResponse
+from services.access_scope import ADMIN_MANAGED, get_access_scope
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -79,32 +80,21 @@ async def get_scorecards(
     today = target_date or (datetime.utcnow() + timedelta(hours=4)).date()
 
     # --- Branch scoping ---
-    branch_query = db.query(Branch).filter(Branch.is_active == True)
-    if current_user.role == UserRole.SUPER_ADMIN:
-        branch_query = branch_query.filter(Branch.territory_id == current_user.territory_id)
-    elif current_user.role == UserRole.ADMIN:
-        branch_query = branch_query.filter(Branch.manager_id == current_user.id)
-    elif current_user.role == UserRole.STAFF:
-        if current_user.branch_id:
-            branch_query = branch_query.filter(Branch.id == current_user.branch_id)
-        else:
-            return []
-
-    branches = branch_query.all()
-    branch_ids = [b.id for b in branches]
-    if not branch_ids:
+    scoped_ids = get_access_scope(db, current_user, ADMIN_MANAGED).branch_ids
+    if not scoped_ids:
         return []
+    branches = db.query(Branch).filter(Branch.id.in_(scoped_ids)).order_by(Branch.id).all()
+    branch_ids = [b.id for b in branches]
 
     branch_map = {b.id: b for b in branches}
 
     # --- Sales: today ---
     today_sales_rows = (
-        db.query(DailySales.branch_id, func.sum(DailySales.gross_sales).label("total"))
+        db.query(BranchDaySales.branch_id, BranchDaySales.gross_sales.label("total"))
         .filter(
-            DailySales.branch_id.in_(branch_ids),
-            DailySales.date == today,
+            BranchDaySales.branch_id.in_(branch_ids),
+            BranchDaySales.date == today,
         )
-        .group_by(DailySales.branch_id)
         .all()
     )
     today_sales_map = {r.branch_id: float(r.total or 0) for r in today_sales_rows}
@@ -123,13 +113,13 @@ async def get_scorecards(
     # --- Sales: MTD ---
     mtd_start = today.replace(day=1)
     mtd_sales_rows = (
-        db.query(DailySales.branch_id, func.sum(DailySales.gross_sales).label("total"))
+        db.query(BranchDaySales.branch_id, func.sum(BranchDaySales.gross_sales).label("total"))
         .filter(
-            DailySales.branch_id.in_(branch_ids),
-            DailySales.date >= mtd_start,
-            DailySales.date <= today,
+            BranchDaySales.branch_id.in_(branch_ids),
+            BranchDaySales.date >= mtd_start,
+            BranchDaySales.date <= today,
         )
-        .group_by(DailySales.branch_id)
+        .group_by(BranchDaySales.branch_id)
         .all()
     )
     mtd_sales_map = {r.branch_id: float(r.total or 0) for r in mtd_sales_rows}
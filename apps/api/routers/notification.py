@@ -3,7 +3,9 @@ Push Notification router
 Handles Web Push subscription registration and VAPID public key endpoint
 """
 
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import and_
 from pydantic import BaseModel
@@ -14,6 +16,7 @@ from utils.security import get_current_user
 from utils.config import settings
 from models.user import User
 from models.notification import PushSubscription
+from services.push_dispatch import push_dispatcher
 
 router = APIRouter()
 
@@ -110,3 +113,44 @@ async def unsubscribe_push(
         db.commit()
 
     return {"status": "unsubscribed"}
+
+
+@router.get("/dispatch/stats")
+async def get_dispatch_stats(
+    current_user: User = Depends(get_current_user),
+):
+    """Counters for the background push dispatcher (queued, sent, retried, stale, failed)."""
+    return push_dispatcher.stats()
+
+
+# ---- Load-test stub ----
+
+_stub_stats = {"received": 0}
+
+
+@router.post("/push-stub")
+async def push_stub(
+    request: Request,
+    delay_ms: int = Query(0, ge=0, le=30000),
+    status_code: int = Query(201, ge=200, le=599),
+):
+    """
+    Stand-in push service for local load tests (only when PUSH_STUB_ENABLED).
+    Use this URL as a test subscription's endpoint: delay_ms simulates gateway latency,
+    status_code makes the subscription look gone (410) or throttled (429).
+    """
+    if not settings.PUSH_STUB_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    await request.body()
+    if delay_ms:
+        await asyncio.sleep(delay_ms / 1000)
+    _stub_stats["received"] += 1
+    return Response(status_code=status_code)
+
+
+@router.get("/push-stub")
+async def push_stub_stats():
+    """How many deliveries the stub has accepted."""
+    if not settings.PUSH_STUB_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return _stub_stats
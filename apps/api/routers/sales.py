@@ -5,17 +5,22 @@ Handles daily sales submissions and Gemini Vision extraction
 
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Body
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, func, desc
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, case, func, desc, select
 from typing import List, Optional, Any
 from datetime import date, timedelta
 import logging
-import json
 
-from utils.database import get_db
+from utils.database import get_db, get_async_db
 from utils.security import get_current_user
 from models.user import User, UserRole
 from models.location import Branch
-from models.sales import DailySales, SalesWindowType, BranchBudget, TrackedItem, CustomSalesWindow
+from models.sales import DailySales, DailyBudget, SalesWindowType, BranchBudget, TrackedItem, CustomSalesWindow, BranchDaySales
+from services.sales_items import sync_line_items, tracked_item_totals
+from services.sales_rollup import refresh_branch_day
+from services.image_pipeline import normalize_images
+from services.access_scope import ADMIN_MANAGED, get_access_scope, get_access_scope_async
+from services.reference_data import get_branch
 from schemas.sales import (
     DailySalesCreate, DailySalesResponse, ReceiptExtractionResponse,
     TrackedItemCreate, TrackedItemResponse,
@@ -73,7 +78,7 @@ async def submit_daily_sales(
     db: Session = Depends(get_db)
 ):
     """Submit a daily sales report for a specific window"""
-    branch = db.query(Branch).filter(Branch.id == data.branch_id).first()
+    branch = get_branch(db, data.branch_id)
     if not branch:
         raise HTTPException(status_code=404, detail="Branch not found")
 
@@ -134,6 +139,8 @@ async def submit_daily_sales(
         _set(existing, 'cm_gross_sales', data.cm_gross_sales or 0)
         _set(existing, 'cm_net_sales', data.cm_net_sales or 0)
         _set(existing, 'cm_orders', data.cm_orders or 0)
+        sync_line_items(db, existing)
+        refresh_branch_day(db, existing.branch_id, existing.date)
         db.commit()
         db.refresh(existing)
 
@@ -174,24 +181,26 @@ async def submit_daily_sales(
     _set(sales_entry, 'cm_orders', data.cm_orders or 0)
 
     db.add(sales_entry)
+    db.flush()
+    sync_line_items(db, sales_entry)
+    refresh_branch_day(db, sales_entry.branch_id, sales_entry.date)
     db.commit()
     db.refresh(sales_entry)
 
-    # Send WhatsApp alert (non-blocking)
+    # Send WhatsApp alert (queued; delivered by the background WhatsApp workers)
     try:
         from models.whatsapp_config import WhatsAppConfig
         from services.whatsapp import send_sales_summary
-        import asyncio
         wa_config = db.query(WhatsAppConfig).filter(WhatsAppConfig.branch_id == data.branch_id).first()
         if wa_config and wa_config.phone_numbers and "sales" in (wa_config.alert_types or ""):
-            branch = db.query(Branch).filter(Branch.id == data.branch_id).first()
+            branch = get_branch(db, data.branch_id)
             branch_name = branch.name if branch else f"Branch {data.branch_id}"
             phones = [p.strip() for p in wa_config.phone_numbers.split(",") if p.strip()]
-            asyncio.create_task(send_sales_summary(
+            await send_sales_summary(
                 branch_name, data.sales_window,
                 {"total_sales": data.total_sales, "transaction_count": data.transaction_count, "atv": data.atv or 0},
                 phones
-            ))
+            )
     except Exception as wa_err:
         logger.warning(f"WhatsApp alert failed (non-critical): {wa_err}")
 
@@ -274,42 +283,10 @@ async def extract_receipt(
 
     allowed_types = ["image/jpeg", "image/png", "image/webp", "image/heic"]
 
+    timings = None
     try:
-        from PIL import Image
-        import io
-
-        def _resize_image(raw_bytes: bytes) -> bytes:
-            """Resize large images to reduce Gemini processing time."""
-            try:
-                img = Image.open(io.BytesIO(raw_bytes))
-                max_dim = 1600
-                if max(img.size) > max_dim:
-                    ratio = max_dim / max(img.size)
-                    new_size = (int(img.size[0] * ratio), int(img.size[1] * ratio))
-                    img = img.resize(new_size, Image.LANCZOS)
-                    buf = io.BytesIO()
-                    img.save(buf, format='JPEG', quality=85)
-                    logger.info(f"Resized image to {new_size}, {len(buf.getvalue())} bytes")
-                    return buf.getvalue()
-            except Exception as resize_err:
-                logger.warning(f"Image resize skipped: {resize_err}")
-            return raw_bytes
-
-        # Read and resize all images
-        image_bytes_list = []
-        for f in files:
-            raw = await f.read()
-            # Convert any format to JPEG (handles HEIC, HEIF, WebP, etc.)
-            try:
-                img = Image.open(io.BytesIO(raw))
-                if img.mode in ("RGBA", "P", "LA"):
-                    img = img.convert("RGB")
-                buf = io.BytesIO()
-                img.save(buf, format="JPEG", quality=90)
-                raw = buf.getvalue()
-            except Exception as conv_err:
-                logger.warning(f"Image conversion skipped ({f.content_type}): {conv_err}")
-            image_bytes_list.append(_resize_image(raw))
+        # Decode / resize / encode each upload once, in parallel, off the event loop
+        image_bytes_list, timings = await normalize_images([await f.read() for f in files])
 
         logger.info(f"Extraction request: type={receipt_type}, images={len(image_bytes_list)}")
 
@@ -332,6 +309,7 @@ async def extract_receipt(
             receipt_type=receipt_type,
             success=True,
             data=data,
+            timings=timings,
         )
     except ValueError as e:
         return ReceiptExtractionResponse(
@@ -339,6 +317,7 @@ async def extract_receipt(
             success=False,
             data={},
             error=str(e),
+            timings=timings,
         )
     except Exception as e:
         logger.error(f"Extraction failed for {receipt_type}: {e}")
@@ -347,9 +326,19 @@ async def extract_receipt(
             success=False,
             data={},
             error=f"Extraction failed: {str(e)}",
+            timings=timings,
         )
 
 
+
+@router.get("/extraction-cache/stats")
+async def get_extraction_cache_stats(
+    current_user: User = Depends(get_current_user),
+):
+    """Hit/miss counters for the receipt extraction cache (saved LLM calls and latency)."""
+    from services.extraction_cache import extraction_cache
+    return extraction_cache.stats()
+
 # ============== TRACKED PROMOTION ITEMS ==============
 
 @router.get("/tracked-items", response_model=List[TrackedItemResponse])
@@ -431,19 +420,7 @@ async def monthly_year_over_year(
     current_year = year or dt.utcnow().year
     previous_year = current_year - 1
 
-    # Determine accessible branch IDs
-    branch_query = db.query(Branch).filter(Branch.is_active == True)
-    if current_user.role == UserRole.SUPER_ADMIN:
-        branch_query = branch_query.filter(Branch.territory_id == current_user.territory_id)
-    elif current_user.role == UserRole.ADMIN:
-        branch_query = branch_query.filter(Branch.manager_id == current_user.id)
-    elif current_user.role == UserRole.STAFF:
-        if current_user.branch_id:
-            branch_query = branch_query.filter(Branch.id == current_user.branch_id)
-        else:
-            branch_query = branch_query.filter(Branch.id == -1)  # Empty result
-
-    accessible_ids = [b.id for b in branch_query.all()]
+    accessible_ids = _get_accessible_branch_ids(current_user, db)
 
     if branch_id is not None:
         if branch_id not in accessible_ids:
@@ -455,16 +432,18 @@ async def monthly_year_over_year(
 
     def _query_monthly(yr: int):
         """Return {month: total_gross_sales} for a given year."""
+        # One closing-equivalent row per branch-day, so windows aren't double counted
         rows = (
             db.query(
-                func.extract("month", DailySales.date).label("month"),
-                func.sum(DailySales.gross_sales).label("total"),
+                func.extract("month", BranchDaySales.date).label("month"),
+                func.sum(BranchDaySales.gross_sales).label("total"),
             )
             .filter(
-                DailySales.branch_id.in_(filter_ids),
-                func.extract("year", DailySales.date) == yr,
+                BranchDaySales.branch_id.in_(filter_ids),
+                BranchDaySales.date >= date(yr, 1, 1),
+                BranchDaySales.date <= date(yr, 12, 31),
             )
-            .group_by(func.extract("month", DailySales.date))
+            .group_by(func.extract("month", BranchDaySales.date))
             .all()
         )
         return {int(r.month): float(r.total or 0) for r in rows}
@@ -506,17 +485,12 @@ async def monthly_year_over_year(
 
 def _get_accessible_branch_ids(current_user: User, db: Session) -> List[int]:
     """Get branch IDs accessible to the current user."""
-    branch_query = db.query(Branch).filter(Branch.is_active == True)
-    if current_user.role == UserRole.SUPER_ADMIN:
-        branch_query = branch_query.filter(Branch.territory_id == current_user.territory_id)
-    elif current_user.role == UserRole.ADMIN:
-        branch_query = branch_query.filter(Branch.manager_id == current_user.id)
-    elif current_user.role == UserRole.STAFF:
-        if current_user.branch_id:
-            branch_query = branch_query.filter(Branch.id == current_user.branch_id)
-        else:
-            branch_query = branch_query.filter(Branch.id == -1)
-    return [b.id for b in branch_query.all()]
+    return get_access_scope(db, current_user, ADMIN_MANAGED).branch_ids
+
+
+async def _get_accessible_branch_ids_async(current_user: User, db: AsyncSession) -> List[int]:
+    """Async variant of _get_accessible_branch_ids for AsyncSession routes."""
+    return (await get_access_scope_async(db, current_user, ADMIN_MANAGED)).branch_ids
 
 
 @router.get("/promotion-roi")
@@ -548,54 +522,20 @@ async def get_promotion_roi(
         TrackedItem.is_active == True,
     ).all()
 
-    def _query_period(start: date, end: date):
-        """Query sales data for tracked items in a date range."""
-        sales_records = db.query(DailySales).filter(
-            DailySales.branch_id.in_(filter_ids),
-            DailySales.date >= start,
-            DailySales.date <= end,
-        ).all()
-
-        item_stats = {}
-        for tracked in tracked_items:
-            item_key = f"{tracked.id}"
-            item_stats[item_key] = {"qty": 0, "sales": 0.0}
-
-            for sales in sales_records:
-                if not sales.items_data:
-                    continue
-
-                try:
-                    items_list = json.loads(sales.items_data)
-                except:
-                    continue
-
-                for item in items_list:
-                    match = False
-                    if tracked.item_code.startswith("NAME:"):
-                        tracked_name = tracked.item_code[5:].lower()
-                        match = tracked_name in (item.get("name") or "").lower()
-                    elif tracked.item_code.startswith("CAT:"):
-                        tracked_cat = tracked.item_code[4:].lower()
-                        match = tracked_cat == (item.get("category") or "").lower()
-                    else:
-                        match = tracked.item_code == item.get("code")
-
-                    if match:
-                        item_stats[item_key]["qty"] += item.get("quantity", 0)
-                        item_stats[item_key]["sales"] += item.get("sales", 0.0)
-
-        return item_stats
-
-    period_data = _query_period(date_from, date_to)
-    baseline_data = _query_period(baseline_from, baseline_to)
+    # One aggregate over the normalized line items covers both periods
+    totals = tracked_item_totals(
+        db, [t.id for t in tracked_items], filter_ids,
+        {"period": (date_from, date_to), "baseline": (baseline_from, baseline_to)},
+    )
+    branch_names = dict(db.query(Branch.id, Branch.name).filter(
+        Branch.id.in_({t.branch_id for t in tracked_items})
+    ).all()) if tracked_items else {}
 
     # Build response
     result_items = []
     for tracked in tracked_items:
-        item_key = f"{tracked.id}"
-        period = period_data.get(item_key, {"qty": 0, "sales": 0.0})
-        baseline = baseline_data.get(item_key, {"qty": 0, "sales": 0.0})
+        period = totals.get((tracked.id, "period"), {"qty": 0, "sales": 0.0})
+        baseline = totals.get((tracked.id, "baseline"), {"qty": 0, "sales": 0.0})
 
         qty_change_pct = 0.0
         if baseline["qty"] > 0:
@@ -605,7 +545,6 @@ async def get_promotion_roi(
         if baseline["sales"] > 0:
             sales_change_pct = round((period["sales"] - baseline["sales"]) / baseline["sales"] * 100, 1)
 
-        branch = db.query(Branch).filter(Branch.id == tracked.branch_id).first()
         item_type = "name" if tracked.item_code.startswith("NAME:") else \
                     "category" if tracked.item_code.startswith("CAT:") else "code"
 
@@ -614,7 +553,7 @@ async def get_promotion_roi(
             "name": tracked.item_name,
             "type": item_type,
             "branch_id": tracked.branch_id,
-            "branch_name": branch.name if branch else "Unknown",
+            "branch_name": branch_names.get(tracked.branch_id, "Unknown"),
             "qty": period["qty"],
             "sales": round(period["sales"], 2),
             "baseline_qty": baseline["qty"],
@@ -638,38 +577,49 @@ async def get_branch_ranking(
     date_to: date = Query(...),
     metric: str = Query("sales", regex="^(sales|gc|atv|budget_ach)$"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    """Get branch ranking leaderboard."""
-    accessible_branch_ids = _get_accessible_branch_ids(current_user, db)
-
-    # Get sales data grouped by branch
-    sales_by_branch = {}
-    for branch_id in accessible_branch_ids:
-        sales_rows = db.query(DailySales).filter(
-            DailySales.branch_id == branch_id,
-            DailySales.date >= date_from,
-            DailySales.date <= date_to,
-        ).all()
+    """Get branch ranking leaderboard (async session — runs at closing time alongside submissions)."""
+    accessible_branch_ids = await _get_accessible_branch_ids_async(current_user, db)
 
-        total_sales = sum(s.total_sales or 0 for s in sales_rows)
-        total_gc = sum(s.transaction_count or 0 for s in sales_rows)
-        total_atv_sum = sum((s.atv or 0) * (s.transaction_count or 1) for s in sales_rows)
-        avg_atv = total_atv_sum / total_gc if total_gc > 0 else 0
-
-        budget_rows = db.query(func.sum(func.coalesce(DailySales.total_sales, 0)).label("total")).filter(
-            DailySales.branch_id == branch_id,
-            DailySales.date >= date_from,
-            DailySales.date <= date_to,
-        ).first()
+    # Prior period of the same length, for change_vs_prev
+    period_length = (date_to - date_from).days
+    prev_date_to = date_from - timedelta(days=1)
+    prev_date_from = prev_date_to - timedelta(days=period_length)
 
-        from models.sales import DailyBudget
-        budget_total = db.query(func.sum(DailyBudget.budget_amount)).filter(
-            DailyBudget.branch_id == branch_id,
+    # One grouped pass over both periods: current totals plus the prior-period sum
+    in_current = DailySales.date >= date_from
+    sales_stmt = select(
+        DailySales.branch_id,
+        func.sum(case((in_current, func.coalesce(DailySales.total_sales, 0)), else_=0)),
+        func.sum(case((in_current, func.coalesce(DailySales.transaction_count, 0)), else_=0)),
+        # ATV weighted by GC; a missing/zero GC counts as 1 like a single ticket
+        func.sum(case((in_current, func.coalesce(DailySales.atv, 0)
+                       * func.coalesce(func.nullif(DailySales.transaction_count, 0), 1)), else_=0)),
+        func.sum(case((in_current, 0), else_=func.coalesce(DailySales.total_sales, 0))),
+    ).where(
+        DailySales.branch_id.in_(accessible_branch_ids),
+        DailySales.date >= prev_date_from,
+        DailySales.date <= date_to,
+    ).group_by(DailySales.branch_id)
+    sales_totals = {row[0]: row[1:] for row in (await db.execute(sales_stmt)).all()}
+
+    budget_totals = dict((await db.execute(
+        select(DailyBudget.branch_id, func.sum(DailyBudget.budget_amount)).where(
+            DailyBudget.branch_id.in_(accessible_branch_ids),
             DailyBudget.budget_date >= date_from,
             DailyBudget.budget_date <= date_to,
-        ).scalar() or 0
+        ).group_by(DailyBudget.branch_id)
+    )).all())
 
+    sales_by_branch = {}
+    prev_sales_by_branch = {}
+    for branch_id in accessible_branch_ids:
+        total_sales, total_gc, total_atv_sum, prev_sales = sales_totals.get(branch_id, (0, 0, 0, 0))
+        total_sales = total_sales or 0
+        total_gc = total_gc or 0
+        avg_atv = (total_atv_sum or 0) / total_gc if total_gc > 0 else 0
+        budget_total = budget_totals.get(branch_id) or 0
         budget_ach_pct = round((total_sales / budget_total * 100), 1) if budget_total > 0 else 0
 
         sales_by_branch[branch_id] = {
@@ -679,29 +629,19 @@ async def get_branch_ranking(
             "budget_total": budget_total,
             "budget_ach_pct": budget_ach_pct,
         }
-
-    # Calculate prior period for change_vs_prev
-    period_length = (date_to - date_from).days
-    prev_date_to = date_from - timedelta(days=1)
-    prev_date_from = prev_date_to - timedelta(days=period_length)
-
-    prev_sales_by_branch = {}
-    for branch_id in accessible_branch_ids:
-        prev_sales = db.query(func.sum(func.coalesce(DailySales.total_sales, 0))).filter(
-            DailySales.branch_id == branch_id,
-            DailySales.date >= prev_date_from,
-            DailySales.date <= prev_date_to,
-        ).scalar() or 0
-        prev_sales_by_branch[branch_id] = prev_sales
+        prev_sales_by_branch[branch_id] = prev_sales or 0
 
     # Determine sort key based on metric
     metric_key = {"sales": "total_sales", "gc": "total_gc", "atv": "avg_atv", "budget_ach": "budget_ach_pct"}[metric]
 
+    branch_names = dict((await db.execute(
+        select(Branch.id, Branch.name).where(Branch.id.in_(accessible_branch_ids))
+    )).all())
+
     # Build ranking
     ranking_list = []
     for branch_id in accessible_branch_ids:
-        branch = db.query(Branch).filter(Branch.id == branch_id).first()
-        if not branch:
+        if branch_id not in branch_names:
             continue
 
         stats = sales_by_branch[branch_id]
@@ -713,7 +653,7 @@ async def get_branch_ranking(
 
         ranking_list.append({
             "branch_id": branch_id,
-            "branch_name": branch.name,
+            "branch_name": branch_names[branch_id],
             "total_sales": stats["total_sales"],
             "total_gc": stats["total_gc"],
             "avg_atv": stats["avg_atv"],
@@ -748,7 +688,7 @@ async def get_available_windows(
     from models.sales import CustomSalesWindow
 
     # Check user has access to this branch
-    branch = db.query(Branch).filter(Branch.id == branch_id).first()
+    branch = get_branch(db, branch_id)
     if not branch:
         raise HTTPException(status_code=404, detail="Branch not found")
 
@@ -794,7 +734,7 @@ async def create_custom_window(
         raise HTTPException(status_code=400, detail="branch_id and window_name are required")
 
     # Check user has access to this branch
-    branch = db.query(Branch).filter(Branch.id == branch_id).first()
+    branch = get_branch(db, branch_id)
     if not branch:
         raise HTTPException(status_code=404, detail="Branch not found")
 
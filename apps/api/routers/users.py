@@ -4,6 +4,7 @@ Handles user management (CRUD operations)
 """
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from pydantic import BaseModel
@@ -11,7 +12,8 @@ from pydantic import BaseModel
 from utils.database import get_db
 from utils.security import get_current_user, require_role, get_password_hash
 from models.user import User, UserRole
-from models.location import Territory, Area, Branch
+from models.location import Branch
+from services.reference_data import get_area, get_branch, get_territory, location_names
 from schemas.user import UserCreate, UserUpdate, UserResponse, ApprovalAction
 
 router = APIRouter()
@@ -20,15 +22,9 @@ router = APIRouter()
 def enrich_user_response(user: User, db: Session) -> UserResponse:
     """Add territory_name, area_name, branch_name to user response"""
     resp = UserResponse.model_validate(user)
-    if user.territory_id:
-        territory = db.query(Territory).filter(Territory.id == user.territory_id).first()
-        resp.territory_name = territory.name if territory else None
-    if user.area_id:
-        area = db.query(Area).filter(Area.id == user.area_id).first()
-        resp.area_name = area.name if area else None
-    if user.branch_id:
-        branch = db.query(Branch).filter(Branch.id == user.branch_id).first()
-        resp.branch_name = branch.name if branch else None
+    resp.territory_name, resp.area_name, resp.branch_name = location_names(
+        db, user.territory_id, user.area_id, user.branch_id
+    )
     return resp
 
 
@@ -36,14 +32,14 @@ def cascade_location_ids(db: Session, branch_id=None, area_id=None, territory_id
     """Auto-fill parent location IDs from child.
     branch -> area -> territory"""
     if branch_id:
-        branch = db.query(Branch).filter(Branch.id == branch_id).first()
+        branch = get_branch(db, branch_id)
         if branch:
             area_id = branch.area_id
-            area = db.query(Area).filter(Area.id == area_id).first()
+            area = get_area(db, area_id) if area_id else None
             if area:
                 territory_id = area.territory_id
     elif area_id:
-        area = db.query(Area).filter(Area.id == area_id).first()
+        area = get_area(db, area_id)
         if area:
             territory_id = area.territory_id
     return branch_id, area_id, territory_id
@@ -76,6 +72,7 @@ async def list_users(
     is_approved: Optional[bool] = None,
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
+    after_id: Optional[int] = Query(None, ge=0, description="Keyset pagination: return users with id > after_id (skip is ignored)"),
     current_user: User = Depends(require_role([
         UserRole.SUPREME_ADMIN,
         UserRole.SUPER_ADMIN,
@@ -85,6 +82,8 @@ async def list_users(
 ):
     """
     List users based on current user's role and permissions
+    Ordered by id; pass the last id seen as after_id to page through large lists.
+    Location names come from the reference data cache, so the page costs one query.
     """
     query = db.query(User)
 
@@ -94,8 +93,8 @@ async def list_users(
     # Filter based on current user's role
     if current_user.role == UserRole.ADMIN:
         # AM sees only FE users assigned to branches they manage
-        managed_branch_ids = [b.id for b in db.query(Branch).filter(Branch.manager_id == current_user.id).all()]
-        query = query.filter(User.branch_id.in_(managed_branch_ids) if managed_branch_ids else User.id == -1)
+        managed_branch_ids = select(Branch.id).where(Branch.manager_id == current_user.id)
+        query = query.filter(User.branch_id.in_(managed_branch_ids))
     elif current_user.role == UserRole.SUPER_ADMIN:
         query = query.filter(User.territory_id == current_user.territory_id)
 
@@ -113,8 +112,12 @@ async def list_users(
     if is_approved is not None:
         query = query.filter(User.is_approved == is_approved)
 
-    users = query.offset(skip).limit(limit).all()
-    return [enrich_user_response(u, db) for u in users]
+    query = query.order_by(User.id)
+    if after_id is not None:
+        query = query.filter(User.id > after_id)
+    else:
+        query = query.offset(skip)
+    return [enrich_user_response(u, db) for u in query.limit(limit).all()]
 
 
 @router.get("/{user_id}", response_model=UserResponse)
@@ -178,13 +181,13 @@ async def create_user(
 
     # Validate territory exists
     if user_data.territory_id:
-        territory = db.query(Territory).filter(Territory.id == user_data.territory_id).first()
+        territory = get_territory(db, user_data.territory_id)
         if not territory:
             raise HTTPException(status_code=400, detail="Territory not found")
 
     # Validate branch if provided
     if user_data.branch_id:
-        branch = db.query(Branch).filter(Branch.id == user_data.branch_id).first()
+        branch = get_branch(db, user_data.branch_id)
         if not branch:
             raise HTTPException(status_code=400, detail="Branch not found")
 
@@ -280,7 +283,7 @@ async def assign_user(
 
     # Validate branch if provided
     if data.branch_id:
-        branch = db.query(Branch).filter(Branch.id == data.branch_id).first()
+        branch = get_branch(db, data.branch_id)
         if not branch:
             raise HTTPException(status_code=400, detail="Branch not found")
 
@@ -290,7 +293,7 @@ async def assign_user(
         if user.territory_id != current_user.territory_id:
             raise HTTPException(status_code=403, detail="Cannot assign users outside your territory")
         if data.branch_id:
-            branch = db.query(Branch).filter(Branch.id == data.branch_id).first()
+            branch = get_branch(db, data.branch_id)
             if branch and branch.territory_id != current_user.territory_id:
                 raise HTTPException(status_code=403, detail="Cannot assign to branch outside your territory")
     elif current_user.role == UserRole.ADMIN:
@@ -298,7 +301,7 @@ async def assign_user(
         if user.role != UserRole.STAFF:
             raise HTTPException(status_code=403, detail="Can only assign Flavor Expert users")
         if data.branch_id:
-            branch = db.query(Branch).filter(Branch.id == data.branch_id).first()
+            branch = get_branch(db, data.branch_id)
             if branch and branch.manager_id != current_user.id:
                 raise HTTPException(status_code=403, detail="Cannot assign to a branch you don't manage")
 
@@ -13,8 +13,8 @@ import base64
 from utils.database import get_db
 from utils.security import get_current_user, require_role
 from models.user import User, UserRole
-from models.location import Branch
 from models.branch_visit import BranchVisit
+from services.reference_data import get_branch
 from schemas.branch_visit import BranchVisitCreate, BranchVisitUpdate
 
 router = APIRouter()
@@ -30,7 +30,7 @@ async def create_visit(
 ):
     """Create a new branch visit (swipe in)"""
     # Verify branch exists
-    branch = db.query(Branch).filter(Branch.id == data.branch_id).first()
+    branch = get_branch(db, data.branch_id)
     if not branch:
         raise HTTPException(status_code=404, detail="Branch not found")
 
@@ -227,22 +227,11 @@ async def extract_visit_times_from_photo(
     """Extract swipe in/out times from a POS photo using Claude Vision"""
     try:
         from services.claude_vision import extract_visit_times
-        import io
-        from PIL import Image
-
-        image_bytes = await file.read()
-
-        # Convert any format (HEIC, WebP, etc.) to JPEG so Gemini can read it
-        try:
-            img = Image.open(io.BytesIO(image_bytes))
-            if img.mode in ("RGBA", "P"):
-                img = img.convert("RGB")
-            buf = io.BytesIO()
-            img.save(buf, format="JPEG", quality=90)
-            image_bytes = buf.getvalue()
-        except Exception as conv_err:
-            # If PIL can't open it, pass raw bytes and let Gemini try
-            pass
+        from services.image_pipeline import normalize_images
+
+        # Convert any format (HEIC, WebP, etc.) to a bounded JPEG off the event loop
+        images, _ = await normalize_images([await file.read()])
+        image_bytes = images[0]
 
         result = await extract_visit_times(image_bytes)
         return result
@@ -7,16 +7,14 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import Optional
-import httpx
 
 from utils.database import get_db
 from utils.security import get_current_user, require_role
 from models.user import User, UserRole
+from services.whatsapp import whatsapp_client
 
 router = APIRouter()
 
-WA_SERVICE_URL = "http://br-whatsapp:3005"
-
 
 class RecipientConfig(BaseModel):
     branch_id: int
@@ -37,8 +35,8 @@ async def get_whatsapp_status(
 ):
     """Get WhatsApp connection status and QR code."""
     try:
-        async with httpx.AsyncClient(timeout=5) as client:
-            resp = await client.get(f"{WA_SERVICE_URL}/status")
+        async with whatsapp_client.http() as client:
+            resp = await client.get("/status", timeout=5)
             return resp.json()
     except Exception:
         return {"status": "service_unavailable", "connected": False, "qr": None}
@@ -50,8 +48,8 @@ async def logout_whatsapp(
 ):
     """Disconnect WhatsApp session."""
     try:
-        async with httpx.AsyncClient(timeout=5) as client:
-            resp = await client.post(f"{WA_SERVICE_URL}/logout")
+        async with whatsapp_client.http() as client:
+            resp = await client.post("/logout", timeout=5)
             return resp.json()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -66,9 +64,9 @@ async def send_test_message(
 ):
     """Send a test WhatsApp message to verify connection."""
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
+        async with whatsapp_client.http() as client:
             resp = await client.post(
-                f"{WA_SERVICE_URL}/send",
+                "/send",
                 json={"to": data.phone, "message": data.message}
             )
             if resp.status_code == 200:
@@ -81,6 +79,25 @@ async def send_test_message(
         raise HTTPException(status_code=503, detail=f"WhatsApp service unavailable: {e}")
 
 
+@router.get("/queue/stats")
+async def get_queue_stats(
+    current_user: User = Depends(require_role([UserRole.SUPREME_ADMIN, UserRole.SUPER_ADMIN])),
+    db: Session = Depends(get_db)
+):
+    """Delivery queue counters and outbox backlog."""
+    from models.whatsapp_config import WhatsAppOutboxMessage, WhatsAppOutboxStatus
+    from sqlalchemy import func
+    outbox = dict(
+        db.query(WhatsAppOutboxMessage.status, func.count(WhatsAppOutboxMessage.id))
+        .group_by(WhatsAppOutboxMessage.status)
+        .all()
+    )
+    return {
+        **whatsapp_client.stats(),
+        "outbox": {status.value: outbox.get(status, 0) for status in WhatsAppOutboxStatus},
+    }
+
+
 # ============ RECIPIENT SETTINGS ============
 
 @router.get("/recipients")
@@ -3,7 +3,7 @@ Sales schemas for request/response validation
 """
 
 from pydantic import BaseModel, Field
-from typing import Optional, Any
+from typing import Optional, Any, List
 from datetime import datetime, date
 
 
@@ -89,6 +89,7 @@ class ReceiptExtractionResponse(BaseModel):
     success: bool
     data: dict = {}
     error: Optional[str] = None
+    timings: Optional[List[dict]] = None  # per-image preprocessing stages (ms)
 
 
 class TrackedItemCreate(BaseModel):
@@ -0,0 +1,37 @@
+"""
+Sales line item backfill
+Populates sales_line_items for DailySales rows submitted before the table existed.
+Safe to re-run: rows that already have line items are skipped.
+
+Usage: python scripts/backfill_sales_items.py [batch_size]
+"""
+
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.database import SessionLocal, engine, Base
+import models  # noqa: F401 — registers tables for create_all
+from services.sales_items import backfill_line_items
+
+
+def backfill(batch_size=500):
+    """Backfill line items in batches of batch_size DailySales rows"""
+    Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    try:
+        count = backfill_line_items(db, batch_size=batch_size)
+        print(f"Backfilled {count} sales line items")
+    except Exception as e:
+        print(f"Error backfilling sales line items: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    backfill(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
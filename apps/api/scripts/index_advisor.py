@@ -0,0 +1,140 @@
+"""
+Index advisor
+Runs EXPLAIN on the known hot queries and reports any that fall back to a
+sequential scan. Exits non-zero when a scan is found so it can gate CI.
+
+Usage: python scripts/index_advisor.py
+"""
+
+import sys
+import os
+import json
+from datetime import date, timedelta
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, func, text
+
+from utils.database import engine, Base
+from models.sales import DailySales, DailyBudget, SalesWindowType
+from models.inventory import DailyInventory, TubReceipt
+from models.cake import CakeStock, CakeAlertConfig, CakeStockLog
+from models.expiry import ExpiryResponse
+from models.branch_visit import BranchVisit
+from models.feedback import CustomerFeedback
+
+
+def hot_queries():
+    """The access patterns the routers hit on every dashboard load, with sample params."""
+    today = date.today()
+    month_start = today.replace(day=1)
+    week_ago = today - timedelta(days=7)
+    branch_ids = [1, 2, 3]
+
+    return {
+        "daily_sales by branch + date range": select(DailySales).where(
+            DailySales.branch_id.in_(branch_ids), DailySales.date >= month_start, DailySales.date <= today
+        ),
+        "daily_sales submit lookup": select(DailySales).where(
+            DailySales.branch_id == 1, DailySales.date == today, DailySales.sales_window == SalesWindowType.CLOSING
+        ),
+        "daily_budgets by branch + date range": select(func.sum(DailyBudget.budget_amount)).where(
+            DailyBudget.branch_id.in_(branch_ids), DailyBudget.budget_date >= month_start, DailyBudget.budget_date <= today
+        ),
+        "daily_inventory by branch + date": select(DailyInventory).where(
+            DailyInventory.branch_id == 1, DailyInventory.date == today
+        ),
+        "tub_receipts by branch + date range": select(TubReceipt).where(
+            TubReceipt.branch_id == 1, TubReceipt.date >= week_ago, TubReceipt.date <= today
+        ),
+        "cake_stock by branch": select(CakeStock).where(CakeStock.branch_id == 1),
+        "cake_alert_configs by branch + product": select(CakeAlertConfig).where(
+            CakeAlertConfig.branch_id == 1, CakeAlertConfig.cake_product_id == 1
+        ),
+        "cake_stock_logs by branch, newest first": select(CakeStockLog).where(
+            CakeStockLog.branch_id == 1
+        ).order_by(CakeStockLog.created_at.desc()).limit(50),
+        "expiry_responses by request + branch": select(ExpiryResponse).where(
+            ExpiryResponse.expiry_request_id == 1, ExpiryResponse.branch_id == 1
+        ),
+        "branch_visits by user + date range": select(BranchVisit).where(
+            BranchVisit.user_id == 1, BranchVisit.visit_date >= week_ago
+        ),
+        "branch_visits by branch + date range": select(BranchVisit).where(
+            BranchVisit.branch_id == 1, BranchVisit.visit_date >= week_ago
+        ),
+        "customer_feedback newest first": select(CustomerFeedback).order_by(
+            CustomerFeedback.created_at.desc()
+        ).limit(50),
+    }
+
+
+def _postgres_seq_scans(plan_node, found):
+    """Walk a Postgres JSON plan collecting relations read with a Seq Scan."""
+    if plan_node.get("Node Type") == "Seq Scan":
+        found.append(plan_node.get("Relation Name", "?"))
+    for child in plan_node.get("Plans", []):
+        _postgres_seq_scans(child, found)
+    return found
+
+
+def explain(conn, stmt):
+    """Return (plan_text, scanned_tables) for a statement on the current dialect."""
+    sql = str(stmt.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+
+    if engine.dialect.name == "postgresql":
+        # Small dev tables make the planner prefer seq scans regardless of indexes;
+        # disabling them shows whether a usable index exists at all.
+        conn.execute(text("SET LOCAL enable_seqscan = off"))
+        raw = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+        plan = raw if isinstance(raw, list) else json.loads(raw)
+        return json.dumps(plan, indent=2), _postgres_seq_scans(plan[0]["Plan"], [])
+
+    if engine.dialect.name == "sqlite":
+        rows = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")).fetchall()
+        details = [row[-1] for row in rows]
+        scanned = [
+            d.split()[1] for d in details
+            if d.startswith("SCAN") and "USING" not in d and "INDEX" not in d
+        ]
+        return "\n".join(details), scanned
+
+    raise RuntimeError(f"EXPLAIN not supported for dialect {engine.dialect.name}")
+
+
+def run_advisor(verbose=False):
+    """Explain every hot query; return {query_name: [tables scanned sequentially]}."""
+    Base.metadata.create_all(bind=engine)
+    problems = {}
+
+    with engine.connect() as conn:
+        for name, stmt in hot_queries().items():
+            trans = conn.begin()
+            try:
+                plan_text, scanned = explain(conn, stmt)
+            finally:
+                trans.rollback()
+
+            status = "SEQ SCAN" if scanned else "ok"
+            print(f"[{status:>8}] {name}")
+            if verbose or scanned:
+                for line in plan_text.splitlines():
+                    print(f"           {line}")
+            if scanned:
+                problems[name] = scanned
+
+    return problems
+
+
+if __name__ == "__main__":
+    verbose = "-v" in sys.argv or "--verbose" in sys.argv
+    problems = run_advisor(verbose=verbose)
+
+    print("-" * 50)
+    if problems:
+        print(f"{len(problems)} hot queries use sequential scans:")
+        for name, tables in problems.items():
+            print(f"  - {name}: {', '.join(tables)}")
+        sys.exit(1)
+    print("All hot queries use an index.")
@@ -0,0 +1,69 @@
+"""
+Push dispatcher load test
+Sends N encrypted pushes through the dispatch queue to the stub push endpoint
+and reports throughput. Start the API with PUSH_STUB_ENABLED=true first.
+
+Usage: python scripts/push_load_test.py [count] [stub_url]
+  e.g. python scripts/push_load_test.py 500 "http://localhost:8000/api/v1/notifications/push-stub?delay_ms=200"
+"""
+
+import sys
+import os
+import asyncio
+import base64
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+from utils.config import settings
+from services.push_dispatch import PushDispatcher, PushMessage
+
+DEFAULT_STUB_URL = "http://localhost:8000/api/v1/notifications/push-stub?delay_ms=200"
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def _fake_subscription_keys():
+    """A browser-like receiver key pair so pywebpush can encrypt the payload"""
+    receiver = ec.generate_private_key(ec.SECP256R1())
+    p256dh = receiver.public_key().public_bytes(
+        serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint
+    )
+    return _b64(p256dh), _b64(os.urandom(16))
+
+
+async def run(count: int, stub_url: str):
+    if not settings.VAPID_PRIVATE_KEY:
+        vapid_key = ec.generate_private_key(ec.SECP256R1())
+        settings.VAPID_PRIVATE_KEY = _b64(vapid_key.private_bytes(
+            serialization.Encoding.DER, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        ))
+
+    p256dh, auth = _fake_subscription_keys()
+    dispatcher = PushDispatcher()
+    await dispatcher.start()
+
+    started = time.perf_counter()
+    dispatcher.enqueue(
+        PushMessage(subscription_id=i, endpoint=stub_url, p256dh_key=p256dh, auth_key=auth,
+                    payload='{"title": "Load test"}')
+        for i in range(count)
+    )
+    await dispatcher.stop(timeout=600)
+    elapsed = time.perf_counter() - started
+
+    print(f"Delivered {count} pushes in {elapsed:.2f}s ({count / elapsed:.1f}/s) "
+          f"with {dispatcher.workers} workers")
+    print(dispatcher.stats())
+
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    url = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_STUB_URL
+    asyncio.run(run(total, url))
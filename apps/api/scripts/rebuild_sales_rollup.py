@@ -0,0 +1,39 @@
+"""
+Sales rollup rebuild
+Recomputes branch_day_sales (latest window per branch per day) from daily_sales.
+
+Usage: python scripts/rebuild_sales_rollup.py [YYYY-MM-DD [YYYY-MM-DD]]
+With no dates the whole history is rebuilt; with one date, from that date onwards.
+"""
+
+import sys
+import os
+from datetime import date
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.database import SessionLocal, engine, Base
+import models  # noqa: F401 — registers tables for create_all
+from services.sales_rollup import rebuild_rollup
+
+
+def rebuild(date_from=None, date_to=None):
+    """Rebuild the rollup for the given date range (inclusive)"""
+    Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    try:
+        count = rebuild_rollup(db, date_from=date_from, date_to=date_to)
+        print(f"Rebuilt {count} branch_day_sales rows")
+    except Exception as e:
+        print(f"Error rebuilding sales rollup: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    args = [date.fromisoformat(a) for a in sys.argv[1:3]]
+    rebuild(*args)
@@ -0,0 +1,230 @@
+"""
+Authorization scope service
+Resolves the current user (principal) and the branch ids their role can see,
+memoized in a short-TTL in-process cache so each request costs no extra queries
+once warm. Entries are dropped when users or branches change in this process;
+the TTL bounds staleness across workers.
+
+Role scoping:
+- SUPREME_ADMIN: every branch
+- SUPER_ADMIN:   branches in their territory
+- ADMIN:         depends on the caller's admin_scope
+                 ADMIN_MANAGED          branches they manage (manager_id) - sales, KPI, brief, expiry
+                 ADMIN_AREA             branches in their area - consumption analytics
+                 ADMIN_MANAGED_OR_AREA  either of the above - feedback, cake alerts (default)
+- STAFF:         their own branch
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import FrozenSet, List, Optional, Tuple
+
+from sqlalchemy import false, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from models.location import Branch
+from models.user import User, UserRole
+from utils.config import settings
+from utils.database import register_invalidation
+
+
+ADMIN_MANAGED = "managed"
+ADMIN_AREA = "area"
+ADMIN_MANAGED_OR_AREA = "managed_or_area"
+
+
+@dataclass(frozen=True)
+class AccessScope:
+    """Branches visible to one user."""
+    user_id: int
+    role: UserRole
+    active_ids: Tuple[int, ...]
+    inactive_ids: Tuple[int, ...]
+
+    @property
+    def branch_ids(self) -> List[int]:
+        """Active branches in scope (what most listings show)."""
+        return list(self.active_ids)
+
+    @property
+    def all_branch_ids(self) -> List[int]:
+        """Active and inactive branches in scope (for historical reports)."""
+        return list(self.active_ids) + list(self.inactive_ids)
+
+    @property
+    def branch_id_set(self) -> FrozenSet[int]:
+        return frozenset(self.active_ids)
+
+    def can_access(self, branch_id: int) -> bool:
+        return branch_id in self.active_ids or branch_id in self.inactive_ids
+
+
+class _TTLCache:
+    """Tiny thread-safe TTL map."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._data[key]
+                return None
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + settings.AUTH_SCOPE_CACHE_TTL_SECONDS, value)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_principals = _TTLCache()  # user_id -> column snapshot
+_scopes = _TTLCache()      # (user_id, role, territory_id, area_id, branch_id, admin_scope) -> AccessScope
+
+
+def invalidate_user(user_id: int):
+    """Forget a user's cached principal and scope."""
+    _principals.pop(str(user_id))
+    # Scope keys embed the user's role/territory/area/branch, so clear them all
+    _scopes.clear()
+
+
+def invalidate_all():
+    """Forget every cached principal and scope."""
+    _principals.clear()
+    _scopes.clear()
+
+
+# ============== PRINCIPAL ==============
+
+def _snapshot(user: User) -> dict:
+    return {attr.key: getattr(user, attr.key) for attr in User.__mapper__.column_attrs}
+
+
+def load_principal(db: Session, user_id) -> Optional[User]:
+    """
+    Return the User for a token subject, attached to this request's session.
+    A cache hit rebuilds the instance from its snapshot and merges it without a SELECT,
+    so routers still get a normal persistent User they can read, update or lazy-load from.
+    """
+    key = str(user_id)
+    if settings.AUTH_SCOPE_CACHE_TTL_SECONDS > 0:
+        values = _principals.get(key)
+        if values is not None:
+            user = User(**values)
+            make_transient_to_detached(user)
+            return db.merge(user, load=False)
+
+    user = db.query(User).filter(User.id == user_id).first()
+    if user is not None and settings.AUTH_SCOPE_CACHE_TTL_SECONDS > 0:
+        _principals.set(key, _snapshot(user))
+    return user
+
+
+# ============== BRANCH SCOPE ==============
+
+def _scope_key(user: User, admin_scope: str) -> tuple:
+    return (user.id, user.role, user.territory_id, user.area_id, user.branch_id, admin_scope)
+
+
+def _admin_filter(user: User, admin_scope: str):
+    managed = Branch.manager_id == user.id
+    in_area = Branch.area_id == user.area_id if user.area_id else false()
+    if admin_scope == ADMIN_MANAGED:
+        return managed
+    if admin_scope == ADMIN_AREA:
+        return in_area
+    return or_(managed, in_area)
+
+
+def _scope_statement(user: User, admin_scope: str):
+    stmt = select(Branch.id, Branch.is_active).order_by(Branch.id)
+    if user.role == UserRole.SUPER_ADMIN:
+        stmt = stmt.where(Branch.territory_id == user.territory_id)
+    elif user.role == UserRole.ADMIN:
+        stmt = stmt.where(_admin_filter(user, admin_scope))
+    elif user.role == UserRole.STAFF:
+        stmt = stmt.where(Branch.id == user.branch_id if user.branch_id else false())
+    return stmt
+
+
+def _build_scope(user: User, rows) -> AccessScope:
+    rows = list(rows)
+    return AccessScope(
+        user_id=user.id,
+        role=user.role,
+        active_ids=tuple(branch_id for branch_id, is_active in rows if is_active),
+        inactive_ids=tuple(branch_id for branch_id, is_active in rows if not is_active),
+    )
+
+
+def get_access_scope(db: Session, user: User, admin_scope: str = ADMIN_MANAGED_OR_AREA) -> AccessScope:
+    """Branch scope for a user (cached). admin_scope picks which branches an ADMIN sees."""
+    key = _scope_key(user, admin_scope)
+    scope = _scopes.get(key)
+    if scope is None:
+        scope = _build_scope(user, db.execute(_scope_statement(user, admin_scope)).all())
+        if settings.AUTH_SCOPE_CACHE_TTL_SECONDS > 0:
+            _scopes.set(key, scope)
+    return scope
+
+
+async def get_access_scope_async(
+    db: AsyncSession, user: User, admin_scope: str = ADMIN_MANAGED_OR_AREA,
+) -> AccessScope:
+    """AsyncSession variant of get_access_scope sharing the same cache."""
+    key = _scope_key(user, admin_scope)
+    scope = _scopes.get(key)
+    if scope is None:
+        scope = _build_scope(user, (await db.execute(_scope_statement(user, admin_scope))).all())
+        if settings.AUTH_SCOPE_CACHE_TTL_SECONDS > 0:
+            _scopes.set(key, scope)
+    return scope
+
+
+# ============== INVALIDATION ==============
+
+_PENDING_KEY = "access_scope_invalidate"
+
+
+def _changed_users(session):
+    """Note user/branch writes; dropped now and again once committed (a concurrent
+    reader may re-cache the old rows between flush and commit)."""
+    pending = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Branch):
+            pending.add("*")
+        elif isinstance(obj, User) and obj.id is not None:
+            pending.add(obj.id)
+    return pending
+
+
+def _apply(pending):
+    if "*" in pending:
+        invalidate_all()
+        return
+    for user_id in pending:
+        invalidate_user(user_id)
+
+
+register_invalidation(
+    (User, Branch),
+    _apply,
+    _PENDING_KEY,
+    collect=_changed_users,
+    bulk_keys=lambda model: {"*"},
+    on_write=lambda session, pending: _apply(pending),
+)
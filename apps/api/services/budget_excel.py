@@ -2,11 +2,15 @@
 Budget Excel Parser — Smart Header Detection
 Reads DAILY SALES TRACKER .xlsx files of ANY column order/format.
 Scans all header rows and matches columns by their actual label text.
+
+Workbooks are opened read-only (streamed) and each sheet's values are read once
+into a SheetGrid; all detection then works on that in-memory array.
 """
 
 import io
 import logging
 from datetime import datetime
+from typing import List, Optional
 
 import openpyxl
 
@@ -55,6 +59,30 @@ def _normalize(text: str) -> str:
     return str(text).upper().replace(" ", "").replace(".", "").replace("-", "").replace("_", "").replace("/", "")
 
 
+# ── Sheet values ───────────────────────────────────────────────────────────────
+
+class SheetGrid:
+    """A worksheet's cell values, read once. cell() is 1-based like openpyxl."""
+
+    def __init__(self, rows):
+        self.rows = [tuple(r) for r in rows]
+        # Streamed sheets can report trailing formatted-but-empty rows — drop them
+        while self.rows and all(v is None for v in self.rows[-1]):
+            self.rows.pop()
+        self.max_row = len(self.rows)
+        self.max_column = max((len(r) for r in self.rows), default=0)
+
+    @classmethod
+    def from_worksheet(cls, ws) -> "SheetGrid":
+        return cls(ws.iter_rows(values_only=True))
+
+    def cell(self, row: int, column: int):
+        if row < 1 or column < 1 or row > self.max_row:
+            return None
+        values = self.rows[row - 1]
+        return values[column - 1] if column <= len(values) else None
+
+
 # ── Column matcher rules ────────────────────────────────────────────────────────
 # Each rule: (field_name, list_of_keywords_that_must_ALL_be_in_normalized_label)
 # Earlier rules take priority. We do two passes: one for section labels (MTD vs Day)
@@ -90,7 +118,7 @@ DAY_FIELDS = [
 ]
 
 
-def _scan_headers(ws) -> dict:
+def _scan_headers(ws: SheetGrid) -> dict:
     """
     Scan ALL rows in the first 8 rows for header labels.
     Build a merged label per column by concatenating non-empty header text
@@ -104,7 +132,7 @@ def _scan_headers(ws) -> dict:
     col_labels = {}   # col_index -> list of normalized text fragments
     for row in range(1, 9):
         for col in range(1, max_col + 1):
-            val = ws.cell(row=row, column=col).value
+            val = ws.cell(row, col)
             if val is not None and str(val).strip():
                 norm = _normalize(str(val))
                 col_labels.setdefault(col, []).append(norm)
@@ -197,7 +225,7 @@ def _fallback_columns() -> dict:
 
 # ── KPI scanner ────────────────────────────────────────────────────────────────
 
-def _scan_kpis(ws, start_row: int) -> dict:
+def _scan_kpis(ws: SheetGrid, start_row: int) -> dict:
     """
     After the TOTAL row, scan remaining rows for KPI table.
     Looks for labels like ATV, AUV, Cake QTY, HP QTY in any column,
@@ -206,23 +234,23 @@ def _scan_kpis(ws, start_row: int) -> dict:
     kpis = {}
     for row in range(start_row + 1, ws.max_row + 1):
         for col in range(1, min(ws.max_column, 6) + 1):
-            val = ws.cell(row=row, column=col).value
+            val = ws.cell(row, col)
             if val is None:
                 continue
             label = _normalize(str(val))
             # Find the first numeric value to the right of this label
             num_val = None
             for nc in range(col + 1, col + 5):
-                nv = ws.cell(row=row, column=nc).value
+                nv = ws.cell(row, nc)
                 f = _safe_float(nv, default=None)
                 if f is not None and f != 0:
                     num_val = f
                     break
 
             if "ATV" in label and "CAUV" not in label and "atv" not in kpis:
-                kpis["atv"] = num_val or _safe_float(ws.cell(row=row, column=col + 1).value)
+                kpis["atv"] = num_val or _safe_float(ws.cell(row, col + 1))
             elif "AUV" in label and "auv" not in kpis:
-                kpis["auv"] = num_val or _safe_float(ws.cell(row=row, column=col + 1).value)
+                kpis["auv"] = num_val or _safe_float(ws.cell(row, col + 1))
             elif "CAKE" in label and "cake_qty" not in kpis:
                 kpis["cake_qty"] = num_val
             elif label.startswith("HP") and "hp_qty" not in kpis:
@@ -233,7 +261,7 @@ def _scan_kpis(ws, start_row: int) -> dict:
 
 # ── Header row scanner ─────────────────────────────────────────────────────────
 
-def _find_header_info(ws) -> dict:
+def _find_header_info(ws: SheetGrid) -> dict:
     """
     Scan top rows for parlor name, month, area manager.
     Looks for keywords like 'PARLOR', 'STORE', 'MONTH', 'AREA MANAGER'.
@@ -241,12 +269,12 @@ def _find_header_info(ws) -> dict:
     info = {"parlor_name": None, "month": None, "area_manager": None}
     for row in range(1, 6):
         for col in range(1, ws.max_column + 1):
-            val = ws.cell(row=row, column=col).value
+            val = ws.cell(row, col)
             if val is None:
                 continue
             label = _normalize(str(val))
             # Check adjacent cell for value
-            next_val = ws.cell(row=row, column=col + 1).value
+            next_val = ws.cell(row, col + 1)
             if "PARLOR" in label or "STORE" in label or "BRANCHNAME" in label or "ORNAME" in label:
                 info["parlor_name"] = str(next_val).strip() if next_val else None
             elif label in ("MONTH", "MONTH:"):
@@ -258,9 +286,9 @@ def _find_header_info(ws) -> dict:
 
 # ── Main parser ────────────────────────────────────────────────────────────────
 
-def parse_budget_excel(file_bytes: bytes) -> dict:
+def _parse_sheet(ws: SheetGrid) -> dict:
     """
-    Parse a DAILY SALES TRACKER Excel file of ANY column format.
+    Parse one DAILY SALES TRACKER sheet of ANY column format.
 
     Strategy:
     1. Scan header rows → auto-detect column positions by label text
@@ -269,9 +297,6 @@ def parse_budget_excel(file_bytes: bytes) -> dict:
     4. Find TOTAL row by scanning for "TOTAL" text
     5. Scan below TOTAL for KPI table (ATV, AUV, Cake QTY, HP QTY)
     """
-    wb = openpyxl.load_workbook(io.BytesIO(file_bytes), data_only=True)
-    ws = wb.active
-
     # Step 1: detect headers
     cols = _scan_headers(ws)
 
@@ -286,7 +311,7 @@ def parse_budget_excel(file_bytes: bytes) -> dict:
     header_info = _find_header_info(ws)
 
     def get(r, key):
-        return ws.cell(row=r, column=cols[key]).value
+        return ws.cell(r, cols[key])
 
     daily_data = []
     totals_row = None
@@ -295,7 +320,7 @@ def parse_budget_excel(file_bytes: bytes) -> dict:
     for row in range(1, ws.max_row + 1):
         # Check for TOTAL row (any of first 4 cells contains "TOTAL")
         row_snippet = " ".join(
-            str(ws.cell(row=row, column=c).value or "") for c in range(1, 5)
+            str(ws.cell(row, c) or "") for c in range(1, 5)
         ).upper()
         if "TOTAL" in row_snippet and totals_row is None:
             totals_row = row
@@ -305,7 +330,7 @@ def parse_budget_excel(file_bytes: bytes) -> dict:
             break  # stop parsing data rows after TOTAL
 
         # Must have a numeric SL (1-31)
-        sl_val = ws.cell(row=row, column=cols["sl"]).value
+        sl_val = ws.cell(row, cols["sl"])
         try:
             sl = int(float(sl_val))
             if sl < 1 or sl > 31:
@@ -354,7 +379,7 @@ def parse_budget_excel(file_bytes: bytes) -> dict:
 
     # Step 6: totals row values
     def totals_cell(key):
-        return ws.cell(row=totals_row, column=cols[key]).value if totals_row else None
+        return ws.cell(totals_row, cols[key]) if totals_row else None
 
     totals = {
         "ly_sales_total":      _safe_float(totals_cell("ly_sales")),
@@ -364,8 +389,6 @@ def parse_budget_excel(file_bytes: bytes) -> dict:
         "current_gc_total":    _safe_int(totals_cell("cur_gc")) or None,
     }
 
-    wb.close()
-
     # Step 7: build KPIs structure
     kpis = {
         "atv":      {"ly_2025": kpi_rows.get("atv"),      "current_2026": None, "diff_vs_py": None},
@@ -405,3 +428,43 @@ def parse_budget_excel(file_bytes: bytes) -> dict:
         "totals": totals,
         "kpis": kpis,
     }
+
+
+def _open_workbook(file_bytes: bytes):
+    return openpyxl.load_workbook(io.BytesIO(file_bytes), read_only=True, data_only=True)
+
+
+def parse_budget_excel(file_bytes: bytes) -> dict:
+    """Parse the active sheet of a DAILY SALES TRACKER file. Blocking — call via a thread."""
+    wb = _open_workbook(file_bytes)
+    try:
+        grid = SheetGrid.from_worksheet(wb.active)
+    finally:
+        wb.close()
+    return _parse_sheet(grid)
+
+
+def parse_budget_workbook(file_bytes: bytes, sheet_names: Optional[List[str]] = None) -> List[dict]:
+    """
+    Parse every sheet of a workbook holding one tracker per parlor. Blocking — call via a thread.
+    Sheets without daily rows (cover pages, summaries) are skipped.
+    Returns parse_budget_excel-shaped dicts with an added "sheet_name".
+    """
+    wb = _open_workbook(file_bytes)
+    try:
+        grids = [
+            (ws.title, SheetGrid.from_worksheet(ws))
+            for ws in wb.worksheets
+            if sheet_names is None or ws.title in sheet_names
+        ]
+    finally:
+        wb.close()
+
+    results = []
+    for title, grid in grids:
+        parsed = _parse_sheet(grid)
+        if parsed["daily_data"]:
+            results.append({"sheet_name": title, **parsed})
+        else:
+            logger.info(f"Skipping sheet '{title}': no daily rows")
+    return results
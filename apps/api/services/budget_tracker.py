@@ -0,0 +1,61 @@
+"""
+Budget tracker metrics
+Budget vs actual for one branch-day from its DailyBudget and BranchDaySales rows
+(either may be missing). Shared by the tracker overview and the month export.
+"""
+
+from typing import Optional
+
+from models.sales import BranchDaySales, DailyBudget
+
+# Worst first: how the overview sorts branches
+STATUS_ORDER = {"critical": 0, "behind": 1, "no_budget": 2, "on_track": 3, "achieved": 4}
+
+
+def tracker_metrics(bud: Optional[DailyBudget], sal: Optional[BranchDaySales]) -> dict:
+    budget_amt = bud.budget_amount if bud else 0
+    ly_sales_val = bud.ly_sales if bud else 0
+    ly_gc_val = bud.ly_gc if bud else 0
+
+    # Latest cumulative window only — summing every window double counts
+    actual_gross = (
+        (sal.gross_sales or 0) + (sal.hd_gross_sales or 0) + (sal.deliveroo_gross_sales or 0)
+    ) if sal else 0
+    actual_gc = (
+        (sal.transaction_count or 0) + (sal.hd_orders or 0) + (sal.deliveroo_orders or 0)
+    ) if sal else 0
+
+    ach_pct = (actual_gross / budget_amt * 100) if budget_amt > 0 else 0
+    growth_vs_ly = ((actual_gross - ly_sales_val) / ly_sales_val * 100) if ly_sales_val > 0 else 0
+    atv = actual_gross / actual_gc if actual_gc > 0 else 0
+    ly_atv_branch = ly_sales_val / ly_gc_val if ly_gc_val > 0 else 0
+
+    # Determine status
+    if not bud:
+        status = "no_budget"
+    elif ach_pct >= 100:
+        status = "achieved"
+    elif ach_pct >= 75:
+        status = "on_track"
+    elif ach_pct >= 50:
+        status = "behind"
+    else:
+        status = "critical"
+
+    return {
+        "day_name": bud.day_name if bud else None,
+        "budget": budget_amt,
+        "ly_sales": ly_sales_val,
+        "ly_gc": ly_gc_val,
+        "actual_gross": round(actual_gross, 2),
+        "actual_gc": actual_gc,
+        "achievement_pct": round(ach_pct, 1),
+        "remaining": round(budget_amt - actual_gross, 2),
+        "atv": round(atv, 2),
+        "ly_atv": round(ly_atv_branch, 2),
+        "growth_vs_ly": round(growth_vs_ly, 1),
+        "budget_loaded": bud is not None,
+        "has_sales": sal is not None,
+        "windows": sal.windows_submitted if sal else 0,
+        "status": status,
+    }
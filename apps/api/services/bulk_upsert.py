@@ -0,0 +1,93 @@
+"""
+Bulk upsert helper
+Writes many rows in a few INSERT ... ON CONFLICT DO UPDATE statements (PostgreSQL and
+SQLite share the syntax). Other dialects, and tables whose unique index could not be
+created (see run_migrations), fall back to one SELECT + UPDATE/INSERT per row.
+"""
+
+import logging
+from contextlib import nullcontext
+from typing import Dict, Iterable, List, Sequence
+
+from sqlalchemy import and_, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+_DIALECT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+# Keeps each statement well under the bind parameter limits of both databases
+CHUNK_ROWS = 500
+
+
+def _dedupe(rows: Iterable[dict], key_columns: Sequence[str]) -> List[dict]:
+    """Last row wins per key — one statement may not touch the same row twice."""
+    by_key: Dict[tuple, dict] = {}
+    for row in rows:
+        by_key[tuple(row[c] for c in key_columns)] = row
+    return list(by_key.values())
+
+
+def _upsert_row_by_row(db: Session, model, rows: List[dict], key_columns: Sequence[str]):
+    table = model.__table__
+    for row in rows:
+        match = and_(*(table.c[c] == row[c] for c in key_columns))
+        existing = db.execute(select(table.c.id).where(match).limit(1)).first()
+        if existing:
+            values = {k: v for k, v in row.items() if k not in key_columns}
+            if "updated_at" in table.c:
+                values["updated_at"] = func.now()
+            db.execute(
+                update(model).where(table.c.id == existing[0]).values(**values),
+                execution_options={"synchronize_session": False},
+            )
+        else:
+            db.execute(insert(model).values(**row))
+
+
+def dialect_insert(db: Session):
+    """The INSERT construct with ON CONFLICT support for db's dialect, or None."""
+    return _DIALECT_INSERTS.get(db.get_bind().dialect.name)
+
+
+def upsert_rows(db: Session, model, rows: Iterable[dict], key_columns: Sequence[str]) -> int:
+    """
+    Insert rows into model's table, updating the non-key columns of rows whose
+    key_columns already exist. Runs inside the caller's transaction (no commit).
+    Returns the number of distinct rows written.
+    """
+    table = model.__table__
+    rows = _dedupe(rows, key_columns)
+    if not rows:
+        return 0
+
+    dialect = db.get_bind().dialect.name
+    make_insert = dialect_insert(db)
+    if make_insert is None:
+        _upsert_row_by_row(db, model, rows, key_columns)
+        return len(rows)
+
+    update_columns = [c for c in rows[0] if c not in key_columns]
+    # A failed statement aborts a PostgreSQL transaction, so guard it with a savepoint.
+    # SQLite rejects a non-matching ON CONFLICT before writing anything, and pysqlite
+    # savepoints would commit early, so none is used there.
+    guard = db.begin_nested() if dialect == "postgresql" else nullcontext()
+    try:
+        with guard:
+            for start in range(0, len(rows), CHUNK_ROWS):
+                # ORM-enabled statements, so session hooks (e.g. reference data versions) see the write
+                stmt = make_insert(model).values(rows[start:start + CHUNK_ROWS])
+                set_ = {c: stmt.excluded[c] for c in update_columns}
+                if "updated_at" in table.c:
+                    set_["updated_at"] = func.now()
+                db.execute(stmt.on_conflict_do_update(index_elements=list(key_columns), set_=set_))
+    except (OperationalError, ProgrammingError) as e:
+        # No unique index on the key columns (e.g. legacy duplicates kept it non-unique)
+        logger.warning(f"Bulk upsert into {table.name} fell back to row-by-row: {e}")
+        _upsert_row_by_row(db, model, rows, key_columns)
+    return len(rows)
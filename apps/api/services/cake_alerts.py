@@ -0,0 +1,94 @@
+"""
+Cake low-stock evaluation
+Computes which (branch, cake) cells are at or below their alert threshold in a
+single query, shared by the alerts endpoint, the notify endpoint and the daily brief.
+
+A cell is every active product at every active branch in scope; a missing stock
+row counts as 0 pcs. The threshold is the branch's enabled CakeAlertConfig, else
+the product default.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Iterable, List
+
+from sqlalchemy import and_, func, select, true
+from sqlalchemy.orm import Session
+
+from models.cake import CakeAlertConfig, CakeProduct, CakeStock
+from models.location import Branch
+
+DEFAULT_THRESHOLD = 2  # CakeProduct.default_alert_threshold column default
+
+
+@dataclass
+class LowStockItem:
+    branch_id: int
+    branch_name: str
+    cake_product_id: int
+    cake_name: str
+    cake_code: str
+    current_quantity: int
+    threshold: int
+
+    @property
+    def severity(self) -> str:
+        return "critical" if self.current_quantity == 0 else "warning"
+
+
+def _threshold_expr():
+    return func.coalesce(CakeAlertConfig.threshold, CakeProduct.default_alert_threshold, DEFAULT_THRESHOLD)
+
+
+def _enabled_config_join():
+    return and_(
+        CakeAlertConfig.branch_id == Branch.id,
+        CakeAlertConfig.cake_product_id == CakeProduct.id,
+        CakeAlertConfig.is_enabled == True,
+    )
+
+
+def evaluate_low_stock(db: Session, branch_ids: Iterable[int]) -> List[LowStockItem]:
+    """
+    Low-stock cells for the given branches, critical first then by quantity.
+    One round trip: branches x active products, left-joined to stock and config.
+    """
+    branch_ids = list(branch_ids)
+    if not branch_ids:
+        return []
+
+    quantity = func.coalesce(CakeStock.current_quantity, 0)
+    threshold = _threshold_expr()
+    stmt = (
+        select(
+            Branch.id, Branch.name,
+            CakeProduct.id, CakeProduct.name, CakeProduct.code,
+            quantity.label("current_quantity"), threshold.label("threshold"),
+        )
+        .select_from(Branch)
+        .join(CakeProduct, true())
+        .outerjoin(CakeStock, and_(
+            CakeStock.branch_id == Branch.id,
+            CakeStock.cake_product_id == CakeProduct.id,
+        ))
+        .outerjoin(CakeAlertConfig, _enabled_config_join())
+        .where(
+            Branch.id.in_(branch_ids),
+            Branch.is_active == True,
+            CakeProduct.is_active == True,
+            quantity <= threshold,
+        )
+        .order_by(quantity, Branch.name, CakeProduct.name)
+    )
+    return [LowStockItem(*row) for row in db.execute(stmt).all()]
+
+
+def get_effective_thresholds(db: Session, branch_id: int) -> Dict[int, int]:
+    """{cake_product_id: threshold} for every active product at one branch."""
+    stmt = (
+        select(CakeProduct.id, _threshold_expr())
+        .select_from(Branch)
+        .join(CakeProduct, true())
+        .outerjoin(CakeAlertConfig, _enabled_config_join())
+        .where(Branch.id == branch_id, CakeProduct.is_active == True)
+    )
+    return dict(db.execute(stmt).all())
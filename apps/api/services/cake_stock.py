@@ -0,0 +1,341 @@
+"""
+Cake stock mutations
+Every change is one conditional UPDATE / upsert evaluated by the database, so
+concurrent tills at a branch can't lose each other's updates and no row locks are
+held between reading and writing:
+
+- record_sale:    one UPDATE ... SET current_quantity = current_quantity - n
+                  WHERE current_quantity >= n RETURNING ... for all items of a sale
+- receive:        one INSERT ... ON CONFLICT DO UPDATE SET current_quantity = current_quantity + n
+- set_quantity:   compare-and-set (UPDATE ... WHERE current_quantity = <value read>), retried on conflict
+- initialize:     one INSERT ... ON CONFLICT DO UPDATE SET current_quantity = <uploaded count>
+                  for a whole initial upload, after locking the rows it replaces
+
+The CakeStockLog rows of a call are written in one executemany. Callers commit.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import and_, case, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from models.cake import CakeStock, CakeStockChangeType, CakeStockLog
+from services.bulk_upsert import dialect_insert
+from services.reference_data import get_cake_product
+
+# Compare-and-set attempts before set_quantity gives up under contention
+SET_QUANTITY_ATTEMPTS = 5
+
+_stock = CakeStock.__table__
+
+
+class StockError(ValueError):
+    """A stock change that can't be applied (missing record, insufficient stock)."""
+
+
+@dataclass
+class StockLine:
+    """One requested change: product, positive quantity, optional note."""
+    cake_product_id: int
+    quantity: int
+    notes: Optional[str] = None
+
+
+@dataclass
+class StockLevel:
+    """A stock row as it stands after a change."""
+    id: int
+    cake_product_id: int
+    current_quantity: int
+    last_updated_at: Optional[datetime]
+
+
+def _totals(lines: Sequence[StockLine]) -> "OrderedDict[int, int]":
+    """Quantity per product, in first-seen order (a product may appear on several lines)."""
+    totals: "OrderedDict[int, int]" = OrderedDict()
+    for line in lines:
+        totals[line.cake_product_id] = totals.get(line.cake_product_id, 0) + line.quantity
+    return totals
+
+
+def _per_product(column, totals: Dict[int, int]):
+    return case(totals, value=column)
+
+
+def _returning_levels(result) -> Dict[int, StockLevel]:
+    return {
+        row.cake_product_id: StockLevel(row.id, row.cake_product_id, row.current_quantity, row.last_updated_at)
+        for row in result
+    }
+
+
+def _log_lines(
+    db: Session, branch_id: int, lines: Sequence[StockLine], levels: Dict[int, StockLevel],
+    sign: int, change_type: CakeStockChangeType, user_id: int, reference_number: Optional[str] = None,
+):
+    """
+    Insert one log row per line. Lines for the same product are chained so each
+    row's before/after follows on from the previous one and ends at the new level.
+    """
+    totals = _totals(lines)
+    running = {pid: levels[pid].current_quantity - sign * total for pid, total in totals.items()}
+    rows = []
+    for line in lines:
+        before = running[line.cake_product_id]
+        after = before + sign * line.quantity
+        running[line.cake_product_id] = after
+        rows.append({
+            "branch_id": branch_id,
+            "cake_product_id": line.cake_product_id,
+            "change_type": change_type,
+            "quantity_change": sign * line.quantity,
+            "quantity_before": before,
+            "quantity_after": after,
+            "reference_number": reference_number,
+            "notes": line.notes,
+            "recorded_by_id": user_id,
+        })
+    if rows:
+        db.execute(insert(CakeStockLog.__table__), rows)
+
+
+# ============== SALES ==============
+
+def record_sale(db: Session, branch_id: int, lines: Sequence[StockLine], user_id: int) -> List[StockLevel]:
+    """
+    Decrement stock for every line in one statement. If any product has no stock
+    row or too little stock, StockError is raised and the caller must roll back
+    (the other products were already decremented).
+    """
+    totals = _totals(lines)
+    if not totals:
+        return []
+
+    result = db.execute(
+        update(_stock)
+        .where(
+            _stock.c.branch_id == branch_id,
+            _stock.c.cake_product_id.in_(list(totals)),
+            _stock.c.current_quantity >= _per_product(_stock.c.cake_product_id, totals),
+        )
+        .values(
+            current_quantity=_stock.c.current_quantity - _per_product(_stock.c.cake_product_id, totals),
+            last_updated_by_id=user_id,
+        )
+        .returning(_stock.c.id, _stock.c.cake_product_id, _stock.c.current_quantity, _stock.c.last_updated_at)
+    )
+    levels = _returning_levels(result)
+
+    if len(levels) < len(totals):
+        _raise_sale_error(db, branch_id, totals, levels)
+
+    _log_lines(db, branch_id, lines, levels, -1, CakeStockChangeType.SALE, user_id)
+    return [levels[pid] for pid in totals]
+
+
+def _raise_sale_error(db: Session, branch_id: int, totals: Dict[int, int], levels: Dict[int, StockLevel]):
+    # The failed products were not touched, so this read is still their current stock
+    failed = [pid for pid in totals if pid not in levels]
+    available = dict(db.execute(
+        select(_stock.c.cake_product_id, _stock.c.current_quantity)
+        .where(_stock.c.branch_id == branch_id, _stock.c.cake_product_id.in_(failed))
+    ).all())
+    pid = failed[0]
+    if pid not in available:
+        raise StockError(f"No stock record for cake product {pid}. Please initialize stock first.")
+    product = get_cake_product(db, pid)
+    name = product.name if product else f"cake product {pid}"
+    raise StockError(f"Insufficient stock for {name}. Available: {available[pid]}, Requested: {totals[pid]}")
+
+
+# ============== RECEIPTS ==============
+
+def receive(
+    db: Session, branch_id: int, lines: Sequence[StockLine], user_id: int, reference_number: Optional[str] = None,
+) -> List[StockLevel]:
+    """Increment stock for every line in one statement, creating missing stock rows."""
+    totals = _totals(lines)
+    if not totals:
+        return []
+
+    make_insert = dialect_insert(db)
+    if make_insert is None:
+        levels = _receive_without_upsert(db, branch_id, totals, user_id)
+    else:
+        stmt = make_insert(_stock).values([
+            {"branch_id": branch_id, "cake_product_id": pid, "current_quantity": qty, "last_updated_by_id": user_id}
+            for pid, qty in totals.items()
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["branch_id", "cake_product_id"],
+            set_={
+                "current_quantity": _stock.c.current_quantity + stmt.excluded.current_quantity,
+                "last_updated_by_id": stmt.excluded.last_updated_by_id,
+                "last_updated_at": func.now(),  # onupdate doesn't fire for ON CONFLICT
+            },
+        ).returning(_stock.c.id, _stock.c.cake_product_id, _stock.c.current_quantity, _stock.c.last_updated_at)
+        levels = _returning_levels(db.execute(stmt))
+
+    _log_lines(db, branch_id, lines, levels, 1, CakeStockChangeType.RECEIVED, user_id, reference_number)
+    return [levels[pid] for pid in totals]
+
+
+def _receive_without_upsert(db: Session, branch_id: int, totals: Dict[int, int], user_id: int) -> Dict[int, StockLevel]:
+    levels = _returning_levels(db.execute(
+        update(_stock)
+        .where(_stock.c.branch_id == branch_id, _stock.c.cake_product_id.in_(list(totals)))
+        .values(
+            current_quantity=_stock.c.current_quantity + _per_product(_stock.c.cake_product_id, totals),
+            last_updated_by_id=user_id,
+        )
+        .returning(_stock.c.id, _stock.c.cake_product_id, _stock.c.current_quantity, _stock.c.last_updated_at)
+    ))
+    missing = [pid for pid in totals if pid not in levels]
+    if missing:
+        levels.update(_returning_levels(db.execute(
+            insert(_stock)
+            .values([
+                {"branch_id": branch_id, "cake_product_id": pid, "current_quantity": totals[pid], "last_updated_by_id": user_id}
+                for pid in missing
+            ])
+            .returning(_stock.c.id, _stock.c.cake_product_id, _stock.c.current_quantity, _stock.c.last_updated_at)
+        )))
+    return levels
+
+
+# ============== ADJUSTMENTS ==============
+
+def set_quantity(
+    db: Session, branch_id: int, cake_product_id: int, new_quantity: int, user_id: int,
+    change_type: CakeStockChangeType = CakeStockChangeType.ADJUSTMENT, notes: Optional[str] = None,
+) -> StockLevel:
+    """
+    Set an absolute quantity and log the difference from the value it replaced.
+    Compare-and-set: the UPDATE only applies if the quantity is still the one read,
+    otherwise it re-reads and tries again.
+    """
+    match = and_(_stock.c.branch_id == branch_id, _stock.c.cake_product_id == cake_product_id)
+    for _ in range(SET_QUANTITY_ATTEMPTS):
+        before = db.execute(select(_stock.c.current_quantity).where(match)).scalar()
+        if before is None:
+            values = dict(
+                branch_id=branch_id, cake_product_id=cake_product_id,
+                current_quantity=new_quantity, last_updated_by_id=user_id,
+            )
+            make_insert = dialect_insert(db)
+            if make_insert is not None:
+                # Another till may create the row first; then compare-and-set against it
+                stmt = make_insert(_stock).values(**values).on_conflict_do_nothing(
+                    index_elements=["branch_id", "cake_product_id"],
+                )
+            else:
+                stmt = insert(_stock).values(**values)
+            before = 0
+        else:
+            stmt = (
+                update(_stock)
+                .where(match, _stock.c.current_quantity == before)
+                .values(current_quantity=new_quantity, last_updated_by_id=user_id)
+            )
+        levels = _returning_levels(db.execute(
+            stmt.returning(_stock.c.id, _stock.c.cake_product_id, _stock.c.current_quantity, _stock.c.last_updated_at)
+        ))
+        if cake_product_id in levels:
+            level = levels[cake_product_id]
+            db.execute(insert(CakeStockLog.__table__).values(
+                branch_id=branch_id,
+                cake_product_id=cake_product_id,
+                change_type=change_type,
+                quantity_change=new_quantity - before,
+                quantity_before=before,
+                quantity_after=new_quantity,
+                notes=notes,
+                recorded_by_id=user_id,
+            ))
+            return level
+    raise StockError("Stock is being changed by someone else, please try again")
+
+
+def initialize(
+    db: Session, branch_id: int, lines: Sequence[StockLine], user_id: int, notes: Optional[str] = None,
+) -> List[StockLevel]:
+    """
+    Set the counted quantity of every line in one statement (last line wins per product),
+    creating missing stock rows, and log the difference from the quantity each replaced.
+    """
+    quantities: "OrderedDict[int, int]" = OrderedDict()
+    for line in lines:
+        quantities[line.cake_product_id] = line.quantity
+    if not quantities:
+        return []
+
+    # Lock the rows being replaced so the logged before-quantities stay true until commit
+    before = dict(db.execute(
+        select(_stock.c.cake_product_id, _stock.c.current_quantity)
+        .where(_stock.c.branch_id == branch_id, _stock.c.cake_product_id.in_(list(quantities)))
+        .with_for_update()
+    ).all())
+
+    make_insert = dialect_insert(db)
+    if make_insert is None:
+        levels = _initialize_without_upsert(db, branch_id, quantities, set(before), user_id)
+    else:
+        stmt = make_insert(_stock).values([
+            {"branch_id": branch_id, "cake_product_id": pid, "current_quantity": qty, "last_updated_by_id": user_id}
+            for pid, qty in quantities.items()
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["branch_id", "cake_product_id"],
+            set_={
+                "current_quantity": stmt.excluded.current_quantity,
+                "last_updated_by_id": stmt.excluded.last_updated_by_id,
+                "last_updated_at": func.now(),  # onupdate doesn't fire for ON CONFLICT
+            },
+        ).returning(_stock.c.id, _stock.c.cake_product_id, _stock.c.current_quantity, _stock.c.last_updated_at)
+        levels = _returning_levels(db.execute(stmt))
+
+    db.execute(insert(CakeStockLog.__table__), [
+        {
+            "branch_id": branch_id,
+            "cake_product_id": pid,
+            "change_type": CakeStockChangeType.INITIAL,
+            "quantity_change": qty - before.get(pid, 0),
+            "quantity_before": before.get(pid, 0),
+            "quantity_after": qty,
+            "reference_number": None,
+            "notes": notes,
+            "recorded_by_id": user_id,
+        }
+        for pid, qty in quantities.items()
+    ])
+    return [levels[pid] for pid in quantities]
+
+
+def _initialize_without_upsert(
+    db: Session, branch_id: int, quantities: Dict[int, int], existing: set, user_id: int,
+) -> Dict[int, StockLevel]:
+    levels = {}
+    if existing:
+        levels.update(_returning_levels(db.execute(
+            update(_stock)
+            .where(_stock.c.branch_id == branch_id, _stock.c.cake_product_id.in_(list(existing)))
+            .values(
+                current_quantity=_per_product(_stock.c.cake_product_id, {pid: quantities[pid] for pid in existing}),
+                last_updated_by_id=user_id,
+            )
+            .returning(_stock.c.id, _stock.c.cake_product_id, _stock.c.current_quantity, _stock.c.last_updated_at)
+        )))
+    missing = [pid for pid in quantities if pid not in existing]
+    if missing:
+        levels.update(_returning_levels(db.execute(
+            insert(_stock)
+            .values([
+                {"branch_id": branch_id, "cake_product_id": pid, "current_quantity": quantities[pid], "last_updated_by_id": user_id}
+                for pid in missing
+            ])
+            .returning(_stock.c.id, _stock.c.cake_product_id, _stock.c.current_quantity, _stock.c.last_updated_at)
+        )))
+    return levels
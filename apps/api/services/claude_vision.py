@@ -4,13 +4,14 @@ Fast extraction using Anthropic Claude API for POS receipts, deliveries, budgets
 """
 
 import anthropic
-import asyncio
 import base64
 import json
 import logging
 import re
 
 from utils.config import settings
+from services.extraction_cache import cached_extraction
+from services.llm_gateway import CLAUDE, call_llm
 
 logger = logging.getLogger(__name__)
 
@@ -265,7 +266,7 @@ def _get_client() -> anthropic.Anthropic:
     api_key = settings.ANTHROPIC_API_KEY
     if not api_key:
         raise ValueError("ANTHROPIC_API_KEY not configured")
-    return anthropic.Anthropic(api_key=api_key)
+    return anthropic.Anthropic(api_key=api_key, timeout=settings.LLM_TIMEOUT_SECONDS)
 
 
 def _parse_json_response(text: str) -> dict:
@@ -309,17 +310,17 @@ def _validate_pos_combined(data: dict) -> dict:
 async def _call_claude_with_image(content: list, max_tokens: int = 4096) -> str:
     """Call Claude API with images and text."""
     client = _get_client()
-    response = await asyncio.get_event_loop().run_in_executor(
-        None,
-        lambda: client.messages.create(
-            model="claude-haiku-4-5-20251001",
-            max_tokens=max_tokens,
-            messages=[{"role": "user", "content": content}],
-        )
+    response = await call_llm(
+        CLAUDE,
+        client.messages.create,
+        model="claude-haiku-4-5-20251001",
+        max_tokens=max_tokens,
+        messages=[{"role": "user", "content": content}],
     )
     return response.content[0].text
 
 
+@cached_extraction("claude", "pos_combined", POS_COMBINED_PROMPT)
 async def extract_pos_combined(image_bytes_list) -> dict:
     """Extract ALL POS data (sales + categories + items) — Haiku fast."""
     if isinstance(image_bytes_list, bytes):
@@ -346,6 +347,7 @@ async def extract_pos_combined(image_bytes_list) -> dict:
     return data
 
 
+@cached_extraction("claude", "hd", HOME_DELIVERY_PROMPT)
 async def extract_hd_sales(image_bytes: bytes) -> dict:
     """Extract Home Delivery data from report photo."""
     b64 = base64.standard_b64encode(image_bytes).decode("utf-8")
@@ -364,6 +366,7 @@ async def extract_hd_sales(image_bytes: bytes) -> dict:
     return _parse_json_response(text)
 
 
+@cached_extraction("claude", "deliveroo", DELIVEROO_PROMPT)
 async def extract_deliveroo_sales(image_bytes: bytes) -> dict:
     """Extract Deliveroo/aggregator data from dashboard photo."""
     b64 = base64.standard_b64encode(image_bytes).decode("utf-8")
@@ -382,6 +385,7 @@ async def extract_deliveroo_sales(image_bytes: bytes) -> dict:
     return _parse_json_response(text)
 
 
+@cached_extraction("claude", "budget_sheet", BUDGET_SHEET_PROMPT)
 async def extract_budget_sheet(image_bytes: bytes) -> dict:
     """Extract monthly budget sheet data from photo (DAILY SALES TRACKER format)."""
     b64 = base64.standard_b64encode(image_bytes).decode("utf-8")
@@ -423,6 +427,7 @@ async def extract_budget_sheet(image_bytes: bytes) -> dict:
     return budget_data
 
 
+@cached_extraction("claude", "visit_times", VISIT_TIME_PROMPT)
 async def extract_visit_times(image_bytes: bytes) -> dict:
     """Extract swipe in/out times from a POS or clock photo."""
     b64 = base64.standard_b64encode(image_bytes).decode("utf-8")
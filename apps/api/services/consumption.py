@@ -0,0 +1,159 @@
+"""
+Consumption engine
+Computes opening / closing / received inches for every (branch, flavor, period)
+combination in a single grouped round-trip, instead of three aggregate queries
+per flavor per branch.
+
+Consumption = Opening + Received - Closing
+"""
+
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, case, func, literal, select, union_all
+from sqlalchemy.orm import Session
+
+from models.inventory import DailyInventory, TubReceipt, InventoryEntryType
+
+
+class ConsumptionMatrix:
+    """
+    Result of a consumption run.
+    cells: {(branch_id, flavor_id, period): [opening, closing, received]}
+    Raw values are NOT clamped — callers decide where max(0, ...) applies,
+    matching the per-endpoint semantics the analytics router always had.
+    """
+
+    def __init__(self, cells: Dict[Tuple[int, int, str], List[float]]):
+        self.cells = cells
+
+    def consumed(self, branch_id: int, flavor_id: int, period: str) -> float:
+        """Raw consumption for one cell (0 if no data)."""
+        opening, closing, received = self.cells.get((branch_id, flavor_id, period), (0, 0, 0))
+        return opening + received - closing
+
+    def by_flavor(self, period: str) -> Dict[int, float]:
+        """Raw consumption per flavor, summed across all branches in the run."""
+        totals: Dict[int, float] = {}
+        for (branch_id, flavor_id, cell_period), (opening, closing, received) in self.cells.items():
+            if cell_period != period:
+                continue
+            totals[flavor_id] = totals.get(flavor_id, 0) + opening + received - closing
+        return totals
+
+    def by_branch_flavor(self, period: str) -> Dict[Tuple[int, int], float]:
+        """Raw consumption per (branch, flavor)."""
+        return {
+            (branch_id, flavor_id): opening + received - closing
+            for (branch_id, flavor_id, cell_period), (opening, closing, received) in self.cells.items()
+            if cell_period == period
+        }
+
+
+def _period_label(column, periods: Dict[str, Tuple[date, date]]):
+    """CASE expression mapping a date column onto its period name."""
+    return case(
+        *[(and_(column >= start, column <= end), literal(name)) for name, (start, end) in periods.items()],
+        else_=None,
+    )
+
+
+def compute_consumption(
+    db: Session,
+    branch_ids: Iterable[int],
+    periods: Dict[str, Tuple[date, date]],
+    flavor_ids: Optional[Iterable[int]] = None,
+) -> ConsumptionMatrix:
+    """
+    Load opening/closing/received sums for all branches × flavors × periods in one query.
+    periods: {"name": (date_from, date_to)} — ranges must not overlap.
+    """
+    branch_ids = list(branch_ids)
+    if not branch_ids or not periods:
+        return ConsumptionMatrix({})
+
+    range_start = min(start for start, _ in periods.values())
+    range_end = max(end for _, end in periods.values())
+
+    inv_filters = [
+        DailyInventory.branch_id.in_(branch_ids),
+        DailyInventory.date >= range_start,
+        DailyInventory.date <= range_end,
+    ]
+    rec_filters = [
+        TubReceipt.branch_id.in_(branch_ids),
+        TubReceipt.date >= range_start,
+        TubReceipt.date <= range_end,
+    ]
+    if flavor_ids is not None:
+        flavor_ids = list(flavor_ids)
+        inv_filters.append(DailyInventory.flavor_id.in_(flavor_ids))
+        rec_filters.append(TubReceipt.flavor_id.in_(flavor_ids))
+
+    # Label rows with their period in a subquery, then group on the label column
+    # (grouping on the CASE expression itself breaks on Postgres bind params)
+    inv_rows = select(
+        DailyInventory.branch_id.label("branch_id"),
+        DailyInventory.flavor_id.label("flavor_id"),
+        _period_label(DailyInventory.date, periods).label("period"),
+        case((DailyInventory.entry_type == InventoryEntryType.OPENING, DailyInventory.inches), else_=0).label("opening"),
+        case((DailyInventory.entry_type == InventoryEntryType.CLOSING, DailyInventory.inches), else_=0).label("closing"),
+        literal(0.0).label("received"),
+    ).where(*inv_filters)
+
+    rec_rows = select(
+        TubReceipt.branch_id.label("branch_id"),
+        TubReceipt.flavor_id.label("flavor_id"),
+        _period_label(TubReceipt.date, periods).label("period"),
+        literal(0.0).label("opening"),
+        literal(0.0).label("closing"),
+        (TubReceipt.quantity * TubReceipt.inches_per_tub).label("received"),
+    ).where(*rec_filters)
+
+    rows = union_all(inv_rows, rec_rows).subquery()
+    stmt = (
+        select(
+            rows.c.branch_id,
+            rows.c.flavor_id,
+            rows.c.period,
+            func.sum(rows.c.opening),
+            func.sum(rows.c.closing),
+            func.sum(rows.c.received),
+        )
+        .where(rows.c.period.isnot(None))
+        .group_by(rows.c.branch_id, rows.c.flavor_id, rows.c.period)
+    )
+
+    cells = {
+        (branch_id, flavor_id, period): [opening or 0, closing or 0, received or 0]
+        for branch_id, flavor_id, period, opening, closing, received in db.execute(stmt)
+    }
+    return ConsumptionMatrix(cells)
+
+
+def count_days_tracked_by_flavor(
+    db: Session, branch_ids: List[int], date_from: date, date_to: date
+) -> Dict[int, int]:
+    """Distinct inventory dates per flavor across the given branches."""
+    rows = db.query(
+        DailyInventory.flavor_id, func.count(func.distinct(DailyInventory.date))
+    ).filter(
+        DailyInventory.branch_id.in_(branch_ids),
+        DailyInventory.date >= date_from,
+        DailyInventory.date <= date_to,
+    ).group_by(DailyInventory.flavor_id).all()
+    return {flavor_id: count for flavor_id, count in rows}
+
+
+def count_days_reported_by_branch(
+    db: Session, branch_ids: List[int], date_from: date, date_to: date
+) -> Dict[int, int]:
+    """Distinct inventory dates per branch (any flavor)."""
+    rows = db.query(
+        DailyInventory.branch_id, func.count(func.distinct(DailyInventory.date))
+    ).filter(
+        DailyInventory.branch_id.in_(branch_ids),
+        DailyInventory.date >= date_from,
+        DailyInventory.date <= date_to,
+    ).group_by(DailyInventory.branch_id).all()
+    return {branch_id: count for branch_id, count in rows}
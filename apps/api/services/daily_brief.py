@@ -0,0 +1,517 @@
+"""
+Daily brief service
+Gathers the data behind a user's daily brief, has Gemini summarise it, and keeps
+the result as a DailyBriefSnapshot so page loads are served from storage.
+
+A snapshot is re-checked at most every BRIEF_SNAPSHOT_MAX_AGE_SECONDS: the data is
+gathered again and hashed, and Gemini is only called when the hash changed.
+BriefScheduler pre-generates briefs at BRIEF_SCHEDULE_TIMES (Dubai time); each slot
+is claimed through a DailyBriefRun row so only one API worker runs it.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models.branch_visit import BranchVisit
+from models.daily_brief import DailyBriefRun, DailyBriefSnapshot
+from models.expiry import ExpiryRequest, ExpiryRequestBranch, ExpiryBranchStatus
+from models.location import Branch
+from models.sales import DailyBudget
+from models.user import User, UserRole
+from services.access_scope import ADMIN_MANAGED, get_access_scope
+from services.cake_alerts import evaluate_low_stock
+from services.llm_gateway import GEMINI, call_llm
+from services.reference_data import get_branch
+from services.sales_rollup import get_day_rollups
+from utils.config import settings
+from utils.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+NO_DATA_BRIEF = "No data available for today's brief."
+
+
+def get_today() -> date:
+    """Get today's date (UTC+4 Dubai)."""
+    return (datetime.utcnow() + timedelta(hours=4)).date()
+
+
+def _day_gross(day_sales) -> float:
+    """Gross across POS + HD + Deliveroo for one branch-day rollup row."""
+    if not day_sales:
+        return 0
+    return (day_sales.gross_sales or 0) + (day_sales.hd_gross_sales or 0) + (day_sales.deliveroo_gross_sales or 0)
+
+
+def gather_admin_data(db: Session, current_user: User, target_date: date) -> dict:
+    """Gather all data for admin/TM/AM daily brief."""
+
+    # Determine branch scope
+    scoped_ids = get_access_scope(db, current_user, ADMIN_MANAGED).branch_ids
+    branches = db.query(Branch).filter(Branch.id.in_(scoped_ids)).order_by(Branch.id).all() if scoped_ids else []
+    branch_ids = [b.id for b in branches]
+
+    if not branch_ids:
+        return {"branches": [], "budget": {}, "visits": {}, "expiry": {}}
+
+    # --- Budget vs Actual ---
+    budgets = db.query(DailyBudget).filter(
+        and_(DailyBudget.branch_id.in_(branch_ids), DailyBudget.budget_date == target_date)
+    ).all()
+    s_map = get_day_rollups(db, branch_ids, target_date)
+
+    b_map = {b.branch_id: b for b in budgets}
+
+    budget_data = []
+    total_budget = 0
+    total_actual = 0
+    for br in branches:
+        bud = b_map.get(br.id)
+        budget_amt = bud.budget_amount if bud else 0
+        actual_gross = _day_gross(s_map.get(br.id))
+        ach_pct = round((actual_gross / budget_amt * 100), 1) if budget_amt > 0 else 0
+        total_budget += budget_amt
+        total_actual += actual_gross
+
+        if budget_amt > 0 or actual_gross > 0:
+            budget_data.append({
+                "branch": br.name,
+                "budget": round(budget_amt),
+                "actual": round(actual_gross),
+                "achievement": ach_pct,
+                "status": "achieved" if ach_pct >= 100 else "on_track" if ach_pct >= 75 else "behind" if ach_pct >= 50 else "critical",
+            })
+
+    # --- Visits ---
+    visits = db.query(BranchVisit).filter(BranchVisit.visit_date == target_date)
+    if current_user.role == UserRole.ADMIN:
+        visits = visits.filter(BranchVisit.user_id == current_user.id)
+    elif current_user.role == UserRole.SUPER_ADMIN:
+        visits = visits.join(User, BranchVisit.user_id == User.id).filter(
+            User.territory_id == current_user.territory_id
+        )
+    visits = visits.all()
+
+    visit_data = {
+        "total_visits": len(visits),
+        "total_hours": round(sum(v.hours_spent or 0 for v in visits), 1),
+        "unique_users": len(set(v.user_id for v in visits)),
+        "branches_visited": len(set(v.branch_id for v in visits)),
+    }
+
+    # Check AMs who didn't visit (for TM/HQ)
+    if current_user.role in [UserRole.SUPREME_ADMIN, UserRole.SUPER_ADMIN]:
+        am_query = db.query(User).filter(User.role == UserRole.ADMIN, User.is_active == True)
+        if current_user.role == UserRole.SUPER_ADMIN:
+            am_query = am_query.filter(User.territory_id == current_user.territory_id)
+        all_ams = am_query.all()
+        visited_user_ids = set(v.user_id for v in visits)
+        no_visit_ams = [am.full_name for am in all_ams if am.id not in visited_user_ids]
+        visit_data["ams_no_visit"] = no_visit_ams
+
+    # --- Expiry Tracking ---
+    expiry_requests = db.query(ExpiryRequest).filter(ExpiryRequest.status == "open").all()
+    pending_branches = db.query(ExpiryRequestBranch).filter(
+        ExpiryRequestBranch.status == ExpiryBranchStatus.PENDING
+    ).count()
+    expiry_data = {
+        "open_requests": len(expiry_requests),
+        "pending_branch_responses": pending_branches,
+    }
+
+    # --- Cake Alerts ---
+    cake_data = [
+        {
+            "product": item.cake_name,
+            "branch": item.branch_name,
+            "qty": item.current_quantity,
+            "threshold": item.threshold,
+        }
+        for item in evaluate_low_stock(db, branch_ids)
+    ]
+
+    return {
+        "branch_count": len(branches),
+        "budget": {
+            "branches": budget_data,
+            "total_budget": round(total_budget),
+            "total_actual": round(total_actual),
+            "overall_achievement": round((total_actual / total_budget * 100), 1) if total_budget > 0 else 0,
+        },
+        "visits": visit_data,
+        "expiry": expiry_data,
+        "cake_alerts": cake_data,
+    }
+
+
+def gather_staff_data(db: Session, current_user: User, target_date: date) -> dict:
+    """Gather data for flavor expert (staff) daily brief."""
+    branch_id = current_user.branch_id
+    if not branch_id:
+        return {}
+
+    branch = get_branch(db, branch_id)
+    branch_name = branch.name if branch else "My Branch"
+
+    # Budget vs Actual
+    bud = db.query(DailyBudget).filter(
+        and_(DailyBudget.branch_id == branch_id, DailyBudget.budget_date == target_date)
+    ).first()
+    day_sales = get_day_rollups(db, [branch_id], target_date).get(branch_id)
+
+    budget_amt = bud.budget_amount if bud else 0
+    actual_gross = _day_gross(day_sales)
+    remaining = budget_amt - actual_gross
+
+    # Expiry requests pending
+    pending_expiry = db.query(ExpiryRequestBranch).filter(
+        and_(
+            ExpiryRequestBranch.branch_id == branch_id,
+            ExpiryRequestBranch.status == ExpiryBranchStatus.PENDING,
+        )
+    ).count()
+
+    # Cake alerts
+    cake_alerts = [
+        {"product": item.cake_name, "qty": item.current_quantity}
+        for item in evaluate_low_stock(db, [branch_id])
+    ]
+
+    return {
+        "branch_name": branch_name,
+        "budget": budget_amt,
+        "actual_sales": round(actual_gross),
+        "achievement": round((actual_gross / budget_amt * 100), 1) if budget_amt > 0 else 0,
+        "remaining": round(remaining),
+        "sales_windows_submitted": day_sales.windows_submitted if day_sales else 0,
+        "pending_expiry_requests": pending_expiry,
+        "cake_alerts": cake_alerts,
+    }
+
+
+async def _generate_brief_with_gemini(data: dict, role: str, user_name: str, target_date: str) -> str:
+    """Send aggregated data to Gemini and get a natural language summary."""
+    try:
+        from google import genai
+        from google.genai import types
+
+        client = genai.Client(
+            api_key=settings.GEMINI_API_KEY,
+            http_options=types.HttpOptions(timeout=int(settings.LLM_TIMEOUT_SECONDS * 1000)),
+        )
+
+        if role == "staff":
+            prompt = f"""You are an AI assistant for a food & beverage retail branch.
+Generate a concise daily brief for a Flavor Expert (branch staff member) named {user_name}.
+Date: {target_date}
+
+Branch data:
+{json.dumps(data, indent=2)}
+
+Write a brief, friendly summary in 4-6 bullet points covering:
+- Today's sales vs budget (if data available)
+- How much more they need to hit target
+- Pending expiry requests they need to respond to
+- Low cake stock warnings
+- A motivational note if they're doing well, or encouragement if behind
+
+Keep each bullet to 1 short sentence. Use simple language. No markdown headers.
+Start directly with the bullet points using • symbol.
+If no sales data yet, mention to submit sales when the window opens."""
+        else:
+            role_label = "HQ Admin" if role == "supreme_admin" else "Territory Manager" if role == "super_admin" else "Area Manager"
+            prompt = f"""You are an AI assistant for a food & beverage retail management system.
+Generate a concise daily brief for {user_name} ({role_label}).
+Date: {target_date}
+
+Today's data:
+{json.dumps(data, indent=2)}
+
+Write a brief, actionable summary in 5-8 bullet points covering:
+- Overall budget achievement across branches (which are doing well, which need attention)
+- Branch visit compliance (who visited, who didn't)
+- Pending expiry tracking responses
+- Low cake stock alerts
+- Top performer and weakest branch
+- Any action items that need immediate attention
+
+Keep each bullet to 1 short sentence. Be specific with names and numbers.
+Use • symbol for bullets. No markdown headers. No greeting.
+Start directly with the most important insight."""
+
+        response = await call_llm(
+            GEMINI,
+            client.models.generate_content,
+            model="gemini-2.5-flash",
+            contents=[prompt],
+            config=types.GenerateContentConfig(temperature=0.3),
+        )
+        return response.text.strip()
+    except Exception as e:
+        logger.error(f"Gemini daily brief failed: {e}")
+        return None
+
+
+
+def fallback_brief(data: dict, role: UserRole) -> str:
+    """Plain bullet summary used when Gemini is unavailable."""
+    if role == UserRole.STAFF:
+        brief_text = f"• Today's sales: AED {data.get('actual_sales', 0):,} of AED {data.get('budget', 0):,} budget ({data.get('achievement', 0)}%)"
+        if data.get('pending_expiry_requests', 0) > 0:
+            brief_text += f"\n• You have {data['pending_expiry_requests']} pending expiry request(s) to respond to"
+        if data.get('cake_alerts'):
+            brief_text += f"\n• {len(data['cake_alerts'])} cake item(s) running low on stock"
+    else:
+        budget = data.get("budget", {})
+        brief_text = f"• Overall achievement: {budget.get('overall_achievement', 0)}% (AED {budget.get('total_actual', 0):,} of AED {budget.get('total_budget', 0):,})"
+        visits = data.get("visits", {})
+        brief_text += f"\n• {visits.get('total_visits', 0)} branch visits logged today ({visits.get('total_hours', 0)} hours)"
+        if visits.get('ams_no_visit'):
+            brief_text += f"\n• No visits from: {', '.join(visits['ams_no_visit'][:3])}"
+        expiry = data.get("expiry", {})
+        if expiry.get('pending_branch_responses', 0) > 0:
+            brief_text += f"\n• {expiry['pending_branch_responses']} expiry responses still pending"
+    return brief_text
+
+
+# ============== SNAPSHOTS ==============
+
+def gather_brief_data(db: Session, user: User, target_date: date) -> dict:
+    if user.role == UserRole.STAFF:
+        return gather_staff_data(db, user, target_date)
+    return gather_admin_data(db, user, target_date)
+
+
+def _gather_in_own_session(bind, user_id: int, target_date: date) -> dict:
+    """Gather a user's brief data on a worker thread, in a session of its own."""
+    with Session(bind=bind) as db:
+        return gather_brief_data(db, db.get(User, user_id), target_date)
+
+
+def data_hash(data: dict, role: UserRole) -> str:
+    """Stable fingerprint of a brief's inputs."""
+    canonical = json.dumps({"role": role.value, "data": data}, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _snapshot_response(snapshot: DailyBriefSnapshot, cached: bool) -> dict:
+    return {
+        "success": True,
+        "date": str(snapshot.brief_date),
+        "brief": snapshot.brief_text,
+        "data": json.loads(snapshot.data_json),
+        "generated_at": snapshot.generated_at,
+        "source": snapshot.source,
+        "cached": cached,
+    }
+
+
+def _load_snapshot(db: Session, user_id: int, target_date: date) -> Optional[DailyBriefSnapshot]:
+    return db.query(DailyBriefSnapshot).filter(
+        DailyBriefSnapshot.user_id == user_id,
+        DailyBriefSnapshot.brief_date == target_date,
+    ).first()
+
+
+# (user_id, date) -> [lock, holders]; one generation per user/date at a time in this process
+_generation_locks: Dict[Tuple[int, date], list] = {}
+
+
+@asynccontextmanager
+async def _generation_lock(key: Tuple[int, date]):
+    entry = _generation_locks.setdefault(key, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0:
+            _generation_locks.pop(key, None)
+
+
+async def get_brief(db: Session, user: User, target_date: date, refresh: bool = False) -> dict:
+    """
+    Serve the user's brief for a date from its snapshot.
+    A snapshot checked within BRIEF_SNAPSHOT_MAX_AGE_SECONDS is returned as-is (unless refresh);
+    otherwise the data is gathered again and Gemini is only called if its hash changed
+    (or the stored brief was a fallback).
+    """
+    snapshot = _load_snapshot(db, user.id, target_date)
+    if snapshot is not None and not refresh:
+        checked_at = _naive_utc(snapshot.checked_at)
+        if checked_at and datetime.utcnow() - checked_at < timedelta(seconds=settings.BRIEF_SNAPSHOT_MAX_AGE_SECONDS):
+            return _snapshot_response(snapshot, cached=True)
+
+    async with _generation_lock((user.id, target_date)):
+        # The queries are blocking; keep them off the event loop
+        data = await asyncio.to_thread(_gather_in_own_session, db.get_bind(), user.id, target_date)
+        digest = data_hash(data, user.role)
+
+        # Another request may have generated it while we waited for the lock
+        db.expire_all()
+        snapshot = _load_snapshot(db, user.id, target_date)
+        now = datetime.utcnow()
+        if snapshot is not None and snapshot.data_hash == digest and snapshot.source != "fallback":
+            snapshot.checked_at = now
+            db.commit()
+            return _snapshot_response(snapshot, cached=True)
+
+        if not data:
+            brief_text, source = NO_DATA_BRIEF, "empty"
+        else:
+            brief_text = await _generate_brief_with_gemini(data, user.role.value, user.full_name, str(target_date))
+            source = "ai"
+            if not brief_text:
+                brief_text, source = fallback_brief(data, user.role), "fallback"
+
+        if snapshot is None:
+            snapshot = DailyBriefSnapshot(user_id=user.id, brief_date=target_date)
+            db.add(snapshot)
+        snapshot.data_hash = digest
+        snapshot.data_json = json.dumps(data, default=str)
+        snapshot.brief_text = brief_text
+        snapshot.source = source
+        snapshot.generated_at = now
+        snapshot.checked_at = now
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another worker stored the same user/date first; theirs is just as good
+            db.rollback()
+            snapshot = _load_snapshot(db, user.id, target_date)
+            return _snapshot_response(snapshot, cached=True)
+        db.refresh(snapshot)
+        return _snapshot_response(snapshot, cached=False)
+
+
+# ============== SCHEDULE ==============
+
+def _schedule_times() -> List[Tuple[int, int]]:
+    times = []
+    for part in settings.BRIEF_SCHEDULE_TIMES.split(","):
+        part = part.strip()
+        if part:
+            hour, minute = part.split(":")
+            times.append((int(hour), int(minute)))
+    return sorted(times)
+
+
+def next_run_at(now_utc: datetime) -> Optional[datetime]:
+    """The next BRIEF_SCHEDULE_TIMES slot (Dubai time, UTC+4) after now, as naive UTC."""
+    times = _schedule_times()
+    if not times:
+        return None
+    local_now = now_utc + timedelta(hours=4)
+    for day_offset in (0, 1):
+        day = local_now.date() + timedelta(days=day_offset)
+        for hour, minute in times:
+            slot = datetime(day.year, day.month, day.day, hour, minute)
+            if slot > local_now:
+                return slot - timedelta(hours=4)
+    return None
+
+
+def seconds_until_next_run(now_utc: datetime) -> Optional[float]:
+    """Seconds from now until the next BRIEF_SCHEDULE_TIMES slot."""
+    run_at = next_run_at(now_utc)
+    return (run_at - now_utc).total_seconds() if run_at else None
+
+
+class BriefScheduler:
+    """
+    Pre-generates briefs on a schedule. start() and stop() run inside the app lifespan.
+    Every worker process runs one; claim() makes sure each slot is generated only once.
+    """
+
+    def __init__(self, session_factory: Callable = SessionLocal):
+        self.session_factory = session_factory
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is None and settings.BRIEF_SCHEDULER_ENABLED and _schedule_times():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        after = datetime.utcnow()
+        while True:
+            run_at = next_run_at(after)
+            await asyncio.sleep(max(0.0, (run_at - datetime.utcnow()).total_seconds()))
+            after = run_at
+            try:
+                if not await asyncio.to_thread(self.claim, run_at):
+                    logger.info(f"Scheduled daily briefs for {run_at} taken by another worker")
+                    continue
+                result = await self.run_once()
+                await asyncio.to_thread(self.finish, run_at)
+                logger.info(f"Scheduled daily briefs: {result}")
+            except Exception as e:
+                logger.error(f"Scheduled daily brief run failed: {e}")
+
+    def claim(self, run_at: datetime) -> bool:
+        """Claim a scheduled slot (blocking). The primary key lets only one worker's insert succeed."""
+        db = self.session_factory()
+        try:
+            db.add(DailyBriefRun(run_at=run_at))
+            db.commit()
+            return True
+        except IntegrityError:
+            db.rollback()
+            return False
+        finally:
+            db.close()
+
+    def finish(self, run_at: datetime):
+        db = self.session_factory()
+        try:
+            db.query(DailyBriefRun).filter(DailyBriefRun.run_at == run_at).update(
+                {"finished_at": datetime.utcnow()}, synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    async def run_once(self, target_date: Optional[date] = None) -> dict:
+        """Bring every manager's (and optionally staff's) brief for the date up to date."""
+        target_date = target_date or get_today()
+        counts = {"generated": 0, "unchanged": 0, "failed": 0}
+        db = self.session_factory()
+        try:
+            query = db.query(User).filter(User.is_active == True)
+            if not settings.BRIEF_SCHEDULE_INCLUDE_STAFF:
+                query = query.filter(User.role != UserRole.STAFF)
+            for user in query.order_by(User.id).all():
+                try:
+                    result = await get_brief(db, user, target_date, refresh=True)
+                    counts["unchanged" if result["cached"] else "generated"] += 1
+                except Exception as e:
+                    db.rollback()
+                    counts["failed"] += 1
+                    logger.error(f"Daily brief for user {user.id} failed: {e}")
+        finally:
+            db.close()
+        return counts
+
+
+brief_scheduler = BriefScheduler()
@@ -1,40 +1,242 @@
 """
 Email service
-Sends HTML emails via SMTP (supports TLS on port 587)
+Sends HTML emails via SMTP (supports TLS on port 587).
+
+Reports go through an outbox: queue_email() stores an EmailJob and returns at once;
+a background worker drains due jobs over one reused SMTP connection and retries
+failures with exponential backoff.
 """
 
+import asyncio
 import smtplib
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
+from typing import Callable, List, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
 
+from models.email_outbox import EmailJob, EmailJobStatus
 from utils.config import settings
+from utils.database import SessionLocal
 
 logger = logging.getLogger(__name__)
 
+# Errors that will not go away on retry
+PERMANENT_ERRORS = (ValueError, smtplib.SMTPRecipientsRefused, smtplib.SMTPAuthenticationError)
 
-def send_email(to_emails: list[str], subject: str, html_body: str):
-    """
-    Send an HTML email to one or more recipients.
-    Raises ValueError if SMTP is not configured.
-    Raises smtplib exceptions on connection / auth failures.
-    """
-    if not settings.SMTP_HOST or not settings.SMTP_USER:
-        raise ValueError("SMTP not configured")
 
+def _build_message(to_emails: List[str], subject: str, html_body: str) -> MIMEMultipart:
     msg = MIMEMultipart("alternative")
     msg["Subject"] = subject
     msg["From"] = settings.SMTP_FROM
     msg["To"] = ", ".join(to_emails)
     msg.attach(MIMEText(html_body, "html"))
+    return msg
 
-    logger.info(f"Sending email '{subject}' to {to_emails} via {settings.SMTP_HOST}:{settings.SMTP_PORT}")
 
-    with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT) as server:
-        server.ehlo()
-        server.starttls()
+class SMTPConnection:
+    """
+    One SMTP session reused across sends: connect + STARTTLS + login happen once,
+    then each message is a single DATA exchange. Idle sessions are probed with NOOP
+    and reopened if the server has dropped them.
+    """
+
+    def __init__(self):
+        self._server: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT, timeout=settings.SMTP_TIMEOUT_SECONDS)
         server.ehlo()
-        server.login(settings.SMTP_USER, settings.SMTP_PASS)
-        server.sendmail(settings.SMTP_FROM, to_emails, msg.as_string())
+        if settings.SMTP_STARTTLS:
+            server.starttls()
+            server.ehlo()
+        if settings.SMTP_USER:
+            server.login(settings.SMTP_USER, settings.SMTP_PASS)
+        return server
+
+    def _get_server(self) -> smtplib.SMTP:
+        if self._server is not None and time.monotonic() - self._last_used > settings.SMTP_IDLE_SECONDS:
+            try:
+                if self._server.noop()[0] != 250:
+                    self.close()
+            except smtplib.SMTPException:
+                self.close()
+        if self._server is None:
+            self._server = self._connect()
+        return self._server
+
+    def send(self, to_emails: List[str], subject: str, html_body: str):
+        if not settings.SMTP_HOST:
+            raise ValueError("SMTP not configured")
+        msg = _build_message(to_emails, subject, html_body).as_string()
+        with self._lock:
+            try:
+                self._get_server().sendmail(settings.SMTP_FROM, to_emails, msg)
+            except smtplib.SMTPServerDisconnected:
+                # Server closed the reused session between sends — reconnect once
+                self.close()
+                self._get_server().sendmail(settings.SMTP_FROM, to_emails, msg)
+            self._last_used = time.monotonic()
 
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            self._server = None
+
+
+def send_email(to_emails: list[str], subject: str, html_body: str):
+    """
+    Send an HTML email to one or more recipients right away on a fresh connection.
+    Raises ValueError if SMTP is not configured.
+    Raises smtplib exceptions on connection / auth failures.
+    """
+    logger.info(f"Sending email '{subject}' to {to_emails} via {settings.SMTP_HOST}:{settings.SMTP_PORT}")
+    connection = SMTPConnection()
+    try:
+        connection.send(to_emails, subject, html_body)
+    finally:
+        connection.close()
     logger.info(f"Email sent successfully to {to_emails}")
+
+
+# ============== OUTBOX ==============
+
+def queue_email(db: Session, to_emails: List[str], subject: str, html_body: str,
+                created_by_id: Optional[int] = None) -> EmailJob:
+    """Persist an email for background delivery and wake the worker."""
+    job = EmailJob(
+        recipients=",".join(to_emails),
+        subject=subject,
+        html_body=html_body,
+        status=EmailJobStatus.QUEUED,
+        next_attempt_at=datetime.utcnow(),
+        created_by_id=created_by_id,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    email_outbox.wake()
+    return job
+
+
+class EmailOutbox:
+    """Background worker that drains due EmailJobs. start() and stop() run inside the app lifespan."""
+
+    def __init__(self, session_factory: Callable = SessionLocal):
+        self.session_factory = session_factory
+        self.connection = SMTPConnection()
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self):
+        if self.running or not settings.EMAIL_OUTBOX_ENABLED:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        # One thread so every send shares the worker's SMTP session
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="smtp")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if not self.running:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        await self._loop.run_in_executor(self._executor, self.connection.close)
+        self._executor.shutdown(wait=True)
+        self._task = None
+        self._executor = None
+        self._loop = None
+
+    def wake(self):
+        """Nudge the worker (safe from any thread); a no-op when it isn't running."""
+        if self.running:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _run(self):
+        while True:
+            try:
+                while await self._loop.run_in_executor(self._executor, self.process_next):
+                    pass
+            except Exception as e:
+                logger.error(f"Email outbox worker error: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), settings.EMAIL_OUTBOX_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def _claim(self, db: Session) -> Optional[EmailJob]:
+        """Take the oldest due job. The conditional UPDATE makes the claim safe across workers."""
+        now = datetime.utcnow()
+        due = or_(EmailJob.status == EmailJobStatus.QUEUED, EmailJob.status == EmailJobStatus.SENDING)
+        job = (
+            db.query(EmailJob)
+            .filter(due, EmailJob.next_attempt_at <= now)
+            .order_by(EmailJob.next_attempt_at, EmailJob.id)
+            .first()
+        )
+        if job is None:
+            return None
+        lease = now + timedelta(seconds=settings.EMAIL_SEND_LEASE_SECONDS)
+        claimed = db.query(EmailJob).filter(
+            EmailJob.id == job.id,
+            EmailJob.status == job.status,
+            EmailJob.next_attempt_at == job.next_attempt_at,
+        ).update({"status": EmailJobStatus.SENDING, "next_attempt_at": lease}, synchronize_session=False)
+        db.commit()
+        if not claimed:
+            return self._claim(db)
+        db.refresh(job)
+        return job
+
+    def process_next(self) -> bool:
+        """Deliver one due job (blocking). Returns False when nothing is due."""
+        db = self.session_factory()
+        try:
+            job = self._claim(db)
+            if job is None:
+                return False
+
+            job.attempts += 1
+            try:
+                self.connection.send(job.recipient_list, job.subject, job.html_body)
+            except Exception as e:
+                job.last_error = str(e)[:1000]
+                if isinstance(e, PERMANENT_ERRORS) or job.attempts >= settings.EMAIL_MAX_ATTEMPTS:
+                    job.status = EmailJobStatus.FAILED
+                    logger.error(f"Email job {job.id} failed after {job.attempts} attempt(s): {e}")
+                else:
+                    delay = settings.EMAIL_RETRY_BASE_SECONDS * (2 ** (job.attempts - 1))
+                    job.status = EmailJobStatus.QUEUED
+                    job.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+                    logger.warning(f"Email job {job.id} attempt {job.attempts} failed, retrying in {delay}s: {e}")
+            else:
+                job.status = EmailJobStatus.SENT
+                job.sent_at = datetime.utcnow()
+                job.last_error = None
+                logger.info(f"Email job {job.id} sent to {job.recipient_list}")
+            db.commit()
+            return True
+        finally:
+            db.close()
+
+
+email_outbox = EmailOutbox()
@@ -0,0 +1,256 @@
+"""
+Streaming spreadsheet export
+Rows are read with server-side cursors (yield_per) and written out as they arrive,
+so memory stays flat however many rows an export has.
+
+- CSV streams from the first row: the header goes out before the query runs.
+- XLSX uses openpyxl's write-only mode, which spools rows to a temp file. The zip
+  container can only be assembled once the sheet is complete; it is then streamed
+  from disk in chunks.
+
+Sources yield plain tuples matching their column list:
+- expiry_matrix_rows:  one row per item, a quantity/expiry column pair per branch
+- daily_sales_rows:    one row per submitted window in a date range
+- tracker_month_rows:  budget vs actual per branch per day (merge of two cursors)
+"""
+
+import codecs
+import csv
+import io
+import re
+import tempfile
+from datetime import date
+from itertools import groupby
+from typing import Iterable, Iterator, List, Sequence, Tuple
+
+import openpyxl
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models.expiry import ExpiryRequestBranch, ExpiryRequestItem, ExpiryResponse
+from models.sales import BranchDaySales, DailyBudget, DailySales
+from models.user import User
+from services import reference_data
+from services.budget_tracker import tracker_metrics
+
+# Rows fetched per round trip from the server-side cursor
+YIELD_PER = 1000
+# CSV rows buffered per chunk sent to the client
+CSV_FLUSH_ROWS = 500
+XLSX_CHUNK_BYTES = 64 * 1024
+
+CSV_MEDIA_TYPE = "text/csv; charset=utf-8"
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+# ============== WRITERS ==============
+
+def iter_csv(columns: Sequence[str], rows: Iterable[Sequence]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    # BOM so Excel opens the UTF-8 file with the right encoding
+    yield codecs.BOM_UTF8 + buffer.getvalue().encode("utf-8")
+    buffer.seek(0)
+    buffer.truncate()
+
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= CSV_FLUSH_ROWS:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if pending:
+        yield buffer.getvalue().encode("utf-8")
+
+
+_INVALID_SHEET_CHARS = re.compile(r"[\\/?*:\[\]]")
+DEFAULT_SHEET_TITLE = "Export"
+
+
+def safe_sheet_title(title: str) -> str:
+    """A valid Excel sheet name for a free-text title (no / \\ ? * : [ ], max 31 chars)."""
+    cleaned = " ".join(_INVALID_SHEET_CHARS.sub(" ", title or "").split())[:31].strip(" '")
+    return cleaned or DEFAULT_SHEET_TITLE
+
+
+def iter_xlsx(title: str, columns: Sequence[str], rows: Iterable[Sequence]) -> Iterator[bytes]:
+    """
+    The workbook and sheet are created here, before any response is started, so a
+    bad title fails the request instead of truncating a download already under way.
+    """
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(title=safe_sheet_title(title))
+    ws.append(list(columns))
+    return _xlsx_chunks(wb, ws, rows)
+
+
+def _xlsx_chunks(wb, ws, rows: Iterable[Sequence]) -> Iterator[bytes]:
+    for row in rows:
+        ws.append(list(row))
+    with tempfile.TemporaryFile() as tmp:
+        wb.save(tmp)
+        tmp.seek(0)
+        while chunk := tmp.read(XLSX_CHUNK_BYTES):
+            yield chunk
+
+
+def export_response(fmt: str, filename: str, sheet_title: str, columns: Sequence[str], rows: Iterable[Sequence]) -> StreamingResponse:
+    """
+    StreamingResponse for rows in "csv" or "xlsx". rows should be a lazy source:
+    Starlette drains it in a worker thread, and the request's session stays open
+    until the response has been sent.
+    """
+    if fmt == "xlsx":
+        body, media_type = iter_xlsx(sheet_title, columns, rows), XLSX_MEDIA_TYPE
+    else:
+        body, media_type = iter_csv(columns, rows), CSV_MEDIA_TYPE
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'},
+    )
+
+
+def _branch_label(db: Session, branch_id: int) -> Tuple[str, str]:
+    branch = reference_data.get_branch(db, branch_id)
+    return (branch.code or "", branch.name) if branch else ("", f"Branch {branch_id}")
+
+
+# ============== EXPIRY RESPONSE MATRIX ==============
+
+def expiry_matrix_columns(db: Session, request_id: int) -> Tuple[List[str], List[int]]:
+    """Column headers and the branch id behind each quantity/expiry pair."""
+    branch_ids = list(db.execute(
+        select(ExpiryRequestBranch.branch_id)
+        .where(ExpiryRequestBranch.expiry_request_id == request_id)
+        .order_by(ExpiryRequestBranch.branch_id)
+    ).scalars())
+    columns = ["Product", "Expected Expiry"]
+    for branch_id in branch_ids:
+        name = _branch_label(db, branch_id)[1]
+        columns += [f"{name} Qty", f"{name} Expiry"]
+    return columns, branch_ids
+
+
+def expiry_matrix_rows(db: Session, request_id: int, branch_ids: List[int]) -> Iterator[tuple]:
+    position = {branch_id: i for i, branch_id in enumerate(branch_ids)}
+    stmt = (
+        select(
+            ExpiryRequestItem.id,
+            ExpiryRequestItem.product_name,
+            ExpiryRequestItem.expiry_date,
+            ExpiryResponse.branch_id,
+            ExpiryResponse.quantity,
+            ExpiryResponse.expiry_date.label("response_expiry"),
+        )
+        .outerjoin(ExpiryResponse, ExpiryResponse.expiry_request_item_id == ExpiryRequestItem.id)
+        .where(ExpiryRequestItem.expiry_request_id == request_id)
+        .order_by(ExpiryRequestItem.sort_order, ExpiryRequestItem.id)
+        .execution_options(yield_per=YIELD_PER)
+    )
+    # Responses arrive grouped by item, so each item's row is complete when its group ends
+    for _, group in groupby(db.execute(stmt), key=lambda r: r.id):
+        cells = [None] * (2 * len(branch_ids))
+        first = None
+        for r in group:
+            first = first or r
+            i = position.get(r.branch_id)
+            if i is not None:
+                cells[2 * i] = r.quantity
+                cells[2 * i + 1] = r.response_expiry
+        yield (first.product_name, first.expiry_date, *cells)
+
+
+# ============== DAILY SALES ==============
+
+DAILY_SALES_COLUMNS = [
+    "Date", "Branch Code", "Branch", "Window",
+    "Gross Sales", "Net Sales", "GC", "ATV", "Cash Sales", "Cash GC",
+    "HD Gross", "HD Net", "HD Orders",
+    "Deliveroo Gross", "Deliveroo Net", "Deliveroo Orders",
+    "Cool Mood Gross", "Cool Mood Net", "Cool Mood Orders",
+    "Submitted By", "Notes",
+]
+
+
+def daily_sales_rows(db: Session, branch_ids: List[int], start_date: date, end_date: date) -> Iterator[tuple]:
+    reference_data.get_branches(db, active_only=False)  # load names before the cursor opens
+    stmt = (
+        select(
+            DailySales.date, DailySales.branch_id, DailySales.sales_window,
+            DailySales.gross_sales, DailySales.total_sales, DailySales.transaction_count, DailySales.atv,
+            DailySales.cash_sales, DailySales.cash_gc,
+            DailySales.hd_gross_sales, DailySales.hd_net_sales, DailySales.hd_orders,
+            DailySales.deliveroo_gross_sales, DailySales.deliveroo_net_sales, DailySales.deliveroo_orders,
+            DailySales.cm_gross_sales, DailySales.cm_net_sales, DailySales.cm_orders,
+            User.full_name, DailySales.notes,
+        )
+        .outerjoin(User, User.id == DailySales.submitted_by_id)
+        .where(
+            DailySales.branch_id.in_(branch_ids),
+            DailySales.date >= start_date,
+            DailySales.date <= end_date,
+        )
+        .order_by(DailySales.date, DailySales.branch_id, DailySales.id)
+        .execution_options(yield_per=YIELD_PER)
+    )
+    for r in db.execute(stmt):
+        code, name = _branch_label(db, r.branch_id)
+        window = r.sales_window.value if hasattr(r.sales_window, "value") else r.sales_window
+        yield (r.date, code, name, window, *r[3:])
+
+
+# ============== TRACKER MONTH ==============
+
+TRACKER_COLUMNS = [
+    "Date", "Day", "Branch Code", "Branch",
+    "Budget", "LY Sales", "LY GC", "Actual Gross", "Actual GC",
+    "Achievement %", "Remaining", "ATV", "LY ATV", "Growth vs LY %", "Windows", "Status",
+]
+_TRACKER_FIELDS = [
+    "budget", "ly_sales", "ly_gc", "actual_gross", "actual_gc",
+    "achievement_pct", "remaining", "atv", "ly_atv", "growth_vs_ly", "windows", "status",
+]
+
+
+def tracker_month_rows(db: Session, branch_ids: List[int], start_date: date, end_date: date) -> Iterator[tuple]:
+    """
+    Budget vs actual per branch-day: budgets and sales are read by two cursors in
+    (branch, date) order and merged, so a day with only one of them still appears.
+    """
+    reference_data.get_branches(db, active_only=False)
+    budgets = db.execute(
+        select(DailyBudget)
+        .where(DailyBudget.branch_id.in_(branch_ids), DailyBudget.budget_date.between(start_date, end_date))
+        .order_by(DailyBudget.branch_id, DailyBudget.budget_date)
+        .execution_options(yield_per=YIELD_PER)
+    ).scalars()
+    sales = db.execute(
+        select(BranchDaySales)
+        .where(BranchDaySales.branch_id.in_(branch_ids), BranchDaySales.date.between(start_date, end_date))
+        .order_by(BranchDaySales.branch_id, BranchDaySales.date)
+        .execution_options(yield_per=YIELD_PER)
+    ).scalars()
+
+    bud, sal = next(budgets, None), next(sales, None)
+    while bud is not None or sal is not None:
+        bud_key = (bud.branch_id, bud.budget_date) if bud is not None else None
+        sal_key = (sal.branch_id, sal.date) if sal is not None else None
+        key = min(k for k in (bud_key, sal_key) if k is not None)
+        row_bud = bud if bud_key == key else None
+        row_sal = sal if sal_key == key else None
+
+        metrics = tracker_metrics(row_bud, row_sal)
+        code, name = _branch_label(db, key[0])
+        day = metrics["day_name"] or key[1].strftime("%a")
+        yield (key[1], day, code, name, *(metrics[f] for f in _TRACKER_FIELDS))
+
+        if row_bud is not None:
+            bud = next(budgets, None)
+        if row_sal is not None:
+            sal = next(sales, None)
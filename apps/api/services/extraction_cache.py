@@ -0,0 +1,118 @@
+"""
+Extraction cache
+Content-addressed cache for vision extraction results. Re-uploading the same
+photo (e.g. after a failed save) returns the earlier result instead of paying
+for another LLM call.
+
+Key = provider + receipt type + prompt hash + sha256 of each normalized image,
+so editing a prompt invalidates its entries automatically.
+"""
+
+import copy
+import functools
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from utils.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionCache:
+    """In-process TTL + LRU cache with hit/miss accounting."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, result, latency)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved_seconds = 0.0
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += entry[2]
+            return copy.deepcopy(entry[1])
+
+    def put(self, key: str, result: dict, latency: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, copy.deepcopy(result), latency)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+            self.saved_seconds = 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "saved_llm_seconds": round(self.saved_seconds, 1),
+            }
+
+
+extraction_cache = ExtractionCache(
+    max_entries=settings.EXTRACTION_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.EXTRACTION_CACHE_TTL_SECONDS,
+)
+
+
+def extraction_key(provider: str, receipt_type: str, prompt: str, image_bytes_list) -> str:
+    """Cache key for one extraction request."""
+    if isinstance(image_bytes_list, bytes):
+        image_bytes_list = [image_bytes_list]
+    digest = hashlib.sha256()
+    digest.update(f"{provider}:{receipt_type}:".encode())
+    digest.update(hashlib.sha256(prompt.encode()).digest())
+    for image_bytes in image_bytes_list:
+        digest.update(hashlib.sha256(image_bytes).digest())
+    return digest.hexdigest()
+
+
+def cached_extraction(provider: str, receipt_type: str, prompt: str) -> Callable:
+    """Decorator: serve an async extract_* function from the extraction cache."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(image_bytes_list):
+            if not settings.EXTRACTION_CACHE_ENABLED:
+                return await fn(image_bytes_list)
+
+            key = extraction_key(provider, receipt_type, prompt, image_bytes_list)
+            cached = extraction_cache.get(key)
+            if cached is not None:
+                logger.info(f"Extraction cache hit: {provider}/{receipt_type}")
+                return cached
+
+            started = time.monotonic()
+            result = await fn(image_bytes_list)
+            extraction_cache.put(key, result, time.monotonic() - started)
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,271 @@
+"""
+File store
+Uploaded files (expiry templates, ...) are kept out of table rows. Content is
+addressed by its SHA-256, so the same file uploaded for many requests is stored
+once; a StoredFile row records the hash, size and content type.
+
+Backends (FILE_STORE_BACKEND):
+- "local": a directory on disk (FILE_STORE_DIR), the default
+- "s3":    any S3-compatible object store; needs boto3, imported only when selected
+
+Saving and garbage collection meet on the stored_files row: save_file upserts the
+row (locking it) before checking for the blob, and delete_file_if_unused locks it
+(SELECT ... FOR UPDATE) before re-counting references. The blob is only deleted once
+the row's deletion has committed, while briefly holding the hash again through a
+placeholder row. So a re-upload of content that is being deleted either waits and
+writes the blob again, or keeps the hash in use so the blob isn't deleted.
+"""
+
+import abc
+import base64
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Iterator, Optional
+
+from sqlalchemy import event, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models.expiry import ExpiryRequest
+from models.stored_file import StoredFile
+from services.bulk_upsert import upsert_rows
+from utils.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class FileStore(abc.ABC):
+    """Blob storage keyed by content hash."""
+
+    @abc.abstractmethod
+    def exists(self, key: str) -> bool:
+        ...
+
+    @abc.abstractmethod
+    def write(self, key: str, data: bytes):
+        ...
+
+    @abc.abstractmethod
+    def iter_chunks(self, key: str, chunk_size: int) -> Iterator[bytes]:
+        ...
+
+    @abc.abstractmethod
+    def delete(self, key: str):
+        ...
+
+
+class LocalFileStore(FileStore):
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        # Fan out so no single directory grows huge
+        return self.root / key[:2] / key[2:4] / key
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).is_file()
+
+    def write(self, key: str, data: bytes):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename, so readers and concurrent writers of the same content never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+
+    def iter_chunks(self, key: str, chunk_size: int) -> Iterator[bytes]:
+        with open(self._path(key), "rb") as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+
+    def delete(self, key: str):
+        self._path(key).unlink(missing_ok=True)
+
+
+class S3FileStore(FileStore):
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None):
+        import boto3
+        from botocore.exceptions import ClientError
+
+        self._client_error = ClientError
+        self.client = boto3.client("s3", endpoint_url=endpoint_url or None)
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.prefix + key)
+            return True
+        except self._client_error:
+            return False
+
+    def write(self, key: str, data: bytes):
+        self.client.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=data)
+
+    def iter_chunks(self, key: str, chunk_size: int) -> Iterator[bytes]:
+        body = self.client.get_object(Bucket=self.bucket, Key=self.prefix + key)["Body"]
+        try:
+            yield from body.iter_chunks(chunk_size)
+        finally:
+            body.close()
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self.prefix + key)
+
+
+_store: Optional[FileStore] = None
+_store_lock = threading.Lock()
+
+
+def get_file_store() -> FileStore:
+    """The configured backend, created on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            if settings.FILE_STORE_BACKEND == "s3":
+                _store = S3FileStore(
+                    settings.FILE_STORE_S3_BUCKET,
+                    settings.FILE_STORE_S3_PREFIX,
+                    settings.FILE_STORE_S3_ENDPOINT_URL,
+                )
+            else:
+                _store = LocalFileStore(settings.FILE_STORE_DIR)
+        return _store
+
+
+# ============== FILES ==============
+
+def save_file(db: Session, data: bytes, content_type: str) -> StoredFile:
+    """
+    Store data (deduplicated by SHA-256) and return its StoredFile row; the caller commits.
+    The row is upserted first: that waits for any delete of the same content to finish,
+    and the blob check after it then sees whether the blob is still there.
+    """
+    sha256 = hashlib.sha256(data).hexdigest()
+    # Insert-or-touch, so two uploads of the same file at once share one row
+    upsert_rows(db, StoredFile, [{
+        "sha256": sha256,
+        "size_bytes": len(data),
+        "content_type": content_type,
+    }], key_columns=("sha256",))
+    store = get_file_store()
+    if not store.exists(sha256):
+        store.write(sha256, data)
+    return db.execute(select(StoredFile).where(StoredFile.sha256 == sha256)).scalar_one()
+
+
+def iter_file(stored: StoredFile, chunk_size: Optional[int] = None) -> Iterator[bytes]:
+    """Yield a stored file's content in chunks (for StreamingResponse)."""
+    return get_file_store().iter_chunks(stored.sha256, chunk_size or settings.FILE_STORE_CHUNK_BYTES)
+
+
+def file_exists(stored: StoredFile) -> bool:
+    return get_file_store().exists(stored.sha256)
+
+
+def delete_file_if_unused(db: Session, file_id: Optional[int]) -> bool:
+    """
+    Drop a StoredFile row no expiry request references any more; its blob is deleted
+    once the caller commits (which it should do straight away, as the row stays locked).
+    Returns True if the file was deleted.
+    """
+    if file_id is None:
+        return False
+    stored = db.execute(
+        select(StoredFile).where(StoredFile.id == file_id).with_for_update()
+    ).scalar_one_or_none()
+    if stored is None:
+        return False
+    in_use = db.execute(
+        select(func.count()).select_from(ExpiryRequest).where(ExpiryRequest.template_file_id == file_id)
+    ).scalar()
+    if in_use:
+        return False
+    db.delete(stored)
+    db.flush()
+    db.info.setdefault(_PENDING_BLOBS_KEY, set()).add(stored.sha256)
+    return True
+
+
+_PENDING_BLOBS_KEY = "file_store_delete_blobs"
+
+
+@event.listens_for(Session, "after_commit")
+def _delete_blobs_on_commit(session):
+    pending = session.info.pop(_PENDING_BLOBS_KEY, None)
+    if pending:
+        _delete_unreferenced_blobs(session.get_bind(), pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _keep_blobs_on_rollback(session):
+    session.info.pop(_PENDING_BLOBS_KEY, None)
+
+
+def _delete_unreferenced_blobs(bind, sha256s):
+    """
+    Delete blobs whose rows are gone, each while a placeholder row holds its hash:
+    a save_file of the same content then waits and writes the blob again, and if the
+    content was saved again first the placeholder conflicts and the blob is kept.
+    """
+    with Session(bind=bind) as db:
+        for sha256 in sha256s:
+            try:
+                db.add(StoredFile(sha256=sha256, size_bytes=0))
+                db.flush()
+            except IntegrityError:
+                db.rollback()
+                continue
+            delete_blob(sha256)
+            db.rollback()
+
+
+def delete_blob(sha256: Optional[str]):
+    if sha256:
+        try:
+            get_file_store().delete(sha256)
+        except Exception as e:
+            logger.warning(f"Could not delete stored file {sha256}: {e}")
+
+
+# ============== MIGRATION ==============
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def move_legacy_expiry_templates(db: Session) -> int:
+    """
+    Move base64 templates still held in expiry_requests.template_file_data into the
+    file store, one row per transaction so memory stays bounded. Returns rows moved.
+    """
+    ids = db.execute(
+        select(ExpiryRequest.id).where(ExpiryRequest.template_file_data.isnot(None)).order_by(ExpiryRequest.id)
+    ).scalars().all()
+    moved = 0
+    for request_id in ids:
+        encoded = db.execute(
+            select(ExpiryRequest.template_file_data).where(ExpiryRequest.id == request_id)
+        ).scalar()
+        try:
+            data = base64.b64decode(encoded)
+        except (ValueError, TypeError) as e:
+            logger.warning(f"Expiry request {request_id}: template is not valid base64, leaving it in place ({e})")
+            continue
+        stored = save_file(db, data, XLSX_CONTENT_TYPE)
+        db.execute(
+            update(ExpiryRequest.__table__)
+            .where(ExpiryRequest.id == request_id)
+            .values(template_file_id=stored.id, template_file_data=None)
+        )
+        db.commit()
+        moved += 1
+    return moved
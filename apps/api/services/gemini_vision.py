@@ -12,6 +12,8 @@ import logging
 import re
 
 from utils.config import settings
+from services.extraction_cache import cached_extraction
+from services.llm_gateway import GEMINI, LLMTimeoutError, call_llm
 
 logger = logging.getLogger(__name__)
 
@@ -345,10 +347,16 @@ Return ONLY valid JSON, no markdown code blocks:
 
 def _get_client() -> genai.Client:
     """Return a configured Gemini client."""
+    from google.genai import types
+
     api_key = settings.GEMINI_API_KEY
     if not api_key:
         raise ValueError("GEMINI_API_KEY not configured")
-    return genai.Client(api_key=api_key)
+    # HTTP timeout (ms) frees the worker thread even if the gateway gave up waiting
+    return genai.Client(
+        api_key=api_key,
+        http_options=types.HttpOptions(timeout=int(settings.LLM_TIMEOUT_SECONDS * 1000)),
+    )
 
 
 def _parse_json_response(text: str) -> dict:
@@ -412,12 +420,15 @@ async def _call_gemini_with_retry(model: str, contents: list, config=None) -> st
                 kwargs = {"model": m, "contents": contents}
                 if config:
                     kwargs["config"] = config
-                response = client.models.generate_content(**kwargs)
+                response = await call_llm(GEMINI, client.models.generate_content, **kwargs)
                 if response.text:
                     if m != model:
                         logger.info(f"Used fallback model {m} (primary {model} unavailable)")
                     return response.text
                 raise ValueError("Empty response from Gemini")
+            except LLMTimeoutError:
+                # Retrying a hung call would hold the request for minutes — fail fast
+                raise
             except Exception as e:
                 last_error = e
                 err_str = str(e)
@@ -445,6 +456,7 @@ async def extract_pos_categories(image_bytes: bytes) -> dict:
     return _parse_json_response(text)
 
 
+@cached_extraction("gemini", "pos_combined", POS_COMBINED_PROMPT)
 async def extract_pos_combined(image_bytes_list) -> dict:
     """Extract ALL POS data (sales summary + categories + items) in one call.
     Accepts a single bytes object or a list of bytes (multi-image).
@@ -471,6 +483,7 @@ async def extract_pos_combined(image_bytes_list) -> dict:
     return data
 
 
+@cached_extraction("gemini", "hd", HOME_DELIVERY_PROMPT)
 async def extract_hd_sales(image_bytes: bytes) -> dict:
     """Extract Home Delivery data from report photo."""
     img = _image_from_bytes(image_bytes)
@@ -478,6 +491,7 @@ async def extract_hd_sales(image_bytes: bytes) -> dict:
     return _parse_json_response(text)
 
 
+@cached_extraction("gemini", "deliveroo", DELIVEROO_PROMPT)
 async def extract_deliveroo_sales(image_bytes: bytes) -> dict:
     """Extract Deliveroo data from dashboard photo."""
     img = _image_from_bytes(image_bytes)
@@ -485,6 +499,7 @@ async def extract_deliveroo_sales(image_bytes: bytes) -> dict:
     return _parse_json_response(text)
 
 
+@cached_extraction("gemini", "budget_sheet", BUDGET_SHEET_PROMPT)
 async def extract_budget_sheet(image_bytes: bytes) -> dict:
     """Extract monthly budget sheet data from photo (DAILY SALES TRACKER format)."""
     from google.genai import types
@@ -545,6 +560,7 @@ If no times found, return both as null.
 """
 
 
+@cached_extraction("gemini", "visit_times", VISIT_TIME_PROMPT)
 async def extract_visit_times(image_bytes: bytes) -> dict:
     """Extract swipe in/out times from a POS or clock photo."""
     from google.genai import types
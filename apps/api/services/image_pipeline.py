@@ -0,0 +1,109 @@
+"""
+Image normalization pipeline
+Turns uploaded photos (JPEG/PNG/WebP/HEIC...) into a single size-bounded JPEG
+for the vision services: decode once, resize once, encode once.
+Images are normalized in parallel on a process pool so PIL work never runs on
+the event loop thread.
+"""
+
+import asyncio
+import io
+import logging
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from PIL import Image
+
+from utils.config import settings
+
+logger = logging.getLogger(__name__)
+
+MAX_DIMENSION = 1600
+JPEG_QUALITY = 90          # unchanged size — keep detail for OCR
+RESIZED_JPEG_QUALITY = 85  # downscaled images can take a little more compression
+
+
+def normalize_image(raw: bytes, max_dim: int = MAX_DIMENSION) -> Tuple[bytes, dict]:
+    """
+    Decode, downscale and re-encode one image as JPEG.
+    Returns (jpeg_bytes, timings). Undecodable input is passed through unchanged
+    so the vision model can still try it.
+    """
+    timings = {"input_bytes": len(raw)}
+    started = time.perf_counter()
+    try:
+        img = Image.open(io.BytesIO(raw))
+        original_size = img.size
+        # JPEG draft mode lets libjpeg decode at 1/2, 1/4 or 1/8 scale directly,
+        # skipping most of the work for 12MP phone photos
+        if img.format == "JPEG" and max(img.size) > max_dim * 2:
+            ratio = max_dim / max(img.size)
+            img.draft("RGB", (int(img.size[0] * ratio), int(img.size[1] * ratio)))
+        img.load()
+        t_decoded = time.perf_counter()
+        timings["decode_ms"] = round((t_decoded - started) * 1000, 1)
+
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        resized = max(img.size) > max_dim
+        if resized:
+            ratio = max_dim / max(img.size)
+            img = img.resize((int(img.size[0] * ratio), int(img.size[1] * ratio)), Image.LANCZOS)
+        t_resized = time.perf_counter()
+        timings["resize_ms"] = round((t_resized - t_decoded) * 1000, 1)
+
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=RESIZED_JPEG_QUALITY if resized else JPEG_QUALITY)
+        output = buf.getvalue()
+        timings["encode_ms"] = round((time.perf_counter() - t_resized) * 1000, 1)
+        timings["original_size"] = list(original_size)
+        timings["output_size"] = list(img.size)
+    except Exception as e:
+        logger.warning(f"Image normalization skipped: {e}")
+        output = raw
+        timings["skipped"] = str(e)[:200]
+
+    timings["output_bytes"] = len(output)
+    timings["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return output, timings
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    """Shared process pool, created on first use. None when IMAGE_WORKERS is 0."""
+    global _pool
+    if settings.IMAGE_WORKERS <= 0:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=settings.IMAGE_WORKERS)
+    return _pool
+
+
+async def normalize_images(raw_images: List[bytes]) -> Tuple[List[bytes], List[dict]]:
+    """Normalize several uploads in parallel. Returns (images, per-image timings) in input order."""
+    loop = asyncio.get_running_loop()
+    pool = _get_pool()
+    if pool is None:
+        results = await asyncio.gather(*[asyncio.to_thread(normalize_image, raw) for raw in raw_images])
+    else:
+        results = await asyncio.gather(*[loop.run_in_executor(pool, normalize_image, raw) for raw in raw_images])
+    images = [image for image, _ in results]
+    timings = [timing for _, timing in results]
+    logger.info(f"Normalized {len(images)} image(s): {[t['total_ms'] for t in timings]} ms")
+    return images, timings
+
+
+def shutdown_pipeline():
+    """Stop the worker processes (called on application shutdown)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
@@ -0,0 +1,76 @@
+"""
+LLM Gateway
+Runs blocking Gemini / Claude SDK calls off the event loop.
+Each provider gets its own bounded thread pool, so its pool size is its
+concurrency limit and a slow provider only queues its own calls.
+"""
+
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from utils.config import settings
+
+logger = logging.getLogger(__name__)
+
+GEMINI = "gemini"
+CLAUDE = "claude"
+
+
+class LLMTimeoutError(TimeoutError):
+    """Raised when a provider call exceeds the gateway timeout."""
+
+
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def _provider_limit(provider: str) -> int:
+    limits = {
+        GEMINI: settings.LLM_GEMINI_CONCURRENCY,
+        CLAUDE: settings.LLM_CLAUDE_CONCURRENCY,
+    }
+    if provider not in limits:
+        raise ValueError(f"Unknown LLM provider: {provider}")
+    return max(1, limits[provider])
+
+
+def _get_executor(provider: str) -> ThreadPoolExecutor:
+    """Return the provider's worker pool, creating it on first use."""
+    executor = _executors.get(provider)
+    if executor is None:
+        with _executors_lock:
+            executor = _executors.get(provider)
+            if executor is None:
+                executor = ThreadPoolExecutor(
+                    max_workers=_provider_limit(provider),
+                    thread_name_prefix=f"llm-{provider}",
+                )
+                _executors[provider] = executor
+    return executor
+
+
+async def call_llm(provider: str, fn: Callable, *args, timeout: Optional[float] = None, **kwargs):
+    """
+    Run a blocking SDK call on the provider's pool and await it.
+    Calls beyond the provider's limit wait in its queue; the timeout covers queueing too.
+    """
+    timeout = timeout or settings.LLM_TIMEOUT_SECONDS
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_get_executor(provider), functools.partial(fn, *args, **kwargs))
+    try:
+        return await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"{provider} call timed out after {timeout}s")
+        raise LLMTimeoutError(f"{provider} call timed out after {timeout}s")
+
+
+def shutdown_gateway(wait: bool = False):
+    """Stop all provider pools (called on application shutdown)."""
+    with _executors_lock:
+        for executor in _executors.values():
+            executor.shutdown(wait=wait, cancel_futures=True)
+        _executors.clear()
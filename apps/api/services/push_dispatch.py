@@ -0,0 +1,261 @@
+"""
+Push dispatch queue
+Request handlers enqueue web-push messages and return immediately; background
+workers deliver them with bounded concurrency. Transient failures (network,
+429, 5xx) are retried with exponential backoff, and subscriptions the push
+service reports as gone (404/410) are deactivated in one batched UPDATE.
+"""
+
+import asyncio
+import logging
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Optional
+
+from pywebpush import webpush, WebPushException
+
+from models.notification import PushSubscription
+from utils.config import settings
+from utils.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+SENT = "sent"
+STALE = "stale"
+RETRY = "retry"
+FAILED = "failed"
+
+
+@dataclass
+class PushMessage:
+    """One payload for one subscription (plain values, safe to use after the request session closes)."""
+    subscription_id: int
+    endpoint: str
+    p256dh_key: str
+    auth_key: str
+    payload: str
+    attempt: int = 0
+    retry_after: Optional[float] = None
+
+    @classmethod
+    def for_subscription(cls, sub: PushSubscription, payload: str) -> "PushMessage":
+        return cls(sub.id, sub.endpoint, sub.p256dh_key, sub.auth_key, payload)
+
+
+def send_push(message: PushMessage) -> str:
+    """Blocking delivery of one message. Returns SENT, STALE, RETRY or FAILED."""
+    try:
+        webpush(
+            subscription_info={
+                "endpoint": message.endpoint,
+                "keys": {"p256dh": message.p256dh_key, "auth": message.auth_key},
+            },
+            data=message.payload,
+            vapid_private_key=settings.VAPID_PRIVATE_KEY,
+            vapid_claims={"sub": f"mailto:{settings.VAPID_MAILTO}"},
+            timeout=settings.PUSH_TIMEOUT_SECONDS,
+        )
+        return SENT
+    except WebPushException as e:
+        response = getattr(e, "response", None)
+        if response is None:
+            logger.warning(f"Push failed for sub {message.subscription_id}: {e}")
+            return RETRY
+        status_code = response.status_code
+        if status_code in (404, 410):
+            logger.info(f"Push subscription {message.subscription_id} expired (HTTP {status_code}), marking inactive")
+            return STALE
+        if status_code == 429 or status_code >= 500:
+            retry_after = response.headers.get("Retry-After") if response.headers else None
+            if retry_after and str(retry_after).isdigit():
+                message.retry_after = float(retry_after)
+            logger.warning(f"Push throttled/failed for sub {message.subscription_id}: HTTP {status_code}")
+            return RETRY
+        logger.warning(f"Push failed for sub {message.subscription_id}: HTTP {status_code} - {e}")
+        return FAILED
+    except Exception as e:
+        # Connection errors and timeouts from requests
+        logger.warning(f"Push error for sub {message.subscription_id}: {e}")
+        return RETRY
+
+
+def deactivate_subscriptions(session_factory: Callable, subscription_ids: List[int]):
+    """Mark expired subscriptions inactive in one statement."""
+    db = session_factory()
+    try:
+        db.query(PushSubscription).filter(PushSubscription.id.in_(subscription_ids)).update(
+            {"is_active": False}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+class PushDispatcher:
+    """Bounded background sender. start() and stop() run inside the app lifespan."""
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        session_factory: Callable = SessionLocal,
+        sender: Callable[[PushMessage], str] = send_push,
+    ):
+        self._workers = workers
+        self.session_factory = session_factory
+        self.sender = sender
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._retry_handles = set()
+        self._stale: List[int] = []
+        self._lock = threading.Lock()
+        self.counters = {"queued": 0, "sent": 0, "retried": 0, "stale": 0, "failed": 0, "dropped": 0}
+
+    @property
+    def workers(self) -> int:
+        return settings.PUSH_WORKERS if self._workers is None else self._workers
+
+    @property
+    def running(self) -> bool:
+        return self._queue is not None
+
+    # ---- lifecycle ----
+
+    async def start(self):
+        if self.running or self.workers <= 0:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=settings.PUSH_QUEUE_MAX)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="push")
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"Push dispatcher started with {self.workers} workers")
+
+    async def stop(self, timeout: float = 10):
+        """Drain queued messages (up to timeout), then stop workers and flush stale ids."""
+        if not self.running:
+            return
+        for handle in list(self._retry_handles):
+            handle.cancel()
+        self._retry_handles.clear()
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Push dispatcher stopped with {self._queue.qsize()} undelivered messages")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self._flush_stale()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._queue = None
+        self._tasks = []
+        self._executor = None
+        self._loop = None
+
+    # ---- producer side ----
+
+    def enqueue(self, messages: Iterable[PushMessage]) -> int:
+        """
+        Queue messages for delivery; safe to call from the event loop or a worker thread.
+        Without a running dispatcher (scripts, PUSH_WORKERS=0) messages are sent inline.
+        """
+        messages = list(messages)
+        if not messages:
+            return 0
+        if not self.running:
+            self._send_inline(messages)
+            return len(messages)
+
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        for message in messages:
+            if on_loop:
+                self._put(message)
+            else:
+                self._loop.call_soon_threadsafe(self._put, message)
+        return len(messages)
+
+    def _put(self, message: PushMessage):
+        try:
+            self._queue.put_nowait(message)
+            if message.attempt == 0:
+                self.counters["queued"] += 1
+        except asyncio.QueueFull:
+            self.counters["dropped"] += 1
+            logger.error(f"Push queue full, dropped message for sub {message.subscription_id}")
+
+    def _send_inline(self, messages: List[PushMessage]):
+        stale = []
+        for message in messages:
+            outcome = self.sender(message)
+            self._count(FAILED if outcome == RETRY else outcome)
+            if outcome == STALE:
+                stale.append(message.subscription_id)
+        if stale:
+            deactivate_subscriptions(self.session_factory, stale)
+
+    # ---- consumer side ----
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await self._queue.get()
+            try:
+                outcome = await loop.run_in_executor(self._executor, self.sender, message)
+                if outcome == RETRY and message.attempt < settings.PUSH_MAX_RETRIES:
+                    self._schedule_retry(message)
+                else:
+                    self._count(FAILED if outcome == RETRY else outcome)
+                    if outcome == STALE:
+                        self._stale.append(message.subscription_id)
+                if self._stale and (self._queue.qsize() == 0 or len(self._stale) >= 100):
+                    await self._flush_stale()
+            except Exception as e:
+                logger.error(f"Push worker error for sub {message.subscription_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _schedule_retry(self, message: PushMessage):
+        delay = message.retry_after or settings.PUSH_RETRY_BASE_SECONDS * (2 ** message.attempt)
+        delay *= random.uniform(0.8, 1.2)
+        message.attempt += 1
+        message.retry_after = None
+        self.counters["retried"] += 1
+
+        def requeue():
+            self._retry_handles.discard(handle)
+            if self.running:
+                self._put(message)
+
+        handle = self._loop.call_later(delay, requeue)
+        self._retry_handles.add(handle)
+
+    async def _flush_stale(self):
+        stale, self._stale = self._stale, []
+        if not stale:
+            return
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                self._executor, deactivate_subscriptions, self.session_factory, stale
+            )
+        except Exception as e:
+            logger.error(f"Failed to deactivate {len(stale)} stale push subscriptions: {e}")
+
+    def _count(self, outcome: str):
+        with self._lock:
+            self.counters[outcome] += 1
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "workers": self.workers if self.running else 0,
+            "pending": self._queue.qsize() if self.running else 0,
+            "retry_scheduled": len(self._retry_handles),
+        }
+
+
+push_dispatcher = PushDispatcher()
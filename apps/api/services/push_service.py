@@ -5,59 +5,28 @@ Uses pywebpush to send notifications directly to browser push endpoints.
 
 import json
 import logging
-from typing import Optional
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional, Tuple
 
+from sqlalchemy import and_, inspect, or_
 from sqlalchemy.orm import Session
-from pywebpush import webpush, WebPushException
-
+from models.location import Branch
 from models.notification import PushSubscription
 from models.user import User, UserRole
-from models.location import Branch
+from services.push_dispatch import PushMessage, push_dispatcher
+from services.reference_data import get_branch
 from utils.config import settings
+from utils.database import register_invalidation
 
 logger = logging.getLogger(__name__)
 
 
 def _send_to_subscriptions(db: Session, subscriptions: list, payload: str):
-    """Send a push payload to a list of subscriptions. Cleans up stale ones."""
-    sent_count = 0
-    stale_ids = []
-
-    for sub in subscriptions:
-        try:
-            webpush(
-                subscription_info={
-                    "endpoint": sub.endpoint,
-                    "keys": {
-                        "p256dh": sub.p256dh_key,
-                        "auth": sub.auth_key,
-                    },
-                },
-                data=payload,
-                vapid_private_key=settings.VAPID_PRIVATE_KEY,
-                vapid_claims={"sub": f"mailto:{settings.VAPID_MAILTO}"},
-            )
-            sent_count += 1
-        except WebPushException as e:
-            if hasattr(e, "response") and e.response is not None:
-                status_code = e.response.status_code
-                if status_code in (404, 410):
-                    stale_ids.append(sub.id)
-                    logger.info(f"Push subscription {sub.id} expired (HTTP {status_code}), marking inactive")
-                else:
-                    logger.warning(f"Push failed for sub {sub.id}: HTTP {status_code} - {e}")
-            else:
-                logger.warning(f"Push failed for sub {sub.id}: {e}")
-        except Exception as e:
-            logger.error(f"Unexpected push error for sub {sub.id}: {e}")
-
-    if stale_ids:
-        db.query(PushSubscription).filter(PushSubscription.id.in_(stale_ids)).update(
-            {"is_active": False}, synchronize_session=False
-        )
-        db.commit()
-
-    return sent_count
+    """Queue a push payload for a list of subscriptions. Delivery, retries and
+    stale-subscription cleanup happen on the push dispatcher's workers."""
+    return push_dispatcher.enqueue(PushMessage.for_subscription(sub, payload) for sub in subscriptions)
 
 
 def send_push_to_branch(
@@ -94,69 +63,119 @@ def send_push_to_branch(
     })
 
     sent = _send_to_subscriptions(db, subscriptions, payload)
-    logger.info(f"Sent {sent}/{len(subscriptions)} push notifications for branch {branch_id}")
+    logger.info(f"Queued {sent} push notifications for branch {branch_id}")
     return sent
 
 
-def send_push_to_managers(
-    db: Session,
-    branch_id: int,
-    title: str,
-    body: str,
-    url: str = "/dashboard/cake-alerts",
-):
+@dataclass(frozen=True)
+class BranchRecipients:
+    """Branch display name plus every manager user id in its chain."""
+    branch_name: str
+    manager_user_ids: FrozenSet[int]
+
+
+_recipient_cache: Dict[int, Tuple[float, BranchRecipients]] = {}
+_recipient_lock = threading.Lock()
+
+
+def invalidate_recipients(branch_id: Optional[int] = None):
+    """Forget cached manager chains (one branch, or all)."""
+    with _recipient_lock:
+        if branch_id is None:
+            _recipient_cache.clear()
+        else:
+            _recipient_cache.pop(branch_id, None)
+
+
+def get_branch_recipients(db: Session, branch_id: int) -> Optional[BranchRecipients]:
     """
-    Send push notification to all managers responsible for this branch:
-    - Area manager whose area contains this branch
-    - Territory manager whose territory contains this area
+    Resolve the managers responsible for a branch. Cached; user and branch writes in
+    this process drop the cache, PUSH_RECIPIENT_CACHE_TTL_SECONDS bounds staleness across workers:
+    - Area managers whose area contains this branch, plus branch.manager_id
+    - Territory managers of the branch's territory
     - All supreme admins (HQ)
-    Managers subscribe with branch_id=NULL so we find them by user_id.
     """
-    branch = db.query(Branch).filter(Branch.id == branch_id).first()
-    if not branch:
-        return 0
+    now = time.monotonic()
+    with _recipient_lock:
+        entry = _recipient_cache.get(branch_id)
+    if entry is not None and entry[0] > now:
+        return entry[1]
 
-    # Collect user IDs of all managers in the chain
-    manager_user_ids = set()
+    branch = get_branch(db, branch_id)
+    if not branch:
+        return None
 
-    # Area manager
+    chain = [User.role == UserRole.SUPREME_ADMIN]
     if branch.area_id:
-        area_managers = db.query(User).filter(
-            User.area_id == branch.area_id,
-            User.role == UserRole.ADMIN,
-            User.is_active == True,
-        ).all()
-        for u in area_managers:
-            manager_user_ids.add(u.id)
-
-    # Also check branch.manager_id directly
+        chain.append(and_(User.role == UserRole.ADMIN, User.area_id == branch.area_id))
+    if branch.territory_id:
+        chain.append(and_(User.role == UserRole.SUPER_ADMIN, User.territory_id == branch.territory_id))
+    manager_user_ids = {
+        row[0] for row in db.query(User.id).filter(User.is_active == True, or_(*chain)).all()
+    }
     if branch.manager_id:
         manager_user_ids.add(branch.manager_id)
 
-    # Territory managers
-    if branch.territory_id:
-        territory_managers = db.query(User).filter(
-            User.territory_id == branch.territory_id,
-            User.role == UserRole.SUPER_ADMIN,
-            User.is_active == True,
-        ).all()
-        for u in territory_managers:
-            manager_user_ids.add(u.id)
-
-    # Supreme admins (HQ) — always notify
-    hq_admins = db.query(User).filter(
-        User.role == UserRole.SUPREME_ADMIN,
-        User.is_active == True,
-    ).all()
-    for u in hq_admins:
-        manager_user_ids.add(u.id)
+    recipients = BranchRecipients(branch.name, frozenset(manager_user_ids))
+    if settings.PUSH_RECIPIENT_CACHE_TTL_SECONDS > 0:
+        with _recipient_lock:
+            _recipient_cache[branch_id] = (now + settings.PUSH_RECIPIENT_CACHE_TTL_SECONDS, recipients)
+    return recipients
+
+
+# Columns that decide who is in a branch's manager chain
+_RECIPIENT_COLUMNS = {
+    User: ("role", "area_id", "territory_id", "is_active"),
+    Branch: ("name", "area_id", "territory_id", "manager_id"),
+}
+_PENDING_KEY = "push_recipients_invalidate"
+
 
-    if not manager_user_ids:
+def _changes_recipients(obj, session) -> bool:
+    columns = _RECIPIENT_COLUMNS.get(type(obj))
+    if columns is None:
+        return False
+    if obj in session.new or obj in session.deleted:
+        return True
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in columns)
+
+
+def _recipient_changes(session):
+    """Drop manager chains when a user's role/area/territory/active flag or a branch's
+    chain columns change; again after commit, as a concurrent reader may re-cache old rows."""
+    changed = list(session.new) + list(session.dirty) + list(session.deleted)
+    return {"*"} if any(_changes_recipients(obj, session) for obj in changed) else set()
+
+
+register_invalidation(
+    _RECIPIENT_COLUMNS,
+    lambda keys: invalidate_recipients(),
+    _PENDING_KEY,
+    collect=_recipient_changes,
+    bulk_keys=lambda model: {"*"},
+    on_write=lambda session, keys: invalidate_recipients(),
+)
+
+
+def send_push_to_managers(
+    db: Session,
+    branch_id: int,
+    title: str,
+    body: str,
+    url: str = "/dashboard/cake-alerts",
+):
+    """
+    Send push notification to all managers responsible for this branch
+    (see get_branch_recipients). Managers subscribe with branch_id=NULL so we find them by user_id.
+    """
+    recipients = get_branch_recipients(db, branch_id)
+    if not recipients or not recipients.manager_user_ids:
         return 0
 
     # Find push subscriptions for these managers (branch_id IS NULL = admin subscriptions)
     subscriptions = db.query(PushSubscription).filter(
-        PushSubscription.user_id.in_(list(manager_user_ids)),
+        PushSubscription.user_id.in_(list(recipients.manager_user_ids)),
         PushSubscription.is_active == True,
     ).all()
 
@@ -174,41 +193,93 @@ def send_push_to_managers(
     })
 
     sent = _send_to_subscriptions(db, subscriptions, payload)
-    logger.info(f"Sent {sent}/{len(subscriptions)} manager push notifications for branch {branch_id}")
+    logger.info(f"Queued {sent} manager push notifications for branch {branch_id}")
     return sent
 
 
-def check_and_notify_low_stock(
+# ============== LOW STOCK DIGESTS ==============
+
+@dataclass(frozen=True)
+class LowStockEvent:
+    cake_name: str
+    cake_code: str
+    current_quantity: int
+    threshold: int
+
+
+# (branch_id, cake_code) -> (cooldown expiry, quantity when last alerted)
+_recent_alerts: Dict[Tuple[int, str], Tuple[float, int]] = {}
+_recent_alerts_lock = threading.Lock()
+
+
+def _outside_cooldown(branch_id: int, events: List[LowStockEvent]) -> List[LowStockEvent]:
+    """
+    Drop events already alerted for this branch within LOW_STOCK_ALERT_COOLDOWN_SECONDS,
+    unless the cake has since run out. Surviving events restart their cooldown.
+    """
+    now = time.monotonic()
+    fresh = []
+    with _recent_alerts_lock:
+        for low in events:
+            key = (branch_id, low.cake_code)
+            previous = _recent_alerts.get(key)
+            escalated = previous is not None and previous[1] > 0 and low.current_quantity == 0
+            if previous is None or previous[0] <= now or escalated:
+                fresh.append(low)
+                _recent_alerts[key] = (now + settings.LOW_STOCK_ALERT_COOLDOWN_SECONDS, low.current_quantity)
+    return fresh
+
+
+def reset_low_stock_cooldowns():
+    """Forget recently-sent alerts (tests, or after changing thresholds)."""
+    with _recent_alerts_lock:
+        _recent_alerts.clear()
+
+
+def _digest_text(branch_name: str, events: List[LowStockEvent]) -> Tuple[str, str]:
+    if len(events) == 1:
+        low = events[0]
+        if low.current_quantity == 0:
+            return (f"OUT OF STOCK: {low.cake_name}",
+                    f"{branch_name} — {low.cake_name} ({low.cake_code}) is completely out of stock!")
+        return (f"⚠️ Low Stock: {low.cake_name}",
+                f"{branch_name} — {low.cake_name} ({low.cake_code}): "
+                f"only {low.current_quantity} left (min: {low.threshold})")
+
+    out = [e for e in events if e.current_quantity == 0]
+    low = [e for e in events if e.current_quantity > 0]
+    title = f"OUT OF STOCK: {len(out)} cakes" if out else f"⚠️ Low Stock: {len(low)} cakes"
+    if out and low:
+        title += f", {len(low)} low"
+    parts = [f"{e.cake_name} (out)" for e in out]
+    parts += [f"{e.cake_name} ({e.current_quantity} left, min {e.threshold})" for e in low]
+    return title, f"{branch_name} — " + ", ".join(parts)
+
+
+def notify_low_stock(
     db: Session,
     branch_id: int,
-    cake_name: str,
-    cake_code: str,
-    current_quantity: int,
-    threshold: int,
+    events: List[LowStockEvent],
     triggered_by_user_id: Optional[int] = None,
-):
+    force: bool = False,
+) -> int:
     """
-    Check if stock is at/below threshold and send push notifications:
-    - Branch staff (Flavor Experts)
-    - All managers in the chain (Area Manager, Territory Manager, HQ)
-    Called after every sale or stock adjustment.
+    Send one low-stock digest for a branch covering every at/below-threshold event:
+    one push to branch staff (Flavor Experts) and one to the manager chain
+    (Area Manager, Territory Manager, HQ). Repeat alerts within the cooldown are
+    skipped unless force=True. Returns the number of cakes included.
     """
-    if current_quantity > threshold:
-        return
-
-    # Get branch name for context
-    branch = db.query(Branch).filter(Branch.id == branch_id).first()
-    branch_name = branch.name if branch else f"Branch {branch_id}"
+    events = [e for e in events if e.current_quantity <= e.threshold]
+    if not force:
+        events = _outside_cooldown(branch_id, events)
+    if not events:
+        return 0
 
-    if current_quantity == 0:
-        title = f"OUT OF STOCK: {cake_name}"
-        body = f"{branch_name} — {cake_name} ({cake_code}) is completely out of stock!"
-    else:
-        title = f"⚠️ Low Stock: {cake_name}"
-        body = f"{branch_name} — {cake_name} ({cake_code}): only {current_quantity} left (min: {threshold})"
+    recipients = get_branch_recipients(db, branch_id)
+    branch_name = recipients.branch_name if recipients else f"Branch {branch_id}"
+    title, body = _digest_text(branch_name, events)
 
     try:
-        # Notify branch staff (Flavor Experts at this branch)
         send_push_to_branch(
             db=db,
             branch_id=branch_id,
@@ -221,7 +292,6 @@ def check_and_notify_low_stock(
         logger.error(f"Failed to send branch low stock push: {e}")
 
     try:
-        # Notify managers (Area Manager, Territory Manager, HQ)
         send_push_to_managers(
             db=db,
             branch_id=branch_id,
@@ -231,3 +301,25 @@ def check_and_notify_low_stock(
         )
     except Exception as e:
         logger.error(f"Failed to send manager low stock push: {e}")
+
+    return len(events)
+
+
+def check_and_notify_low_stock(
+    db: Session,
+    branch_id: int,
+    cake_name: str,
+    cake_code: str,
+    current_quantity: int,
+    threshold: int,
+    triggered_by_user_id: Optional[int] = None,
+):
+    """
+    Check if a single cake is at/below threshold and send a low-stock push.
+    Batches of changes should collect LowStockEvents and call notify_low_stock once.
+    """
+    notify_low_stock(
+        db, branch_id,
+        [LowStockEvent(cake_name, cake_code, current_quantity, threshold)],
+        triggered_by_user_id=triggered_by_user_id,
+    )
@@ -0,0 +1,235 @@
+"""
+Reference data cache
+Flavors, cake products, branches, areas and territories change a few times a month
+but are read on almost every request. Each kind is loaded whole into an immutable
+in-process snapshot and served from memory.
+
+Invalidation is versioned: any write to a cached model bumps that kind's row in
+reference_data_versions inside the writing transaction. Each worker re-reads the
+version rows at most every REFERENCE_CACHE_VERSION_CHECK_SECONDS and reloads a kind
+whose version moved; the writing worker also drops its own copy on commit.
+
+Records are frozen dataclasses carrying the model's columns (no relationships, no
+password hashes). Routes that modify a row must still load it through the session.
+"""
+
+import threading
+import time
+from dataclasses import dataclass, make_dataclass
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+
+from models.cake import CakeProduct
+from models.inventory import Flavor
+from models.location import Area, Branch, Territory
+from models.reference_data import ReferenceDataVersion
+from utils.config import settings
+from utils.database import register_invalidation
+
+# Never copied into the cache
+_EXCLUDED_COLUMNS = {"hashed_password"}
+
+
+@dataclass(frozen=True)
+class _Snapshot:
+    version: int
+    loaded_at: float
+    records: tuple
+    by_id: dict
+
+
+class _Kind:
+    """One cached model: its record type and how to load it."""
+
+    def __init__(self, name: str, model, order_by):
+        self.name = name
+        self.model = model
+        self.order_by = order_by
+        self.columns = [
+            attr.key for attr in model.__mapper__.column_attrs if attr.key not in _EXCLUDED_COLUMNS
+        ]
+        self.record = make_dataclass(f"{model.__name__}Ref", self.columns, frozen=True)
+
+    def load(self, db: Session, version: int) -> _Snapshot:
+        stmt = select(*(getattr(self.model, key) for key in self.columns)).order_by(*self.order_by)
+        records = tuple(self.record(*row) for row in db.execute(stmt))
+        return _Snapshot(version, time.monotonic(), records, {r.id: r for r in records})
+
+
+FLAVORS = _Kind("flavors", Flavor, (Flavor.name, Flavor.id))
+CAKE_PRODUCTS = _Kind("cake_products", CakeProduct, (CakeProduct.name, CakeProduct.id))
+BRANCHES = _Kind("branches", Branch, (Branch.id,))
+AREAS = _Kind("areas", Area, (Area.id,))
+TERRITORIES = _Kind("territories", Territory, (Territory.id,))
+
+_KINDS = {kind.model: kind for kind in (FLAVORS, CAKE_PRODUCTS, BRANCHES, AREAS, TERRITORIES)}
+
+FlavorRef = FLAVORS.record
+CakeProductRef = CAKE_PRODUCTS.record
+BranchRef = BRANCHES.record
+AreaRef = AREAS.record
+TerritoryRef = TERRITORIES.record
+
+_lock = threading.Lock()
+_snapshots: Dict[str, _Snapshot] = {}
+_versions: Dict[str, int] = {}
+_versions_checked_at: Optional[float] = None
+
+
+def invalidate(*kinds: str):
+    """Drop cached snapshots (all kinds if none given) and re-read versions on next use."""
+    global _versions_checked_at
+    with _lock:
+        if kinds:
+            for name in kinds:
+                _snapshots.pop(name, None)
+        else:
+            _snapshots.clear()
+        _versions_checked_at = None
+
+
+def _current_versions(db: Session) -> Dict[str, int]:
+    global _versions, _versions_checked_at
+    now = time.monotonic()
+    if _versions_checked_at is not None and now - _versions_checked_at < settings.REFERENCE_CACHE_VERSION_CHECK_SECONDS:
+        return _versions
+    table = ReferenceDataVersion.__table__
+    versions = dict(db.execute(select(table.c.kind, table.c.version)).all())
+    with _lock:
+        _versions = versions
+        _versions_checked_at = now
+    return versions
+
+
+def _snapshot(db: Session, kind: _Kind) -> _Snapshot:
+    if settings.REFERENCE_CACHE_TTL_SECONDS <= 0:
+        return kind.load(db, 0)
+    # Read the version before the rows: a write committing in between leaves an old
+    # version on the snapshot, so the next check reloads it
+    version = _current_versions(db).get(kind.name, 0)
+    snapshot = _snapshots.get(kind.name)
+    if (
+        snapshot is not None
+        and snapshot.version == version
+        and time.monotonic() - snapshot.loaded_at < settings.REFERENCE_CACHE_TTL_SECONDS
+    ):
+        return snapshot
+    snapshot = kind.load(db, version)
+    with _lock:
+        _snapshots[kind.name] = snapshot
+    return snapshot
+
+
+def _all(db: Session, kind: _Kind, active_only: bool) -> list:
+    records = _snapshot(db, kind).records
+    if active_only:
+        return [r for r in records if r.is_active]
+    return list(records)
+
+
+# ============== LOOKUPS ==============
+
+def get_flavors(db: Session, active_only: bool = True) -> List[FlavorRef]:
+    """Flavors ordered by name."""
+    return _all(db, FLAVORS, active_only)
+
+
+def get_flavor(db: Session, flavor_id: int) -> Optional[FlavorRef]:
+    return _snapshot(db, FLAVORS).by_id.get(flavor_id)
+
+
+def get_cake_products(db: Session, active_only: bool = True) -> List[CakeProductRef]:
+    """Cake products ordered by name."""
+    return _all(db, CAKE_PRODUCTS, active_only)
+
+
+def get_cake_product(db: Session, product_id: int) -> Optional[CakeProductRef]:
+    return _snapshot(db, CAKE_PRODUCTS).by_id.get(product_id)
+
+
+def get_branches(db: Session, active_only: bool = True) -> List[BranchRef]:
+    """Branches ordered by id."""
+    return _all(db, BRANCHES, active_only)
+
+
+def get_branch(db: Session, branch_id: int) -> Optional[BranchRef]:
+    return _snapshot(db, BRANCHES).by_id.get(branch_id)
+
+
+def get_area(db: Session, area_id: int) -> Optional[AreaRef]:
+    return _snapshot(db, AREAS).by_id.get(area_id)
+
+
+def get_territory(db: Session, territory_id: int) -> Optional[TerritoryRef]:
+    return _snapshot(db, TERRITORIES).by_id.get(territory_id)
+
+
+def location_names(db: Session, territory_id=None, area_id=None, branch_id=None) -> Tuple[Optional[str], ...]:
+    """(territory_name, area_name, branch_name) for whichever ids are set."""
+    territory = get_territory(db, territory_id) if territory_id else None
+    area = get_area(db, area_id) if area_id else None
+    branch = get_branch(db, branch_id) if branch_id else None
+    return (
+        territory.name if territory else None,
+        area.name if area else None,
+        branch.name if branch else None,
+    )
+
+
+# ============== VERSIONING ==============
+
+def _bump(connection, kinds):
+    """Increment the version rows for kinds inside the caller's transaction."""
+    table = ReferenceDataVersion.__table__
+    result = connection.execute(
+        update(table).where(table.c.kind.in_(kinds)).values(version=table.c.version + 1)
+    )
+    if result.rowcount < len(kinds):
+        existing = set(connection.execute(select(table.c.kind).where(table.c.kind.in_(kinds))).scalars())
+        connection.execute(insert(table), [{"kind": name, "version": 1} for name in sorted(set(kinds) - existing)])
+
+
+def ensure_version_rows(connection):
+    """Create any missing version rows up front so workers never race to insert them."""
+    table = ReferenceDataVersion.__table__
+    existing = set(connection.execute(select(table.c.kind)).scalars())
+    missing = [kind.name for kind in _KINDS.values() if kind.name not in existing]
+    if missing:
+        connection.execute(insert(table), [{"kind": name, "version": 0} for name in missing])
+
+
+_PENDING_KEY = "reference_data_changed"
+
+
+def _kind_of(obj) -> Optional[_Kind]:
+    for model, kind in _KINDS.items():
+        if isinstance(obj, model):
+            return kind
+    return None
+
+
+def _changed_kinds(session):
+    changed = set()
+    for obj in list(session.new) + list(session.deleted):
+        kind = _kind_of(obj)
+        if kind is not None:
+            changed.add(kind.name)
+    for obj in session.dirty:
+        kind = _kind_of(obj)
+        # Backref collection changes (e.g. a new staff user) don't touch the row
+        if kind is not None and session.is_modified(obj, include_collections=False):
+            changed.add(kind.name)
+    return changed
+
+
+register_invalidation(
+    _KINDS,
+    lambda kinds: invalidate(*kinds),
+    _PENDING_KEY,
+    collect=_changed_kinds,
+    bulk_keys=lambda model: {_KINDS[model].name},
+    on_write=lambda session, kinds: _bump(session.connection(), kinds),
+    bulk_inserts=True,
+)
@@ -0,0 +1,149 @@
+"""
+Sales line items
+Keeps the normalized sales_line_items table in step with DailySales.items_data
+and aggregates tracked promotion items over it.
+"""
+
+import json
+import logging
+from datetime import date
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import and_, case, delete, exists, func, insert, literal, or_, select
+from sqlalchemy.orm import Session
+
+from models.sales import DailySales, SalesLineItem, TrackedItem
+
+logger = logging.getLogger(__name__)
+
+
+def parse_line_items(items_data: str) -> List[dict]:
+    """Parse the items_data JSON blob into line item dicts (skips anything malformed)."""
+    if not items_data:
+        return []
+    try:
+        items = json.loads(items_data)
+    except (TypeError, ValueError):
+        return []
+    if not isinstance(items, list):
+        return []
+
+    rows = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        rows.append({
+            "item_code": str(item["code"]) if item.get("code") is not None else None,
+            "item_name": item.get("name"),
+            "category": item.get("category"),
+            "quantity": item.get("quantity") or 0,
+            "sales": item.get("sales") or 0.0,
+        })
+    return rows
+
+
+def sync_line_items(db: Session, sales_entry: DailySales) -> int:
+    """
+    Replace the line items of one DailySales row from its items_data.
+    The entry must already be flushed (needs an id). Does not commit.
+    """
+    db.execute(delete(SalesLineItem).where(SalesLineItem.daily_sales_id == sales_entry.id))
+    rows = parse_line_items(getattr(sales_entry, "items_data", None))
+    if rows:
+        for row in rows:
+            row.update(daily_sales_id=sales_entry.id, branch_id=sales_entry.branch_id, date=sales_entry.date)
+        db.execute(insert(SalesLineItem), rows)
+    return len(rows)
+
+
+def backfill_line_items(db: Session, batch_size: int = 500) -> int:
+    """Populate line items for DailySales rows that have items_data but no line items yet."""
+    has_items = exists().where(SalesLineItem.daily_sales_id == DailySales.id)
+    total = 0
+    last_id = 0
+    while True:
+        batch = db.query(DailySales).filter(
+            DailySales.id > last_id,
+            DailySales.items_data.isnot(None),
+            ~has_items,
+        ).order_by(DailySales.id).limit(batch_size).all()
+        if not batch:
+            break
+        for sales_entry in batch:
+            total += sync_line_items(db, sales_entry)
+        last_id = batch[-1].id
+        db.commit()
+        db.expunge_all()
+    logger.info(f"Backfilled {total} sales line items")
+    return total
+
+
+def _tracked_item_match():
+    """
+    Join condition between a tracked item and a line item, mirroring the item_code rules:
+    NAME:<text> matches a name substring, CAT:<name> a category, anything else the POS code.
+    All comparisons are case-insensitive except the exact code match.
+    """
+    prefix5 = func.substr(TrackedItem.item_code, 1, 5)
+    prefix4 = func.substr(TrackedItem.item_code, 1, 4)
+    is_name = prefix5 == "NAME:"
+    is_cat = prefix4 == "CAT:"
+    return or_(
+        and_(
+            is_name,
+            func.lower(func.coalesce(SalesLineItem.item_name, "")).contains(
+                func.lower(func.substr(TrackedItem.item_code, 6))
+            ),
+        ),
+        and_(
+            is_cat,
+            func.lower(func.coalesce(SalesLineItem.category, "")) == func.lower(func.substr(TrackedItem.item_code, 5)),
+        ),
+        and_(~is_name, ~is_cat, SalesLineItem.item_code == TrackedItem.item_code),
+    )
+
+
+def tracked_item_totals(
+    db: Session,
+    tracked_ids: Iterable[int],
+    branch_ids: Iterable[int],
+    periods: Dict[str, Tuple[date, date]],
+) -> Dict[Tuple[int, str], Dict[str, float]]:
+    """
+    Sum qty/sales of matching line items per tracked item for each period, in one query.
+    periods: {"name": (date_from, date_to)}
+    Returns {(tracked_item_id, period): {"qty": ..., "sales": ...}}
+    """
+    tracked_ids = list(tracked_ids)
+    branch_ids = list(branch_ids)
+    if not tracked_ids or not branch_ids or not periods:
+        return {}
+
+    range_start = min(start for start, _ in periods.values())
+    range_end = max(end for _, end in periods.values())
+
+    columns = [TrackedItem.id]
+    for start, end in periods.values():
+        in_period = and_(SalesLineItem.date >= start, SalesLineItem.date <= end)
+        columns.append(func.sum(case((in_period, SalesLineItem.quantity), else_=literal(0))))
+        columns.append(func.sum(case((in_period, SalesLineItem.sales), else_=literal(0.0))))
+
+    stmt = (
+        select(*columns)
+        .select_from(TrackedItem)
+        .join(SalesLineItem, _tracked_item_match())
+        .where(
+            TrackedItem.id.in_(tracked_ids),
+            SalesLineItem.branch_id.in_(branch_ids),
+            SalesLineItem.date >= range_start,
+            SalesLineItem.date <= range_end,
+        )
+        .group_by(TrackedItem.id)
+    )
+
+    totals = {}
+    for row in db.execute(stmt):
+        tracked_id, sums = row[0], row[1:]
+        for i, name in enumerate(periods):
+            totals[(tracked_id, name)] = {"qty": sums[2 * i] or 0, "sales": sums[2 * i + 1] or 0.0}
+    return totals
@@ -0,0 +1,151 @@
+"""
+Branch day sales rollup
+Maintains branch_day_sales: one closing-equivalent row per branch per day.
+POS windows are cumulative (each includes the earlier ones), so the day's figures
+are simply the latest submitted window's.
+"""
+
+import logging
+from datetime import date
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import delete, insert
+from sqlalchemy.orm import Session
+
+from models.sales import BranchDaySales, DailySales
+
+logger = logging.getLogger(__name__)
+
+# Later windows supersede earlier ones
+WINDOW_PRIORITY = {"closing": 4, "9pm": 3, "7pm": 2, "3pm": 1}
+
+# DailySales column -> BranchDaySales column
+_ROLLUP_FIELDS = {
+    "gross_sales": "gross_sales",
+    "total_sales": "net_sales",
+    "transaction_count": "transaction_count",
+    "hd_gross_sales": "hd_gross_sales",
+    "hd_net_sales": "hd_net_sales",
+    "hd_orders": "hd_orders",
+    "deliveroo_gross_sales": "deliveroo_gross_sales",
+    "deliveroo_net_sales": "deliveroo_net_sales",
+    "deliveroo_orders": "deliveroo_orders",
+    "cm_gross_sales": "cm_gross_sales",
+    "cm_net_sales": "cm_net_sales",
+    "cm_orders": "cm_orders",
+}
+
+
+def window_name(sales: DailySales) -> str:
+    """Sales window as a plain string ("3pm" ... "closing")."""
+    return sales.sales_window.value if hasattr(sales.sales_window, "value") else sales.sales_window
+
+
+def latest_window(sales_rows: Iterable[DailySales]) -> Optional[DailySales]:
+    """Pick the latest (highest priority) window from one branch-day's rows."""
+    return max(sales_rows, key=lambda s: WINDOW_PRIORITY.get(window_name(s), 0), default=None)
+
+
+def _rollup_values(latest: DailySales, windows: int) -> dict:
+    values = {
+        target: getattr(latest, source, 0) or 0
+        for source, target in _ROLLUP_FIELDS.items()
+    }
+    values.update(
+        branch_id=latest.branch_id,
+        date=latest.date,
+        latest_sales_id=latest.id,
+        latest_window=window_name(latest),
+        windows_submitted=windows,
+    )
+    return values
+
+
+def refresh_branch_day(db: Session, branch_id: int, day: date) -> Optional[BranchDaySales]:
+    """
+    Recompute the rollup row for one branch-day from its DailySales windows.
+    Runs inside the caller's transaction (flushes pending rows, does not commit).
+    """
+    db.flush()
+    rows = db.query(DailySales).filter(DailySales.branch_id == branch_id, DailySales.date == day).all()
+    rollup = db.query(BranchDaySales).filter(
+        BranchDaySales.branch_id == branch_id, BranchDaySales.date == day
+    ).first()
+
+    if not rows:
+        if rollup:
+            db.delete(rollup)
+        return None
+
+    values = _rollup_values(latest_window(rows), len(rows))
+    if rollup is None:
+        rollup = BranchDaySales(**values)
+        db.add(rollup)
+    else:
+        for field, value in values.items():
+            setattr(rollup, field, value)
+    return rollup
+
+
+def rebuild_rollup(
+    db: Session,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    batch_size: int = 1000,
+) -> int:
+    """
+    Recompute branch_day_sales from daily_sales history (optionally for a date range).
+    Streams rows ordered by branch/date so memory stays flat. Commits once at the end.
+    """
+    filters = []
+    if date_from:
+        filters += [BranchDaySales.date >= date_from]
+    if date_to:
+        filters += [BranchDaySales.date <= date_to]
+    db.execute(delete(BranchDaySales).where(*filters))
+
+    query = db.query(DailySales).order_by(DailySales.branch_id, DailySales.date)
+    if date_from:
+        query = query.filter(DailySales.date >= date_from)
+    if date_to:
+        query = query.filter(DailySales.date <= date_to)
+
+    pending: List[dict] = []
+    written = 0
+    current_key = None
+    group: List[DailySales] = []
+
+    def _emit():
+        nonlocal written
+        if group:
+            pending.append(_rollup_values(latest_window(group), len(group)))
+        if len(pending) >= batch_size:
+            db.execute(insert(BranchDaySales), pending)
+            written += len(pending)
+            pending.clear()
+
+    for sales in query.yield_per(batch_size):
+        key = (sales.branch_id, sales.date)
+        if key != current_key:
+            _emit()
+            group = []
+            current_key = key
+        group.append(sales)
+    _emit()
+    if pending:
+        db.execute(insert(BranchDaySales), pending)
+        written += len(pending)
+
+    db.commit()
+    logger.info(f"Rebuilt {written} branch_day_sales rows")
+    return written
+
+
+def get_day_rollups(db: Session, branch_ids: List[int], day: date) -> Dict[int, BranchDaySales]:
+    """Rollup rows for the given branches on one day, keyed by branch_id."""
+    if not branch_ids:
+        return {}
+    rows = db.query(BranchDaySales).filter(
+        BranchDaySales.branch_id.in_(branch_ids), BranchDaySales.date == day
+    ).all()
+    return {r.branch_id: r for r in rows}
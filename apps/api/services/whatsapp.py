@@ -1,33 +1,303 @@
 """
 WhatsApp notification service
-Sends alerts via the br-whatsapp Baileys service
+Sends alerts via the br-whatsapp Baileys service.
+
+Alerts are queued and delivered by background workers over one pooled HTTP client;
+queued messages with identical text are merged into a single multi-recipient send.
+Anything that cannot be delivered (service down, queue full, shutdown) is stored in
+the whatsapp_outbox table and retried with backoff.
 """
 
-import httpx
+import asyncio
 import logging
-from typing import Union
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Set, Union
+
+import httpx
+
+from models.whatsapp_config import WhatsAppOutboxMessage, WhatsAppOutboxStatus
+from utils.config import settings
+from utils.database import SessionLocal
 
 logger = logging.getLogger(__name__)
 
-WA_SERVICE_URL = "http://br-whatsapp:3005"
+MAX_BATCH_RECIPIENTS = 50
+# Queued messages a worker takes per pass (the rest is left for other workers)
+MAX_BATCH_MESSAGES = 200
 
 
-async def _send(to: Union[str, list], message: str) -> bool:
-    """Send WhatsApp message(s). Returns True if sent, False if failed."""
-    try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            resp = await client.post(
-                f"{WA_SERVICE_URL}/send",
-                json={"to": to, "message": message},
-            )
-            if resp.status_code == 200:
-                return True
-            logger.warning(f"WhatsApp send failed: {resp.status_code} {resp.text}")
+@dataclass
+class QueuedMessage:
+    recipients: List[str]
+    message: str
+
+
+def _unique(numbers) -> List[str]:
+    return list(dict.fromkeys(n.strip() for n in numbers if n and n.strip()))
+
+
+def _merge(items: List[QueuedMessage]) -> List[QueuedMessage]:
+    """One pass: items with the same text become one send (up to MAX_BATCH_RECIPIENTS), in first-seen order."""
+    merged: List[QueuedMessage] = []
+    open_by_text = {}
+    for item in items:
+        i = open_by_text.get(item.message)
+        if i is not None:
+            recipients = _unique(merged[i].recipients + item.recipients)
+            if len(recipients) <= MAX_BATCH_RECIPIENTS:
+                merged[i] = QueuedMessage(recipients, item.message)
+                continue
+        open_by_text[item.message] = len(merged)
+        merged.append(item)
+    return merged
+
+
+class WhatsAppClient:
+    """Pooled client + bounded delivery queue. start() and stop() run inside the app lifespan."""
+
+    def __init__(self, session_factory: Callable = SessionLocal, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.session_factory = session_factory
+        self.transport = transport  # tests inject an httpx.MockTransport
+        self._http: Optional[httpx.AsyncClient] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._persisting: Set[asyncio.Task] = set()
+        self.counters = {"queued": 0, "sent": 0, "batched": 0, "persisted": 0, "retried": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._queue is not None
+
+    def _new_http(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=settings.WHATSAPP_SERVICE_URL,
+            timeout=settings.WHATSAPP_TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_connections=max(1, settings.WHATSAPP_WORKERS) * 2,
+                                max_keepalive_connections=max(1, settings.WHATSAPP_WORKERS)),
+            transport=self.transport,
+        )
+
+    @asynccontextmanager
+    async def http(self):
+        """The shared pooled client while running, otherwise a short-lived one."""
+        if self._http is not None:
+            yield self._http
+        else:
+            async with self._new_http() as client:
+                yield client
+
+    # ---- lifecycle ----
+
+    async def start(self):
+        if self.running:
+            return
+        self._http = self._new_http()
+        self._queue = asyncio.Queue(maxsize=settings.WHATSAPP_QUEUE_MAX)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(max(1, settings.WHATSAPP_WORKERS))]
+        self._tasks.append(asyncio.create_task(self._retry_loop()))
+
+    async def stop(self):
+        """Drain the queue (up to WHATSAPP_DRAIN_SECONDS), persist leftovers, close the pool."""
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), settings.WHATSAPP_DRAIN_SECONDS)
+        except asyncio.TimeoutError:
+            logger.warning(f"WhatsApp queue not drained; persisting {self._queue.qsize()} messages")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        leftovers = []
+        while not self._queue.empty():
+            leftovers.append(self._queue.get_nowait())
+        await asyncio.to_thread(self._persist_many, leftovers)
+        await asyncio.gather(*self._persisting, return_exceptions=True)
+
+        await self._http.aclose()
+        self._http = None
+        self._queue = None
+        self._tasks = []
+
+    # ---- sending ----
+
+    async def post(self, recipients: Union[str, list], message: str) -> Optional[str]:
+        """One /send call. Returns None on success, else an error description."""
+        try:
+            async with self.http() as client:
+                resp = await client.post("/send", json={"to": recipients, "message": message})
+        except Exception as e:
+            logger.warning(f"WhatsApp service unreachable: {e}")
+            return f"unreachable: {e}"
+        if resp.status_code == 200:
+            return None
+        logger.warning(f"WhatsApp send failed: {resp.status_code} {resp.text}")
+        return f"HTTP {resp.status_code}: {resp.text[:500]}"
+
+    def enqueue(self, recipients: Union[str, list], message: str) -> bool:
+        """
+        Queue a message without waiting for delivery. When the queue is full or not
+        running, the message goes to the outbox instead. Returns True if queued live.
+        """
+        recipients = _unique([recipients] if isinstance(recipients, str) else recipients)
+        if not recipients:
             return False
-    except Exception as e:
-        logger.warning(f"WhatsApp service unreachable: {e}")
+        item = QueuedMessage(recipients, message)
+        if self.running:
+            try:
+                self._queue.put_nowait(item)
+                self.counters["queued"] += 1
+                return True
+            except asyncio.QueueFull:
+                logger.warning("WhatsApp queue full; message stored in outbox")
+        self._persist_in_background(item)
         return False
 
+    def _persist_in_background(self, item: QueuedMessage):
+        """Store in the outbox without blocking the event loop (inline when called outside one)."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._persist(item, None)
+            return
+        task = loop.create_task(asyncio.to_thread(self._persist, item, None))
+        self._persisting.add(task)
+        task.add_done_callback(self._persisting.discard)
+
+    async def _worker(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < MAX_BATCH_MESSAGES and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            # Merge queued messages with the same text into one multi-recipient send
+            unsent = _merge(batch)
+            self.counters["batched"] += len(batch) - len(unsent)
+            try:
+                while unsent:
+                    item = unsent[0]
+                    error = await self.post(item.recipients, item.message)
+                    unsent.pop(0)
+                    if error:
+                        await asyncio.to_thread(self._persist, item, error)
+                    else:
+                        self.counters["sent"] += 1
+            except asyncio.CancelledError:
+                # Shutdown interrupted the batch; keep the in-flight send and the rest for the outbox (at-least-once)
+                await asyncio.to_thread(self._persist_many, unsent)
+                raise
+            except Exception as e:
+                logger.error(f"WhatsApp worker error: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    # ---- outbox ----
+
+    def _persist(self, item: QueuedMessage, error: Optional[str]):
+        """Store an undelivered message; one that already failed waits a backoff step."""
+        now = datetime.utcnow()
+        db = self.session_factory()
+        try:
+            db.add(WhatsAppOutboxMessage(
+                recipients=",".join(item.recipients),
+                message=item.message,
+                status=WhatsAppOutboxStatus.PENDING,
+                attempts=1 if error else 0,
+                last_error=error,
+                next_attempt_at=now + timedelta(seconds=settings.WHATSAPP_RETRY_BASE_SECONDS) if error else now,
+            ))
+            db.commit()
+            self.counters["persisted"] += 1
+        except Exception as e:
+            logger.error(f"Could not store WhatsApp message in outbox: {e}")
+        finally:
+            db.close()
+
+    def _persist_many(self, items: List[QueuedMessage]):
+        for item in items:
+            self._persist(item, None)
+
+    def _claim_due(self, limit: int = 50) -> List[tuple]:
+        """Lease due outbox rows (conditional UPDATE, so concurrent workers don't double-send)."""
+        now = datetime.utcnow()
+        lease = now + timedelta(seconds=settings.WHATSAPP_RETRY_BASE_SECONDS)
+        db = self.session_factory()
+        try:
+            rows = (
+                db.query(WhatsAppOutboxMessage)
+                .filter(WhatsAppOutboxMessage.status == WhatsAppOutboxStatus.PENDING,
+                        WhatsAppOutboxMessage.next_attempt_at <= now)
+                .order_by(WhatsAppOutboxMessage.next_attempt_at)
+                .limit(limit)
+                .all()
+            )
+            claimed = []
+            for row in rows:
+                updated = db.query(WhatsAppOutboxMessage).filter(
+                    WhatsAppOutboxMessage.id == row.id,
+                    WhatsAppOutboxMessage.next_attempt_at == row.next_attempt_at,
+                ).update({"next_attempt_at": lease}, synchronize_session=False)
+                if updated:
+                    claimed.append((row.id, row.recipients, row.message, row.attempts))
+            db.commit()
+            return claimed
+        finally:
+            db.close()
+
+    def _record_attempt(self, outbox_id: int, attempts: int, error: Optional[str]):
+        db = self.session_factory()
+        try:
+            row = db.query(WhatsAppOutboxMessage).filter(WhatsAppOutboxMessage.id == outbox_id).first()
+            if row is None:
+                return
+            row.attempts = attempts
+            if error is None:
+                row.status = WhatsAppOutboxStatus.SENT
+                row.sent_at = datetime.utcnow()
+                row.last_error = None
+            else:
+                row.last_error = error
+                if attempts >= settings.WHATSAPP_MAX_ATTEMPTS:
+                    row.status = WhatsAppOutboxStatus.FAILED
+                else:
+                    delay = settings.WHATSAPP_RETRY_BASE_SECONDS * (2 ** (attempts - 1))
+                    row.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+            db.commit()
+        finally:
+            db.close()
+
+    async def retry_outbox(self) -> int:
+        """Attempt every due outbox message once. Returns how many were delivered."""
+        delivered = 0
+        for outbox_id, recipients, message, attempts in await asyncio.to_thread(self._claim_due):
+            error = await self.post(recipients.split(","), message)
+            await asyncio.to_thread(self._record_attempt, outbox_id, attempts + 1, error)
+            self.counters["retried"] += 1
+            if error is None:
+                delivered += 1
+        return delivered
+
+    async def _retry_loop(self):
+        while True:
+            await asyncio.sleep(settings.WHATSAPP_OUTBOX_POLL_SECONDS)
+            try:
+                await self.retry_outbox()
+            except Exception as e:
+                logger.error(f"WhatsApp outbox retry failed: {e}")
+
+    def stats(self) -> dict:
+        return {**self.counters, "pending": self._queue.qsize() if self.running else 0}
+
+
+whatsapp_client = WhatsAppClient()
+
+
+async def _send(to: Union[str, list], message: str) -> bool:
+    """Queue WhatsApp message(s) for delivery. Returns True if accepted by the live queue."""
+    return whatsapp_client.enqueue(to, message)
+
 
 async def send_sales_summary(branch_name: str, window: str, data: dict, recipients: list[str]):
     """Send sales window summary after submission."""
@@ -17,19 +17,45 @@ import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
-
-from utils.database import Base, get_db
+from sqlalchemy.pool import StaticPool, NullPool
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from models.location import Branch, Territory
+from models.user import User, UserRole
+from services.access_scope import invalidate_all
+from services.daily_brief import brief_scheduler
+from services.email_service import email_outbox
+from services.push_dispatch import push_dispatcher
+from services.push_service import invalidate_recipients, reset_low_stock_cooldowns
+from services import reference_data
+from services.whatsapp import whatsapp_client
+from utils.database import Base, get_db, get_async_db
+from utils.security import create_access_token
 from main import app
 
-# In-memory SQLite with StaticPool so all connections share the same DB
+# Named shared-cache in-memory SQLite so the sync and async engines see the same DB.
+# StaticPool keeps one sync connection open, which keeps the in-memory DB alive.
+TEST_DB_URI = "file:brretailflow_test?mode=memory&cache=shared&uri=true"
+
 engine = create_engine(
-    "sqlite://",
+    f"sqlite:///{TEST_DB_URI}",
     connect_args={"check_same_thread": False},
     poolclass=StaticPool,
 )
 TestSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# NullPool: each TestClient runs its own event loop, so async connections must not outlive a request
+async_engine = create_async_engine(f"sqlite+aiosqlite:///{TEST_DB_URI}", poolclass=NullPool)
+TestAsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
+# Background workers open their own sessions — point them at the test database
+email_outbox.session_factory = TestSessionLocal
+push_dispatcher.session_factory = TestSessionLocal
+whatsapp_client.session_factory = TestSessionLocal
+brief_scheduler.session_factory = TestSessionLocal
+
 
 # SQLite doesn't support Enum natively - this helps with PostgreSQL Enum columns
 @event.listens_for(engine, "connect")
@@ -47,18 +73,98 @@ def override_get_db():
         db.close()
 
 
+async def override_get_async_db():
+    async with TestAsyncSessionLocal() as db:
+        yield db
+
+
 @pytest.fixture(autouse=True)
 def setup_database():
     """Create fresh database tables before each test, drop after"""
     Base.metadata.create_all(bind=engine)
     yield
     Base.metadata.drop_all(bind=engine)
+    # Dropping tables bypasses ORM events, so cached principals/scopes must go too
+    invalidate_all()
+    invalidate_recipients()
+    reset_low_stock_cooldowns()
+    reference_data.invalidate()
+
+
+@pytest.fixture
+def db_session():
+    """Direct session on the test database for seeding fixtures"""
+    db = TestSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def branch_specs():
+    """(name, code) of each branch the branches fixture creates; override or parametrize for others"""
+    return [(f"Parlor {i}", f"BR-{i:03d}") for i in range(1, 4)]
+
+
+@pytest.fixture
+def branches(db_session, branch_specs):
+    """Branches in a "Dubai" territory, one per branch_specs entry; returns their ids in order"""
+    territory = Territory(name="Dubai", code="DUBAI")
+    db_session.add(territory)
+    db_session.flush()
+    rows = [Branch(name=name, code=code, territory_id=territory.id) for name, code in branch_specs]
+    db_session.add_all(rows)
+    db_session.commit()
+    return [b.id for b in rows]
+
+
+@pytest.fixture
+def staff_branch_id(branches):
+    """Branch of the staff_headers user (the first of branches unless overridden)"""
+    return branches[0]
+
+
+@pytest.fixture
+def staff_headers(db_session, staff_branch_id):
+    """Authorization headers for a verified staff user at staff_branch_id"""
+    staff = User(email="branch.staff@example.com", username="branchstaff", hashed_password="x",
+                 full_name="Branch Staff", role=UserRole.STAFF, branch_id=staff_branch_id, is_verified=True)
+    db_session.add(staff)
+    db_session.commit()
+    return {"Authorization": f"Bearer {create_access_token(data={'sub': str(staff.id)})}"}
+
+
+def _record_statements(target):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(target, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(target, "before_cursor_execute", record)
+
+
+@pytest.fixture
+def query_log():
+    """SQL statements run on the sync test engine while the test runs (clear() before the part you measure)"""
+    yield from _record_statements(engine)
+
+
+@pytest.fixture
+def async_query_log():
+    """Same as query_log, for the async engine"""
+    yield from _record_statements(async_engine.sync_engine)
 
 
 @pytest.fixture
 def client():
     """FastAPI test client with test database"""
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
     with TestClient(app) as c:
         yield c
     app.dependency_overrides.clear()
@@ -0,0 +1,70 @@
+"""
+Test the cached principal and branch scope
+Run: cd apps/api && python -m pytest tests/test_access_scope.py -v
+"""
+
+import pytest
+
+from models.location import Area, Branch, Territory
+from models.user import User, UserRole
+from services.access_scope import ADMIN_MANAGED, get_access_scope
+
+
+@pytest.fixture
+def area_admin(db_session):
+    """An area manager with one managed branch, one area branch and one unrelated branch"""
+    territory = Territory(name="Dubai", code="DUBAI")
+    db_session.add(territory)
+    db_session.flush()
+    area = Area(name="Karama", code="DXB-KARAMA", territory_id=territory.id)
+    other_area = Area(name="Deira", code="DXB-DEIRA", territory_id=territory.id)
+    db_session.add_all([area, other_area])
+    db_session.flush()
+
+    admin = User(
+        email="am@example.com", username="am", hashed_password="x", full_name="Area Manager",
+        role=UserRole.ADMIN, area_id=area.id, territory_id=territory.id,
+    )
+    db_session.add(admin)
+    db_session.flush()
+
+    managed = Branch(name="Marina Mall", code="BR-MAR-001", territory_id=territory.id,
+                     area_id=other_area.id, manager_id=admin.id)
+    in_area = Branch(name="Karama Centre", code="BR-KRM-001", territory_id=territory.id, area_id=area.id)
+    unrelated = Branch(name="Deira City", code="BR-DCC-001", territory_id=territory.id, area_id=other_area.id)
+    db_session.add_all([managed, in_area, unrelated])
+    db_session.commit()
+    return admin, managed.id, in_area.id, unrelated.id
+
+
+def test_managed_scope_excludes_area_branches(db_session, area_admin):
+    """Test the managed-only scope (sales, KPI, expiry) ignores branches that are merely in the area"""
+    admin, managed, in_area, unrelated = area_admin
+    scope = get_access_scope(db_session, admin, ADMIN_MANAGED)
+    assert scope.branch_ids == [managed]
+    assert not scope.can_access(in_area)
+    assert not scope.can_access(unrelated)
+
+
+def test_scope_refreshes_when_branch_manager_changes(db_session, area_admin):
+    """Test reassigning a branch invalidates the cached scope"""
+    admin, managed, in_area, unrelated = area_admin
+    assert unrelated not in get_access_scope(db_session, admin).branch_ids
+
+    db_session.query(Branch).filter(Branch.id == unrelated).first().manager_id = admin.id
+    db_session.commit()
+
+    assert unrelated in get_access_scope(db_session, admin).branch_ids
+
+
+def test_warm_principal_skips_user_lookup(client, auth_headers, query_log):
+    """Test repeat requests do not re-select the current user"""
+    assert client.get("/api/v1/auth/me", headers=auth_headers).status_code == 200
+
+    query_log.clear()
+    response = client.get("/api/v1/auth/me", headers=auth_headers)
+    statements = list(query_log)
+
+    assert response.status_code == 200
+    assert response.json()["email"] == "test@example.com"
+    assert not [s for s in statements if "FROM users" in s]
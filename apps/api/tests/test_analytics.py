@@ -0,0 +1,115 @@
+"""
+Test consumption analytics endpoints
+Run: cd apps/api && python -m pytest tests/test_analytics.py -v
+"""
+
+from datetime import date, timedelta
+
+import pytest
+
+from models.location import Territory, Branch
+from models.inventory import Flavor, DailyInventory, TubReceipt, InventoryEntryType
+
+
+@pytest.fixture
+def inventory_data(db_session, verified_user):
+    """Two branches, two flavors, one day of opening/closing/receipts"""
+    user_id = verified_user["user"]["id"]
+    territory = Territory(name="Dubai", code="DUBAI")
+    db_session.add(territory)
+    db_session.flush()
+
+    karama = Branch(name="Karama Centre", code="BR-KRM-001", territory_id=territory.id)
+    marina = Branch(name="Marina Mall", code="BR-MAR-001", territory_id=territory.id)
+    praline = Flavor(name="Pralines n Cream", code="PRALINE")
+    mint = Flavor(name="Mint Chocolate Chip", code="MINT")
+    db_session.add_all([karama, marina, praline, mint])
+    db_session.flush()
+
+    day = date.today()
+
+    def inv(branch, flavor, entry_type, inches):
+        db_session.add(DailyInventory(
+            branch_id=branch.id, date=day, flavor_id=flavor.id,
+            entry_type=entry_type, inches=inches, entered_by_id=user_id,
+        ))
+
+    # Karama: praline 20 + 10 received - 12 = 18, mint 10 - 4 = 6
+    inv(karama, praline, InventoryEntryType.OPENING, 20)
+    inv(karama, praline, InventoryEntryType.CLOSING, 12)
+    inv(karama, mint, InventoryEntryType.OPENING, 10)
+    inv(karama, mint, InventoryEntryType.CLOSING, 4)
+    db_session.add(TubReceipt(
+        branch_id=karama.id, date=day, flavor_id=praline.id,
+        quantity=1, inches_per_tub=10.0, recorded_by_id=user_id,
+    ))
+    # Marina: praline 15 - 5 = 10
+    inv(marina, praline, InventoryEntryType.OPENING, 15)
+    inv(marina, praline, InventoryEntryType.CLOSING, 5)
+    db_session.commit()
+    return {"day": day, "karama": karama.id, "marina": marina.id, "praline": praline.id, "mint": mint.id}
+
+
+def test_consumption_by_flavor(client, auth_headers, inventory_data):
+    """Test consumption sums opening + received - closing across branches"""
+    day = inventory_data["day"].isoformat()
+    response = client.get(
+        "/api/v1/analytics/consumption",
+        params={"date_from": day, "date_to": day},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert [(f["flavor_name"], f["total_consumed"]) for f in data] == [
+        ("Pralines n Cream", 28.0),
+        ("Mint Chocolate Chip", 6.0),
+    ]
+    assert data[0]["days_tracked"] == 1
+
+
+def test_branch_performance(client, auth_headers, inventory_data):
+    """Test per-branch totals and top flavor come from the grouped engine"""
+    day = inventory_data["day"].isoformat()
+    response = client.get(
+        "/api/v1/analytics/branch-performance",
+        params={"date_from": day, "date_to": day},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    data = {b["branch_name"]: b for b in response.json()}
+    assert data["Karama Centre"]["total_consumed"] == 24.0
+    assert data["Karama Centre"]["top_flavor"] == "Pralines n Cream"
+    assert data["Karama Centre"]["days_reported"] == 1
+    assert data["Marina Mall"]["total_consumed"] == 10.0
+
+
+def test_trending_compares_periods(client, auth_headers, inventory_data, db_session, verified_user):
+    """Test trending splits current and previous periods from a single run"""
+    prev_day = inventory_data["day"] - timedelta(days=7)
+    db_session.add_all([
+        DailyInventory(branch_id=inventory_data["karama"], date=prev_day, flavor_id=inventory_data["praline"],
+                       entry_type=InventoryEntryType.OPENING, inches=14, entered_by_id=verified_user["user"]["id"]),
+    ])
+    db_session.commit()
+
+    response = client.get("/api/v1/analytics/trending", params={"period_days": 7}, headers=auth_headers)
+    assert response.status_code == 200
+    praline = next(f for f in response.json() if f["flavor_name"] == "Pralines n Cream")
+    assert praline["current_period_consumption"] == 28.0
+    assert praline["previous_period_consumption"] == 14.0
+    assert praline["trend"] == "up"
+
+
+def test_summary(client, auth_headers, inventory_data):
+    """Test summary totals match the consumption engine"""
+    day = inventory_data["day"].isoformat()
+    response = client.get(
+        "/api/v1/analytics/summary",
+        params={"date_from": day, "date_to": day},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total_consumption"] == 34.0
+    assert data["branches_count"] == 2
+    assert data["flavors_tracked"] == 2
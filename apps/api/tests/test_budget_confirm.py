@@ -0,0 +1,88 @@
+"""
+Test bulk budget confirmation (single sheet and multi-branch batch)
+Run: cd apps/api && python -m pytest tests/test_budget_confirm.py -v
+"""
+
+from datetime import date
+
+from models.sales import BudgetUpload, DailyBudget
+from services import bulk_upsert
+
+
+def _sheet(branch_id, budget=1000.0, days=31):
+    return {
+        "branch_id": branch_id,
+        "month": "2026-03",
+        "parlor_name": f"Parlor {branch_id}",
+        "days": [
+            {"date": f"2026-03-{d:02d}", "day_name": "Sun", "budget": budget + d, "ly_sales": 900, "ly_gc": 40}
+            for d in range(1, days + 1)
+        ],
+    }
+
+
+def _budgets(db_session, branch_id):
+    db_session.expire_all()
+    return (
+        db_session.query(DailyBudget)
+        .filter(DailyBudget.branch_id == branch_id)
+        .order_by(DailyBudget.budget_date)
+        .all()
+    )
+
+
+def test_confirm_upserts_month_in_one_statement(client, auth_headers, db_session, branches, query_log):
+    """Test a month is written with one INSERT, and re-confirming updates in place"""
+    client.get("/api/v1/branches", headers=auth_headers)  # warm the auth and reference caches
+    query_log.clear()
+    response = client.post("/api/v1/budget/confirm", json=_sheet(branches[0]), headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["summary"]["days_saved"] == 31
+    assert len([s for s in query_log if "daily_budgets" in s]) == 1
+
+    client.post("/api/v1/budget/confirm", json=_sheet(branches[0], budget=2000.0), headers=auth_headers)
+    rows = _budgets(db_session, branches[0])
+    assert len(rows) == 31
+    assert rows[0].budget_date == date(2026, 3, 1)
+    assert rows[0].budget_amount == 2001.0
+    assert db_session.query(BudgetUpload).count() == 2
+
+
+def test_batch_confirm_saves_all_branches(client, auth_headers, db_session, branches):
+    """Test many parlors' sheets are saved together with one upload log each"""
+    response = client.post(
+        "/api/v1/budget/confirm-batch",
+        json={"sheets": [_sheet(b, days=28) for b in branches]},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    assert [s["days_saved"] for s in response.json()["sheets"]] == [28, 28, 28]
+    for branch_id in branches:
+        assert len(_budgets(db_session, branch_id)) == 28
+    assert db_session.query(BudgetUpload).count() == 3
+
+
+def test_batch_confirm_is_all_or_nothing(client, auth_headers, db_session, branches):
+    """Test an unknown branch rejects the whole batch"""
+    response = client.post(
+        "/api/v1/budget/confirm-batch",
+        json={"sheets": [_sheet(branches[0]), _sheet(9999)]},
+        headers=auth_headers,
+    )
+    assert response.status_code == 404
+    assert "9999" in response.json()["detail"]
+    assert db_session.query(DailyBudget).count() == 0
+
+
+def test_row_by_row_fallback(db_session, branches, monkeypatch):
+    """Test dialects without ON CONFLICT still insert then update"""
+    monkeypatch.setattr(bulk_upsert, "_DIALECT_INSERTS", {})
+    key = ("branch_id", "budget_date")
+    row = {"branch_id": branches[0], "budget_date": date(2026, 3, 1), "budget_amount": 100.0}
+
+    bulk_upsert.upsert_rows(db_session, DailyBudget, [row], key)
+    bulk_upsert.upsert_rows(db_session, DailyBudget, [{**row, "budget_amount": 250.0}], key)
+    db_session.commit()
+
+    rows = _budgets(db_session, branches[0])
+    assert [r.budget_amount for r in rows] == [250.0]
@@ -0,0 +1,120 @@
+"""
+Test the streaming budget Excel parser and the multi-sheet workbook upload
+Run: cd apps/api && python -m pytest tests/test_budget_excel.py -v
+"""
+
+import io
+from datetime import date
+
+import openpyxl
+import pytest
+
+from models.sales import DailyBudget
+from services.budget_excel import SheetGrid, parse_budget_excel, parse_budget_workbook
+
+XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def _workbook(*sheets) -> bytes:
+    """sheets: (title, parlor_name, days) — one DAILY SALES TRACKER per sheet"""
+    wb = openpyxl.Workbook()
+    wb.remove(wb.active)
+    for title, parlor, days in sheets:
+        ws = wb.create_sheet(title)
+        ws.append(["DAILY SALES TRACKER"])
+        ws.append(["Parlor Name", parlor, None, "Month", "March 2026"])
+        ws.append(["SL", "Date", "Day", "2025", "2026", "Grth %", "Budget", "Ach %", "GC 2025", "GC 2026"])
+        for d in range(1, days + 1):
+            ws.append([d, date(2026, 3, d), "Sun", 900.0, None, None, 1000.0 + d, None, 40, None])
+        ws.append(["TOTAL", None, None, 900.0 * days, None, None, None, None, 40 * days])
+        ws.append([])
+        ws.append(["ATV", 22.5])
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+@pytest.fixture
+def branch_specs():
+    return [("Karama", "BR-KRM"), ("Deira City Centre", "BR-DCC")]
+
+
+def test_sheet_grid_is_one_based_and_bounded():
+    """Test cell lookups outside the materialized rows return None instead of raising"""
+    grid = SheetGrid([("a", "b"), ("c",), (None, None)])
+    assert (grid.max_row, grid.max_column) == (2, 2)
+    assert grid.cell(1, 2) == "b"
+    assert grid.cell(2, 2) is None
+    assert grid.cell(5, 1) is None
+
+
+def test_parse_active_sheet():
+    """Test a single tracker parses days, totals, KPIs and header info"""
+    extracted = parse_budget_excel(_workbook(("March", "Karama", 31)))
+    assert extracted["header"]["parlor_name"] == "Karama"
+    assert len(extracted["daily_data"]) == 31
+    assert extracted["daily_data"][0]["date_2026"] == "2026-03-01"
+    assert extracted["daily_data"][0]["days_sales"]["budget"] == 1001.0
+    assert extracted["totals"]["ly_gc_total"] == 31 * 40
+    assert extracted["kpis"]["atv"]["ly_2025"] == 22.5
+
+
+def test_workbook_skips_sheets_without_days():
+    """Test every parlor sheet is parsed and cover sheets are skipped"""
+    data = _workbook(("Karama", "Karama", 31), ("Cover", None, 0), ("DCC", "Deira City Centre", 28))
+    sheets = parse_budget_workbook(data)
+    assert [(s["sheet_name"], len(s["daily_data"])) for s in sheets] == [("Karama", 31), ("DCC", 28)]
+
+
+def test_workbook_upload_matches_branches(client, auth_headers, branches):
+    """Test the workbook endpoint matches sheets to branches by parlor or sheet name"""
+    data = _workbook(("Karama", "Karama", 31), ("BR-DCC", "DCC", 28), ("Unknown", "Nowhere", 30))
+    response = client.post(
+        "/api/v1/budget/upload-excel-workbook",
+        files={"file": ("budget.xlsx", data, XLSX)},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    sheets = response.json()["sheets"]
+    assert [s["branch_id"] for s in sheets] == [branches[0], branches[1], None]
+    assert sheets[1]["calculated"]["days_with_data"] == 28
+    assert "No branch matches" in sheets[2]["warnings"][0]
+
+
+def test_workbook_confirms_save_via_confirm_batch(client, auth_headers, db_session, branches):
+    """Test the matched sheets' confirm bodies are accepted by /confirm-batch as they are"""
+    data = _workbook(("Karama", "Karama", 31), ("BR-DCC", "DCC", 28), ("Unknown", "Nowhere", 30))
+    sheets = client.post(
+        "/api/v1/budget/upload-excel-workbook",
+        files={"file": ("budget.xlsx", data, XLSX)},
+        headers=auth_headers,
+    ).json()["sheets"]
+    assert sheets[2]["confirm"] is None
+    assert sheets[0]["confirm"]["month"] == "2026-03"
+    assert sheets[0]["confirm"]["days"][0] == {
+        "date": "2026-03-01", "day_name": "Sun", "day_of_week": "Sun", "budget": 1001.0,
+        "ly_sales": 900.0, "ly_gc": 40, "budget_gc": 44, "mtd_ly_sales": 0, "mtd_budget": 0,
+        "ly_atv": 22.5, "notes": None,
+    }
+
+    response = client.post(
+        "/api/v1/budget/confirm-batch",
+        json={"sheets": [s["confirm"] for s in sheets if s["confirm"]]},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    assert [s["days_saved"] for s in response.json()["sheets"]] == [31, 28]
+    assert db_session.query(DailyBudget).filter(DailyBudget.branch_id == branches[1]).count() == 28
+
+
+def test_single_upload_still_parses(client, auth_headers, branches):
+    """Test the single-sheet endpoint returns the same extraction off the event loop"""
+    response = client.post(
+        f"/api/v1/budget/upload-excel?branch_id={branches[0]}",
+        files={"file": ("budget.xlsx", _workbook(("March", "Karama", 30)), XLSX)},
+        headers=auth_headers,
+    )
+    body = response.json()
+    assert body["success"] is True
+    assert body["calculated"]["days_with_data"] == 30
+    assert body["warnings"] == []
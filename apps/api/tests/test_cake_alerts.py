@@ -0,0 +1,75 @@
+"""
+Test the bulk cake low-stock evaluator
+Run: cd apps/api && python -m pytest tests/test_cake_alerts.py -v
+"""
+
+import pytest
+
+from models.cake import CakeAlertConfig, CakeProduct, CakeStock
+from models.location import Branch, Territory
+from services.cake_alerts import evaluate_low_stock
+
+
+@pytest.fixture
+def cake_stock(db_session, verified_user):
+    """Two branches x three cakes with a mix of stock rows and threshold overrides"""
+    user_id = verified_user["user"]["id"]
+    territory = Territory(name="Dubai", code="DUBAI")
+    db_session.add(territory)
+    db_session.flush()
+    branches = [
+        Branch(name="Karama Centre", code="BR-KRM-001", territory_id=territory.id),
+        Branch(name="Marina Mall", code="BR-MAR-001", territory_id=territory.id),
+    ]
+    products = [
+        CakeProduct(name="Chocolate Cake", code="CPU", default_alert_threshold=2),
+        CakeProduct(name="Cookies Cake", code="ATC", default_alert_threshold=2),
+        CakeProduct(name="Retired Cake", code="OLD", is_active=False),
+    ]
+    db_session.add_all(branches + products)
+    db_session.flush()
+    karama, marina = branches
+    choc, cookies, retired = products
+
+    db_session.add_all([
+        CakeStock(branch_id=karama.id, cake_product_id=choc.id, current_quantity=1, last_updated_by_id=user_id),
+        CakeStock(branch_id=karama.id, cake_product_id=cookies.id, current_quantity=4, last_updated_by_id=user_id),
+        CakeStock(branch_id=marina.id, cake_product_id=choc.id, current_quantity=3, last_updated_by_id=user_id),
+        CakeStock(branch_id=marina.id, cake_product_id=cookies.id, current_quantity=5, last_updated_by_id=user_id),
+        # Override raises Karama cookies to low; disabled override at Marina is ignored
+        CakeAlertConfig(branch_id=karama.id, cake_product_id=cookies.id, threshold=4, configured_by_id=user_id),
+        CakeAlertConfig(branch_id=marina.id, cake_product_id=choc.id, threshold=10, is_enabled=False,
+                        configured_by_id=user_id),
+    ])
+    db_session.commit()
+    return karama.id, marina.id
+
+
+def test_evaluate_low_stock(db_session, cake_stock):
+    """Test thresholds, overrides and missing stock rows in one pass"""
+    karama, marina = cake_stock
+    items = evaluate_low_stock(db_session, [karama, marina])
+    assert [(i.branch_id, i.cake_code, i.current_quantity, i.threshold, i.severity) for i in items] == [
+        (karama, "CPU", 1, 2, "warning"),
+        (karama, "ATC", 4, 4, "warning"),
+    ]
+
+    # A new product with no stock rows is critical everywhere
+    db_session.add(CakeProduct(name="Red Velvet", code="RVC"))
+    db_session.commit()
+    items = evaluate_low_stock(db_session, [karama, marina])
+    assert [(i.cake_code, i.severity) for i in items[:2]] == [("RVC", "critical"), ("RVC", "critical")]
+
+
+def test_alerts_endpoint_uses_constant_queries(client, auth_headers, cake_stock, query_log):
+    """Test /cake-stock/alerts cost does not grow with branches x products"""
+    query_log.clear()
+    response = client.get("/api/v1/cake/cake-stock/alerts", headers=auth_headers)
+    statements = list(query_log)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total_count"] == 2
+    assert data["critical_count"] == 0
+    assert not [s for s in statements if s.lstrip().startswith("SELECT cake_alert_configs")]
+    assert len([s for s in statements if "cake_alert_configs" in s]) == 1
@@ -0,0 +1,184 @@
+"""
+Test atomic cake stock changes (sales, receipts, adjustments)
+Run: cd apps/api && python -m pytest tests/test_cake_stock.py -v
+"""
+
+import threading
+
+import pytest
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+from models.cake import CakeProduct, CakeStock, CakeStockChangeType, CakeStockLog
+from models.location import Branch, Territory
+from models.user import User, UserRole
+from services import cake_stock
+from services.cake_stock import StockError, StockLine
+from utils.database import Base
+
+
+def _seed(db, quantity=10):
+    territory = Territory(name="Dubai", code="DUBAI")
+    db.add(territory)
+    db.flush()
+    branch = Branch(name="Karama Centre", code="BR-KRM-001", territory_id=territory.id)
+    db.add(branch)
+    db.flush()
+    staff = User(email="staff@example.com", username="staff", hashed_password="x", full_name="Staff",
+                 role=UserRole.STAFF, branch_id=branch.id)
+    products = [CakeProduct(name=f"Cake {c}", code=c, default_alert_threshold=2) for c in ("CPU", "ATC", "RVC")]
+    db.add(staff)
+    db.add_all(products)
+    db.flush()
+    db.add_all([
+        CakeStock(branch_id=branch.id, cake_product_id=p.id, current_quantity=quantity, last_updated_by_id=staff.id)
+        for p in products[:2]
+    ])
+    db.commit()
+    return branch.id, staff.id, [p.id for p in products]
+
+
+@pytest.fixture
+def stock(db_session):
+    """A branch with a staff user, three products and stock of 10 for the first two"""
+    return _seed(db_session)
+
+
+@pytest.fixture
+def staff_branch_id(stock):
+    return stock[0]
+
+
+def _quantities(db_session, branch_id):
+    db_session.expire_all()
+    return dict(
+        db_session.query(CakeStock.cake_product_id, CakeStock.current_quantity)
+        .filter(CakeStock.branch_id == branch_id)
+        .all()
+    )
+
+
+def test_multi_item_sale_is_one_update(client, staff_headers, db_session, stock, query_log):
+    """Test every item of a sale is decremented by a single UPDATE, with a log row per line"""
+    branch_id, _, (cpu, atc, _) = stock
+    sale = {"branch_id": branch_id, "items": [
+        {"cake_product_id": cpu, "quantity": 3},
+        {"cake_product_id": atc, "quantity": 8},
+        {"cake_product_id": cpu, "quantity": 1},
+    ]}
+    query_log.clear()
+    response = client.post("/api/v1/cake/cake-stock/sale", json=sale, headers=staff_headers)
+    statements = list(query_log)
+
+    assert response.status_code == 200
+    body = {r["cake_product_id"]: r for r in response.json()}
+    assert body[cpu]["current_quantity"] == 6
+    assert body[atc]["current_quantity"] == 2 and body[atc]["is_low_stock"]
+    assert len([s for s in statements if s.startswith("UPDATE cake_stock")]) == 1
+
+    logs = db_session.query(CakeStockLog).filter(CakeStockLog.cake_product_id == cpu).order_by(CakeStockLog.id).all()
+    assert [(l.quantity_before, l.quantity_after) for l in logs] == [(10, 7), (7, 6)]
+
+
+def test_insufficient_stock_rejects_whole_sale(client, staff_headers, db_session, stock):
+    """Test one short item leaves every product untouched"""
+    branch_id, _, (cpu, atc, rvc) = stock
+    sale = {"branch_id": branch_id, "items": [
+        {"cake_product_id": cpu, "quantity": 2},
+        {"cake_product_id": atc, "quantity": 11},
+    ]}
+    response = client.post("/api/v1/cake/cake-stock/sale", json=sale, headers=staff_headers)
+    assert response.status_code == 400
+    assert "Available: 10, Requested: 11" in response.json()["detail"]
+
+    response = client.post("/api/v1/cake/cake-stock/sale", json={
+        "branch_id": branch_id, "items": [{"cake_product_id": rvc, "quantity": 1}],
+    }, headers=staff_headers)
+    assert response.status_code == 400
+    assert "initialize stock" in response.json()["detail"]
+
+    assert _quantities(db_session, branch_id) == {cpu: 10, atc: 10}
+    assert db_session.query(CakeStockLog).count() == 0
+
+
+def test_receive_and_adjust(client, staff_headers, db_session, stock):
+    """Test receipts add to existing rows and create missing ones; adjustments log the difference"""
+    branch_id, _, (cpu, _, rvc) = stock
+    response = client.post("/api/v1/cake/cake-stock/receive", json={
+        "branch_id": branch_id, "reference_number": "WH-1",
+        "items": [{"cake_product_id": cpu, "quantity": 5}, {"cake_product_id": rvc, "quantity": 4}],
+    }, headers=staff_headers)
+    assert response.status_code == 200
+    assert [r["current_quantity"] for r in response.json()] == [15, 4]
+
+    response = client.post("/api/v1/cake/cake-stock/adjust", json={
+        "branch_id": branch_id, "cake_product_id": cpu, "new_quantity": 12,
+    }, headers=staff_headers)
+    assert response.status_code == 200
+    assert response.json()["current_quantity"] == 12
+
+    adjustment = db_session.query(CakeStockLog).filter(
+        CakeStockLog.change_type == CakeStockChangeType.ADJUSTMENT
+    ).one()
+    assert (adjustment.quantity_before, adjustment.quantity_change, adjustment.quantity_after) == (15, -3, 12)
+    assert db_session.query(CakeStockLog).filter(CakeStockLog.reference_number == "WH-1").count() == 2
+
+
+def test_initial_upload_is_one_upsert(client, staff_headers, db_session, stock, query_log):
+    """Test an initial upload sets existing and new rows in one statement and logs each product once"""
+    branch_id, _, (cpu, _, rvc) = stock
+    query_log.clear()
+    response = client.post("/api/v1/cake/cake-stock/init", json={"branch_id": branch_id, "items": [
+        {"cake_product_id": cpu, "quantity": 4},
+        {"cake_product_id": rvc, "quantity": 7},
+    ]}, headers=staff_headers)
+    statements = list(query_log)
+
+    assert response.status_code == 201
+    assert [r["current_quantity"] for r in response.json()] == [4, 7]
+    assert len([s for s in statements if s.startswith("INSERT INTO cake_stock ")]) == 1
+    assert len([s for s in statements if s.startswith("INSERT INTO cake_stock_logs")]) == 1
+    assert not [s for s in statements if s.startswith("UPDATE cake_stock")]
+
+    logs = db_session.query(CakeStockLog).order_by(CakeStockLog.cake_product_id).all()
+    assert [(l.change_type, l.quantity_before, l.quantity_after) for l in logs] == [
+        (CakeStockChangeType.INITIAL, 10, 4), (CakeStockChangeType.INITIAL, 0, 7),
+    ]
+
+
+def test_concurrent_sales_never_oversell(tmp_path):
+    """Test parallel tills selling the last units: exactly the stock on hand is sold, never below zero"""
+    # File-backed so every thread gets its own connection (the shared test DB has only one)
+    file_engine = create_engine(f"sqlite:///{tmp_path / 'stock.db'}", connect_args={"timeout": 30})
+    Base.metadata.create_all(bind=file_engine)
+    Session = sessionmaker(bind=file_engine)
+    with Session() as db:
+        branch_id, user_id, (cpu, _, _) = _seed(db, quantity=100)
+
+    sold, rejected = [], []
+
+    def till():
+        with Session() as db:
+            for _ in range(25):
+                try:
+                    cake_stock.record_sale(db, branch_id, [StockLine(cpu, 1)], user_id)
+                    db.commit()
+                    sold.append(1)
+                except StockError:
+                    db.rollback()
+                    rejected.append(1)
+
+    threads = [threading.Thread(target=till) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    with Session() as db:
+        quantity = db.query(CakeStock.current_quantity).filter(CakeStock.cake_product_id == cpu).scalar()
+        logged = db.query(func.count(CakeStockLog.id), func.sum(CakeStockLog.quantity_change)).one()
+    file_engine.dispose()
+
+    assert (len(sold), len(rejected)) == (100, 100)
+    assert quantity == 0
+    assert tuple(logged) == (100, -100)
@@ -0,0 +1,120 @@
+"""
+Test daily brief snapshots and the pre-generation schedule
+Run: cd apps/api && python -m pytest tests/test_daily_brief_snapshots.py -v
+"""
+
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from models.daily_brief import DailyBriefSnapshot
+from models.location import Branch, Territory
+from models.sales import DailyBudget
+from services import daily_brief
+from services.daily_brief import brief_scheduler, get_today, next_run_at, seconds_until_next_run
+from utils.config import settings
+
+
+@pytest.fixture
+def gemini_calls(monkeypatch):
+    """Replace the Gemini call with a counting fake"""
+    calls = []
+
+    async def fake_generate(data, role, user_name, target_date):
+        calls.append(data)
+        return f"Brief #{len(calls)}"
+
+    monkeypatch.setattr(daily_brief, "_generate_brief_with_gemini", fake_generate)
+    return calls
+
+
+@pytest.fixture
+def branch(db_session, verified_user):
+    territory = Territory(name="Dubai", code="DUBAI")
+    db_session.add(territory)
+    db_session.flush()
+    branch = Branch(name="Karama Centre", code="BR-KRM-001", territory_id=territory.id)
+    db_session.add(branch)
+    db_session.commit()
+    return branch
+
+
+def test_brief_is_served_from_snapshot(client, auth_headers, branch, gemini_calls):
+    """Test a second request reuses the stored brief without calling Gemini"""
+    first = client.get("/api/v1/reports/daily-brief", headers=auth_headers).json()
+    second = client.get("/api/v1/reports/daily-brief", headers=auth_headers).json()
+
+    assert first["brief"] == "Brief #1"
+    assert first["cached"] is False
+    assert second["brief"] == "Brief #1"
+    assert second["cached"] is True
+    assert len(gemini_calls) == 1
+
+
+def test_refresh_only_regenerates_when_data_changes(client, auth_headers, db_session, branch, gemini_calls):
+    """Test refresh re-hashes the inputs and calls Gemini only if they changed"""
+    client.get("/api/v1/reports/daily-brief", headers=auth_headers)
+
+    unchanged = client.get("/api/v1/reports/daily-brief?refresh=true", headers=auth_headers).json()
+    assert unchanged["cached"] is True
+    assert len(gemini_calls) == 1
+
+    db_session.add(DailyBudget(branch_id=branch.id, budget_date=get_today(), budget_amount=5000))
+    db_session.commit()
+
+    changed = client.get("/api/v1/reports/daily-brief?refresh=true", headers=auth_headers).json()
+    assert changed["cached"] is False
+    assert changed["brief"] == "Brief #2"
+    assert db_session.query(DailyBriefSnapshot).count() == 1
+
+
+def test_fallback_brief_is_retried(client, auth_headers, branch, monkeypatch):
+    """Test a brief that fell back (Gemini unavailable) is regenerated on the next check"""
+    async def unavailable(data, role, user_name, target_date):
+        return None
+
+    monkeypatch.setattr(daily_brief, "_generate_brief_with_gemini", unavailable)
+    first = client.get("/api/v1/reports/daily-brief", headers=auth_headers).json()
+    assert first["source"] == "fallback"
+
+    async def available(data, role, user_name, target_date):
+        return "Gemini is back"
+
+    monkeypatch.setattr(daily_brief, "_generate_brief_with_gemini", available)
+    second = client.get("/api/v1/reports/daily-brief?refresh=true", headers=auth_headers).json()
+    assert second["brief"] == "Gemini is back"
+    assert second["source"] == "ai"
+
+
+def test_scheduler_pregenerates_manager_briefs(db_session, branch, gemini_calls):
+    """Test a scheduled run stores briefs and leaves unchanged ones alone the next time"""
+    first = asyncio.run(brief_scheduler.run_once())
+    second = asyncio.run(brief_scheduler.run_once())
+
+    assert first == {"generated": 1, "unchanged": 0, "failed": 0}
+    assert second == {"generated": 0, "unchanged": 1, "failed": 0}
+    assert len(gemini_calls) == 1
+    assert db_session.query(DailyBriefSnapshot).count() == 1
+
+
+def test_each_scheduled_slot_is_claimed_once():
+    """Test only the first worker to claim a slot gets to run it"""
+    run_at = datetime(2026, 3, 10, 3, 30)
+    assert brief_scheduler.claim(run_at) is True
+    assert brief_scheduler.claim(run_at) is False
+    assert brief_scheduler.claim(datetime(2026, 3, 10, 13, 30)) is True
+
+
+def test_next_run_follows_dubai_schedule(monkeypatch):
+    """Test the next slot is computed in Dubai time and wraps to tomorrow"""
+    monkeypatch.setattr(settings, "BRIEF_SCHEDULE_TIMES", "07:30,17:30")
+
+    # 02:00 UTC = 06:00 Dubai -> 07:30 Dubai
+    assert next_run_at(datetime(2026, 3, 10, 2, 0)) == datetime(2026, 3, 10, 3, 30)
+    assert seconds_until_next_run(datetime(2026, 3, 10, 2, 0)) == 90 * 60
+    # 14:00 UTC = 18:00 Dubai -> 07:30 Dubai tomorrow
+    assert seconds_until_next_run(datetime(2026, 3, 10, 14, 0)) == 13.5 * 3600
+
+    monkeypatch.setattr(settings, "BRIEF_SCHEDULE_TIMES", "")
+    assert seconds_until_next_run(datetime(2026, 3, 10, 2, 0)) is None
@@ -0,0 +1,123 @@
+"""
+Test the email outbox against a local aiosmtpd server
+Run: cd apps/api && python -m pytest tests/test_email_outbox.py -v
+"""
+
+import socket
+import time
+from datetime import datetime
+
+import pytest
+from aiosmtpd.controller import Controller
+
+from models.email_outbox import EmailJob, EmailJobStatus
+from services.email_service import EmailOutbox, queue_email
+from tests.conftest import TestSessionLocal
+from utils.config import settings
+
+
+class RecordingHandler:
+    def __init__(self):
+        self.messages = []
+        self.sessions = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.sessions.add(id(session))
+        self.messages.append((envelope.rcpt_tos, envelope.content.decode("utf8", errors="replace")))
+        return "250 Message accepted for delivery"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_settings(monkeypatch):
+    monkeypatch.setattr(settings, "SMTP_HOST", "127.0.0.1")
+    monkeypatch.setattr(settings, "SMTP_PORT", _free_port())
+    monkeypatch.setattr(settings, "SMTP_STARTTLS", False)
+    monkeypatch.setattr(settings, "SMTP_USER", "")
+    monkeypatch.setattr(settings, "REPORT_EMAIL_TO", "")
+    return settings
+
+
+@pytest.fixture
+def smtp_server(smtp_settings):
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname=smtp_settings.SMTP_HOST, port=smtp_settings.SMTP_PORT)
+    controller.start()
+    yield handler
+    controller.stop()
+
+
+def test_report_endpoint_queues_and_worker_delivers(client, auth_headers, smtp_server):
+    """Test the endpoint returns a job id at once and the status endpoint reports delivery"""
+    response = client.post("/api/v1/reports/send-email-report?target_date=2026-03-10", headers=auth_headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["queued"] is True
+    assert body["recipients"] == ["test@example.com"]
+
+    status = None
+    for _ in range(50):
+        status = client.get(f"/api/v1/reports/email-jobs/{body['job_id']}", headers=auth_headers).json()
+        if status["status"] == "sent":
+            break
+        time.sleep(0.05)
+
+    assert status["sent"] is True
+    assert status["attempts"] == 1
+    assert len(smtp_server.messages) == 1
+    assert "Daily Report" in smtp_server.messages[0][1]
+
+
+def test_worker_reuses_one_connection(db_session, smtp_server):
+    """Test several queued jobs go out over a single SMTP session"""
+    for i in range(3):
+        queue_email(db_session, [f"user{i}@example.com"], f"Report {i}", "<p>hi</p>")
+
+    outbox = EmailOutbox(session_factory=TestSessionLocal)
+    try:
+        while outbox.process_next():
+            pass
+    finally:
+        outbox.connection.close()
+
+    assert [rcpt for rcpt, _ in smtp_server.messages] == [[f"user{i}@example.com"] for i in range(3)]
+    assert len(smtp_server.sessions) == 1
+    assert db_session.query(EmailJob).filter(EmailJob.status == EmailJobStatus.SENT).count() == 3
+
+
+def test_unreachable_server_retries_then_fails(db_session, smtp_settings, monkeypatch):
+    """Test delivery failures are rescheduled with backoff, then marked failed"""
+    monkeypatch.setattr(settings, "EMAIL_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(settings, "EMAIL_RETRY_BASE_SECONDS", 0)
+    monkeypatch.setattr(settings, "SMTP_TIMEOUT_SECONDS", 1)
+    job = queue_email(db_session, ["user@example.com"], "Report", "<p>hi</p>")
+
+    outbox = EmailOutbox(session_factory=TestSessionLocal)
+    assert outbox.process_next()
+    db_session.refresh(job)
+    assert job.status == EmailJobStatus.QUEUED
+    assert job.attempts == 1
+    assert job.last_error
+    assert job.next_attempt_at <= datetime.utcnow()
+
+    assert outbox.process_next()
+    db_session.refresh(job)
+    assert job.status == EmailJobStatus.FAILED
+    assert job.attempts == 2
+    assert not outbox.process_next()
+
+
+def test_report_endpoint_reports_nothing_queued_without_smtp(client, auth_headers, monkeypatch):
+    """Test a missing SMTP host answers with the same shape and queued false"""
+    monkeypatch.setattr(settings, "SMTP_HOST", "")
+    response = client.post("/api/v1/reports/send-email-report", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json() == {
+        "queued": False, "job_id": None, "status": None, "recipients": [],
+        "message": "SMTP not configured. Add SMTP settings to environment variables.",
+    }
@@ -0,0 +1,88 @@
+"""
+Test expiry requests and responses are written in a constant number of statements
+Run: cd apps/api && python -m pytest tests/test_expiry_bulk.py -v
+"""
+
+import pytest
+
+from models.expiry import ExpiryRequestBranch, ExpiryRequestItem, ExpiryResponse
+
+
+@pytest.fixture
+def branch_specs():
+    return [(f"Parlor {i}", f"BR-{i:03d}") for i in range(1, 6)]
+
+
+def _create(client, auth_headers, branch_ids, item_count):
+    response = client.post("/api/v1/expiry/requests", headers=auth_headers, json={
+        "title": "Monthly expiry check",
+        "items": [f"Product {i}" for i in range(item_count)] + [{"product_name": "Cone", "expiry_date": "2026-04-01"}],
+        "branch_ids": branch_ids,
+    })
+    assert response.status_code == 201
+    return response.json()["id"]
+
+
+def _writes(query_log, table):
+    return [s for s in query_log if s.lstrip().upper().startswith(("INSERT", "UPDATE")) and table in s]
+
+
+def test_create_inserts_items_and_branches_in_bulk(client, auth_headers, db_session, branches, query_log):
+    """Test creating a request costs one INSERT for items and one for branches"""
+    client.get("/api/v1/branches", headers=auth_headers)  # warm the auth and reference caches
+    query_log.clear()
+    request_id = _create(client, auth_headers, branches, item_count=80)
+
+    assert len(_writes(query_log, "expiry_request_items")) == 1
+    assert len(_writes(query_log, "expiry_request_branches")) == 1
+    items = (db_session.query(ExpiryRequestItem)
+             .filter(ExpiryRequestItem.expiry_request_id == request_id)
+             .order_by(ExpiryRequestItem.sort_order).all())
+    assert len(items) == 81
+    assert items[-1].product_name == "Cone"
+    assert str(items[-1].expiry_date) == "2026-04-01"
+    assert db_session.query(ExpiryRequestBranch).count() == 5
+
+    response = client.put(f"/api/v1/expiry/requests/{request_id}", headers=auth_headers,
+                          json={"items": ["Cone", "Cone", "Sundae"], "branch_ids": branches[:2]})
+    assert response.status_code == 200
+    db_session.expire_all()
+    assert [i.product_name for i in db_session.query(ExpiryRequestItem).order_by(ExpiryRequestItem.sort_order)] == ["Cone", "Sundae"]
+    assert db_session.query(ExpiryRequestBranch).count() == 2
+
+
+def test_responses_query_count_is_constant(client, auth_headers, staff_headers, db_session, branches, query_log):
+    """Test submitting 5 or 80 responses costs the same number of queries, and resubmitting updates"""
+    counts = []
+    for item_count in (5, 80):
+        request_id = _create(client, auth_headers, branches, item_count)
+        item_ids = [i.id for i in db_session.query(ExpiryRequestItem)
+                    .filter(ExpiryRequestItem.expiry_request_id == request_id)]
+        payload = {"expiry_request_id": request_id,
+                   "responses": [{"expiry_request_item_id": i, "quantity": 3} for i in item_ids]}
+        client.post("/api/v1/expiry/responses", headers=staff_headers, json=payload)
+        query_log.clear()
+        payload["responses"][0]["quantity"] = 7
+        response = client.post("/api/v1/expiry/responses", headers=staff_headers, json=payload)
+        assert response.status_code == 200
+        counts.append(len(query_log))
+
+    assert counts[0] == counts[1]
+    db_session.expire_all()
+    rows = db_session.query(ExpiryResponse).filter(ExpiryResponse.expiry_request_id == request_id).all()
+    assert len(rows) == 81
+    assert sorted(r.quantity for r in rows)[-1] == 7
+
+
+def test_responses_reject_items_of_other_requests(client, auth_headers, staff_headers, db_session, branches):
+    """Test an item id from another request is refused without writing anything"""
+    first = _create(client, auth_headers, branches, 1)
+    second = _create(client, auth_headers, branches, 1)
+    other_item = db_session.query(ExpiryRequestItem).filter(ExpiryRequestItem.expiry_request_id == first).first()
+
+    response = client.post("/api/v1/expiry/responses", headers=staff_headers, json={
+        "expiry_request_id": second,
+        "responses": [{"expiry_request_item_id": other_item.id, "quantity": 1}],
+    })
+    assert response.status_code == 400
+    assert db_session.query(ExpiryResponse).count() == 0
@@ -0,0 +1,93 @@
+"""
+Test the expiry request listing: one statement per page, keyset pagination, status filter
+Run: cd apps/api && python -m pytest tests/test_expiry_listing.py -v
+"""
+
+import pytest
+
+from models.expiry import (
+    ExpiryBranchStatus, ExpiryRequest, ExpiryRequestBranch, ExpiryRequestItem, ExpiryRequestStatus,
+)
+from models.location import Branch, Territory
+from models.user import User
+
+
+@pytest.fixture
+def add_requests(db_session, verified_user):
+    """Add requests with 3 items and 4 branches each, the first `responded` branches submitted"""
+    territory = Territory(name="Dubai", code="DUBAI")
+    db_session.add(territory)
+    db_session.flush()
+    branches = [Branch(name=f"Parlor {i}", code=f"BR-{i:03d}", territory_id=territory.id) for i in range(4)]
+    db_session.add_all(branches)
+    db_session.flush()
+    creator_id = db_session.query(User.id).scalar()
+    created = []
+
+    def add(count, responded=1, status=ExpiryRequestStatus.OPEN):
+        for _ in range(count):
+            req = ExpiryRequest(title=f"Check {len(created) + 1}", created_by_id=creator_id, status=status)
+            req.items = [ExpiryRequestItem(product_name=f"Product {i}", sort_order=i) for i in range(3)]
+            req.branches = [
+                ExpiryRequestBranch(branch_id=b.id, status=ExpiryBranchStatus.SUBMITTED if i < responded
+                                    else ExpiryBranchStatus.PENDING)
+                for i, b in enumerate(branches)
+            ]
+            db_session.add(req)
+            db_session.flush()
+            created.append(req.id)
+        db_session.commit()
+        return list(created)
+
+    return add
+
+
+def _list(client, auth_headers, query=""):
+    response = client.get(f"/api/v1/expiry/requests{query}", headers=auth_headers)
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_listing_is_one_statement_per_page(client, auth_headers, add_requests, query_log):
+    """Test 2 or 30 requests cost the same queries and carry correct counts"""
+    add_requests(2)
+    _list(client, auth_headers)  # warm the auth caches
+    query_log.clear()
+    _list(client, auth_headers)
+    small = len(query_log)
+
+    add_requests(28, responded=3)
+    query_log.clear()
+    body = _list(client, auth_headers)
+
+    assert len(query_log) == small
+    assert len(body) == 30
+    assert body[0]["title"] == "Check 30"
+    assert (body[0]["item_count"], body[0]["branch_count"], body[0]["responded_count"]) == (3, 4, 3)
+    assert body[-1]["responded_count"] == 1
+    assert body[0]["created_by_name"] == "Test User"
+
+
+def test_keyset_pagination_and_status_filter(client, auth_headers, add_requests):
+    """Test the next-page header walks newest-first without gaps, and status_filter narrows the page"""
+    ids = add_requests(5)
+    ids += add_requests(2, status=ExpiryRequestStatus.CLOSED)[-2:]
+
+    seen, query, pages = [], "?limit=3", 0
+    while query is not None:
+        response = client.get(f"/api/v1/expiry/requests{query}", headers=auth_headers)
+        seen.extend(r["id"] for r in response.json())
+        pages += 1
+        next_id = response.headers.get("X-Next-Before-Id")
+        query = f"?limit=3&before_id={next_id}" if next_id else None
+    assert seen == sorted(ids, reverse=True)
+    assert pages == 3
+
+    # Without a limit the whole listing comes back, as before paging existed
+    response = client.get("/api/v1/expiry/requests", headers=auth_headers)
+    assert len(response.json()) == 7
+    assert "X-Next-Before-Id" not in response.headers
+
+    closed = _list(client, auth_headers, "?status_filter=closed")
+    assert [r["status"] for r in closed] == ["closed", "closed"]
+    assert client.get("/api/v1/expiry/requests?status_filter=bogus", headers=auth_headers).status_code == 422
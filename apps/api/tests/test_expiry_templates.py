@@ -0,0 +1,155 @@
+"""
+Test expiry templates live in the file store: dedup, streamed download, legacy migration, cleanup
+Run: cd apps/api && python -m pytest tests/test_expiry_templates.py -v
+"""
+
+import base64
+import hashlib
+
+import pytest
+from sqlalchemy import update
+
+from models.expiry import ExpiryRequest
+from models.stored_file import StoredFile
+from services import file_store
+from tests.conftest import engine
+
+TEMPLATE = b"PK\x03\x04" + bytes(range(256)) * 600  # ~150 KB, several download chunks
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    local = file_store.LocalFileStore(tmp_path)
+    monkeypatch.setattr(file_store, "_store", local)
+    return local
+
+
+@pytest.fixture
+def branch_id(branches):
+    return branches[0]
+
+
+def _create(client, auth_headers, branch_id, template=TEMPLATE):
+    response = client.post("/api/v1/expiry/requests", headers=auth_headers, json={
+        "title": "Monthly expiry check",
+        "items": ["Cone"],
+        "branch_ids": [branch_id],
+        "template_file_data": base64.b64encode(template).decode(),
+        "template_filename": "expiry.xlsx",
+    })
+    assert response.status_code == 201
+    return response.json()["id"]
+
+
+def test_templates_are_deduplicated_and_streamed(client, auth_headers, db_session, branch_id, store):
+    """Test the same upload is stored once and downloads byte-for-byte"""
+    first = _create(client, auth_headers, branch_id)
+    second = _create(client, auth_headers, branch_id)
+
+    assert db_session.query(StoredFile).count() == 1
+    sha256 = hashlib.sha256(TEMPLATE).hexdigest()
+    assert store.exists(sha256)
+    assert db_session.get(ExpiryRequest, first).template_file_id == db_session.get(ExpiryRequest, second).template_file_id
+
+    response = client.get(f"/api/v1/expiry/requests/{second}/template", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.content == TEMPLATE
+    assert response.headers["content-length"] == str(len(TEMPLATE))
+    assert response.headers["etag"] == f'"{sha256}"'
+    assert 'filename="expiry.xlsx"' in response.headers["content-disposition"]
+
+
+def test_listings_do_not_load_template_data(client, auth_headers, branch_id, store, query_log):
+    """Test list and detail endpoints never select the legacy base64 column"""
+    request_id = _create(client, auth_headers, branch_id)
+    query_log.clear()
+    client.get("/api/v1/expiry/requests", headers=auth_headers)
+    detail = client.get(f"/api/v1/expiry/requests/{request_id}", headers=auth_headers).json()
+    statements = list(query_log)
+
+    assert detail["has_template"] is True
+    assert not [s for s in statements if "template_file_data" in s]
+
+
+def test_legacy_templates_are_moved_out_of_the_table(client, auth_headers, db_session, branch_id, store):
+    """Test the migration moves base64 rows into the store and downloads keep working"""
+    response = client.post("/api/v1/expiry/requests", headers=auth_headers, json={
+        "title": "Old request", "items": ["Cone"], "branch_ids": [branch_id],
+    })
+    request_id = response.json()["id"]
+    with engine.begin() as conn:
+        conn.execute(update(ExpiryRequest.__table__).where(ExpiryRequest.id == request_id).values(
+            template_file_data=base64.b64encode(TEMPLATE).decode(),
+            template_filename="old.xlsx",
+        ))
+
+    assert file_store.move_legacy_expiry_templates(db_session) == 1
+    assert file_store.move_legacy_expiry_templates(db_session) == 0
+
+    db_session.expire_all()
+    req = db_session.get(ExpiryRequest, request_id)
+    assert req.template_file_data is None
+    assert req.template_file.size_bytes == len(TEMPLATE)
+    download = client.get(f"/api/v1/expiry/requests/{request_id}/template", headers=auth_headers)
+    assert download.content == TEMPLATE
+
+
+def test_deleting_the_last_request_removes_the_blob(client, auth_headers, db_session, branch_id, store):
+    """Test a shared blob survives until no request references it"""
+    first = _create(client, auth_headers, branch_id)
+    second = _create(client, auth_headers, branch_id)
+    sha256 = hashlib.sha256(TEMPLATE).hexdigest()
+
+    client.delete(f"/api/v1/expiry/requests/{first}", headers=auth_headers)
+    assert store.exists(sha256)
+    client.delete(f"/api/v1/expiry/requests/{second}", headers=auth_headers)
+    assert not store.exists(sha256)
+    assert db_session.query(StoredFile).count() == 0
+
+
+def test_blob_is_kept_until_the_delete_commits(db_session, branch_id, store):
+    """Test a rolled-back delete keeps the blob, and a re-saved file keeps it after the commit"""
+    stored = file_store.save_file(db_session, TEMPLATE, file_store.XLSX_CONTENT_TYPE)
+    db_session.commit()
+
+    assert file_store.delete_file_if_unused(db_session, stored.id)
+    assert store.exists(stored.sha256)
+    db_session.rollback()
+    assert store.exists(stored.sha256)
+
+    assert file_store.delete_file_if_unused(db_session, stored.id)
+    db_session.commit()
+    assert not store.exists(stored.sha256)
+
+    # The content is saved again before the deleting transaction gets to the blob
+    stored = file_store.save_file(db_session, TEMPLATE, file_store.XLSX_CONTENT_TYPE)
+    db_session.commit()
+    file_store._delete_unreferenced_blobs(engine, {stored.sha256})
+    assert store.exists(stored.sha256)
+
+
+def test_reupload_restores_a_missing_blob(client, auth_headers, db_session, branch_id, store):
+    """Test saving content whose row exists but whose blob is gone writes the blob again"""
+    _create(client, auth_headers, branch_id)
+    sha256 = hashlib.sha256(TEMPLATE).hexdigest()
+    store.delete(sha256)
+
+    request_id = _create(client, auth_headers, branch_id)
+    download = client.get(f"/api/v1/expiry/requests/{request_id}/template", headers=auth_headers)
+    assert download.status_code == 200
+    assert download.content == TEMPLATE
+
+
+def test_file_store_backends_must_implement_every_operation():
+    """Test the backend base class is abstract"""
+    with pytest.raises(TypeError):
+        file_store.FileStore()
+
+
+def test_invalid_base64_is_rejected(client, auth_headers, branch_id, store):
+    """Test a malformed template upload fails the request instead of storing garbage"""
+    response = client.post("/api/v1/expiry/requests", headers=auth_headers, json={
+        "title": "Broken", "items": ["Cone"], "branch_ids": [branch_id],
+        "template_file_data": "not base64!!",
+    })
+    assert response.status_code == 400
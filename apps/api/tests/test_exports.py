@@ -0,0 +1,140 @@
+"""
+Test the streaming CSV / XLSX exports
+Run: cd apps/api && python -m pytest tests/test_exports.py -v
+"""
+
+import csv
+import io
+from datetime import date
+
+import openpyxl
+import pytest
+
+from models.expiry import ExpiryBranchStatus, ExpiryRequest, ExpiryRequestBranch, ExpiryRequestItem, ExpiryResponse
+from models.location import Branch, Territory
+from models.sales import BranchDaySales, DailyBudget, DailySales, SalesWindowType
+from models.user import User
+from services import export
+
+
+@pytest.fixture
+def seeded(db_session, verified_user):
+    territory = Territory(name="Dubai", code="DUBAI")
+    db_session.add(territory)
+    db_session.flush()
+    branches = [Branch(name=name, code=code, territory_id=territory.id)
+                for name, code in (("Karama", "BR-KRM"), ("Deira", "BR-DRA"))]
+    db_session.add_all(branches)
+    db_session.flush()
+    user_id = db_session.query(User.id).scalar()
+    db_session.commit()
+    return {"user_id": user_id, "branches": [b.id for b in branches]}
+
+
+def _csv_rows(response):
+    assert response.status_code == 200
+    assert response.content.startswith(b"\xef\xbb\xbf")
+    return list(csv.reader(io.StringIO(response.content.decode("utf-8-sig"))))
+
+
+def test_csv_header_is_sent_before_rows_are_read():
+    """Test the first chunk goes out without touching the row source"""
+    def rows():
+        raise AssertionError("rows read too early")
+        yield
+
+    chunks = export.iter_csv(["A", "B"], rows())
+    assert next(chunks) == b"\xef\xbb\xbfA,B\r\n"
+
+
+def test_expiry_matrix_csv_and_xlsx(client, auth_headers, db_session, seeded):
+    """Test responses pivot into one row per item with a qty/expiry pair per branch"""
+    karama, deira = seeded["branches"]
+    req = ExpiryRequest(title="March check", created_by_id=seeded["user_id"])
+    req.items = [ExpiryRequestItem(product_name=name, sort_order=i) for i, name in enumerate(["Cone", "Cake", "Cup"])]
+    req.branches = [ExpiryRequestBranch(branch_id=b, status=ExpiryBranchStatus.SUBMITTED) for b in (karama, deira)]
+    db_session.add(req)
+    db_session.flush()
+    cone, cake, _ = req.items
+    db_session.add_all([
+        ExpiryResponse(expiry_request_id=req.id, expiry_request_item_id=cone.id, branch_id=deira,
+                       quantity=4, expiry_date=date(2026, 4, 1), submitted_by_id=seeded["user_id"]),
+        ExpiryResponse(expiry_request_id=req.id, expiry_request_item_id=cake.id, branch_id=karama,
+                       quantity=2, submitted_by_id=seeded["user_id"]),
+    ])
+    db_session.commit()
+
+    rows = _csv_rows(client.get(f"/api/v1/exports/expiry/{req.id}", headers=auth_headers))
+    assert rows[0] == ["Product", "Expected Expiry", "Karama Qty", "Karama Expiry", "Deira Qty", "Deira Expiry"]
+    assert rows[1:] == [
+        ["Cone", "", "", "", "4.0", "2026-04-01"],
+        ["Cake", "", "2.0", "", "", ""],
+        ["Cup", "", "", "", "", ""],
+    ]
+
+    response = client.get(f"/api/v1/exports/expiry/{req.id}?format=xlsx", headers=auth_headers)
+    assert response.headers["content-disposition"] == f'attachment; filename="expiry-{req.id}.xlsx"'
+    ws = openpyxl.load_workbook(io.BytesIO(response.content), read_only=True).active
+    assert ws.title == "March check"
+    assert [list(r[:3]) for r in ws.iter_rows(min_row=3, max_row=3, values_only=True)] == [["Cake", None, 2]]
+
+
+def test_xlsx_sheet_title_drops_invalid_characters(client, auth_headers, db_session, seeded):
+    """Test a request title with / and : still exports, under a cleaned sheet name"""
+    req = ExpiryRequest(title="Expiry check 03/2026: Dubai", created_by_id=seeded["user_id"])
+    req.items = [ExpiryRequestItem(product_name="Cone", sort_order=0)]
+    db_session.add(req)
+    db_session.commit()
+
+    response = client.get(f"/api/v1/exports/expiry/{req.id}?format=xlsx", headers=auth_headers)
+    assert response.status_code == 200
+    ws = openpyxl.load_workbook(io.BytesIO(response.content), read_only=True).active
+    assert ws.title == "Expiry check 03 2026 Dubai"
+    assert export.safe_sheet_title("[//]") == export.DEFAULT_SHEET_TITLE
+
+
+def test_daily_sales_range(client, auth_headers, db_session, seeded):
+    """Test every window in the range is exported in date order with branch names"""
+    karama, deira = seeded["branches"]
+    for day in (1, 2, 3):
+        for branch_id in (karama, deira):
+            db_session.add(DailySales(branch_id=branch_id, date=date(2026, 3, day), sales_window=SalesWindowType.CLOSING,
+                                      total_sales=100 * day, gross_sales=110 * day, transaction_count=10,
+                                      submitted_by_id=seeded["user_id"]))
+    db_session.commit()
+
+    rows = _csv_rows(client.get(
+        f"/api/v1/exports/daily-sales?start_date=2026-03-02&end_date=2026-03-03&branch_id={deira}",
+        headers=auth_headers,
+    ))
+    assert rows[0][:6] == ["Date", "Branch Code", "Branch", "Window", "Gross Sales", "Net Sales"]
+    assert [(r[0], r[2], r[3], r[5]) for r in rows[1:]] == [
+        ("2026-03-02", "Deira", "closing", "200.0"),
+        ("2026-03-03", "Deira", "closing", "300.0"),
+    ]
+    assert rows[1][-2] == "Test User"
+
+    bad = client.get("/api/v1/exports/daily-sales?start_date=2026-03-03&end_date=2026-03-01", headers=auth_headers)
+    assert bad.status_code == 400
+
+
+def test_tracker_month_merges_budgets_and_sales(client, auth_headers, db_session, seeded):
+    """Test budget-only, sales-only and matched days all appear in (branch, date) order"""
+    karama, _ = seeded["branches"]
+    db_session.add_all([
+        DailyBudget(branch_id=karama, budget_date=date(2026, 3, 1), day_name="Sun", budget_amount=1000, ly_sales=800, ly_gc=40),
+        DailyBudget(branch_id=karama, budget_date=date(2026, 3, 2), day_name="Mon", budget_amount=1000, ly_sales=800, ly_gc=40),
+        BranchDaySales(branch_id=karama, date=date(2026, 3, 2), gross_sales=1200, transaction_count=50, windows_submitted=4),
+        BranchDaySales(branch_id=karama, date=date(2026, 3, 3), gross_sales=500, transaction_count=20, windows_submitted=1),
+        BranchDaySales(branch_id=karama, date=date(2026, 4, 1), gross_sales=999, transaction_count=1, windows_submitted=1),
+    ])
+    db_session.commit()
+
+    rows = _csv_rows(client.get("/api/v1/exports/tracker?month=2026-03", headers=auth_headers))
+    status = rows[0].index("Status")
+    assert [(r[0], r[1], r[7], r[status]) for r in rows[1:]] == [
+        ("2026-03-01", "Sun", "0", "critical"),
+        ("2026-03-02", "Mon", "1200.0", "achieved"),
+        ("2026-03-03", "Tue", "500.0", "no_budget"),
+    ]
+    assert client.get("/api/v1/exports/tracker?month=March", headers=auth_headers).status_code == 400
@@ -0,0 +1,65 @@
+"""
+Test the content-addressed extraction cache
+Run: cd apps/api && python -m pytest tests/test_extraction_cache.py -v
+"""
+
+import asyncio
+
+import pytest
+
+from services.extraction_cache import ExtractionCache, cached_extraction, extraction_cache, extraction_key
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    extraction_cache.clear()
+    yield
+    extraction_cache.clear()
+
+
+def test_repeat_upload_is_served_from_cache(client, auth_headers):
+    """Test the same image + type hits the cache and the stats endpoint reports it"""
+    calls = []
+
+    @cached_extraction("test", "hd", "prompt v1")
+    async def extract(image_bytes):
+        calls.append(image_bytes)
+        return {"gross_sales": 10.0}
+
+    first = asyncio.run(extract(b"photo"))
+    first["gross_sales"] = 99  # callers mutating a result must not poison the cache
+    second = asyncio.run(extract(b"photo"))
+
+    assert len(calls) == 1
+    assert second == {"gross_sales": 10.0}
+
+    response = client.get("/api/v1/sales/extraction-cache/stats", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["hits"] == 1
+    assert response.json()["misses"] == 1
+
+
+def test_key_covers_type_prompt_and_every_image():
+    """Test receipt type, prompt version and image order all change the key"""
+    base = extraction_key("claude", "hd", "p1", [b"a", b"b"])
+    assert base == extraction_key("claude", "hd", "p1", [b"a", b"b"])
+    assert base != extraction_key("claude", "deliveroo", "p1", [b"a", b"b"])
+    assert base != extraction_key("claude", "hd", "p2", [b"a", b"b"])
+    assert base != extraction_key("claude", "hd", "p1", [b"b", b"a"])
+    assert extraction_key("claude", "hd", "p1", b"a") == extraction_key("claude", "hd", "p1", [b"a"])
+
+
+def test_ttl_and_size_bound():
+    """Test expired entries miss and the oldest entry is evicted past max_entries"""
+    cache = ExtractionCache(max_entries=2, ttl_seconds=60)
+    cache.put("a", {"v": 1}, 1.0)
+    cache.put("b", {"v": 2}, 1.0)
+    cache.get("a")  # a is now most recent
+    cache.put("c", {"v": 3}, 1.0)
+    assert cache.get("b") is None
+    assert cache.get("a") == {"v": 1}
+    assert cache.stats()["evictions"] == 1
+
+    expired = ExtractionCache(max_entries=2, ttl_seconds=-1)
+    expired.put("a", {"v": 1}, 1.0)
+    assert expired.get("a") is None
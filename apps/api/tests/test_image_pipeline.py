@@ -0,0 +1,77 @@
+"""
+Test upload image normalization
+Run: cd apps/api && python -m pytest tests/test_image_pipeline.py -v
+"""
+
+import asyncio
+import io
+
+from PIL import Image
+
+from services import image_pipeline
+from services.image_pipeline import normalize_image, normalize_images
+
+
+def _image_bytes(size, mode="RGB", fmt="JPEG"):
+    buf = io.BytesIO()
+    Image.new(mode, size, color=(200, 120, 40, 255)[:len(mode)]).save(buf, format=fmt)
+    return buf.getvalue()
+
+
+def test_large_jpeg_is_downscaled_once_with_timings():
+    """Test a phone-sized JPEG comes out as one bounded JPEG with per-stage timings"""
+    output, timings = normalize_image(_image_bytes((4000, 3000)))
+    img = Image.open(io.BytesIO(output))
+    assert img.format == "JPEG"
+    assert max(img.size) == 1600
+    assert timings["original_size"] == [4000, 3000]
+    for stage in ("decode_ms", "resize_ms", "encode_ms", "total_ms"):
+        assert stage in timings
+
+
+def test_png_with_alpha_converted_and_garbage_passed_through():
+    """Test RGBA PNGs become RGB JPEGs and undecodable bytes are left alone"""
+    output, _ = normalize_image(_image_bytes((300, 200), mode="RGBA", fmt="PNG"))
+    img = Image.open(io.BytesIO(output))
+    assert (img.format, img.mode, img.size) == ("JPEG", "RGB", (300, 200))
+
+    output, timings = normalize_image(b"not an image")
+    assert output == b"not an image"
+    assert "skipped" in timings
+
+
+def test_normalize_images_keeps_order_on_process_pool(monkeypatch):
+    """Test parallel normalization on the process pool returns images in upload order"""
+    monkeypatch.setattr(image_pipeline.settings, "IMAGE_WORKERS", 2)
+    sizes = [(2000, 1000), (100, 50), (1700, 1700)]
+    try:
+        images, timings = asyncio.run(normalize_images([_image_bytes(s) for s in sizes]))
+    finally:
+        image_pipeline.shutdown_pipeline()
+    assert [Image.open(io.BytesIO(i)).size for i in images] == [(1600, 800), (100, 50), (1600, 1600)]
+    assert len(timings) == 3
+
+
+def test_extract_receipt_returns_timings(client, auth_headers, monkeypatch):
+    """Test /sales/extract-receipt normalizes uploads and reports stage timings"""
+    import services.claude_vision as claude_vision
+
+    received = []
+
+    async def fake_extract(image_bytes):
+        received.append(image_bytes)
+        return {"gross_sales": 1.0}
+
+    monkeypatch.setattr(image_pipeline.settings, "IMAGE_WORKERS", 0)
+    monkeypatch.setattr(claude_vision, "extract_hd_sales", fake_extract)
+    response = client.post(
+        "/api/v1/sales/extract-receipt",
+        params={"receipt_type": "hd"},
+        files=[("files", ("hd.png", _image_bytes((2400, 1200), fmt="PNG"), "image/png"))],
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert body["success"] is True
+    assert body["timings"][0]["output_size"] == [1600, 800]
+    assert Image.open(io.BytesIO(received[0])).format == "JPEG"
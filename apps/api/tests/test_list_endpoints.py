@@ -0,0 +1,99 @@
+"""
+Test the users and branches list endpoints: constant query count and keyset pagination
+Run: cd apps/api && python -m pytest tests/test_list_endpoints.py -v
+"""
+
+import pytest
+
+from models.location import Area, Branch, Territory
+from models.user import User, UserRole
+
+
+@pytest.fixture
+def add_branches(db_session):
+    """Add branches, each with an area manager and two staff users"""
+    territory = Territory(name="Dubai", code="DUBAI")
+    db_session.add(territory)
+    db_session.flush()
+    area = Area(name="Karama", code="DXB-KARAMA", territory_id=territory.id)
+    db_session.add(area)
+    db_session.flush()
+    created = []
+
+    def add(count):
+        for _ in range(count):
+            n = len(created) + 1
+            manager = User(email=f"am{n}@example.com", username=f"am{n}", hashed_password="x",
+                           full_name=f"AM {n}", role=UserRole.ADMIN, territory_id=territory.id)
+            db_session.add(manager)
+            db_session.flush()
+            branch = Branch(name=f"Branch {n}", code=f"BR-{n:03d}", territory_id=territory.id,
+                            area_id=area.id, manager_id=manager.id)
+            db_session.add(branch)
+            db_session.flush()
+            db_session.add_all([
+                User(email=f"fe{n}-{i}@example.com", username=f"fe{n}-{i}", hashed_password="x",
+                     full_name=f"FE {n}-{i}", role=UserRole.STAFF, branch_id=branch.id,
+                     area_id=area.id, territory_id=territory.id)
+                for i in range(2)
+            ])
+            created.append(branch.id)
+        db_session.commit()
+        return list(created)
+
+    return add
+
+
+def _count_list_queries(client, auth_headers, query_log, path):
+    client.get(path, headers=auth_headers)  # warm the auth and reference caches
+    query_log.clear()
+    response = client.get(path, headers=auth_headers)
+    assert response.status_code == 200
+    return len(query_log), response.json()
+
+
+def test_branch_list_query_count_is_constant(client, auth_headers, add_branches, query_log):
+    """Test listing branches costs the same number of queries for 2 or 8 branches"""
+    add_branches(2)
+    small, _ = _count_list_queries(client, auth_headers, query_log, "/api/v1/branches")
+    add_branches(6)
+    large, body = _count_list_queries(client, auth_headers, query_log, "/api/v1/branches")
+
+    assert small == large
+    assert len(body) == 8
+    assert body[0]["manager_name"] == "AM 1"
+    assert body[0]["staff_count"] == 2
+    assert body[0]["area_name"] == "Karama"
+    assert body[0]["territory_name"] == "Dubai"
+
+
+def test_user_list_query_count_is_constant(client, auth_headers, add_branches, query_log):
+    """Test listing users costs the same number of queries as the page grows"""
+    add_branches(1)
+    small, _ = _count_list_queries(client, auth_headers, query_log, "/api/v1/users")
+    add_branches(5)
+    large, body = _count_list_queries(client, auth_headers, query_log, "/api/v1/users")
+
+    assert small == large
+    staff = next(u for u in body if u["username"] == "fe1-0")
+    assert staff["branch_name"] == "Branch 1"
+    assert staff["territory_name"] == "Dubai"
+
+
+def test_keyset_pagination(client, auth_headers, add_branches):
+    """Test after_id pages through branches in id order without gaps or repeats"""
+    branch_ids = add_branches(5)
+
+    seen, after_id = [], 0
+    while True:
+        page = client.get(f"/api/v1/branches?limit=2&after_id={after_id}", headers=auth_headers).json()
+        if not page:
+            break
+        seen.extend(b["id"] for b in page)
+        after_id = page[-1]["id"]
+
+    assert seen == branch_ids
+
+    users = client.get("/api/v1/users?limit=100", headers=auth_headers).json()
+    tail = client.get(f"/api/v1/users?after_id={users[4]['id']}&limit=100", headers=auth_headers).json()
+    assert [u["id"] for u in tail] == [u["id"] for u in users[5:]]
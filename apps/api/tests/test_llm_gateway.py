@@ -0,0 +1,83 @@
+"""
+Test the LLM gateway worker pools
+Run: cd apps/api && python -m pytest tests/test_llm_gateway.py -v
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from services import llm_gateway
+from services.llm_gateway import CLAUDE, GEMINI, LLMTimeoutError, call_llm
+from utils.config import settings
+
+
+@pytest.fixture(autouse=True)
+def fresh_gateway(monkeypatch):
+    """Small pools per test, torn down afterwards"""
+    monkeypatch.setattr(settings, "LLM_GEMINI_CONCURRENCY", 2)
+    monkeypatch.setattr(settings, "LLM_CLAUDE_CONCURRENCY", 2)
+    llm_gateway.shutdown_gateway(wait=True)
+    yield
+    llm_gateway.shutdown_gateway(wait=True)
+
+
+def test_provider_concurrency_is_bounded():
+    """Test no more than the provider limit run at once"""
+    lock = threading.Lock()
+    state = {"running": 0, "peak": 0}
+
+    def slow_call():
+        with lock:
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+        time.sleep(0.05)
+        with lock:
+            state["running"] -= 1
+        return "ok"
+
+    async def run():
+        return await asyncio.gather(*[call_llm(GEMINI, slow_call) for _ in range(6)])
+
+    assert asyncio.run(run()) == ["ok"] * 6
+    assert state["peak"] == 2
+
+
+def test_slow_provider_does_not_stall_other_provider_or_loop():
+    """Test a saturated Gemini pool leaves Claude calls and the event loop responsive"""
+    release = threading.Event()
+
+    def stuck_gemini():
+        release.wait(2)
+        return "gemini"
+
+    async def run():
+        gemini = [asyncio.create_task(call_llm(GEMINI, stuck_gemini)) for _ in range(4)]
+        await asyncio.sleep(0.01)
+
+        started = time.monotonic()
+        claude = await call_llm(CLAUDE, lambda: "claude")
+        await asyncio.sleep(0)  # loop still schedules other work
+        elapsed = time.monotonic() - started
+
+        release.set()
+        return claude, elapsed, await asyncio.gather(*gemini)
+
+    claude, elapsed, gemini = asyncio.run(run())
+    assert claude == "claude"
+    assert elapsed < 0.5
+    assert gemini == ["gemini"] * 4
+
+
+def test_call_times_out():
+    """Test a hung call raises LLMTimeoutError instead of holding the request"""
+    release = threading.Event()
+
+    async def run():
+        with pytest.raises(LLMTimeoutError):
+            await call_llm(CLAUDE, release.wait, 2, timeout=0.05)
+        release.set()
+
+    asyncio.run(run())
@@ -0,0 +1,122 @@
+"""
+Test coalesced low-stock push digests
+Run: cd apps/api && python -m pytest tests/test_low_stock_digest.py -v
+"""
+
+import json
+
+import pytest
+
+from models.location import Area, Branch, Territory
+from models.notification import PushSubscription
+from models.user import User, UserRole
+from services import push_service
+from services.push_service import LowStockEvent, notify_low_stock
+
+
+@pytest.fixture
+def branch_with_subscribers(db_session):
+    """A branch with one staff device and an area manager + HQ admin subscribed"""
+    territory = Territory(name="Dubai", code="DUBAI")
+    db_session.add(territory)
+    db_session.flush()
+    area = Area(name="Karama", code="DXB-KARAMA", territory_id=territory.id)
+    db_session.add(area)
+    db_session.flush()
+    branch = Branch(name="Karama Centre", code="BR-KRM-001", territory_id=territory.id, area_id=area.id)
+    db_session.add(branch)
+    db_session.flush()
+
+    managers = [
+        User(email="am@example.com", username="am", hashed_password="x", full_name="AM",
+             role=UserRole.ADMIN, area_id=area.id),
+        User(email="hq@example.com", username="hq", hashed_password="x", full_name="HQ",
+             role=UserRole.SUPREME_ADMIN),
+    ]
+    db_session.add_all(managers)
+    db_session.flush()
+
+    db_session.add_all(
+        [PushSubscription(branch_id=branch.id, endpoint="https://push.example/staff", p256dh_key="k", auth_key="a")]
+        + [PushSubscription(user_id=m.id, endpoint=f"https://push.example/{m.username}", p256dh_key="k", auth_key="a")
+           for m in managers]
+    )
+    db_session.commit()
+    return branch.id
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    """Capture (endpoints, payload) instead of queueing real pushes"""
+    pushes = []
+
+    def capture(db, subscriptions, payload):
+        pushes.append((sorted(s.endpoint for s in subscriptions), json.loads(payload)))
+        return len(subscriptions)
+
+    monkeypatch.setattr(push_service, "_send_to_subscriptions", capture)
+    return pushes
+
+
+SALE = [
+    LowStockEvent("Chocolate Cake", "CPU", 0, 2),
+    LowStockEvent("Cookies Cake", "ATC", 1, 2),
+    LowStockEvent("Red Velvet", "RVC", 5, 2),  # still above threshold
+]
+
+
+def test_batch_sends_one_digest_per_recipient_group(db_session, branch_with_subscribers, sent):
+    """Test a multi-item sale produces one staff push and one manager push"""
+    assert notify_low_stock(db_session, branch_with_subscribers, SALE) == 2
+
+    assert [endpoints for endpoints, _ in sent] == [
+        ["https://push.example/staff"],
+        ["https://push.example/am", "https://push.example/hq"],
+    ]
+    payload = sent[0][1]
+    assert payload["title"] == "OUT OF STOCK: 1 cakes, 1 low"
+    assert "Chocolate Cake (out)" in payload["body"]
+    assert "Cookies Cake (1 left, min 2)" in payload["body"]
+    assert "Red Velvet" not in payload["body"]
+
+
+def test_repeat_alerts_suppressed_within_cooldown(db_session, branch_with_subscribers, sent):
+    """Test the same cakes don't re-alert, but running out does"""
+    notify_low_stock(db_session, branch_with_subscribers, SALE)
+    sent.clear()
+
+    assert notify_low_stock(db_session, branch_with_subscribers, SALE) == 0
+    assert sent == []
+
+    assert notify_low_stock(db_session, branch_with_subscribers, [LowStockEvent("Cookies Cake", "ATC", 0, 2)]) == 1
+    assert sent[0][1]["title"] == "OUT OF STOCK: Cookies Cake"
+
+    assert notify_low_stock(db_session, branch_with_subscribers, SALE, force=True) == 2
+
+
+def test_manager_chain_is_cached(db_session, branch_with_subscribers, sent, query_log):
+    """Test the manager chain is resolved once per branch, not per alert"""
+    notify_low_stock(db_session, branch_with_subscribers, SALE)
+
+    query_log.clear()
+    notify_low_stock(db_session, branch_with_subscribers, SALE, force=True)
+    statements = list(query_log)
+
+    assert len(sent) == 4
+    assert not [s for s in statements if "FROM users" in s or "FROM branches" in s]
+
+
+def test_manager_chain_refreshes_when_manager_changes(db_session, branch_with_subscribers):
+    """Test deactivating a manager is seen at once, not after the cache TTL"""
+    before = push_service.get_branch_recipients(db_session, branch_with_subscribers).manager_user_ids
+    am = db_session.query(User).filter(User.username == "am").one()
+    assert am.id in before
+
+    am.is_active = False
+    db_session.commit()
+    assert am.id not in push_service.get_branch_recipients(db_session, branch_with_subscribers).manager_user_ids
+
+    # Bulk updates skip flush events but still drop the cache
+    db_session.query(User).filter(User.username == "hq").update({"is_active": False})
+    db_session.commit()
+    assert push_service.get_branch_recipients(db_session, branch_with_subscribers).manager_user_ids == frozenset()
@@ -0,0 +1,98 @@
+"""
+Test the background push dispatch queue
+Run: cd apps/api && python -m pytest tests/test_push_dispatch.py -v
+"""
+
+import asyncio
+import threading
+import time
+
+from models.notification import PushSubscription
+from services.push_dispatch import RETRY, SENT, STALE, PushDispatcher, PushMessage
+from tests.conftest import TestSessionLocal
+from utils.config import settings
+
+
+def _message(i: int) -> PushMessage:
+    return PushMessage(subscription_id=i, endpoint=f"https://push.example/{i}",
+                       p256dh_key="key", auth_key="auth", payload="{}")
+
+
+def test_enqueue_returns_immediately_and_bounds_concurrency():
+    """Test handlers don't wait on delivery and at most `workers` sends run at once"""
+    lock = threading.Lock()
+    state = {"running": 0, "peak": 0}
+
+    def slow_sender(message):
+        with lock:
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+        time.sleep(0.05)
+        with lock:
+            state["running"] -= 1
+        return SENT
+
+    async def run():
+        dispatcher = PushDispatcher(workers=3, sender=slow_sender)
+        await dispatcher.start()
+        started = time.monotonic()
+        assert dispatcher.enqueue(_message(i) for i in range(9)) == 9
+        enqueue_elapsed = time.monotonic() - started
+        await dispatcher.stop()
+        return dispatcher, enqueue_elapsed
+
+    dispatcher, enqueue_elapsed = asyncio.run(run())
+    assert enqueue_elapsed < 0.05
+    assert state["peak"] == 3
+    assert dispatcher.counters["sent"] == 9
+
+
+def test_transient_failures_are_retried(monkeypatch):
+    """Test a throttled send is retried with backoff, then gives up after PUSH_MAX_RETRIES"""
+    monkeypatch.setattr(settings, "PUSH_RETRY_BASE_SECONDS", 0.01)
+    monkeypatch.setattr(settings, "PUSH_MAX_RETRIES", 2)
+    attempts = {}
+
+    def flaky_sender(message):
+        attempts[message.subscription_id] = attempts.get(message.subscription_id, 0) + 1
+        if message.subscription_id == 1:
+            return RETRY  # never recovers
+        return SENT if attempts[message.subscription_id] >= 2 else RETRY
+
+    async def run():
+        dispatcher = PushDispatcher(workers=2, sender=flaky_sender)
+        await dispatcher.start()
+        dispatcher.enqueue([_message(1), _message(2)])
+        await asyncio.sleep(0.3)
+        await dispatcher.stop()
+        return dispatcher
+
+    dispatcher = asyncio.run(run())
+    assert attempts == {1: 3, 2: 2}
+    assert dispatcher.counters["sent"] == 1
+    assert dispatcher.counters["failed"] == 1
+    assert dispatcher.counters["retried"] == 3
+
+
+def test_stale_subscriptions_deactivated_in_batch(db_session):
+    """Test 404/410 subscriptions are marked inactive once the queue drains"""
+    subs = [PushSubscription(endpoint=f"https://push.example/{i}", p256dh_key="k", auth_key="a") for i in range(4)]
+    db_session.add_all(subs)
+    db_session.commit()
+    gone = {subs[0].id, subs[2].id}
+
+    def sender(message):
+        return STALE if message.subscription_id in gone else SENT
+
+    async def run():
+        dispatcher = PushDispatcher(workers=2, session_factory=TestSessionLocal, sender=sender)
+        await dispatcher.start()
+        dispatcher.enqueue(PushMessage.for_subscription(sub, "{}") for sub in subs)
+        await dispatcher.stop()
+        return dispatcher
+
+    dispatcher = asyncio.run(run())
+    assert dispatcher.counters["stale"] == 2
+    db_session.expire_all()
+    inactive = {s.id for s in db_session.query(PushSubscription).filter(PushSubscription.is_active == False)}
+    assert inactive == gone
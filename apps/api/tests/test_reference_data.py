@@ -0,0 +1,132 @@
+"""
+Test the reference data cache and its versioned invalidation
+Run: cd apps/api && python -m pytest tests/test_reference_data.py -v
+"""
+
+import pytest
+from sqlalchemy import update
+
+from models.cake import CakeProduct
+from models.inventory import Flavor
+from models.location import Branch, Territory
+from models.reference_data import ReferenceDataVersion
+from models.user import User, UserRole
+from services import reference_data
+from tests.conftest import engine
+from utils.config import settings
+
+
+@pytest.fixture
+def flavors(db_session):
+    db_session.add_all([
+        Flavor(name="Pralines 'n Cream", code="PRALINE", category="Classic"),
+        Flavor(name="Chocolate Chip", code="CHOC-CHIP", category="Classic"),
+        Flavor(name="Mango Sorbet", code="MANGO", category="Seasonal", is_active=False),
+    ])
+    db_session.commit()
+
+
+def _version(db_session, kind):
+    db_session.expire_all()
+    row = db_session.get(ReferenceDataVersion, kind)
+    return row.version if row else 0
+
+
+def test_warm_lookups_issue_no_queries(db_session, flavors, query_log):
+    """Test repeated lookups are served from memory after the first load"""
+    names = [f.name for f in reference_data.get_flavors(db_session)]
+    assert names == ["Chocolate Chip", "Pralines 'n Cream"]
+
+    query_log.clear()
+    for _ in range(20):
+        reference_data.get_flavors(db_session)
+        reference_data.get_flavor(db_session, 1)
+    assert query_log == []
+
+
+def test_writes_bump_the_version_in_the_same_transaction(db_session, flavors):
+    """Test an ORM write bumps the kind's counter and the local cache sees it at once"""
+    assert _version(db_session, "flavors") == 1
+    assert len(reference_data.get_flavors(db_session)) == 2
+
+    flavor = db_session.query(Flavor).filter(Flavor.code == "MANGO").one()
+    flavor.is_active = True
+    db_session.commit()
+
+    assert _version(db_session, "flavors") == 2
+    assert len(reference_data.get_flavors(db_session)) == 3
+
+    db_session.add(Flavor(name="Cotton Candy", code="COTTON"))
+    db_session.rollback()
+    assert _version(db_session, "flavors") == 2
+
+
+def test_other_worker_changes_are_picked_up_by_version(db_session, flavors, monkeypatch):
+    """Test a change committed elsewhere is served once the version row is re-read"""
+    monkeypatch.setattr(settings, "REFERENCE_CACHE_VERSION_CHECK_SECONDS", 3600)
+    assert reference_data.get_flavor(db_session, 1).name == "Pralines 'n Cream"
+
+    # Another worker renames the flavor: plain SQL, so this process gets no session events
+    with engine.begin() as conn:
+        conn.execute(update(Flavor.__table__).where(Flavor.id == 1).values(name="Praline"))
+        reference_data._bump(conn, {"flavors"})
+
+    assert reference_data.get_flavor(db_session, 1).name == "Pralines 'n Cream"
+
+    monkeypatch.setattr(settings, "REFERENCE_CACHE_VERSION_CHECK_SECONDS", 0)
+    assert reference_data.get_flavor(db_session, 1).name == "Praline"
+
+
+def test_cake_stock_tolerates_product_deactivated_elsewhere(client, auth_headers, db_session, monkeypatch):
+    """Test a product still in the stale cache but inactive in the DB falls back to its default threshold"""
+    territory = Territory(name="Dubai", code="DUBAI")
+    db_session.add(territory)
+    db_session.flush()
+    branch = Branch(name="Karama Centre", code="BR-KRM-001", territory_id=territory.id)
+    db_session.add_all([branch, CakeProduct(name="Chocolate Cake", code="CPU", default_alert_threshold=3)])
+    db_session.commit()
+
+    monkeypatch.setattr(settings, "REFERENCE_CACHE_VERSION_CHECK_SECONDS", 3600)
+    url = f"/api/v1/cake/cake-stock/{branch.id}"
+    assert len(client.get(url, headers=auth_headers).json()) == 1
+
+    with engine.begin() as conn:
+        conn.execute(update(CakeProduct.__table__).values(is_active=False))
+        reference_data._bump(conn, {"cake_products"})
+
+    response = client.get(url, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()[0]["alert_threshold"] == 3
+
+
+def test_branch_staff_changes_do_not_bump(db_session):
+    """Test only column changes count; a backref collection change leaves the counter alone"""
+    territory = Territory(name="Dubai", code="DUBAI")
+    db_session.add(territory)
+    db_session.flush()
+    branch = Branch(name="Karama Centre", code="BR-KRM-001", territory_id=territory.id)
+    db_session.add(branch)
+    db_session.commit()
+    before = _version(db_session, "branches")
+
+    branch.staff.append(User(email="fe@example.com", username="fe", hashed_password="x",
+                             full_name="FE", role=UserRole.STAFF))
+    db_session.commit()
+    assert _version(db_session, "branches") == before
+
+    assert reference_data.location_names(db_session, territory.id, None, branch.id) == (
+        "Dubai", None, "Karama Centre"
+    )
+
+
+def test_flavor_routes_serve_cached_data(client, auth_headers, flavors):
+    """Test the flavors API reflects its own writes through the cache"""
+    assert len(client.get("/api/v1/flavors", headers=auth_headers).json()) == 2
+    assert client.get("/api/v1/flavors/categories", headers=auth_headers).json() == ["Classic", "Seasonal"]
+
+    response = client.post("/api/v1/flavors", headers=auth_headers,
+                           json={"name": "Cotton Candy", "code": "COTTON", "category": "Classic"})
+    assert response.status_code == 201
+
+    names = [f["name"] for f in client.get("/api/v1/flavors?search=cotton", headers=auth_headers).json()]
+    assert names == ["Cotton Candy"]
@@ -0,0 +1,213 @@
+"""
+Test sales reporting endpoints
+Run: cd apps/api && python -m pytest tests/test_sales.py -v
+"""
+
+import json
+from datetime import date
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from models.location import Territory, Branch
+from models.sales import DailySales, DailyBudget, SalesWindowType, SalesLineItem, TrackedItem, BranchDaySales
+from services.sales_rollup import rebuild_rollup
+
+
+@pytest.fixture
+def sales_branches(db_session, verified_user):
+    """Two branches with closing sales and budgets on 2026-03-10"""
+    territory = Territory(name="Dubai", code="DUBAI")
+    db_session.add(territory)
+    db_session.flush()
+
+    branches = [
+        Branch(name="Karama Centre", code="BR-KRM-001", territory_id=territory.id),
+        Branch(name="Marina Mall", code="BR-MAR-001", territory_id=territory.id),
+    ]
+    db_session.add_all(branches)
+    db_session.flush()
+
+    user_id = verified_user["user"]["id"]
+    for branch, net, gc in [(branches[0], 1000.0, 50), (branches[1], 3000.0, 100)]:
+        db_session.add(DailySales(
+            branch_id=branch.id, date=date(2026, 3, 10), sales_window=SalesWindowType.CLOSING,
+            total_sales=net, gross_sales=net * 1.05, transaction_count=gc, atv=net / gc,
+            submitted_by_id=user_id,
+        ))
+        db_session.add(DailyBudget(branch_id=branch.id, budget_date=date(2026, 3, 10), budget_amount=2000.0))
+    # Prior-period sales for the first branch only
+    db_session.add(DailySales(
+        branch_id=branches[0].id, date=date(2026, 3, 9), sales_window=SalesWindowType.CLOSING,
+        total_sales=500.0, transaction_count=20, submitted_by_id=user_id,
+    ))
+    db_session.commit()
+    return [b.id for b in branches]
+
+
+def test_branch_ranking_by_sales(client, auth_headers, sales_branches):
+    """Test branch ranking orders branches and computes budget achievement"""
+    response = client.get(
+        "/api/v1/sales/branch-ranking",
+        params={"date_from": "2026-03-10", "date_to": "2026-03-10"},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    ranking = response.json()["ranking"]
+    assert [r["branch_name"] for r in ranking] == ["Marina Mall", "Karama Centre"]
+    assert ranking[0]["rank"] == 1
+    assert ranking[0]["budget_ach_pct"] == 150.0
+    assert ranking[1]["total_gc"] == 50
+    assert ranking[1]["change_vs_prev"] == 100.0
+
+
+def test_branch_ranking_requires_auth(client):
+    """Test branch ranking rejects anonymous requests"""
+    response = client.get(
+        "/api/v1/sales/branch-ranking",
+        params={"date_from": "2026-03-10", "date_to": "2026-03-10"},
+    )
+    assert response.status_code in (401, 403)
+
+
+def test_daily_sales_window_is_unique(db_session, verified_user, sales_branches):
+    """Test the (branch, date, window) unique index rejects a duplicate submission"""
+    db_session.add(DailySales(
+        branch_id=sales_branches[0], date=date(2026, 3, 10), sales_window=SalesWindowType.CLOSING,
+        total_sales=1.0, submitted_by_id=verified_user["user"]["id"],
+    ))
+    with pytest.raises(IntegrityError):
+        db_session.commit()
+    db_session.rollback()
+
+
+def _count_ranking_queries(client, auth_headers, async_query_log):
+    """Run branch-ranking and return how many statements hit the async engine"""
+    async_query_log.clear()
+    response = client.get(
+        "/api/v1/sales/branch-ranking",
+        params={"date_from": "2026-03-10", "date_to": "2026-03-10"},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    return len(async_query_log), response.json()["ranking"]
+
+
+def test_branch_ranking_query_count_is_constant(
+    client, auth_headers, db_session, verified_user, sales_branches, async_query_log,
+):
+    """Benchmark: branch-ranking query count does not grow with branch count"""
+    baseline_count, ranking = _count_ranking_queries(client, auth_headers, async_query_log)
+    assert len(ranking) == 2
+
+    territory_id = db_session.get(Branch, sales_branches[0]).territory_id
+    user_id = verified_user["user"]["id"]
+    for i in range(20):
+        branch = Branch(name=f"Branch {i}", code=f"BR-BENCH-{i:03d}", territory_id=territory_id)
+        db_session.add(branch)
+        db_session.flush()
+        db_session.add(DailySales(
+            branch_id=branch.id, date=date(2026, 3, 10), sales_window=SalesWindowType.CLOSING,
+            total_sales=100.0 + i, transaction_count=10, submitted_by_id=user_id,
+        ))
+        db_session.add(DailyBudget(branch_id=branch.id, budget_date=date(2026, 3, 10), budget_amount=200.0))
+    db_session.commit()
+
+    count, ranking = _count_ranking_queries(client, auth_headers, async_query_log)
+    assert len(ranking) == 22
+    assert count == baseline_count
+
+
+def _submit_items(client, auth_headers, branch_id, day, items):
+    """Submit a closing report carrying POS line items"""
+    response = client.post("/api/v1/sales/daily", headers=auth_headers, json={
+        "branch_id": branch_id, "date": day, "sales_window": "closing",
+        "total_sales": sum(i["sales"] for i in items), "items_data": json.dumps(items),
+    })
+    assert response.status_code == 200
+
+
+def test_promotion_roi_aggregates_line_items(client, auth_headers, db_session, sales_branches):
+    """Test ROI matches code / NAME: / CAT: tracked items against submitted line items"""
+    branch_id = sales_branches[1]
+    cone = {"code": "1142", "name": "Chc Pnt Bliss S", "category": "Cups & Cones", "quantity": 2, "sales": 36.0}
+    shake = {"code": "2001", "name": "Mango Shake", "category": "Beverages", "quantity": 3, "sales": 45.0}
+    _submit_items(client, auth_headers, branch_id, "2026-03-11", [cone])
+    _submit_items(client, auth_headers, branch_id, "2026-03-12", [cone])
+    # Resubmitting the window replaces its line items instead of duplicating them
+    _submit_items(client, auth_headers, branch_id, "2026-03-12", [dict(cone, quantity=4, sales=72.0), shake])
+    assert db_session.query(SalesLineItem).filter(SalesLineItem.branch_id == branch_id).count() == 3
+
+    db_session.add_all([
+        TrackedItem(branch_id=branch_id, item_code="1142", item_name="Bliss"),
+        TrackedItem(branch_id=branch_id, item_code="NAME:shake", item_name="Shakes"),
+        TrackedItem(branch_id=branch_id, item_code="CAT:cups & cones", item_name="Cups"),
+    ])
+    db_session.commit()
+
+    response = client.get(
+        "/api/v1/sales/promotion-roi",
+        params={"date_from": "2026-03-12", "date_to": "2026-03-12"},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    items = {i["name"]: i for i in response.json()["items"]}
+    assert items["Bliss"]["qty"] == 4
+    assert items["Bliss"]["baseline_qty"] == 2
+    assert items["Bliss"]["sales_change_pct"] == 100.0
+    assert items["Bliss"]["branch_name"] == "Marina Mall"
+    assert items["Shakes"]["sales"] == 45.0
+    assert items["Shakes"]["type"] == "name"
+    assert items["Cups"]["qty"] == 4
+    assert items["Cups"]["baseline_sales"] == 36.0
+
+
+def test_submit_maintains_branch_day_rollup(client, auth_headers, db_session, sales_branches):
+    """Test each submission refreshes the day's rollup to the latest cumulative window"""
+    branch_id = sales_branches[0]
+    for window, net, gc in [("closing", 300.0, 25), ("3pm", 100.0, 10)]:
+        response = client.post("/api/v1/sales/daily", headers=auth_headers, json={
+            "branch_id": branch_id, "date": "2026-03-15", "sales_window": window,
+            "total_sales": net, "gross_sales": net * 1.05, "transaction_count": gc,
+            "hd_gross_sales": 50.0 if window == "closing" else 0, "hd_orders": 2 if window == "closing" else 0,
+        })
+        assert response.status_code == 200
+
+    rollup = db_session.query(BranchDaySales).filter_by(branch_id=branch_id, date=date(2026, 3, 15)).one()
+    assert rollup.latest_window == "closing"
+    assert rollup.windows_submitted == 2
+    assert rollup.net_sales == 300.0
+
+    response = client.get("/api/v1/budget/tracker-overview", params={"date": "2026-03-15"}, headers=auth_headers)
+    assert response.status_code == 200
+    row = next(b for b in response.json()["branches"] if b["branch_id"] == branch_id)
+    assert row["actual_gross"] == 365.0
+    assert row["actual_gc"] == 27
+    assert row["windows"] == 2
+
+    response = client.get(f"/api/v1/budget/advisor/{branch_id}", params={"date": "2026-03-15"}, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["latest_window"] == "closing"
+    assert response.json()["mtd"]["actual_gc"] == 27
+
+    response = client.get(f"/api/v1/budget/chart/{branch_id}", params={"month": "2026-03"}, headers=auth_headers)
+    day = next(d for d in response.json()["days"] if d["date"] == "2026-03-15")
+    assert day["actual"] == 300.0
+
+    response = client.get("/api/v1/sales/monthly-yoy", params={"year": 2026, "branch_id": branch_id}, headers=auth_headers)
+    assert response.json()["months"][2]["current"] == 315.0
+
+    response = client.get("/api/v1/reports/scorecards", params={"date": "2026-03-15"}, headers=auth_headers)
+    card = next(c for c in response.json() if c["branch_id"] == branch_id)
+    assert card["sales"]["today"] == 315.0
+
+
+def test_rebuild_rollup_from_history(db_session, sales_branches):
+    """Test the rebuild recomputes one row per branch-day from raw windows"""
+    assert rebuild_rollup(db_session) == 3
+    rollups = db_session.query(BranchDaySales).filter_by(date=date(2026, 3, 10)).all()
+    assert sorted(r.net_sales for r in rollups) == [1000.0, 3000.0]
+
+    response_rows = rebuild_rollup(db_session, date_from=date(2026, 3, 10))
+    assert response_rows == 2
+    assert db_session.query(BranchDaySales).count() == 3
@@ -0,0 +1,120 @@
+"""
+Test the WhatsApp delivery queue and outbox
+Run: cd apps/api && python -m pytest tests/test_whatsapp_queue.py -v
+"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from models.whatsapp_config import WhatsAppOutboxMessage, WhatsAppOutboxStatus
+from services.whatsapp import WhatsAppClient
+from tests.conftest import TestSessionLocal
+from utils.config import settings
+
+
+class FakeWhatsAppService:
+    """Stands in for br-whatsapp: records /send bodies, optionally failing or hanging"""
+
+    def __init__(self, status_code=200, delay=0.0):
+        self.status_code = status_code
+        self.delay = delay
+        self.sends = []
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.sends.append(json.loads(request.content))
+        return httpx.Response(self.status_code, json={"success": self.status_code == 200})
+
+
+@pytest.fixture(autouse=True)
+def one_worker(monkeypatch):
+    monkeypatch.setattr(settings, "WHATSAPP_WORKERS", 1)
+
+
+def _client(service):
+    return WhatsAppClient(session_factory=TestSessionLocal, transport=httpx.MockTransport(service))
+
+
+def test_same_message_is_batched_across_recipients():
+    """Test queued messages with the same text go out as one multi-recipient send"""
+    service = FakeWhatsAppService()
+
+    async def run():
+        client = _client(service)
+        await client.start()
+        client.enqueue(["971500000001"], "Budget alert")
+        client.enqueue(["971500000002", "971500000001"], "Budget alert")
+        client.enqueue("971500000003", "Budget alert")
+        client.enqueue(["971500000004"], "Sales report")
+        await client.stop()
+        return client
+
+    client = asyncio.run(run())
+    assert service.sends == [
+        {"to": ["971500000001", "971500000002", "971500000003"], "message": "Budget alert"},
+        {"to": ["971500000004"], "message": "Sales report"},
+    ]
+    assert client.counters["batched"] == 2
+
+
+def test_backlog_is_grouped_in_one_pass(db_session, monkeypatch):
+    """Test a mixed backlog keeps first-seen order, splits at the recipient cap, and overflow goes to the outbox"""
+    monkeypatch.setattr(settings, "WHATSAPP_QUEUE_MAX", 110)
+    service = FakeWhatsAppService()
+
+    async def run():
+        client = _client(service)
+        await client.start()
+        for i in range(110):
+            client.enqueue([f"9715{i:08d}"], "Budget alert" if i % 2 else "Sales report")
+        client.enqueue(["971599999999"], "Expiry alert")  # queue full
+        await client.stop()
+
+    asyncio.run(run())
+    assert [(s["message"], len(s["to"])) for s in service.sends] == [
+        ("Sales report", 50), ("Budget alert", 50), ("Sales report", 5), ("Budget alert", 5),
+    ]
+    assert db_session.query(WhatsAppOutboxMessage).one().message == "Expiry alert"
+
+
+def test_failed_send_is_persisted_and_retried(db_session, monkeypatch):
+    """Test an unavailable service sends the message to the outbox, and a retry delivers it"""
+    monkeypatch.setattr(settings, "WHATSAPP_RETRY_BASE_SECONDS", 0)
+    service = FakeWhatsAppService(status_code=503)
+
+    async def run():
+        client = _client(service)
+        await client.start()
+        client.enqueue(["971500000001"], "Sales report")
+        await client.stop()
+
+        service.status_code = 200
+        return await client.retry_outbox()
+
+    assert asyncio.run(run()) == 1
+    row = db_session.query(WhatsAppOutboxMessage).one()
+    assert row.status == WhatsAppOutboxStatus.SENT
+    assert row.attempts == 2
+    assert len(service.sends) == 2
+
+
+def test_shutdown_persists_undelivered_messages(db_session, monkeypatch):
+    """Test draining gives up after the grace period and keeps the rest in the outbox"""
+    monkeypatch.setattr(settings, "WHATSAPP_DRAIN_SECONDS", 0.1)
+    service = FakeWhatsAppService(delay=1.0)
+
+    async def run():
+        client = _client(service)
+        await client.start()
+        for i in range(3):
+            client.enqueue([f"97150000000{i}"], f"Message {i}")
+        await client.stop()
+
+    asyncio.run(run())
+    rows = db_session.query(WhatsAppOutboxMessage).order_by(WhatsAppOutboxMessage.message).all()
+    assert [r.message for r in rows] == ["Message 0", "Message 1", "Message 2"]
+    assert all(r.status == WhatsAppOutboxStatus.PENDING for r in rows)
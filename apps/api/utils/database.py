@@ -1,10 +1,15 @@
 """
 Database configuration and session management
+Sync (psycopg2) and async (asyncpg) engines run side by side while
+routers migrate to AsyncSession.
 """
 
-from sqlalchemy import create_engine
+from typing import Callable, Iterable, Optional, Set
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 
 from utils.config import settings
 
@@ -35,3 +40,118 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# ============== ASYNC ENGINE ==============
+
+def get_async_database_url(url: str) -> str:
+    """Map a sync DATABASE_URL onto its async driver (asyncpg / aiosqlite)."""
+    if url.startswith("postgresql+asyncpg://") or url.startswith("sqlite+aiosqlite://"):
+        return url
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    if url.startswith("postgresql"):
+        scheme, rest = url.split("://", 1)
+        return f"postgresql+asyncpg://{rest}"
+    if url.startswith("sqlite"):
+        scheme, rest = url.split("://", 1)
+        return f"sqlite+aiosqlite://{rest}"
+    return url
+
+
+# Created lazily so sync-only tools (seed scripts, migrations) don't need the async driver
+_async_engine = None
+_AsyncSessionLocal = None
+
+
+def get_async_engine():
+    """Return the shared async engine, creating it on first use."""
+    global _async_engine, _AsyncSessionLocal
+    if _async_engine is None:
+        url = get_async_database_url(settings.ASYNC_DATABASE_URL or settings.DATABASE_URL)
+        async_kwargs = {"pool_pre_ping": True}
+        if not url.startswith("sqlite"):
+            async_kwargs["pool_size"] = settings.ASYNC_DB_POOL_SIZE
+            async_kwargs["max_overflow"] = settings.ASYNC_DB_MAX_OVERFLOW
+        _async_engine = create_async_engine(url, **async_kwargs)
+        _AsyncSessionLocal = async_sessionmaker(
+            bind=_async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+        )
+    return _async_engine
+
+
+def AsyncSessionLocal() -> AsyncSession:
+    """Create a new AsyncSession bound to the shared async engine."""
+    get_async_engine()
+    return _AsyncSessionLocal()
+
+
+async def get_async_db():
+    """
+    Dependency to get an async database session
+    Use in routers that have been migrated off the blocking sync Session
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def dispose_async_engine():
+    """Close pooled async connections (called on application shutdown)."""
+    global _async_engine, _AsyncSessionLocal
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+        _AsyncSessionLocal = None
+
+
+# ============== CACHE INVALIDATION ==============
+
+def register_invalidation(
+    models: Iterable[type],
+    on_change: Callable[[Set], None],
+    pending_key: str,
+    collect: Callable[[Session], Set],
+    bulk_keys: Callable[[type], Set],
+    on_write: Optional[Callable[[Session, Set], None]] = None,
+    bulk_inserts: bool = False,
+):
+    """
+    Keep a process-local cache in step with Session writes.
+    collect(session) returns the cache keys a flush changed, bulk_keys(model) those of a
+    bulk update()/delete() (and insert() if bulk_inserts) on one of models, which bypass
+    flush events. on_write(session, keys) runs straight away inside the transaction;
+    on_change(keys) runs once it commits. A rollback drops the keys.
+    """
+    models = tuple(models)
+
+    def note(session, keys):
+        if keys:
+            session.info.setdefault(pending_key, set()).update(keys)
+            if on_write is not None:
+                on_write(session, keys)
+
+    @event.listens_for(Session, "after_flush")
+    def _collect_flush(session, flush_context):
+        note(session, collect(session))
+
+    @event.listens_for(Session, "do_orm_execute")
+    def _collect_bulk(orm_execute_state):
+        if not (
+            orm_execute_state.is_update
+            or orm_execute_state.is_delete
+            or (bulk_inserts and orm_execute_state.is_insert)
+        ):
+            return
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and issubclass(mapper.class_, models):
+            note(orm_execute_state.session, bulk_keys(mapper.class_))
+
+    @event.listens_for(Session, "after_commit")
+    def _apply_on_commit(session):
+        keys = session.info.pop(pending_key, None)
+        if keys:
+            on_change(keys)
+
+    @event.listens_for(Session, "after_rollback")
+    def _discard_on_rollback(session):
+        session.info.pop(pending_key, None)
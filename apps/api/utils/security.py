@@ -71,7 +71,7 @@ async def get_current_user(
     """
     Dependency to get current authenticated user from JWT token
     """
-    from models.user import User  # Import here to avoid circular imports
+    from services.access_scope import load_principal  # Import here to avoid circular imports
 
     token = credentials.credentials
     payload = decode_token(token)
@@ -89,7 +89,8 @@ async def get_current_user(
             detail="Invalid token payload",
         )
 
-    user = db.query(User).filter(User.id == user_id).first()
+    # Served from the short-TTL principal cache when warm
+    user = load_principal(db, user_id)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,